@@ -8,10 +8,7 @@ from django.apps import apps
 from pathlib import Path
 
 from x007007007.er_django.parser import DjangoModelParser
-from x007007007.er_migrate.converter import ERConverter
-from x007007007.er_migrate.file_manager import FileManager
-from x007007007.er_migrate.differ import ERDiffer
-from x007007007.er_migrate.generator import MigrationGenerator
+from x007007007.er_migrate.batch import BatchGenerator, NamespaceTask
 from x007007007.er_django.settings import get_er_settings, get_er_migrations_dir, ensure_directory_exists
 
 
@@ -44,6 +41,17 @@ class Command(BaseCommand):
             type=str,
             help='Comma-separated list of apps to exclude'
         )
+        parser.add_argument(
+            '--jobs', '-j',
+            type=int,
+            default=0,
+            help='Processes used to generate migrations of several apps in parallel (0 = serial)'
+        )
+        parser.add_argument(
+            '--rename-columns',
+            action='store_true',
+            help='Generate RenameColumn for detected column renames (default: remove + add, listed in the output)'
+        )
     
     def handle(self, *args, **options):
         # Get ER settings
@@ -93,123 +101,93 @@ class Command(BaseCommand):
         if er_settings['auto_create_dirs']:
             ensure_directory_exists(migrations_dir)
         
-        # Process each app
-        generated_migrations = []
+        # Parse models here (the app registry lives in this process); the
+        # migrations of all apps are then generated in parallel
+        tasks = []
         for app_label in target_apps:
-            migration = self._process_app(app_label, migrations_dir, custom_name, dry_run)
-            if migration:
-                generated_migrations.append((app_label, migration))
+            er_model = self._parse_app(app_label)
+            if er_model is not None:
+                tasks.append(NamespaceTask(app_label, er_model, custom_name))
+        
+        jobs = options.get('jobs') or 0
+        if jobs < 0:
+            raise CommandError("--jobs must not be negative")
+        
+        # Each app is diffed once against the state rebuilt from its migrations
+        # (snapshot-aware, unchanged tables skipped); a dry run previews exactly
+        # the migration that would be saved
+        self._dry_run = dry_run
+        batch = BatchGenerator(migrations_dir, jobs=jobs,
+                               differ_options={'accept_renames': options.get('rename_columns', False)})
+        results = batch.run(tasks, save=not dry_run, progress=self._report)
         
         # Summary
-        if generated_migrations:
-            self.stdout.write(self.style.SUCCESS(f"\nGenerated {len(generated_migrations)} migrations:"))
-            for app_label, migration in generated_migrations:
-                self.stdout.write(f"  {app_label}: {migration.name}.yaml")
+        if dry_run:
+            planned = [result for result in results if result.migration is not None]
+            if planned:
+                self.stdout.write(self.style.WARNING(
+                    f"\nDry run - {len(planned)} migrations would be generated, no files created"
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS("No changes detected in any app"))
         else:
-            self.stdout.write(self.style.SUCCESS("No changes detected in any app"))
+            generated = [result for result in results if result.path is not None]
+            if generated:
+                self.stdout.write(self.style.SUCCESS(f"\nGenerated {len(generated)} migrations:"))
+                for result in generated:
+                    self.stdout.write(f"  {result.namespace}: {result.path.name} [{result.duration:.2f}s]")
+            else:
+                self.stdout.write(self.style.SUCCESS("No changes detected in any app"))
+        
+        failed = [result.namespace for result in results if result.error is not None]
+        if failed:
+            raise CommandError(f"Failed to generate migrations for: {', '.join(failed)}")
     
-    def _process_app(self, app_label: str, migrations_dir: str, custom_name: str, dry_run: bool):
-        """Process a single app and generate migration if needed"""
-        self.stdout.write(f"\n--- Processing app '{app_label}' ---")
-        
+    def _parse_app(self, app_label: str):
+        """Parse the Django models of an app into an ER model (None when it has no models)"""
         self.stdout.write(f"Parsing Django models from app '{app_label}'...")
-        
-        # Parse Django models to ER model
-        parser = DjangoModelParser(app_label=app_label)
-        er_model = parser.parse()
+        er_model = DjangoModelParser(app_label=app_label).parse()
         
         if not er_model.entities:
             self.stdout.write(self.style.WARNING(f"No models found in app '{app_label}'"))
             return None
         
-        self.stdout.write(f"Found {len(er_model.entities)} models")
-        
-        # Convert ER model to migration format (for future use)
-        converter = ERConverter()
-        current_state = converter.convert_model(er_model)
-        
-        # Initialize file manager and differ
-        file_manager = FileManager(migrations_dir)
-        differ = ERDiffer()
-        
-        # Get previous state
-        previous_migrations = file_manager.load_namespace_migrations(app_label)
-        if previous_migrations:
-            last_migration = previous_migrations[-1]
-            self.stdout.write(f"Last migration: {last_migration.name}")
-            
-            # For now, create an empty previous model since we don't have state reconstruction
-            # TODO: Implement proper state reconstruction from migrations
-            from x007007007.er.models import ERModel
-            previous_model = ERModel()
-        else:
-            self.stdout.write("No previous migrations found")
-            from x007007007.er.models import ERModel
-            previous_model = ERModel()
-        
-        # Generate diff
-        operations = differ.diff(previous_model, er_model)
-        
-        if not operations:
-            self.stdout.write(self.style.SUCCESS("No changes detected"))
-            return None
-        
-        self.stdout.write(f"Detected {len(operations)} operations:")
-        for op in operations:
-            self.stdout.write(f"  - {op.type}")
-        
-        if dry_run:
-            self.stdout.write(self.style.WARNING("Dry run - no files created"))
-            return None
-        
-        # Generate migration
-        generator = MigrationGenerator(migrations_dir)
+        self.stdout.write(f"Found {len(er_model.entities)} models in '{app_label}'")
+        return er_model
+    
+    def _report(self, result):
+        """Print the outcome of one app as soon as it is generated (and saved)"""
+        if result.error is not None:
+            self.stderr.write(self.style.ERROR(f"[{result.namespace}] {result.error}"))
+            return
         
-        migration = generator.generate(
-            namespace=app_label,
-            current_er=er_model,
-            name=custom_name
+        stats = result.stats
+        self.stdout.write(
+            f"[{result.namespace}] Compared tables: {stats.tables_skipped} unchanged (skipped), "
+            f"{stats.tables_inspected} inspected, {stats.tables_created} created, "
+            f"{stats.tables_dropped} dropped, {stats.tables_renamed} renamed [{result.duration:.2f}s]"
         )
+        for rename in result.renames:
+            message = (f"{rename.table_name}.{rename.old_name} -> {rename.table_name}.{rename.new_name} "
+                       f"(confidence {rename.score:.2f})")
+            if rename.accepted:
+                self.stdout.write(self.style.WARNING(f"[{result.namespace}] Detected column rename: {message}"))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f"[{result.namespace}] Possible column rename: {message}, generated as remove + add; "
+                    f"use --rename-columns to rename it"
+                ))
+        if result.migration is None:
+            self.stdout.write(f"[{result.namespace}] No changes detected")
+            return
         
-        if migration:
-            # Save the migration to disk
-            migration_path = generator.file_manager.save_migration(migration)
-            self.stdout.write(f"Migration saved to: {migration_path}")
-            return migration
+        operations = result.migration.operations
+        if self._dry_run:
+            self.stdout.write(f"[{result.namespace}] Would generate '{result.migration.name}' "
+                              f"with {len(operations)} operations:")
+            for op in operations:
+                target = getattr(op, 'table_name', None) or f"{op.old_name} -> {op.new_name}"
+                self.stdout.write(f"  - {op.type} {target}")
         else:
-            self.stdout.write("No migration generated")
-            return None
-    
-    def _rebuild_state(self, migrations):
-        """Rebuild database state from migrations"""
-        state = {"tables": {}, "foreign_keys": []}
-        
-        for migration in migrations:
-            for operation in migration.operations:
-                op_type = operation.type
-                
-                if op_type == "CreateTable":
-                    state["tables"][operation.table_name] = {
-                        "columns": operation.columns,
-                        "indexes": []
-                    }
-                elif op_type == "DropTable":
-                    state["tables"].pop(operation.table_name, None)
-                elif op_type == "AddColumn":
-                    if operation.table_name in state["tables"]:
-                        state["tables"][operation.table_name]["columns"].append(operation.column)
-                elif op_type == "RemoveColumn":
-                    if operation.table_name in state["tables"]:
-                        state["tables"][operation.table_name]["columns"] = [
-                            col for col in state["tables"][operation.table_name]["columns"]
-                            if col.name != operation.column_name
-                        ]
-                elif op_type == "AddForeignKey":
-                    state["foreign_keys"].append(operation.foreign_key)
-                elif op_type == "RemoveForeignKey":
-                    state["foreign_keys"] = [
-                        fk for fk in state["foreign_keys"]
-                        if not (fk.column_name == operation.constraint_name)
-                    ]
-        
-        return state
+            self.stdout.write(f"[{result.namespace}] {len(operations)} operations, "
+                              f"migration saved to: {result.path}")
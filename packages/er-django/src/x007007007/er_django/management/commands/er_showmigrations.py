@@ -8,6 +8,7 @@ from django.apps import apps
 from pathlib import Path
 
 from x007007007.er_migrate.file_manager import FileManager
+from x007007007.er_migrate.history import MigrationHistory
 from x007007007.er_django.settings import get_er_migrations_dir
 
 
@@ -63,7 +64,7 @@ class Command(BaseCommand):
     
     def _show_app_migrations(self, file_manager, app_label):
         """Show migrations for a specific app"""
-        migrations = file_manager.load_namespace_migrations(app_label)
+        migrations = MigrationHistory(file_manager, app_label).migrations
         
         if not migrations:
             self.stdout.write(f"{app_label}:")
@@ -265,3 +265,73 @@ class TestIntegration:
         # Check foreign keys
         assert 'foreign_keys' in migration_data
         assert len(migration_data['foreign_keys']) > 0
+
+
+class TestMakemigrationsCommand:
+    """Tests for the er_makemigrations management command"""
+    
+    def _run(self, migrations_dir, *args):
+        from io import StringIO
+        from django.core.management import call_command
+        
+        out = StringIO()
+        call_command('er_makemigrations', 'auth', '--migrations-dir', str(migrations_dir), *args, stdout=out)
+        return out.getvalue()
+    
+    def test_dry_run_previews_the_saved_migration(self, tmp_path):
+        """Test a dry run lists the operations that would be saved, without writing files"""
+        output = self._run(tmp_path, '--dry-run')
+        
+        assert "Would generate 'initial'" in output
+        assert "- CreateTable user" in output
+        assert not list(tmp_path.glob("auth/*.yaml"))
+    
+    def test_second_run_diffs_against_rebuilt_state(self, tmp_path):
+        """Test the previous migrations are replayed instead of diffing against an empty model"""
+        self._run(tmp_path)
+        assert [p.name for p in (tmp_path / "auth").glob("*.yaml")] == ["0001_initial.yaml"]
+        
+        output = self._run(tmp_path, '--dry-run')
+        assert "No changes detected" in output
+        assert "Would generate" not in output
+        
+        self._run(tmp_path)
+        assert [p.name for p in (tmp_path / "auth").glob("*.yaml")] == ["0001_initial.yaml"]
+    
+    def test_dry_run_leaves_directory_unchanged(self, tmp_path):
+        """Test a dry run replays the migrations without writing the index, manifest or snapshots"""
+        self._run(tmp_path)
+        (tmp_path / "auth" / ".index.json").unlink()
+        before = {path: path.read_bytes() for path in tmp_path.rglob("*") if path.is_file()}
+        
+        self._run(tmp_path, '--dry-run')
+        assert {path: path.read_bytes() for path in tmp_path.rglob("*") if path.is_file()} == before
+    
+    def _rename_username_column(self, tmp_path):
+        """Rewrite the saved initial migration as if the model had a user_name column"""
+        from x007007007.er_migrate.file_manager import FileManager
+        
+        self._run(tmp_path)
+        path = next((tmp_path / "auth").glob("0001_*.yaml"))
+        migration = FileManager(str(tmp_path)).load_migration("auth", path.name)
+        for op in migration.operations:
+            for column in getattr(op, 'columns', []):
+                if column.name == "username":
+                    column.name = "user_name"
+        for path in tmp_path.rglob("*"):
+            if path.is_file():
+                path.unlink()
+        FileManager(str(tmp_path)).save_migration(migration)
+    
+    def test_detected_rename_needs_opt_in(self, tmp_path):
+        """Test a detected column rename is listed and only generated as RenameColumn with --rename-columns"""
+        self._rename_username_column(tmp_path)
+        
+        output = self._run(tmp_path, '--dry-run')
+        assert "Possible column rename: user.user_name -> user.username" in output
+        assert "- RemoveColumn user" in output
+        assert "- RenameColumn" not in output
+        
+        output = self._run(tmp_path, '--dry-run', '--rename-columns')
+        assert "Detected column rename: user.user_name -> user.username" in output
+        assert "- RenameColumn user" in output
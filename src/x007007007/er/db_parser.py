@@ -1,156 +1,293 @@
 import logging
 import re
 from contextlib import contextmanager
+from typing import Dict, Iterator, List, Union
 from sqlalchemy import create_engine, inspect
 from x007007007.er.base import Parser
-from x007007007.er.models import ERModel, Entity, Column as ERColumn, Relationship
+from x007007007.er.models import ERModel, Entity, Column as ERColumn, Relationship, Index
 
 logger = logging.getLogger(__name__)
 
 
 class DBParser(Parser):
+    # Number of tables reflected per catalog round-trip
+    DEFAULT_BATCH_SIZE = 100
+
     def __init__(self):
         self._engine = None
-    
+
     @contextmanager
     def _get_inspector(self, db_url: str):
         """Context manager for database connection."""
         assert isinstance(db_url, str), "DB URL must be a string"
         assert len(db_url) > 0, "DB URL cannot be empty"
-        
+
         engine = create_engine(db_url)
         self._engine = engine
-        inspector = inspect(engine)
-        yield inspector
-        engine.dispose()
-        self._engine = None
-    
+        try:
+            yield inspect(engine)
+        finally:
+            # Generators may be closed early by the consumer
+            engine.dispose()
+            self._engine = None
+
     def parse(self, db_url: str) -> ERModel:
         assert isinstance(db_url, str), "DB URL must be a string"
         assert len(db_url) > 0, "DB URL cannot be empty"
-        
+
         model = ERModel()
-        
+        for item in self.iter_entities(db_url):
+            if isinstance(item, Entity):
+                model.add_entity(item)
+            else:
+                model.add_relationship(item)
+        return model
+
+    def iter_entities(self, db_url: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Union[Entity, Relationship]]:
+        """
+        Reflect the database lazily.
+
+        Yields every Entity as soon as its batch of tables has been reflected,
+        then yields the Relationships once all entities are known. Only primary
+        key and foreign key metadata is kept between batches.
+        """
+        assert isinstance(db_url, str), "DB URL must be a string"
+        assert len(db_url) > 0, "DB URL cannot be empty"
+        assert isinstance(batch_size, int) and batch_size > 0, "batch_size must be a positive integer"
+
+        pk_columns: Dict[str, List[str]] = {}
+        foreign_keys: Dict[str, List[dict]] = {}
+
         with self._get_inspector(db_url) as inspector:
-            # Get all table names
-            table_names = inspector.get_table_names()
             # Allow empty database for testing purposes
-            
-            # First pass: create entities and columns
-            for table_name in table_names:
-                entity = Entity(name=table_name)
-                pk_constraint = inspector.get_pk_constraint(table_name)
-                pk_cols = pk_constraint.get('constrained_columns', []) if pk_constraint else []
-                
-                # Get table comment if available (may not be supported by all databases)
-                try:
-                    table_info = inspector.get_table_comment(table_name)
-                    if table_info and table_info.get('text'):
-                        entity.comment = table_info['text']
-                except NotImplementedError:
-                    # Some databases don't support table comments
-                    pass
-                
-                # Process columns
-                for col in inspector.get_columns(table_name):
-                    col_type = str(col['type'])
-                    
-                    # Extract max_length from type string if available
-                    max_length = None
-                    if 'VARCHAR' in col_type.upper() or 'CHAR' in col_type.upper():
-                        match = re.search(r'\((\d+)\)', col_type)
-                        if match:
-                            max_length = int(match.group(1))
-                    
-                    # Extract precision and scale for decimal types
-                    precision = None
-                    scale = None
-                    if 'DECIMAL' in col_type.upper() or 'NUMERIC' in col_type.upper():
-                        match = re.search(r'\((\d+)\s*,\s*(\d+)\)', col_type)
-                        if match:
-                            precision = int(match.group(1))
-                            scale = int(match.group(2))
-                    
-                    # Check if column is a foreign key
-                    is_fk = False
-                    for fk in inspector.get_foreign_keys(table_name):
-                        if col['name'] in fk.get('constrained_columns', []):
-                            is_fk = True
-                            break
-                    
-                    entity.columns.append(ERColumn(
-                        name=col['name'],
-                        type=col_type,
-                        is_pk=col['name'] in pk_cols,
-                        is_fk=is_fk,
-                        nullable=col['nullable'],
-                        default=str(col['default']) if col['default'] is not None else None,
-                        comment=col.get('comment'),
-                        max_length=max_length,
-                        precision=precision,
-                        scale=scale
-                    ))
-                
-                model.add_entity(entity)
-            
+            table_names = inspector.get_table_names()
+
+            # First pass: reflect entities batch by batch
+            for start in range(0, len(table_names), batch_size):
+                batch = table_names[start:start + batch_size]
+                for entity in self._reflect_batch(inspector, batch, pk_columns, foreign_keys):
+                    yield entity
+
             # Second pass: create relationships from foreign keys
             for table_name in table_names:
-                for fk in inspector.get_foreign_keys(table_name):
-                    # fk structure: {
-                    #   'constrained_columns': ['local_col'],
-                    #   'referred_table': 'referred_table',
-                    #   'referred_columns': ['referred_col']
-                    # }
-                    local_cols = fk.get('constrained_columns', [])
-                    referred_table = fk.get('referred_table')
-                    referred_cols = fk.get('referred_columns', [])
-                    
-                    if not local_cols or not referred_table or not referred_cols:
-                        logger.warning(f"Incomplete foreign key definition in table '{table_name}', skipping")
-                        continue
-                    
-                    # Determine relationship type
-                    # Check if referred table has a unique constraint on the referred column
-                    referred_pk = inspector.get_pk_constraint(referred_table)
-                    referred_pk_cols = referred_pk.get('constrained_columns', []) if referred_pk else []
-                    
-                    # If referred column is PK, it's likely one-to-many or one-to-one
-                    # If local column is also unique, it's one-to-one
-                    local_entity = model.entities.get(table_name)
-                    if local_entity:
-                        local_col = next((c for c in local_entity.columns if c.name == local_cols[0]), None)
-                        if local_col and local_col.is_pk:
-                            # Local PK -> Referred PK: one-to-one
-                            relation_type = "one-to-one"
-                        elif referred_cols[0] in referred_pk_cols:
-                            # Local FK -> Referred PK: many-to-one (reverse: one-to-many)
-                            relation_type = "one-to-many"
-                        else:
-                            # Default to one-to-many
-                            relation_type = "one-to-many"
-                    else:
-                        relation_type = "one-to-many"
-                    
-                    # Create relationship (from referred table to local table for one-to-many)
-                    if relation_type == "one-to-many":
-                        # Referred table (one) -> Local table (many)
-                        rel = Relationship(
-                            left_entity=referred_table,
-                            right_entity=table_name,
-                            relation_type=relation_type,
-                            left_column=referred_cols[0] if referred_cols else None,
-                            right_column=local_cols[0] if local_cols else None
-                        )
-                    else:
-                        # One-to-one: can be either direction
-                        rel = Relationship(
-                            left_entity=table_name,
-                            right_entity=referred_table,
-                            relation_type=relation_type,
-                            left_column=local_cols[0] if local_cols else None,
-                            right_column=referred_cols[0] if referred_cols else None
-                        )
-                    
-                    model.add_relationship(rel)
-        
-        return model
+                for fk in foreign_keys.get(table_name, []):
+                    rel = self._build_relationship(table_name, fk, pk_columns)
+                    if rel is not None:
+                        yield rel
+
+    def _reflect_batch(self, inspector, table_names: List[str],
+                       pk_columns: Dict[str, List[str]],
+                       foreign_keys: Dict[str, List[dict]]) -> Iterator[Entity]:
+        """Reflect a batch of tables with one catalog query per kind of metadata."""
+        columns_by_table = self._by_table(inspector.get_multi_columns(filter_names=table_names))
+        pks_by_table = self._by_table(inspector.get_multi_pk_constraint(filter_names=table_names))
+        fks_by_table = self._by_table(inspector.get_multi_foreign_keys(filter_names=table_names))
+        indexes_by_table = self._by_table(inspector.get_multi_indexes(
+            filter_names=table_names, **self._index_options(inspector)
+        ))
+
+        # Unique constraints are not reflectable on every dialect
+        try:
+            uniques_by_table = self._by_table(inspector.get_multi_unique_constraints(filter_names=table_names))
+        except NotImplementedError:
+            uniques_by_table = {}
+
+        # Get table comments if available (may not be supported by all databases)
+        try:
+            comments_by_table = self._by_table(inspector.get_multi_table_comment(filter_names=table_names))
+        except NotImplementedError:
+            comments_by_table = {}
+
+        for table_name in table_names:
+            pk_constraint = pks_by_table.get(table_name)
+            pk_cols = pk_constraint.get('constrained_columns', []) if pk_constraint else []
+            fks = fks_by_table.get(table_name, [])
+            if fks and inspector.dialect.name == 'sqlite':
+                self._sqlite_foreign_key_actions(inspector, table_name, fks)
+            pk_columns[table_name] = pk_cols
+            foreign_keys[table_name] = fks
+
+            fk_cols = {col for fk in fks for col in fk.get('constrained_columns', [])}
+
+            entity = Entity(name=table_name)
+            table_info = comments_by_table.get(table_name)
+            if table_info and table_info.get('text'):
+                entity.comment = table_info['text']
+
+            for col in columns_by_table.get(table_name, []):
+                entity.columns.append(self._build_column(col, pk_cols, fk_cols))
+
+            self._apply_indexes(
+                entity, pk_cols,
+                uniques_by_table.get(table_name, []),
+                indexes_by_table.get(table_name, [])
+            )
+
+            yield entity
+
+    def _index_options(self, inspector) -> dict:
+        """Dialect specific keyword arguments for index reflection."""
+        if inspector.dialect.name == 'sqlite':
+            # Column level UNIQUE is only visible through SQLite's auto indexes
+            return {'include_auto_indexes': True}
+        return {}
+
+    def _sqlite_foreign_key_actions(self, inspector, table_name: str, fks: List[dict]) -> None:
+        """
+        Fill in ON DELETE/ON UPDATE actions from PRAGMA foreign_key_list.
+
+        SQLAlchemy only parses the actions of table-level FOREIGN KEY clauses;
+        actions on column-level REFERENCES clauses are otherwise lost.
+        """
+        quoted = inspector.dialect.identifier_preparer.quote(table_name)
+        with inspector.bind.connect() as connection:
+            rows = connection.exec_driver_sql(f"PRAGMA foreign_key_list({quoted})").mappings().all()
+        actions = {}
+        for row in rows:
+            key = (row['table'], row['id'])
+            actions.setdefault(key, {'columns': [], 'on_delete': row['on_delete'], 'on_update': row['on_update']})
+            actions[key]['columns'].append(row['from'])
+        for fk in fks:
+            match = next((action for (table, _), action in actions.items()
+                          if table == fk.get('referred_table') and action['columns'] == fk.get('constrained_columns')),
+                         None)
+            if match is None:
+                continue
+            options = fk.setdefault('options', {})
+            for option, action in (('ondelete', match['on_delete']), ('onupdate', match['on_update'])):
+                if action and action.upper() != 'NO ACTION':
+                    options.setdefault(option, action)
+
+    def _apply_indexes(self, entity: Entity, pk_cols: List[str],
+                       unique_constraints: List[dict], indexes: List[dict]) -> None:
+        """
+        Attach reflected unique constraints and indexes to an entity.
+
+        Single-column indexes are stored on the column flags (unique/indexed)
+        together with their real name, multi-column ones in entity.indexes. Indexes that only cover the primary
+        key, expression indexes and duplicates of a unique constraint are skipped.
+        """
+        columns = {col.name: col for col in entity.columns}
+        seen = set()
+
+        reflected = [(uc, True) for uc in unique_constraints]
+        reflected.extend((idx, bool(idx.get('unique'))) for idx in indexes)
+
+        for info, unique in reflected:
+            col_names = info.get('column_names') or []
+            if not col_names or any(name is None for name in col_names):
+                continue
+            if list(col_names) == list(pk_cols):
+                continue
+
+            key = (tuple(col_names), unique)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            if len(col_names) == 1:
+                col = columns.get(col_names[0])
+                if col is None:
+                    continue
+                if unique:
+                    col.unique = True
+                else:
+                    col.indexed = True
+                # SQLite's auto indexes belong to a UNIQUE constraint and cannot be dropped by name
+                name = info.get('name')
+                if name and not name.startswith('sqlite_autoindex_'):
+                    col.index_name = name
+                continue
+
+            name = info.get('name')
+            if not name or name.startswith('sqlite_autoindex_'):
+                name = f"idx_{entity.name}_{'_'.join(col_names)}"
+                if unique:
+                    name = f"{name}_unique"
+            entity.indexes.append(Index(name=name, columns=list(col_names), unique=unique))
+
+    def _by_table(self, reflected: dict) -> dict:
+        """Re-key get_multi_* results from (schema, table) to table name."""
+        return {table_name: value for (_schema, table_name), value in reflected.items()}
+
+    def _build_column(self, col: dict, pk_cols: List[str], fk_cols: set) -> ERColumn:
+        col_type = str(col['type'])
+
+        # Extract max_length from type string if available
+        max_length = None
+        if 'VARCHAR' in col_type.upper() or 'CHAR' in col_type.upper():
+            match = re.search(r'\((\d+)\)', col_type)
+            if match:
+                max_length = int(match.group(1))
+
+        # Extract precision and scale for decimal types
+        precision = None
+        scale = None
+        if 'DECIMAL' in col_type.upper() or 'NUMERIC' in col_type.upper():
+            match = re.search(r'\((\d+)\s*,\s*(\d+)\)', col_type)
+            if match:
+                precision = int(match.group(1))
+                scale = int(match.group(2))
+
+        return ERColumn(
+            name=col['name'],
+            type=col_type,
+            is_pk=col['name'] in pk_cols,
+            is_fk=col['name'] in fk_cols,
+            nullable=col['nullable'],
+            default=str(col['default']) if col['default'] is not None else None,
+            comment=col.get('comment'),
+            max_length=max_length,
+            precision=precision,
+            scale=scale
+        )
+
+    def _build_relationship(self, table_name: str, fk: dict, pk_columns: Dict[str, List[str]]):
+        # fk structure: {
+        #   'constrained_columns': ['local_col'],
+        #   'referred_table': 'referred_table',
+        #   'referred_columns': ['referred_col']
+        # }
+        local_cols = fk.get('constrained_columns', [])
+        referred_table = fk.get('referred_table')
+        referred_cols = fk.get('referred_columns', [])
+        # Dialects leave out the database default NO ACTION
+        options = fk.get('options') or {}
+        on_delete = (options.get('ondelete') or 'NO ACTION').upper()
+        on_update = (options.get('onupdate') or 'NO ACTION').upper()
+
+        if not local_cols or not referred_table or not referred_cols:
+            logger.warning(f"Incomplete foreign key definition in table '{table_name}', skipping")
+            return None
+
+        # Determine relationship type
+        # If local column is also the PK, it's one-to-one
+        # If referred column is PK (or anything else), it's one-to-many
+        if local_cols[0] in pk_columns.get(table_name, []):
+            relation_type = "one-to-one"
+        else:
+            relation_type = "one-to-many"
+
+        # Create relationship (from referred table to local table for one-to-many)
+        if relation_type == "one-to-many":
+            # Referred table (one) -> Local table (many)
+            return Relationship(
+                left_entity=referred_table,
+                right_entity=table_name,
+                relation_type=relation_type,
+                left_column=referred_cols[0],
+                right_column=local_cols[0],
+                on_delete=on_delete,
+                on_update=on_update
+            )
+
+        # One-to-one: can be either direction
+        return Relationship(
+            left_entity=table_name,
+            right_entity=referred_table,
+            relation_type=relation_type,
+            left_column=local_cols[0],
+            right_column=referred_cols[0],
+            on_delete=on_delete,
+            on_update=on_update
+        )
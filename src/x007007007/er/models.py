@@ -15,6 +15,7 @@ class Column:
     scale: Optional[int] = None  # For DECIMAL, NUMERIC
     unique: bool = False
     indexed: bool = False
+    index_name: Optional[str] = None  # Name of the single-column index (unique/indexed), None means idx_{table}_{column}[_unique]
 
 @dataclass
 class Relationship:
@@ -27,6 +28,15 @@ class Relationship:
     right_column: Optional[str] = None  # Foreign key column name in right entity
     left_cardinality: Optional[str] = None  # "1", "0..1", "*", "0..*"
     right_cardinality: Optional[str] = None
+    on_delete: Optional[str] = None  # Foreign key ON DELETE action, None means CASCADE
+    on_update: Optional[str] = None  # Foreign key ON UPDATE action, None means CASCADE
+    constraint_name: Optional[str] = None  # Foreign key constraint name, None means fk_{table}_{column}
+
+@dataclass
+class Index:
+    name: str
+    columns: List[str]  # Ordered column names
+    unique: bool = False
 
 @dataclass
 class Entity:
@@ -35,6 +45,7 @@ class Entity:
     comment: Optional[str] = None
     extends: List[str] = field(default_factory=list)  # 继承的模板列表
     export_path: Optional[str] = None  # 导出路径，None表示不导出（只引用）
+    indexes: List[Index] = field(default_factory=list)  # 多列索引，单列索引用Column.indexed/unique表示
 
 @dataclass
 class ERModel:
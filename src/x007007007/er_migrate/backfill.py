@@ -0,0 +1,190 @@
+"""
+批量回填 - 按键范围分批执行RunBackfill
+
+每批先找出本批的键上界：
+    SELECT key FROM 表 WHERE key > 上一批上界 ORDER BY key LIMIT 1 OFFSET chunk_size - 1
+再更新该范围内的行：
+    UPDATE 表 SET 列 = 表达式 WHERE key > 上一批上界 AND key <= 本批上界
+找不到上界时是最后一批（更新剩余的全部行）。每批在独立的事务中执行，锁只持有一批的时间，
+大表上的回填不会形成一个长事务。键可以是任意唯一且可排序的列（整数、UUID、字符串）。
+
+断点续传：指定任务名时，每批的上界、累计行数和批数与该批的UPDATE在同一个事务中写入
+进度表er_backfill_progress。进程中断时最多丢失正在执行的一批（随事务回滚），重新执行时从
+最后提交的上界继续，已完成的批不会重复执行；已完成的任务直接跳过。
+"""
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Iterable, Optional, Tuple
+import sqlalchemy as sa
+from .models import RunBackfill
+
+
+@dataclass
+class BackfillProgress:
+    """回填进度（每批完成后报告）"""
+    job: Optional[str]
+    table_name: str
+    column_name: str
+    chunks: int                 # 累计完成的批数（含之前中断的执行）
+    rows: int                   # 累计更新的行数
+    last_key: Any               # 最后完成的一批的键上界
+    finished: bool
+    elapsed: float              # 本次执行的耗时（秒）
+    resumed_chunks: int = 0     # 本次执行开始时已完成的批数，大于0表示从断点继续
+
+
+class BackfillRunner:
+    """RunBackfill的分批执行器"""
+
+    PROGRESS_TABLE = "er_backfill_progress"
+
+    def __init__(self, engine: sa.engine.Engine):
+        """
+        初始化执行器
+
+        Args:
+            engine: 目标数据库
+        """
+        assert isinstance(engine, sa.engine.Engine), "engine must be a SQLAlchemy Engine"
+        self.engine = engine
+        self.progress_table = sa.Table(
+            self.PROGRESS_TABLE, sa.MetaData(),
+            sa.Column('job', sa.String(255), primary_key=True),
+            sa.Column('last_key', sa.Text, nullable=True),      # JSON编码的键上界
+            sa.Column('rows', sa.BigInteger, nullable=False),
+            sa.Column('chunks', sa.Integer, nullable=False),
+            sa.Column('finished', sa.Boolean, nullable=False),
+            sa.Column('updated_at', sa.DateTime, nullable=False),
+        )
+        self._progress_table_ready = False
+
+    def run(self, op: RunBackfill, job: Optional[str] = None,
+            progress: Optional[Callable[[BackfillProgress], None]] = None) -> int:
+        """
+        分批执行回填
+
+        Args:
+            op: 回填操作
+            job: 任务名（可选），指定时记录进度并从上次中断的位置继续
+            progress: 每批完成（已提交）后调用（可选）
+
+        Returns:
+            本次执行的批数（任务已完成时为0）
+        """
+        assert isinstance(op, RunBackfill), "op must be a RunBackfill operation"
+
+        lower, rows, chunks, finished = self._load(job)
+        if finished:
+            return 0
+        resumed_chunks = chunks
+        started = time.perf_counter()
+        executed = 0
+        while True:
+            with self.engine.begin() as connection:
+                upper = connection.execute(self.upper_bound_query(op, lower)).scalar()
+                result = connection.execute(self.update_statement(op, lower, upper))
+                rows += max(result.rowcount, 0)
+                chunks += 1
+                finished = upper is None
+                if not finished:
+                    lower = upper
+                if job is not None:
+                    self._save(connection, job, lower, rows, chunks, finished)
+            executed += 1
+
+            if progress is not None:
+                progress(BackfillProgress(job, op.table_name, op.column_name, chunks, rows, lower, finished,
+                                          time.perf_counter() - started, resumed_chunks))
+            if finished:
+                return executed
+            if op.throttle:
+                time.sleep(op.throttle)
+
+    def clear(self, jobs: Iterable[str]) -> None:
+        """
+        删除任务的进度记录（迁移记录为已应用之后调用）
+
+        Args:
+            jobs: 任务名
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return
+        self._ensure_progress_table()
+        with self.engine.begin() as connection:
+            connection.execute(self.progress_table.delete().where(self.progress_table.c.job.in_(jobs)))
+
+    def upper_bound_query(self, op: RunBackfill, lower: Optional[Any]) -> sa.Select:
+        """
+        本批键上界的查询（本批不足chunk_size行时结果为空）
+
+        Args:
+            op: 回填操作
+            lower: 上一批的上界，第一批为None
+        """
+        table = self._table(op)
+        key = table.c[op.key_column]
+        query = sa.select(key).order_by(key).limit(1).offset(op.chunk_size - 1)
+        if lower is not None:
+            query = query.where(key > lower)
+        return query
+
+    def update_statement(self, op: RunBackfill, lower: Optional[Any], upper: Optional[Any]) -> sa.Update:
+        """
+        更新 (lower, upper] 范围内的行，None表示该侧不限
+
+        Args:
+            op: 回填操作
+            lower: 下界（不含）
+            upper: 上界（含）
+        """
+        table = self._table(op)
+        key = table.c[op.key_column]
+        statement = table.update().values({op.column_name: sa.literal_column(op.expression)})
+        if lower is not None:
+            statement = statement.where(key > lower)
+        if upper is not None:
+            statement = statement.where(key <= upper)
+        return statement
+
+    @staticmethod
+    def _table(op: RunBackfill) -> sa.TableClause:
+        return sa.table(op.table_name, sa.column(op.key_column), sa.column(op.column_name))
+
+    # ============ 进度 ============
+
+    def _ensure_progress_table(self) -> None:
+        if not self._progress_table_ready:
+            self.progress_table.create(self.engine, checkfirst=True)
+            self._progress_table_ready = True
+
+    def _load(self, job: Optional[str]) -> Tuple[Optional[Any], int, int, bool]:
+        """任务的 (键上界, 行数, 批数, 是否完成)，没有记录时从头开始"""
+        if job is None:
+            return None, 0, 0, False
+        self._ensure_progress_table()
+        table = self.progress_table
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                sa.select(table.c.last_key, table.c.rows, table.c.chunks, table.c.finished).where(table.c.job == job)
+            ).first()
+        if row is None:
+            return None, 0, 0, False
+        last_key = json.loads(row.last_key) if row.last_key is not None else None
+        return last_key, row.rows, row.chunks, row.finished
+
+    def _save(self, connection, job: str, last_key: Optional[Any], rows: int, chunks: int, finished: bool) -> None:
+        """在当前批的事务中写入进度"""
+        values = {
+            # 整数和字符串键原样保存，其他类型（UUID、日期等）按字符串保存，比较时由数据库转换
+            'last_key': None if last_key is None else json.dumps(last_key, default=str),
+            'rows': rows,
+            'chunks': chunks,
+            'finished': finished,
+            'updated_at': datetime.now(),
+        }
+        table = self.progress_table
+        if connection.execute(table.update().where(table.c.job == job).values(**values)).rowcount == 0:
+            connection.execute(table.insert().values(job=job, **values))
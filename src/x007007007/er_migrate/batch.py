@@ -0,0 +1,166 @@
+"""
+批量生成迁移 - 多个命名空间并行生成，在主进程中保存
+
+每个 (命名空间, ER来源) 在独立的工作进程中完成解析ER图、重建状态和差异检测，
+结果返回主进程后立即在命名空间的文件锁内保存（见FileManager.save_migration），
+总耗时接近最慢的一个命名空间。
+
+交互式确认列重命名需要终端，只在串行执行时可用；并行时由accept_renames（见ERDiffer）
+决定是否接受达到阈值的重命名，检测到的重命名候选随结果返回，由调用方输出。
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+from x007007007.er.models import ERModel
+from .differ import ColumnRename, DiffStats, ERDiffer
+from .file_manager import FileManager
+from .generator import MigrationGenerator
+from .models import Migration
+
+
+@dataclass
+class NamespaceTask:
+    """一个命名空间的生成任务"""
+    namespace: str
+    source: Union[str, ERModel]     # ER图文件路径（Mermaid格式）或已解析的ER模型
+    name: Optional[str] = None      # 自定义迁移名称
+
+
+@dataclass
+class NamespaceResult:
+    """一个命名空间的生成结果"""
+    namespace: str
+    migration: Optional[Migration] = None       # 没有变更时为None
+    stats: DiffStats = field(default_factory=DiffStats)
+    renames: List[ColumnRename] = field(default_factory=list)  # 检测到的列重命名候选（含未接受的）
+    duration: float = 0.0                       # 解析和生成耗时（秒，不含保存）
+    path: Optional[Path] = None                 # 保存的文件路径
+    error: Optional[str] = None
+
+
+def generate_namespace(migrations_dir: str, task: NamespaceTask, trusted: bool = False,
+                       differ_options: Optional[Dict[str, Any]] = None,
+                       confirm_rename: Optional[Callable[[str, str, str, float], bool]] = None,
+                       read_only: bool = False) -> NamespaceResult:
+    """
+    生成一个命名空间的迁移（不保存），在工作进程中执行
+
+    Args:
+        migrations_dir: 迁移文件根目录
+        task: 生成任务
+        trusted: 可信模式（见FileManager）
+        differ_options: ERDiffer的参数（不含confirm_rename）
+        confirm_rename: 确认列重命名的回调（可选，只能在主进程中使用）
+        read_only: 只读模式（预览），不写入快照、目录索引和已校验清单
+
+    Returns:
+        生成结果
+
+    Raises:
+        ValueError: 命名空间有多个叶子迁移（需要先合并）
+    """
+    started = time.perf_counter()
+    result = NamespaceResult(task.namespace)
+
+    er_model = task.source
+    if not isinstance(er_model, ERModel):
+        from x007007007.er.parser.antlr.mermaid_antlr_parser import MermaidAntlrParser
+        er_model = MermaidAntlrParser().parse(Path(task.source).read_text(encoding='utf-8'))
+
+    differ = ERDiffer(**(differ_options or {}), confirm_rename=confirm_rename)
+    generator = MigrationGenerator(migrations_dir, trusted=trusted, differ=differ, read_only=read_only)
+    history = generator.load_history(task.namespace)
+    leaves = history.leaves
+    if len(leaves) > 1:
+        raise ValueError(f"Conflicting migrations in '{task.namespace}': {', '.join(leaves)} are all latest "
+                         f"(nothing depends on them); merge them before generating new migrations")
+
+    result.migration = generator.generate(task.namespace, er_model, name=task.name, history=history)
+    result.stats = differ.last_stats
+    result.renames = differ.last_renames
+    result.duration = time.perf_counter() - started
+    return result
+
+
+class BatchGenerator:
+    """多命名空间迁移生成器"""
+
+    def __init__(self, migrations_dir: str, trusted: bool = False, jobs: int = 0,
+                 differ_options: Optional[Dict[str, Any]] = None,
+                 confirm_rename: Optional[Callable[[str, str, str, float], bool]] = None):
+        """
+        初始化批量生成器
+
+        Args:
+            migrations_dir: 迁移文件根目录
+            trusted: 可信模式（见FileManager）
+            jobs: 并行生成的进程数，0或1表示在当前进程中串行生成
+            differ_options: ERDiffer的参数，例如column_rename_threshold、accept_renames、workers
+            confirm_rename: 确认列重命名的回调，只在串行时使用
+        """
+        assert isinstance(jobs, int) and jobs >= 0, "jobs must be a non-negative integer"
+        assert confirm_rename is None or jobs <= 1, "confirm_rename requires serial generation (jobs <= 1)"
+
+        self.migrations_dir = migrations_dir
+        self.trusted = trusted
+        self.jobs = jobs
+        self.differ_options = dict(differ_options or {})
+        self.confirm_rename = confirm_rename
+        self.file_manager = FileManager(migrations_dir, trusted=trusted)
+
+    def run(self, tasks: List[NamespaceTask], save: bool = True,
+            progress: Optional[Callable[[NamespaceResult], None]] = None) -> List[NamespaceResult]:
+        """
+        生成并保存各命名空间的迁移
+
+        一个命名空间失败不影响其他命名空间，错误记录在结果的error中。
+
+        Args:
+            tasks: 生成任务，命名空间不能重复
+            save: 是否保存生成的迁移（False时只生成，用于预览，迁移目录中不写入任何文件）
+            progress: 每个命名空间完成（并保存）后调用，调用顺序为完成顺序
+
+        Returns:
+            生成结果，顺序与tasks一致
+        """
+        namespaces = [task.namespace for task in tasks]
+        assert len(set(namespaces)) == len(namespaces), "Each namespace may only appear once"
+
+        results: Dict[str, NamespaceResult] = {}
+
+        def finish(result: NamespaceResult) -> None:
+            if save and result.migration is not None and result.error is None:
+                try:
+                    result.path = self.file_manager.save_migration(result.migration, check_latest=True)
+                except (OSError, ValueError) as e:
+                    result.error = str(e)
+            results[result.namespace] = result
+            if progress is not None:
+                progress(result)
+
+        jobs = min(self.jobs, len(tasks))
+        if jobs <= 1:
+            for task in tasks:
+                try:
+                    result = generate_namespace(self.migrations_dir, task, self.trusted,
+                                                self.differ_options, self.confirm_rename, read_only=not save)
+                except Exception as e:
+                    result = NamespaceResult(task.namespace, error=str(e))
+                finish(result)
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = {
+                    executor.submit(generate_namespace, self.migrations_dir, task, self.trusted,
+                                    self.differ_options, read_only=not save): task
+                    for task in tasks
+                }
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = NamespaceResult(futures[future].namespace, error=str(e))
+                    finish(result)
+
+        return [results[namespace] for namespace in namespaces]
@@ -1,11 +1,20 @@
 """
 CLI命令行接口
 """
+import time
 import click
 from pathlib import Path
 from x007007007.er.parser.antlr.mermaid_antlr_parser import MermaidAntlrParser
+from .batch import BatchGenerator, NamespaceResult, NamespaceTask
+from .cost import CostEstimator, load_row_counts
+from .ddl import DDLCompiler
+from .expand import ExpandContractSplitter, save_phases
+from .differ import ERDiffer
+from .executor import MigrationExecutor
 from .generator import MigrationGenerator
-from .file_manager import FileManager
+from .file_manager import FileManager, MIGRATION_FORMATS
+from .graph import MigrationGraph
+from .history import MigrationHistory
 from ..er.version import get_version
 
 
@@ -17,84 +26,165 @@ def cli():
 
 
 @cli.command()
-@click.option('--namespace', '-n', required=True, help='Migration namespace')
-@click.option('--er-file', '-e', required=True, type=click.Path(exists=True), help='ER diagram file (Mermaid format)')
+@click.option('--namespace', '-n', 'namespaces', required=True, multiple=True,
+              help='Migration namespace (repeat together with --er-file for several namespaces)')
+@click.option('--er-file', '-e', 'er_files', required=True, multiple=True, type=click.Path(exists=True),
+              help='ER diagram file (Mermaid format), one per --namespace')
 @click.option('--migrations-dir', '-d', default='.migrations', help='Migrations directory')
 @click.option('--name', help='Custom migration name (optional)')
-def makemigrations(namespace: str, er_file: str, migrations_dir: str, name: str):
+@click.option('--trusted', is_flag=True, help='Skip validation of migration files recorded as already validated')
+@click.option('--rename-threshold', type=click.FloatRange(0, 1, min_open=True), default=ERDiffer.COLUMN_RENAME_THRESHOLD,
+              show_default=True, help='Confidence needed to treat a removed and an added column as a rename')
+@click.option('--rename-columns', is_flag=True,
+              help='Accept detected column renames without asking (default: keep them as remove + add)')
+@click.option('--no-rename-columns', is_flag=True, help='Never detect column renames (always remove + add)')
+@click.option('--interactive', '-i', is_flag=True, help='Ask before accepting each detected column rename')
+@click.option('--workers', type=click.IntRange(min=0), default=0, show_default=True,
+              help='Processes used to compare changed tables of very large models (0 = serial)')
+@click.option('--jobs', '-j', type=click.IntRange(min=0), default=0, show_default=True,
+              help='Processes used to generate several namespaces in parallel (0 = serial)')
+def makemigrations(namespaces: tuple, er_files: tuple, migrations_dir: str, name: str, trusted: bool,
+                   rename_threshold: float, rename_columns: bool, no_rename_columns: bool, interactive: bool,
+                   workers: int, jobs: int):
     """
     Generate migration from ER diagram
     
+    Detected column renames are listed in the output but generated as
+    remove + add (which loses the column data) unless they are confirmed:
+    use --interactive to confirm them one by one, or --rename-columns to
+    accept all of them.
+    
+    Several namespaces can be generated in one call by repeating -n/-e pairs;
+    with --jobs each namespace is diffed in its own process and the results
+    are saved as they finish.
+    
     Example:
         er-migrate makemigrations -n blog -e schema.mmd
+        er-migrate makemigrations -n auth -e auth.mmd -n blog -e blog.mmd -j 4
     """
     try:
-        # 1. 解析ER图
-        click.echo(f"Parsing ER diagram from {er_file}...")
-        parser = MermaidAntlrParser()
+        if len(namespaces) != len(er_files):
+            raise ValueError("--namespace and --er-file must be given the same number of times")
+        if interactive and jobs > 1:
+            raise ValueError("--interactive cannot be combined with --jobs")
+        if rename_columns and no_rename_columns:
+            raise ValueError("--rename-columns cannot be combined with --no-rename-columns")
         
-        with open(er_file, 'r', encoding='utf-8') as f:
-            er_content = f.read()
+        def confirm_rename(table_name: str, old_name: str, new_name: str, score: float) -> bool:
+            message = f"{table_name}.{old_name} -> {table_name}.{new_name} (confidence {score:.2f})"
+            return click.confirm(f"Was {message} renamed?", default=True)
         
-        er_model = parser.parse(er_content)
+        def describe_rename(rename) -> str:
+            message = (f"{rename.table_name}.{rename.old_name} -> {rename.table_name}.{rename.new_name} "
+                       f"(confidence {rename.score:.2f})")
+            if rename.accepted:
+                return f"Detected column rename: {message}"
+            if interactive:
+                return f"Rejected column rename: {message}, generated as remove + add"
+            return (f"Possible column rename: {message}, generated as remove + add; "
+                    f"use --rename-columns or --interactive to rename it")
         
-        # 2. 生成迁移
-        click.echo(f"Generating migration for namespace '{namespace}'...")
-        generator = MigrationGenerator(migrations_dir)
-        migration = generator.generate(namespace, er_model, name=name)
+        # 1. 解析ER图并生成迁移（多个命名空间时可并行），生成后立即保存
+        tasks = [NamespaceTask(namespace, er_file, name) for namespace, er_file in zip(namespaces, er_files)]
+        for task in tasks:
+            click.echo(f"Generating migration for namespace '{task.namespace}' from {task.source}...")
         
-        # 3. 保存迁移
-        if migration is None:
-            click.echo(click.style("No changes detected.", fg='yellow'))
-            return
+        def report(result: NamespaceResult) -> None:
+            prefix = f"[{result.namespace}] " if len(tasks) > 1 else ""
+            if result.error is not None:
+                click.echo(click.style(f"{prefix}Error: {result.error}", fg='red'), err=True)
+                return
+            if not interactive:
+                for rename in result.renames:
+                    click.echo(click.style(f"  {prefix}{describe_rename(rename)}", fg='yellow'))
+            stats = result.stats
+            click.echo(f"{prefix}Compared tables: {stats.tables_skipped} unchanged (skipped), "
+                       f"{stats.tables_inspected} inspected, {stats.tables_created} created, "
+                       f"{stats.tables_dropped} dropped, {stats.tables_renamed} renamed")
+            if result.path is None:
+                click.echo(click.style(f"{prefix}No changes detected.", fg='yellow'))
+                return
+            click.echo(click.style(f"\nMigrations for '{result.namespace}':", fg='green', bold=True))
+            click.echo(f"  {result.path.name}")
+            click.echo(f"\nMigration saved to: {result.path}")
         
-        file_manager = FileManager(migrations_dir)
-        file_path = file_manager.save_migration(migration)
+        batch = BatchGenerator(
+            migrations_dir,
+            trusted=trusted,
+            jobs=jobs,
+            differ_options={
+                'column_rename_threshold': None if no_rename_columns else rename_threshold,
+                'accept_renames': rename_columns,
+                'workers': workers,
+            },
+            confirm_rename=confirm_rename if interactive else None,
+        )
+        started = time.perf_counter()
+        results = batch.run(tasks, progress=report)
         
-        # 4. 显示结果
-        click.echo(click.style(f"\nMigrations for '{namespace}':", fg='green', bold=True))
-        click.echo(f"  {file_path.name}")
-        click.echo(f"\nMigration saved to: {file_path}")
+        # 2. 多个命名空间时输出汇总
+        if len(tasks) > 1:
+            click.echo(click.style(f"\nSummary ({time.perf_counter() - started:.2f}s):", fg='cyan', bold=True))
+            for result in results:
+                if result.error is not None:
+                    status = click.style("failed", fg='red')
+                elif result.path is not None:
+                    status = f"{result.path.name} ({len(result.migration.operations)} operations)"
+                else:
+                    status = "no changes"
+                click.echo(f"  {result.namespace}: {status} [{result.duration:.2f}s]")
+                for rename in result.renames:
+                    click.echo(f"    {describe_rename(rename)}")
         
-    except FileNotFoundError as e:
-        click.echo(click.style(f"Error: File does not exist: {er_file}", fg='red'), err=True)
-        raise click.Abort()
     except Exception as e:
         click.echo(click.style(f"Error: {str(e)}", fg='red'), err=True)
         raise click.Abort()
+    
+    # 失败的命名空间已经输出了错误
+    if any(result.error is not None for result in results):
+        raise click.Abort()
 
 
 @cli.command()
 @click.option('--namespace', '-n', help='Show migrations for specific namespace')
 @click.option('--migrations-dir', '-d', default='.migrations', help='Migrations directory')
-def showmigrations(namespace: str, migrations_dir: str):
+@click.option('--trusted', is_flag=True, help='Skip validation of migration files recorded as already validated')
+@click.option('--plan', is_flag=True, help='Show the cross-namespace execution plan instead')
+def showmigrations(namespace: str, migrations_dir: str, trusted: bool, plan: bool):
     """
     Show migration status
     
     Example:
         er-migrate showmigrations -n blog
         er-migrate showmigrations  # Show all namespaces
+        er-migrate showmigrations --plan  # Dependency order across namespaces
     """
     try:
-        file_manager = FileManager(migrations_dir)
+        file_manager = FileManager(migrations_dir, trusted=trusted)
         migrations_path = Path(migrations_dir)
         
+        if plan:
+            execution_plan = MigrationGraph.load(migrations_dir, trusted=trusted).plan()
+            click.echo(click.style(f"\nPlan ({len(execution_plan.order)} migrations):", fg='cyan', bold=True))
+            for number, stage in enumerate(execution_plan.stages, 1):
+                click.echo(f"  Stage {number}: {', '.join(stage)}")
+            click.echo("Independent namespace groups (can run in parallel): "
+                       + " | ".join(", ".join(group) for group in execution_plan.groups))
+            return
+        
         # 如果指定了命名空间
         if namespace:
-            migrations = file_manager.load_namespace_migrations(namespace)
+            history = MigrationHistory(file_manager, namespace)
+            entries = history.entries()
             
-            if not migrations:
+            if not entries:
                 click.echo(f"No migrations found for namespace '{namespace}'")
                 return
             
             click.echo(click.style(f"\n{namespace}:", fg='cyan', bold=True))
-            for migration in migrations:
-                # 获取文件名
-                files = file_manager.list_migration_files(namespace)
-                for file in files:
-                    if migration.name in file:
-                        click.echo(f"  [X] {file.replace('.yaml', '').replace('.yml', '')}")
-                        break
+            for migration_id, _migration in entries:
+                click.echo(f"  [X] {migration_id}")
+            _echo_conflicts(history)
         
         # 显示所有命名空间
         else:
@@ -103,20 +193,362 @@ def showmigrations(namespace: str, migrations_dir: str):
                 return
             
             # 列出所有命名空间
-            namespaces = [d.name for d in migrations_path.iterdir() if d.is_dir()]
+            namespaces = file_manager.list_namespaces()
             
             if not namespaces:
                 click.echo("No migrations found")
                 return
             
             for ns in sorted(namespaces):
-                migrations = file_manager.load_namespace_migrations(ns)
-                if migrations:
+                history = MigrationHistory(file_manager, ns)
+                entries = history.entries()
+                if entries:
                     click.echo(click.style(f"\n{ns}:", fg='cyan', bold=True))
-                    files = file_manager.list_migration_files(ns)
-                    for file in files:
-                        migration_id = file.replace('.yaml', '').replace('.yml', '')
+                    for migration_id, _migration in entries:
                         click.echo(f"  [X] {migration_id}")
+                    _echo_conflicts(history)
+    
+    except Exception as e:
+        click.echo(click.style(f"Error: {str(e)}", fg='red'), err=True)
+        raise click.Abort()
+
+
+def _echo_conflicts(history: MigrationHistory) -> None:
+    """命名空间有多个叶子迁移时输出警告"""
+    leaves = history.leaves
+    if len(leaves) > 1:
+        click.echo(click.style(f"  Conflicting latest migrations (merge needed): {', '.join(leaves)}", fg='yellow'))
+
+
+@cli.command()
+@click.option('--namespace', '-n', required=True, help='Migration namespace')
+@click.option('--upto', type=int, help='Squash migrations up to this number (default: all)')
+@click.option('--name', help='Custom squashed migration name (optional)')
+@click.option('--migrations-dir', '-d', default='.migrations', help='Migrations directory')
+@click.option('--trusted', is_flag=True, help='Skip validation of migration files recorded as already validated')
+def squash(namespace: str, upto: int, name: str, migrations_dir: str, trusted: bool):
+    """
+    Squash migrations into a single equivalent migration
+    
+    The original migrations are kept and skipped when rebuilding state;
+    they can be deleted once every database has applied them.
+    
+    Example:
+        er-migrate squash -n blog --upto 42
+    """
+    try:
+        generator = MigrationGenerator(migrations_dir, trusted=trusted)
+        migration = generator.squash(namespace, upto=upto, name=name)
+        file_path = generator.file_manager.save_migration(migration)
+        
+        click.echo(click.style(f"\nSquashed {len(migration.replaces)} migrations for '{namespace}':", fg='green', bold=True))
+        click.echo(f"  {file_path.name} ({len(migration.operations)} operations)")
+        click.echo(f"\nMigration saved to: {file_path}")
+    
+    except Exception as e:
+        click.echo(click.style(f"Error: {str(e)}", fg='red'), err=True)
+        raise click.Abort()
+
+
+@cli.command('convert-format')
+@click.option('--namespace', '-n', required=True, help='Migration namespace')
+@click.option('--to', 'fmt', required=True, type=click.Choice(sorted(MIGRATION_FORMATS)), help='Target file format')
+@click.option('--migrations-dir', '-d', default='.migrations', help='Migrations directory')
+@click.option('--trusted', is_flag=True, help='Record converted files as already validated')
+def convert_format(namespace: str, fmt: str, migrations_dir: str, trusted: bool):
+    """
+    Convert migration files of a namespace to another file format
+    
+    New migrations of the namespace are written in the target format afterwards.
+    
+    Example:
+        er-migrate convert-format -n blog --to json
+    """
+    try:
+        file_manager = FileManager(migrations_dir, trusted=trusted)
+        converted = file_manager.convert_format(namespace, fmt)
+        
+        click.echo(click.style(f"\nConverted '{namespace}' to {fmt}:", fg='green', bold=True))
+        for old_name, new_name in converted:
+            click.echo(f"  {old_name} -> {new_name}")
+        if not converted:
+            click.echo("  No files to convert")
+    
+    except Exception as e:
+        click.echo(click.style(f"Error: {str(e)}", fg='red'), err=True)
+        raise click.Abort()
+
+
+@cli.command()
+@click.argument('migration')
+@click.option('--namespace', '-n', required=True, help='Migration namespace')
+@click.option('--dialect', default='postgresql', show_default=True,
+              help='SQL dialect (postgresql, mysql, sqlite, ...)')
+@click.option('--migrations-dir', '-d', default='.migrations', help='Migrations directory')
+@click.option('--trusted', is_flag=True, help='Skip validation of migration files recorded as already validated')
+def sql(migration: str, namespace: str, dialect: str, migrations_dir: str, trusted: bool):
+    """
+    Print the SQL DDL statements of a migration
+    
+    MIGRATION is a migration ID or a unique prefix of one (e.g. 0002).
+    
+    Example:
+        er-migrate sql -n blog 0002 --dialect mysql
+    """
+    try:
+        generator = MigrationGenerator(migrations_dir, trusted=trusted)
+        history = generator.load_history(namespace)
+        
+        filename = _match_migration(history, namespace, migration)
+        state = generator.state_before(namespace, history.migration_id(filename), history=history)
+        target = history.load(filename)
+        for statement in DDLCompiler(dialect).compile(target, state):
+            click.echo(f"{statement};")
+        for op in target.operations:
+            if op.type == 'RunBackfill':
+                throttle = f", {op.throttle:g} s apart" if op.throttle else ""
+                click.echo(f"-- {op.table_name}.{op.column_name} = {op.expression}: "
+                           f"applied in batches of {op.chunk_size} rows ordered by {op.key_column}{throttle}")
+    
+    except Exception as e:
+        click.echo(click.style(f"Error: {str(e)}", fg='red'), err=True)
+        raise click.Abort()
+
+
+def _match_migration(history: MigrationHistory, namespace: str, migration: str) -> str:
+    """按迁移ID或唯一前缀查找迁移文件名"""
+    ids = [history.migration_id(f) for f in history.filenames]
+    matches = [migration_id for migration_id in ids if migration_id == migration] or \
+        [migration_id for migration_id in ids if migration_id.startswith(migration)]
+    if len(matches) != 1:
+        problem = "is ambiguous" if matches else "not found"
+        raise ValueError(f"Migration '{migration}' {problem} in namespace '{namespace}'")
+    return history.filenames[ids.index(matches[0])]
+
+
+@cli.command()
+@click.option('--namespace', '-n', required=True, help='Migration namespace')
+@click.option('--dialect', default='postgresql', show_default=True,
+              help='SQL dialect (postgresql, mysql, mariadb, sqlite)')
+@click.option('--rows', 'rows_source', help='Row counts: a JSON stats file ({"table": rows}) or a SQLite database')
+@click.option('--from', 'start', help='First migration to plan (ID or unique prefix), e.g. the first pending one')
+@click.option('--large-table', default=1_000_000, show_default=True, type=click.IntRange(min=0),
+              help='Row count from which a table is large; slow operations on it should get their own migration')
+@click.option('--sort', 'sort_by', type=click.Choice(['cost', 'order']), default='cost', show_default=True,
+              help='Order operations by estimated cost or by execution order')
+@click.option('--migrations-dir', '-d', default='.migrations', help='Migrations directory')
+@click.option('--trusted', is_flag=True, help='Skip validation of migration files recorded as already validated')
+def plan(namespace: str, dialect: str, rows_source: str, start: str, large_table: int, sort_by: str,
+         migrations_dir: str, trusted: bool):
+    """
+    Estimate the cost of migrations before applying them
+    
+    Each operation is classified for the dialect as instant, index build,
+    rewrite or lock-heavy; with row counts the relative cost is the category
+    weight times the table's rows. Migrations that mix slow operations on
+    large tables with other operations are flagged for splitting.
+    
+    Example:
+        er-migrate plan -n blog --rows stats.json --from 0005
+    """
+    try:
+        generator = MigrationGenerator(migrations_dir, trusted=trusted)
+        history = generator.load_history(namespace)
+        estimator = CostEstimator(dialect, load_row_counts(rows_source) if rows_source else None, large_table)
+        
+        filenames = history.filenames
+        if start:
+            filenames = filenames[filenames.index(_match_migration(history, namespace, start)):]
+        replaced = history.replaced_filenames
+        filenames = [filename for filename in filenames if filename not in replaced]
+        if not filenames:
+            click.echo(f"No migrations to plan for namespace '{namespace}'")
+            return
+        
+        state = generator.state_before(namespace, history.migration_id(filenames[0]), history=history)
+        costs = estimator.estimate(
+            [(history.migration_id(filename), history.load(filename)) for filename in filenames], state
+        )
+        
+        rows_note = f", row counts from {rows_source}" if rows_source else ", no row counts"
+        click.echo(click.style(f"\nPlan for '{namespace}' ({dialect}{rows_note}):", fg='cyan', bold=True))
+        items = [(migration.migration_id, item) for migration in costs for item in migration.operations]
+        if sort_by == 'cost':
+            items.sort(key=lambda pair: -pair[1].cost)
+        click.echo(f"  {'COST':>14}  {'ROWS':>12}  {'CATEGORY':<11}  {'MIGRATION':<24}  OPERATION")
+        for migration_id, item in items:
+            rows = '?' if item.rows is None else f"{item.rows:,}"
+            line = (f"  {item.cost:>14,}  {rows:>12}  {item.category:<11}  {migration_id:<24}  "
+                    f"{_describe_operation(item.operation)}")
+            if item.note:
+                line += f"  ({item.note})"
+            color = {'lock-heavy': 'red', 'rewrite': 'yellow'}.get(item.category)
+            click.echo(click.style(line, fg=color) if color else line)
+        
+        click.echo(click.style("\nMigrations:", fg='cyan', bold=True))
+        for migration in sorted(costs, key=lambda m: -m.total) if sort_by == 'cost' else costs:
+            click.echo(f"  {migration.migration_id}: total {migration.total:,}")
+            if migration.split_reason:
+                click.echo(click.style(f"    ⚠ Consider splitting: {migration.split_reason}", fg='yellow'))
+    
+    except Exception as e:
+        click.echo(click.style(f"Error: {str(e)}", fg='red'), err=True)
+        raise click.Abort()
+
+
+@cli.command()
+@click.argument('migration', required=False)
+@click.option('--namespace', '-n', required=True, help='Migration namespace')
+@click.option('--dialect', default='postgresql', show_default=True,
+              help='SQL dialect (postgresql, mysql, mariadb, sqlite)')
+@click.option('--chunk-size', default=1000, show_default=True, type=click.IntRange(min=1),
+              help='Rows updated per backfill transaction')
+@click.option('--throttle', default=0.0, show_default=True, type=click.FloatRange(min=0),
+              help='Seconds to pause between backfill chunks')
+@click.option('--backfill', 'backfills', multiple=True, metavar='TABLE.COLUMN=SQL',
+              help='Value of a new NOT NULL column for existing rows, e.g. order.total=price*quantity')
+@click.option('--table', '-t', 'tables', multiple=True, help='Hot table to split (repeatable)')
+@click.option('--rows', 'rows_source', help='Row counts (JSON stats file or SQLite database) to find hot tables')
+@click.option('--large-table', default=1_000_000, show_default=True, type=click.IntRange(min=0),
+              help='Row count from which a table is hot when --rows is given')
+@click.option('--dry-run', is_flag=True, help='Show the phases without writing files')
+@click.option('--migrations-dir', '-d', default='.migrations', help='Migrations directory')
+@click.option('--trusted', is_flag=True, help='Skip validation of migration files recorded as already validated')
+def split(migration: str, namespace: str, dialect: str, chunk_size: int, throttle: float, backfills: tuple,
+          tables: tuple, rows_source: str, large_table: int, dry_run: bool, migrations_dir: str, trusted: bool):
+    """
+    Split the latest migration into expand/contract phases
+    
+    MIGRATION (ID or unique prefix) defaults to the latest migration of the
+    namespace. The phases replace the original file, so only the latest
+    migration can be split; an earlier one can only be previewed with
+    --dry-run.
+    
+    Column type changes that rewrite the table become: add the new column,
+    backfill it in batches, switch the names over, drop the old column.
+    Column removals become: make the column nullable, drop it later. A NOT
+    NULL column added with --backfill becomes: add it nullable, backfill it,
+    set NOT NULL. Without --table or --rows every table is treated as hot.
+    
+    Example:
+        er-migrate split -n shop --rows stats.json --chunk-size 5000
+        er-migrate split -n shop 0007 --table order --dry-run
+    """
+    try:
+        generator = MigrationGenerator(migrations_dir, trusted=trusted)
+        history = generator.load_history(namespace)
+        if not history.filenames:
+            raise ValueError(f"No migrations in namespace '{namespace}'")
+        latest = history.filenames[-1]
+        filename = _match_migration(history, namespace, migration) if migration else latest
+        if filename != latest and not dry_run:
+            raise ValueError(f"Only the latest migration can be split; {filename} is not the latest "
+                             f"in namespace '{namespace}' (use --dry-run to preview it)")
+        
+        hot_tables = set(tables) if tables or rows_source else None
+        if rows_source:
+            hot_tables.update(table_name for table_name, rows in load_row_counts(rows_source).items()
+                              if rows >= large_table)
+        expressions = {}
+        for backfill in backfills:
+            column, separator, expression = backfill.partition('=')
+            if not separator or '.' not in column or not expression.strip():
+                raise ValueError(f"Invalid --backfill '{backfill}': expected TABLE.COLUMN=SQL")
+            expressions[column.strip()] = expression.strip()
+        splitter = ExpandContractSplitter(dialect, chunk_size, hot_tables, throttle=throttle, expressions=expressions)
+        state = generator.state_before(namespace, history.migration_id(filename), history=history)
+        phases = splitter.split(history.load(filename), state)
+        
+        for column in splitter.skipped:
+            click.echo(click.style(f"  Not split: {column} (primary key, foreign key or table without a primary key)",
+                                   fg='yellow'))
+        if dry_run:
+            for phase in phases:
+                click.echo(click.style(f"\n{phase.name}:", fg='cyan', bold=True))
+                for op in phase.operations:
+                    click.echo(f"  - {_describe_operation(op)}")
+            return
+        
+        saved = save_phases(generator.file_manager, filename, phases)
+        click.echo(click.style(f"\n✓ Split {filename} into {len(saved)} migrations:", fg='green'))
+        for name in saved:
+            click.echo(f"  {name}")
+    
+    except Exception as e:
+        click.echo(click.style(f"Error: {str(e)}", fg='red'), err=True)
+        raise click.Abort()
+
+
+def _describe_operation(op) -> str:
+    """操作的简短描述，例如 AlterColumn user.email"""
+    if op.type == 'RenameTable':
+        return f"RenameTable {op.old_name} -> {op.new_name}"
+    if op.type == 'RenameColumn':
+        return f"RenameColumn {op.table_name}.{op.old_name} -> {op.new_name}"
+    if op.type == 'AddColumn':
+        return f"AddColumn {op.table_name}.{op.column.name}"
+    if op.type in ('RemoveColumn', 'AlterColumn', 'RunBackfill'):
+        return f"{op.type} {op.table_name}.{op.column_name}"
+    if op.type in ('AddIndex', 'RemoveIndex'):
+        return f"{op.type} {op.table_name} ({op.index.name if op.type == 'AddIndex' else op.index_name})"
+    if op.type == 'AddForeignKey':
+        return f"AddForeignKey {op.table_name}.{op.foreign_key.column_name} -> {op.foreign_key.reference_table}"
+    if op.type in ('RemoveForeignKey', 'AlterForeignKey'):
+        return f"{op.type} {op.table_name} ({op.constraint_name})"
+    return f"{op.type} {op.table_name}"
+
+
+@cli.command()
+@click.argument('migration', required=False)
+@click.option('--namespace', '-n', required=True, help='Migration namespace')
+@click.option('--db', 'db_url', required=True, help='Database URL (SQLAlchemy format, e.g. sqlite:///app.db)')
+@click.option('--migrations-dir', '-d', default='.migrations', help='Migrations directory')
+@click.option('--trusted', is_flag=True, help='Skip validation of migration files recorded as already validated')
+def apply(migration: str, namespace: str, db_url: str, migrations_dir: str, trusted: bool):
+    """
+    Apply pending migrations to a database
+    
+    Applied migrations are recorded in the er_migrations table. Each migration
+    runs in one transaction where the database supports transactional DDL.
+    With MIGRATION (ID or unique prefix) only the pending migrations up to and
+    including it are applied, e.g. the expand and backfill phases of a split
+    migration before the application is switched over.
+    
+    Example:
+        er-migrate apply -n blog --db sqlite:///app.db
+        er-migrate apply -n shop 0008 --db sqlite:///app.db
+    """
+    try:
+        executor = MigrationExecutor(db_url, migrations_dir, trusted=trusted)
+        history = executor.generator.load_history(namespace)
+        target = history.migration_id(_match_migration(history, namespace, migration)) if migration else None
+        
+        def report(result):
+            action = "Recorded" if result.record_only else "Applied"
+            click.echo(f"  {action} {namespace}.{result.migration_id} "
+                       f"({result.statements} statements, {result.duration * 1000:.1f} ms)")
+        
+        last_report = [0.0]
+        
+        def report_backfill(progress):
+            # 大表回填有大量的批，最多每两秒输出一次
+            now = time.perf_counter()
+            if progress.finished or now - last_report[0] >= 2:
+                last_report[0] = now
+                resumed = f", resumed after {progress.resumed_chunks:,} chunks" if progress.resumed_chunks else ""
+                state = "done" if progress.finished else f"up to {progress.last_key}"
+                click.echo(f"    Backfill {progress.table_name}.{progress.column_name}: {progress.rows:,} rows "
+                           f"in {progress.chunks:,} chunks, {state} ({progress.elapsed:.1f} s{resumed})")
+        
+        until = f" up to {target}" if target else ""
+        click.echo(click.style(f"\nApplying migrations for '{namespace}'{until}:", fg='cyan', bold=True))
+        results = executor.apply(namespace, history, progress=report, backfill_progress=report_backfill,
+                                 target=target)
+        if not results:
+            click.echo("  No migrations to apply")
+        else:
+            total = sum(result.duration for result in results)
+            click.echo(click.style(f"\n✓ Applied {len(results)} migrations in {total * 1000:.1f} ms", fg='green'))
     
     except Exception as e:
         click.echo(click.style(f"Error: {str(e)}", fg='red'), err=True)
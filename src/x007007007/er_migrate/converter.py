@@ -2,7 +2,7 @@
 ER模型转换器 - 将现有的ERModel转换为迁移系统格式
 """
 import re
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Tuple, Any, Optional
 from x007007007.er.models import Entity, Column, Relationship, ERModel
 from .models import ColumnDefinition, IndexDefinition, ForeignKeyDefinition
 
@@ -51,6 +51,22 @@ class ERConverter:
         
         return table_name, columns
     
+    def column_index_name(self, table_name: str, col: Column, unique: bool) -> str:
+        """
+        列上单列索引的名称
+        
+        Args:
+            table_name: 表名
+            col: 列
+            unique: 是否为唯一索引
+            
+        Returns:
+            记录的实际名称（反射得到，或表、列重命名之前的名称），否则为 idx_{表名}_{列名}[_unique]
+        """
+        if col.index_name:
+            return col.index_name
+        return f"idx_{table_name}_{col.name}_unique" if unique else f"idx_{table_name}_{col.name}"
+    
     def extract_indexes(self, entity: Entity) -> List[IndexDefinition]:
         """
         从实体提取索引定义
@@ -67,22 +83,28 @@ class ERConverter:
         for col in entity.columns:
             # 唯一索引
             if col.unique and not col.is_pk:
-                idx_name = f"idx_{table_name}_{col.name}_unique"
                 indexes.append(IndexDefinition(
-                    name=idx_name,
+                    name=self.column_index_name(table_name, col, unique=True),
                     columns=[col.name],
                     unique=True
                 ))
             
             # 普通索引
             elif col.indexed:
-                idx_name = f"idx_{table_name}_{col.name}"
                 indexes.append(IndexDefinition(
-                    name=idx_name,
+                    name=self.column_index_name(table_name, col, unique=False),
                     columns=[col.name],
                     unique=False
                 ))
         
+        # 多列索引
+        for index in entity.indexes:
+            indexes.append(IndexDefinition(
+                name=index.name,
+                columns=list(index.columns),
+                unique=index.unique
+            ))
+        
         return indexes
     
     def convert_relationship(self, relationship: Relationship) -> ForeignKeyDefinition:
@@ -95,52 +117,7 @@ class ERConverter:
         Returns:
             ForeignKeyDefinition对象
         """
-        # 根据关系类型确定外键位置
-        # one-to-many: 外键在right_entity (many side)
-        # many-to-one: 外键在left_entity (many side)
-        # one-to-one: 外键在有FK列的一侧
-        
-        if relationship.relation_type == "one-to-many":
-            # User ||--o{ Post
-            # 外键在Post (right_entity)，指向User (left_entity)
-            fk_table = relationship.right_entity
-            reference_table = relationship.left_entity
-            fk_column = relationship.right_column
-            reference_column = relationship.left_column
-        elif relationship.relation_type == "many-to-one":
-            # Post }o--|| User
-            # 外键在Post (left_entity)，指向User (right_entity)
-            fk_table = relationship.left_entity
-            reference_table = relationship.right_entity
-            fk_column = relationship.left_column
-            reference_column = relationship.right_column
-        elif relationship.relation_type == "one-to-one":
-            # A ||--|| B
-            # 外键可以在任一侧，根据哪一侧有FK列来决定
-            if relationship.right_column:
-                # FK在right_entity
-                fk_table = relationship.right_entity
-                reference_table = relationship.left_entity
-                fk_column = relationship.right_column
-                reference_column = relationship.left_column
-            elif relationship.left_column:
-                # FK在left_entity
-                fk_table = relationship.left_entity
-                reference_table = relationship.right_entity
-                fk_column = relationship.left_column
-                reference_column = relationship.right_column
-            else:
-                # 默认：外键在left_entity
-                fk_table = relationship.left_entity
-                reference_table = relationship.right_entity
-                fk_column = relationship.left_column
-                reference_column = relationship.right_column
-        else:  # many-to-many
-            # 默认：外键在left_entity
-            fk_table = relationship.left_entity
-            reference_table = relationship.right_entity
-            fk_column = relationship.left_column
-            reference_column = relationship.right_column
+        _, reference_table, fk_column, reference_column = self._foreign_key_sides(relationship)
         
         # 转换表名为snake_case
         reference_table_snake = self._to_snake_case(reference_table)
@@ -160,10 +137,101 @@ class ERConverter:
             column_name=column_name,
             reference_table=reference_table_snake,
             reference_column=reference_column,
-            on_delete="CASCADE",
-            on_update="CASCADE"
+            on_delete=relationship.on_delete or "CASCADE",
+            on_update=relationship.on_update or "CASCADE"
         )
     
+    def foreign_key_table(self, relationship: Relationship) -> str:
+        """
+        外键所在的表名（snake_case）
+        
+        Args:
+            relationship: 原始Relationship对象
+            
+        Returns:
+            表名
+        """
+        return self._to_snake_case(self._foreign_key_sides(relationship)[0])
+    
+    def foreign_key_name(self, table_name: str, column_name: str) -> str:
+        """
+        外键约束名：fk_{table}_{column}
+        
+        Args:
+            table_name: 外键所在的表名
+            column_name: 外键列名
+            
+        Returns:
+            约束名
+        """
+        return f"fk_{table_name}_{column_name}"
+    
+    def foreign_key_names(self, er_model: ERModel) -> Dict[str, Dict[str, str]]:
+        """
+        模型中记录了实际约束名的外键（例如表或列重命名之前创建的外键）
+        
+        Args:
+            er_model: 原始ERModel对象
+            
+        Returns:
+            {表名: {外键列名: 约束名}}，没有记录的外键使用foreign_key_name的命名规则
+        """
+        names: Dict[str, Dict[str, str]] = {}
+        for rel in er_model.relationships:
+            if rel.constraint_name is not None:
+                column = self.convert_relationship(rel).column_name
+                names.setdefault(self.foreign_key_table(rel), {})[column] = rel.constraint_name
+        return names
+    
+    def foreign_key_index(self, er_model: ERModel) -> Dict[str, Dict[str, ForeignKeyDefinition]]:
+        """
+        按表和列索引模型中的全部外键，每个关系只转换一次
+        
+        Args:
+            er_model: 原始ERModel对象
+            
+        Returns:
+            {表名: {外键列名: ForeignKeyDefinition}}，同一列有多个关系时以最后一个为准
+        """
+        index: Dict[str, Dict[str, ForeignKeyDefinition]] = {}
+        for rel in er_model.relationships:
+            fk = self.convert_relationship(rel)
+            index.setdefault(self.foreign_key_table(rel), {})[fk.column_name] = fk
+        return index
+    
+    def _foreign_key_sides(self, relationship: Relationship) -> Tuple[str, str, Optional[str], Optional[str]]:
+        """
+        根据关系类型确定外键位置
+        
+        one-to-many: 外键在right_entity (many side)
+        many-to-one: 外键在left_entity (many side)
+        one-to-one: 外键在有FK列的一侧
+        many-to-many: 默认外键在left_entity
+        
+        Args:
+            relationship: 原始Relationship对象
+            
+        Returns:
+            (外键所在实体, 被引用实体, 外键列名, 被引用列名)，列名可能为None
+        """
+        left = (relationship.left_entity, relationship.right_entity,
+                relationship.left_column, relationship.right_column)
+        right = (relationship.right_entity, relationship.left_entity,
+                 relationship.right_column, relationship.left_column)
+        
+        if relationship.relation_type == "one-to-many":
+            # User ||--o{ Post
+            # 外键在Post (right_entity)，指向User (left_entity)
+            return right
+        if relationship.relation_type == "many-to-one":
+            # Post }o--|| User
+            # 外键在Post (left_entity)，指向User (right_entity)
+            return left
+        if relationship.relation_type == "one-to-one" and relationship.right_column:
+            # A ||--|| B，FK列在right_entity
+            return right
+        return left
+    
     def convert_model(self, er_model: ERModel) -> Dict[str, Any]:
         """
         转换完整的ER模型
@@ -0,0 +1,347 @@
+"""
+迁移代价估算 - 按数据库方言对每个操作分类，并结合表行数估算相对代价
+
+操作分为四类：
+- instant：只修改元数据，耗时与行数无关
+- index build：读取整张表建立索引
+- rewrite：复制整张表的数据（新表或原地重建）
+- lock-heavy：在持有阻塞写入（PostgreSQL上通常连读取也阻塞）的锁期间扫描或复制整张表
+
+相对代价 = 类别权重 × 表行数（新建的表行数为0），只用于比较操作之间、迁移之间的相对大小，
+不是耗时预测。分类对应的版本：PostgreSQL 11+、MySQL 8.0（InnoDB）、SQLite 3.35+。
+
+同一个迁移中合并执行的表变更只计一次数据复制：PostgreSQL、MySQL同一张表相邻的列和外键变更
+合并为一条ALTER TABLE（见DDLCompiler），SQLite同一张表的全部变更合并为一次重建。
+
+包含大表（行数达到阈值）上非instant操作的迁移如果还有其他操作，建议拆分：拆开后每个迁移的
+锁持有时间更短，失败时的影响范围也更小（MySQL的DDL不是事务性的）。
+"""
+import copy
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import sqlalchemy as sa
+from x007007007.er.models import ERModel
+from .models import Migration, Operation, AddColumn, AlterColumn, RenameTable
+from .state import SchemaState
+
+INSTANT = 'instant'
+INDEX_BUILD = 'index build'
+REWRITE = 'rewrite'
+LOCK_HEAVY = 'lock-heavy'
+
+# 类别 -> 每行的相对代价
+CATEGORY_WEIGHTS = {INSTANT: 0, INDEX_BUILD: 1, REWRITE: 2, LOCK_HEAVY: 3}
+
+# 字符串类型（之间的转换按加长处理）
+_STRING_TYPES = {'string', 'str', 'varchar', 'char', 'text'}
+
+# 合并到同一条ALTER TABLE中的操作（见DDLCompiler._compile_operation）
+_ALTER_CLAUSE_OPERATIONS = {
+    'AddColumn', 'RemoveColumn', 'AlterColumn', 'AddForeignKey', 'RemoveForeignKey', 'AlterForeignKey',
+}
+
+# PostgreSQL中作为默认值时不重写表的函数（STABLE或IMMUTABLE，添加列时只计算一次，存为快速默认值）；
+# 其他函数调用（random()、gen_random_uuid()、clock_timestamp()等）按VOLATILE处理，添加列需要逐行计算
+_NON_VOLATILE_FUNCTIONS = {
+    'now', 'current_timestamp', 'current_date', 'current_time', 'localtimestamp', 'localtime',
+    'transaction_timestamp', 'statement_timestamp',
+}
+_FUNCTION_CALL = re.compile(r'([A-Za-z_][\w.]*)\s*\(')
+
+# SQLite上需要重建表的操作，以及随重建一起完成的表内操作
+_SQLITE_REBUILD_OPERATIONS = {'RemoveColumn', 'AlterColumn', 'AddForeignKey', 'RemoveForeignKey', 'AlterForeignKey'}
+_SQLITE_TABLE_OPERATIONS = _SQLITE_REBUILD_OPERATIONS | {'AddColumn', 'RenameColumn', 'AddIndex', 'RemoveIndex'}
+
+
+@dataclass
+class OperationCost:
+    """一个操作的分类和代价"""
+    operation: Operation
+    category: str
+    table_name: Optional[str] = None
+    rows: Optional[int] = None      # 操作之前的表行数，None表示未知
+    cost: int = 0
+    note: str = ""
+
+
+@dataclass
+class MigrationCost:
+    """一个迁移的代价"""
+    migration_id: str
+    operations: List[OperationCost] = field(default_factory=list)
+    split_reason: Optional[str] = None      # 建议拆分的原因
+
+    @property
+    def total(self) -> int:
+        """迁移的总代价"""
+        return sum(item.cost for item in self.operations)
+
+
+def load_row_counts(source: str) -> Dict[str, int]:
+    """
+    读取各表的行数
+
+    Args:
+        source: JSON统计文件（{"表名": 行数}），或SQLite数据库文件路径/SQLAlchemy数据库URL
+
+    Returns:
+        {表名: 行数}
+
+    Raises:
+        ValueError: 文件不存在或内容格式不正确
+    """
+    assert isinstance(source, str) and source, "source must be a non-empty string"
+
+    if source.endswith('.json'):
+        path = Path(source)
+        if not path.exists():
+            raise ValueError(f"Row count file not found: {source}")
+        data = json.loads(path.read_text(encoding='utf-8'))
+        if not isinstance(data, dict) or not all(
+                isinstance(rows, int) and not isinstance(rows, bool) and rows >= 0 for rows in data.values()):
+            raise ValueError(f"Row count file {source} must map table names to non-negative integers")
+        return {str(table_name): rows for table_name, rows in data.items()}
+
+    if '://' not in source:
+        if not Path(source).exists():
+            raise ValueError(f"Database file not found: {source}")
+        source = f"sqlite:///{source}"
+    engine = sa.create_engine(source)
+    try:
+        with engine.connect() as connection:
+            counts = {}
+            for table_name in sa.inspect(connection).get_table_names():
+                query = sa.select(sa.func.count()).select_from(sa.table(table_name))
+                counts[table_name] = connection.execute(query).scalar_one()
+            return counts
+    finally:
+        engine.dispose()
+
+
+class CostEstimator:
+    """迁移操作的分类和代价估算"""
+
+    DIALECTS = {'postgresql', 'mysql', 'mariadb', 'sqlite'}
+
+    def __init__(self, dialect: str = 'postgresql', row_counts: Optional[Dict[str, int]] = None,
+                 large_table_rows: int = 1_000_000):
+        """
+        初始化估算器
+
+        Args:
+            dialect: 方言名称（postgresql、mysql、mariadb、sqlite）
+            row_counts: 迁移之前各表的行数（见load_row_counts），不在其中的表行数未知
+            large_table_rows: 大表的行数阈值，大表上的非instant操作与其他操作放在同一个迁移时建议拆分
+
+        Raises:
+            ValueError: 不支持的方言
+        """
+        assert isinstance(dialect, str), "dialect must be a string"
+        assert isinstance(large_table_rows, int) and large_table_rows >= 0, \
+            "large_table_rows must be a non-negative integer"
+
+        if dialect not in self.DIALECTS:
+            raise ValueError(f"No cost rules for dialect '{dialect}' "
+                             f"(supported: {', '.join(sorted(self.DIALECTS))})")
+        self.dialect = 'mysql' if dialect == 'mariadb' else dialect
+        self.row_counts = dict(row_counts or {})
+        self.large_table_rows = large_table_rows
+
+    def estimate(self, migrations: List[Tuple[str, Migration]],
+                 state: Optional[ERModel] = None) -> List[MigrationCost]:
+        """
+        依次估算多个迁移（后面的迁移基于前面迁移之后的结构）
+
+        Args:
+            migrations: (迁移ID, 迁移) 列表，按执行顺序
+            state: 第一个迁移之前的ER状态（可选），AlterColumn需要原列定义才能区分加长和类型变化
+
+        Returns:
+            每个迁移的代价，顺序与migrations一致
+        """
+        schema = SchemaState(copy.deepcopy(state) if state is not None else None)
+        # 当前表名 -> 统计中的表名，计划中新建的表为None（行数为0）
+        origins: Dict[str, Optional[str]] = {}
+
+        results = []
+        for migration_id, migration in migrations:
+            result = MigrationCost(migration_id)
+            rebuilt = self._sqlite_rebuilt_tables(migration.operations, schema)
+            charged: set = set()        # 本次迁移中已计入数据复制的表（合并执行的变更）
+            previous_table = None
+            for op in migration.operations:
+                table_name = getattr(op, 'table_name', None)
+                if op.type not in _ALTER_CLAUSE_OPERATIONS or table_name != previous_table:
+                    charged = {name for name in charged if name in rebuilt}
+                previous_table = table_name if op.type in _ALTER_CLAUSE_OPERATIONS else None
+
+                item = self._classify(op, schema, table_name in rebuilt)
+                item.table_name = table_name
+                if op.type == 'CreateTable':
+                    item.rows = 0       # 新建的表没有数据，与计划中之后对它的操作一致
+                else:
+                    item.rows = self._rows(table_name, origins) if table_name is not None else None
+                if item.category in (REWRITE, LOCK_HEAVY) and table_name in charged:
+                    item.note = "shares the table copy of a previous operation"
+                elif item.category != INSTANT:
+                    item.cost = CATEGORY_WEIGHTS[item.category] * (item.rows or 0)
+                    if item.category in (REWRITE, LOCK_HEAVY):
+                        charged.add(table_name)
+                    if table_name in rebuilt:
+                        item.note = "table rebuild (copies all rows)"
+                result.operations.append(item)
+
+                self._track_origin(op, origins)
+                schema.apply(op)
+
+            result.split_reason = self._split_reason(result)
+            results.append(result)
+        return results
+
+    # ============ 分类 ============
+
+    def _classify(self, op: Operation, schema: SchemaState, rebuilt: bool) -> OperationCost:
+        """按方言对单个操作分类（schema为操作之前的结构）"""
+        if op.type == 'CreateTable':
+            return OperationCost(op, INSTANT, note="new table")
+        if op.type == 'RunBackfill':
+            return OperationCost(op, REWRITE, note=f"batched: {op.chunk_size} rows per transaction")
+        if op.type in ('DropTable', 'RenameTable'):
+            return OperationCost(op, INSTANT)
+        if op.type in ('RenameColumn', 'RemoveIndex'):
+            if rebuilt:
+                return OperationCost(op, REWRITE, note="part of the table rebuild")
+            return OperationCost(op, INSTANT)
+        if op.type == 'AddIndex':
+            if rebuilt:
+                return OperationCost(op, REWRITE, note="part of the table rebuild")
+            if self.dialect == 'postgresql':
+                return OperationCost(op, INDEX_BUILD, note="blocks writes unless built CONCURRENTLY")
+            return OperationCost(op, INDEX_BUILD)
+
+        if self.dialect == 'sqlite':
+            if rebuilt:
+                return OperationCost(op, REWRITE, note="table rebuild (copies all rows)")
+            return OperationCost(op, INSTANT)
+        if self.dialect == 'mysql':
+            return self._classify_mysql(op, schema)
+        return self._classify_postgresql(op, schema)
+
+    def _classify_postgresql(self, op: Operation, schema: SchemaState) -> OperationCost:
+        if isinstance(op, AddColumn):
+            if self._volatile_default(op.column.default):
+                return OperationCost(op, LOCK_HEAVY, note="volatile default rewrites the table")
+            if not op.column.nullable and op.column.default is None:
+                return OperationCost(op, INSTANT, note="NOT NULL without default fails on a non-empty table")
+            return OperationCost(op, INSTANT)
+        if isinstance(op, AlterColumn):
+            change = self.type_change(op, schema)
+            if change == 'change':
+                return OperationCost(op, LOCK_HEAVY, note="type change rewrites the table under an exclusive lock")
+            if op.new_nullable is False:
+                return OperationCost(op, LOCK_HEAVY, note="SET NOT NULL scans the table under an exclusive lock")
+            return OperationCost(op, INSTANT)
+        if op.type in ('AddForeignKey', 'AlterForeignKey'):
+            return OperationCost(op, LOCK_HEAVY, note="validating the constraint scans the table and blocks writes")
+        return OperationCost(op, INSTANT)
+
+    @staticmethod
+    def _volatile_default(default) -> bool:
+        """默认值中是否调用了非STABLE/IMMUTABLE的函数（按函数名判断）"""
+        if not isinstance(default, str):
+            return False
+        return any(name.rsplit('.', 1)[-1].lower() not in _NON_VOLATILE_FUNCTIONS
+                   for name in _FUNCTION_CALL.findall(default))
+
+    def _classify_mysql(self, op: Operation, schema: SchemaState) -> OperationCost:
+        if isinstance(op, AddColumn):
+            return OperationCost(op, INSTANT, note="ALGORITHM=INSTANT")
+        if op.type == 'RemoveColumn':
+            return OperationCost(op, REWRITE, note="in-place rebuild (instant from 8.0.29)")
+        if isinstance(op, AlterColumn):
+            change = self.type_change(op, schema)
+            if change == 'change':
+                return OperationCost(op, LOCK_HEAVY, note="type change copies the table and blocks writes")
+            if op.new_nullable is not None and op.new_nullable != self._nullable(op, schema):
+                return OperationCost(op, REWRITE, note="in-place rebuild")
+            return OperationCost(op, INSTANT)
+        if op.type in ('AddForeignKey', 'AlterForeignKey'):
+            return OperationCost(op, LOCK_HEAVY, note="adding a foreign key with checks enabled copies the table")
+        return OperationCost(op, INSTANT)
+
+    def type_change(self, op: AlterColumn, schema: SchemaState) -> Optional[str]:
+        """
+        AlterColumn的类型变化
+
+        Returns:
+            None（类型不变）、'widen'（字符串加长或数值精度增加，不需要重写）或'change'
+        """
+        if all(value is None for value in (op.new_type, op.new_max_length, op.new_precision, op.new_scale)):
+            return None
+        column = schema.column(op.table_name, op.column_name)
+        if column is None:
+            return 'change'
+
+        old_type, new_type = column.type.lower(), (op.new_type or column.type).lower()
+        if old_type != new_type:
+            if old_type in _STRING_TYPES and new_type == 'text':
+                return 'widen'
+            return 'change'
+        if op.new_scale is not None and op.new_scale != column.scale:
+            return 'change'
+        if op.new_precision is not None and op.new_precision != column.precision:
+            if column.precision is None or op.new_precision < column.precision:
+                return 'change'
+        if op.new_max_length is not None and op.new_max_length != column.max_length:
+            if column.max_length is None or op.new_max_length < column.max_length:
+                return 'change'
+            # MySQL utf8mb4：长度前缀从1字节变为2字节（超过255字节）时需要复制表
+            if self.dialect == 'mysql' and column.max_length < 64 <= op.new_max_length:
+                return 'change'
+        return 'widen'
+
+    @staticmethod
+    def _nullable(op: AlterColumn, schema: SchemaState) -> Optional[bool]:
+        column = schema.column(op.table_name, op.column_name)
+        return column.nullable if column is not None else None
+
+    def _sqlite_rebuilt_tables(self, operations: List[Operation], schema: SchemaState) -> set:
+        """SQLite上本次迁移需要重建的已有表（见DDLCompiler._plan_rebuilds）"""
+        if self.dialect != 'sqlite':
+            return set()
+        return {
+            op.table_name for op in operations
+            if op.type in _SQLITE_REBUILD_OPERATIONS and schema.has_table(op.table_name)
+        } & {op.table_name for op in operations if op.type in _SQLITE_TABLE_OPERATIONS}
+
+    # ============ 行数和拆分 ============
+
+    def _rows(self, table_name: str, origins: Dict[str, Optional[str]]) -> Optional[int]:
+        """表在操作之前的行数"""
+        origin = origins.get(table_name, table_name)
+        if origin is None:
+            return 0
+        return self.row_counts.get(origin)
+
+    @staticmethod
+    def _track_origin(op: Operation, origins: Dict[str, Optional[str]]) -> None:
+        """跟踪表名变化：重命名后的表仍使用原表名的行数，新建的表行数为0"""
+        if isinstance(op, RenameTable):
+            origins[op.new_name] = origins.pop(op.old_name, op.old_name)
+        elif op.type in ('CreateTable', 'DropTable'):
+            origins[op.table_name] = None
+
+    def _split_reason(self, result: MigrationCost) -> Optional[str]:
+        """大表上的慢操作与其他操作放在同一个迁移中时给出拆分原因"""
+        slow = [
+            item for item in result.operations
+            if item.cost > 0 and (item.rows or 0) >= self.large_table_rows
+        ]
+        if not slow or len(result.operations) == 1:
+            return None
+        tables = sorted({item.table_name for item in slow})
+        return (f"{len(slow)} slow operations on large tables ({', '.join(tables)}) "
+                f"among {len(result.operations)} operations")
@@ -0,0 +1,566 @@
+"""
+DDL编译器 - 将迁移操作编译为指定数据库方言的SQL语句
+
+建表、索引、约束和列定义使用SQLAlchemy的DDL构造生成，类型、引号和方言差异
+（例如MySQL的DROP FOREIGN KEY）由SQLAlchemy处理。
+
+同一张表上相邻的列和约束变更合并为一条ALTER TABLE（PostgreSQL、MySQL支持多子句），
+大表上只需要一次表重写。
+
+SQLite每条ALTER TABLE只能有一个子句，并且不支持修改列和在已有表上增删外键。
+提供了迁移之前的状态时，需要这些操作的表按批处理方式重建：本次迁移中对该表的
+全部列、索引和外键变更合并为一次重建（建新表、复制数据、删除旧表、改名、重建索引），
+无论有多少列变更都只复制一次数据；没有状态时遇到这些操作抛出ValueError。
+
+唯一约束统一通过唯一索引（AddIndex）表达，列定义中不重复输出UNIQUE。
+
+数据操作（RunBackfill）不编译为DDL，由执行器分批执行（见backfill.py）。
+
+编译过程中跟踪表结构（列定义、索引和外键），MySQL的MODIFY COLUMN需要完整的列定义，
+AlterForeignKey需要原外键的引用目标；迁移之前的结构通过state参数传入。
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Union
+import sqlalchemy as sa
+from sqlalchemy.dialects import registry
+from sqlalchemy.engine import Dialect
+from sqlalchemy.schema import CreateIndex, CreateTable as CreateTableDDL, DropIndex, DropTable as DropTableDDL
+from sqlalchemy.types import TypeEngine, UserDefinedType
+from x007007007.er.models import ERModel
+from .converter import ERConverter
+from .models import (
+    Migration,
+    Operation,
+    CreateTable,
+    DropTable,
+    RenameTable,
+    AddColumn,
+    RemoveColumn,
+    AlterColumn,
+    RenameColumn,
+    AddIndex,
+    RemoveIndex,
+    AddForeignKey,
+    RemoveForeignKey,
+    AlterForeignKey,
+    ColumnDefinition,
+    IndexDefinition,
+    ForeignKeyDefinition,
+    DATA_OPERATIONS,
+)
+
+
+# ER类型名（小写） -> SQLAlchemy类型
+_TYPES = {
+    'string': sa.String,
+    'str': sa.String,
+    'varchar': sa.String,
+    'char': sa.String,
+    'text': sa.Text,
+    'int': sa.Integer,
+    'integer': sa.Integer,
+    'bigint': sa.BigInteger,
+    'smallint': sa.SmallInteger,
+    'float': sa.Float,
+    'double': sa.Double,
+    'decimal': sa.Numeric,
+    'numeric': sa.Numeric,
+    'bool': sa.Boolean,
+    'boolean': sa.Boolean,
+    'date': sa.Date,
+    'time': sa.Time,
+    'datetime': sa.DateTime,
+    'timestamp': sa.DateTime,
+    'json': sa.JSON,
+    'uuid': sa.Uuid,
+    'binary': sa.LargeBinary,
+    'blob': sa.LargeBinary,
+}
+
+# 字符串类型未指定长度时的默认长度（与TypeMapper一致）
+DEFAULT_STRING_LENGTH = 255
+
+# 已经是SQL表达式的默认值：带引号的字面量、函数调用、CURRENT_*、NULL、数字
+_SQL_EXPRESSION = re.compile(r"^('.*'|\w+\(.*\)|CURRENT_\w+|NULL|-?\d+(\.\d+)?)$", re.IGNORECASE | re.DOTALL)
+
+
+class _RawType(UserDefinedType):
+    """未知类型按原样输出"""
+    cache_ok = True
+
+    def __init__(self, spec: str):
+        self.spec = spec
+
+    def get_col_spec(self, **kw) -> str:
+        return self.spec
+
+
+@dataclass
+class _AlterClause:
+    """一条ALTER TABLE的子句，同一张表的相邻子句可以合并"""
+    table_name: str
+    clause: str
+
+
+class DDLCompiler:
+    """迁移操作 -> SQL DDL语句"""
+
+    # 一条ALTER TABLE可以包含多个子句的方言
+    MULTI_CLAUSE_ALTER = {'postgresql', 'mysql', 'mariadb'}
+
+    # 作用于已有表内部的操作（SQLite重建表时合并处理）
+    TABLE_OPERATIONS = {
+        'AddColumn', 'RemoveColumn', 'AlterColumn', 'RenameColumn',
+        'AddIndex', 'RemoveIndex', 'AddForeignKey', 'RemoveForeignKey', 'AlterForeignKey',
+    }
+
+    # SQLite上需要重建表的操作（DROP COLUMN本身也会重写整张表，并且限制较多）
+    SQLITE_REBUILD_OPERATIONS = {'RemoveColumn', 'AlterColumn', 'AddForeignKey', 'RemoveForeignKey', 'AlterForeignKey'}
+
+    # SQLite重建表时临时表名的前缀
+    REBUILD_PREFIX = "_er_new_"
+
+    def __init__(self, dialect: Union[str, Dialect] = 'postgresql'):
+        """
+        初始化DDL编译器
+
+        Args:
+            dialect: 方言名称（postgresql、mysql、sqlite等）或SQLAlchemy Dialect实例
+        """
+        assert isinstance(dialect, (str, Dialect)), "dialect must be a dialect name or a Dialect instance"
+
+        if isinstance(dialect, str):
+            dialect = registry.load(dialect)()
+        self.dialect = dialect
+        self.converter = ERConverter()
+        self._ddl = dialect.ddl_compiler(dialect, None)
+        self._quote = dialect.identifier_preparer.quote
+
+    @property
+    def name(self) -> str:
+        """方言名称"""
+        return self.dialect.name
+
+    def compile(self, migration: Union[Migration, List[Operation]], state: Optional[ERModel] = None) -> List[str]:
+        """
+        将迁移编译为有序的SQL语句列表
+
+        Args:
+            migration: 迁移或操作列表
+            state: 迁移之前的ER状态（可选）；MySQL修改列、修改外键以及SQLite重建表时需要
+
+        Returns:
+            SQL语句列表（不含结尾分号），不含数据操作
+
+        Raises:
+            ValueError: 方言不支持的操作，或缺少编译所需的原有结构
+        """
+        operations = migration.operations if isinstance(migration, Migration) else migration
+        self._load_state(state)
+
+        # SQLite不能在已有表上添加外键：新建表的外键直接写进CREATE TABLE
+        inline_fks: Dict[str, List[ForeignKeyDefinition]] = {}
+        if self.name == 'sqlite':
+            created = {op.table_name for op in operations if isinstance(op, CreateTable)}
+            for op in operations:
+                if isinstance(op, AddForeignKey) and op.table_name in created:
+                    inline_fks.setdefault(op.table_name, []).append(op.foreign_key)
+
+        rebuilds = self._plan_rebuilds(operations)
+        origins: Dict[str, Dict[str, str]] = {}   # 重建中的表 -> {当前列名: 原列名}
+
+        pieces: List[Union[str, _AlterClause]] = []
+        for position, op in enumerate(operations):
+            if op.type in DATA_OPERATIONS:
+                continue
+            table_name = getattr(op, 'table_name', None)
+            if table_name in rebuilds and op.type in self.TABLE_OPERATIONS:
+                # 合并到该表的重建中，在该表的最后一个操作处输出
+                origin = origins.setdefault(table_name, {name: name for name in self._columns[table_name]})
+                self._track_origin(origin, op)
+                self._track(op)
+                if position == rebuilds[table_name]:
+                    pieces.extend(self._rebuild(table_name, origins.pop(table_name)))
+                continue
+            if not (isinstance(op, AddForeignKey) and op.foreign_key in inline_fks.get(op.table_name, ())):
+                pieces.extend(self._compile_operation(op, inline_fks))
+            self._track(op)
+        return self._merge(pieces)
+
+    # ============ 表结构跟踪 ============
+
+    def _load_state(self, state: Optional[ERModel]) -> None:
+        """从迁移之前的状态初始化跟踪的表结构"""
+        self._columns: Dict[str, Dict[str, ColumnDefinition]] = {}
+        self._indexes: Dict[str, Dict[str, IndexDefinition]] = {}
+        self._fks: Dict[str, Dict[str, ForeignKeyDefinition]] = {}
+        self._fk_names: Dict[str, Dict[str, str]] = {}      # 不符合命名规则的外键约束名 {表名: {列名: 约束名}}
+        if state is None:
+            return
+        for entity in state.entities.values():
+            table_name, columns = self.converter.convert_entity(entity)
+            self._columns[table_name] = {col.name: col for col in columns}
+            self._indexes[table_name] = {idx.name: idx for idx in self.converter.extract_indexes(entity)}
+        self._fks = self.converter.foreign_key_index(state)
+        self._fk_names = self.converter.foreign_key_names(state)
+
+    def _track(self, op: Operation) -> None:
+        """将操作应用到跟踪的表结构"""
+        tracked = (self._columns, self._indexes, self._fks, self._fk_names)
+
+        if isinstance(op, CreateTable):
+            self._columns[op.table_name] = {col.name: col for col in op.columns}
+            self._indexes[op.table_name] = {}
+
+        elif isinstance(op, DropTable):
+            for mapping in tracked:
+                mapping.pop(op.table_name, None)
+
+        elif isinstance(op, RenameTable):
+            # 外键约束不随表重命名，记录按原表名生成的约束名
+            for column in self._fks.get(op.old_name, {}):
+                self._pin_foreign_key_name(op.old_name, column)
+            for mapping in tracked:
+                if op.old_name in mapping:
+                    mapping[op.new_name] = mapping.pop(op.old_name)
+
+        elif isinstance(op, AddColumn):
+            self._columns.setdefault(op.table_name, {})[op.column.name] = op.column
+
+        elif isinstance(op, RemoveColumn):
+            self._columns.get(op.table_name, {}).pop(op.column_name, None)
+            indexes = self._indexes.get(op.table_name, {})
+            for name in [name for name, idx in indexes.items() if op.column_name in idx.columns]:
+                del indexes[name]
+            self._fks.get(op.table_name, {}).pop(op.column_name, None)
+            self._fk_names.get(op.table_name, {}).pop(op.column_name, None)
+
+        elif isinstance(op, AlterColumn):
+            columns = self._columns.get(op.table_name, {})
+            if op.column_name in columns:
+                columns[op.column_name] = self._altered(columns[op.column_name], op)
+
+        elif isinstance(op, RenameColumn):
+            columns = self._columns.get(op.table_name, {})
+            if op.old_name in columns:
+                columns[op.new_name] = columns.pop(op.old_name).model_copy(update={'name': op.new_name})
+            for idx in self._indexes.get(op.table_name, {}).values():
+                idx.columns = [op.new_name if c == op.old_name else c for c in idx.columns]
+            fks = self._fks.get(op.table_name, {})
+            if op.old_name in fks:
+                self._pin_foreign_key_name(op.table_name, op.old_name)
+                fks[op.new_name] = fks.pop(op.old_name).model_copy(update={'column_name': op.new_name})
+                self._fk_names[op.table_name][op.new_name] = self._fk_names[op.table_name].pop(op.old_name)
+
+        elif isinstance(op, AddIndex):
+            self._indexes.setdefault(op.table_name, {})[op.index.name] = op.index.model_copy(deep=True)
+
+        elif isinstance(op, RemoveIndex):
+            self._indexes.get(op.table_name, {}).pop(op.index_name, None)
+
+        elif isinstance(op, AddForeignKey):
+            self._fks.setdefault(op.table_name, {})[op.foreign_key.column_name] = op.foreign_key
+            self._fk_names.get(op.table_name, {}).pop(op.foreign_key.column_name, None)
+
+        elif isinstance(op, RemoveForeignKey):
+            fks = self._fks.get(op.table_name, {})
+            for column in list(fks):
+                if self._foreign_key_name(op.table_name, column) == op.constraint_name:
+                    del fks[column]
+                    self._fk_names.get(op.table_name, {}).pop(column, None)
+
+        elif isinstance(op, AlterForeignKey):
+            column, fk = self._tracked_foreign_key(op.table_name, op.constraint_name)
+            self._fks[op.table_name][column] = self._altered_foreign_key(fk, op)
+
+    def _altered(self, column: ColumnDefinition, op: AlterColumn) -> ColumnDefinition:
+        """应用AlterColumn之后的列定义"""
+        return column.model_copy(update={
+            field[len('new_'):]: value
+            for field, value in op.model_dump(exclude={'type', 'table_name', 'column_name'}).items()
+            if value is not None
+        })
+
+    def _altered_foreign_key(self, fk: ForeignKeyDefinition, op: AlterForeignKey) -> ForeignKeyDefinition:
+        """应用AlterForeignKey之后的外键定义"""
+        return fk.model_copy(update={
+            'on_delete': op.new_on_delete or fk.on_delete,
+            'on_update': op.new_on_update or fk.on_update,
+        })
+
+    # ============ 单个操作 ============
+
+    def _compile_operation(self, op: Operation,
+                           inline_fks: Dict[str, List[ForeignKeyDefinition]]) -> List[Union[str, _AlterClause]]:
+        """编译单个操作（在_track之前调用，跟踪的结构是操作之前的状态）"""
+        if isinstance(op, CreateTable):
+            table = self._table(op.table_name, op.columns)
+            for fk in inline_fks.get(op.table_name, ()):
+                table.append_constraint(self._foreign_key_constraint(op.table_name, fk))
+            return [self._statement(CreateTableDDL(table))]
+
+        if isinstance(op, DropTable):
+            return [self._statement(DropTableDDL(sa.Table(op.table_name, sa.MetaData())))]
+
+        if isinstance(op, RenameTable):
+            return [f"ALTER TABLE {self._quote(op.old_name)} RENAME TO {self._quote(op.new_name)}"]
+
+        if isinstance(op, AddColumn):
+            return [_AlterClause(op.table_name, f"ADD COLUMN {self._column_spec(op.table_name, op.column)}")]
+
+        if isinstance(op, RemoveColumn):
+            return [_AlterClause(op.table_name, f"DROP COLUMN {self._quote(op.column_name)}")]
+
+        if isinstance(op, RenameColumn):
+            return [f"ALTER TABLE {self._quote(op.table_name)} "
+                    f"RENAME COLUMN {self._quote(op.old_name)} TO {self._quote(op.new_name)}"]
+
+        if isinstance(op, AlterColumn):
+            return self._alter_column(op)
+
+        if isinstance(op, AddIndex):
+            return [self._create_index(op.table_name, op.index)]
+
+        if isinstance(op, RemoveIndex):
+            # MySQL的DROP INDEX需要表名，用只有名称的索引绑定到表上
+            table = sa.Table(op.table_name, sa.MetaData(), sa.Column('_', sa.Integer))
+            return [self._statement(DropIndex(sa.Index(op.index_name, table.c['_'])))]
+
+        if isinstance(op, AddForeignKey):
+            self._require_alter_constraint(op)
+            return [_AlterClause(op.table_name, f"ADD {self._constraint_spec(op.table_name, op.foreign_key)}")]
+
+        if isinstance(op, RemoveForeignKey):
+            self._require_alter_constraint(op)
+            return [_AlterClause(op.table_name, self._drop_constraint(op.constraint_name))]
+
+        if isinstance(op, AlterForeignKey):
+            # 外键的引用动作不能直接修改，删除后按新动作重建
+            self._require_alter_constraint(op)
+            _, fk = self._tracked_foreign_key(op.table_name, op.constraint_name)
+            return [
+                _AlterClause(op.table_name, self._drop_constraint(op.constraint_name)),
+                _AlterClause(op.table_name, f"ADD {self._constraint_spec(op.table_name, self._altered_foreign_key(fk, op), op.constraint_name)}"),
+            ]
+
+        raise ValueError(f"Unsupported operation: {op.type}")
+
+    def _alter_column(self, op: AlterColumn) -> List[_AlterClause]:
+        """修改列：PostgreSQL逐项修改，MySQL用完整定义MODIFY COLUMN，SQLite需要重建表"""
+        if self.name == 'sqlite':
+            raise ValueError(f"SQLite cannot alter column {op.table_name}.{op.column_name} "
+                             f"without a table rebuild; pass state")
+
+        current = self._columns.get(op.table_name, {}).get(op.column_name)
+        if self.name in ('mysql', 'mariadb'):
+            if current is None:
+                raise ValueError(f"MySQL needs the full definition of {op.table_name}.{op.column_name} to alter it; pass state")
+            return [_AlterClause(op.table_name, f"MODIFY COLUMN {self._column_spec(op.table_name, self._altered(current, op))}")]
+
+        column = self._quote(op.column_name)
+        clauses = []
+        if any(value is not None for value in (op.new_type, op.new_max_length, op.new_precision, op.new_scale)):
+            if current is None and op.new_type is None:
+                # 只改长度或精度时需要知道原类型
+                raise ValueError(f"Cannot change the length or precision of {op.table_name}.{op.column_name} "
+                                 f"without its current type; pass state")
+            target = self._altered(current or ColumnDefinition(name=op.column_name, type=op.new_type), op)
+            type_spec = self.dialect.type_compiler_instance.process(self.column_type(target))
+            clauses.append(f"ALTER COLUMN {column} TYPE {type_spec}")
+        if op.new_nullable is not None:
+            clauses.append(f"ALTER COLUMN {column} {'DROP' if op.new_nullable else 'SET'} NOT NULL")
+        if op.new_default is not None:
+            clauses.append(f"ALTER COLUMN {column} SET DEFAULT {self._default_sql(op.new_default)}")
+        return [_AlterClause(op.table_name, clause) for clause in clauses]
+
+    # ============ SQLite重建表 ============
+
+    def _plan_rebuilds(self, operations: List[Operation]) -> Dict[str, int]:
+        """
+        找出需要重建的已有表
+
+        Returns:
+            {表名: 该表最后一个表内操作的位置}，重建在这个位置输出
+        """
+        if self.name != 'sqlite':
+            return {}
+        existing = set(self._columns)
+        last: Dict[str, int] = {}
+        needs_rebuild: Set[str] = set()
+        for position, op in enumerate(operations):
+            if isinstance(op, (CreateTable, DropTable)):
+                existing.discard(op.table_name)
+                last.pop(op.table_name, None)
+                needs_rebuild.discard(op.table_name)
+            elif isinstance(op, RenameTable):
+                if op.old_name in existing:
+                    existing.discard(op.old_name)
+                    existing.add(op.new_name)
+            elif op.type in self.TABLE_OPERATIONS and op.table_name in existing:
+                last[op.table_name] = position
+                if op.type in self.SQLITE_REBUILD_OPERATIONS:
+                    needs_rebuild.add(op.table_name)
+        return {table_name: position for table_name, position in last.items() if table_name in needs_rebuild}
+
+    def _track_origin(self, origin: Dict[str, str], op: Operation) -> None:
+        """记录重建表中每一列对应的原列名，新加的列不在其中"""
+        if isinstance(op, RemoveColumn):
+            origin.pop(op.column_name, None)
+        elif isinstance(op, AddColumn):
+            origin.pop(op.column.name, None)
+        elif isinstance(op, RenameColumn) and op.old_name in origin:
+            origin[op.new_name] = origin.pop(op.old_name)
+
+    def _rebuild(self, table_name: str, origin: Dict[str, str]) -> List[str]:
+        """
+        按跟踪的最终结构重建表：建新表、复制数据、删除旧表、改名、重建索引
+
+        Args:
+            table_name: 表名
+            origin: {最终列名: 原列名}，只包含原表中已有的列
+
+        Returns:
+            SQL语句列表
+        """
+        temp_name = f"{self.REBUILD_PREFIX}{table_name}"
+        columns = list(self._columns[table_name].values())
+        table = self._table(temp_name, columns)
+        for fk in self._fks.get(table_name, {}).values():
+            table.append_constraint(self._foreign_key_constraint(table_name, fk,
+                                                                 self._foreign_key_name(table_name, fk.column_name)))
+
+        copied = [col.name for col in columns if col.name in origin]
+        quote = self._quote
+        statements = [
+            self._statement(CreateTableDDL(table)),
+            f"INSERT INTO {quote(temp_name)} ({', '.join(map(quote, copied))}) "
+            f"SELECT {', '.join(quote(origin[name]) for name in copied)} FROM {quote(table_name)}",
+            f"DROP TABLE {quote(table_name)}",
+            f"ALTER TABLE {quote(temp_name)} RENAME TO {quote(table_name)}",
+        ]
+        statements.extend(self._create_index(table_name, idx) for idx in self._indexes.get(table_name, {}).values())
+        return statements
+
+    # ============ 合并 ============
+
+    def _merge(self, pieces: List[Union[str, _AlterClause]]) -> List[str]:
+        """同一张表相邻的ALTER子句合并为一条语句（方言支持时）"""
+        statements: List[str] = []
+        pending: List[_AlterClause] = []
+
+        def flush() -> None:
+            if pending:
+                statements.append(f"ALTER TABLE {self._quote(pending[0].table_name)} "
+                                  + ", ".join(piece.clause for piece in pending))
+                pending.clear()
+
+        for piece in pieces:
+            if isinstance(piece, str):
+                flush()
+                statements.append(piece)
+                continue
+            if pending and (pending[0].table_name != piece.table_name or self.name not in self.MULTI_CLAUSE_ALTER):
+                flush()
+            pending.append(piece)
+        flush()
+        return statements
+
+    # ============ 构造 ============
+
+    def column_type(self, column: ColumnDefinition) -> TypeEngine:
+        """
+        ER列类型对应的SQLAlchemy类型
+
+        Args:
+            column: 列定义
+
+        Returns:
+            SQLAlchemy类型；未知类型按原样输出
+        """
+        type_cls = _TYPES.get(column.type.lower())
+        if type_cls is None:
+            return _RawType(column.type)
+        if type_cls is sa.String:
+            return sa.String(column.max_length or DEFAULT_STRING_LENGTH)
+        if type_cls is sa.Numeric:
+            return sa.Numeric(column.precision, column.scale)
+        return type_cls()
+
+    def _table(self, table_name: str, columns: List[ColumnDefinition]) -> sa.Table:
+        """构造只用于生成DDL的表对象"""
+        return sa.Table(table_name, sa.MetaData(), *(self._column(col) for col in columns))
+
+    def _column(self, column: ColumnDefinition) -> sa.Column:
+        return sa.Column(
+            column.name,
+            self.column_type(column),
+            primary_key=column.primary_key,
+            nullable=column.nullable and not column.primary_key,
+            server_default=sa.text(self._default_sql(column.default)) if column.default is not None else None,
+            comment=column.comment,
+        )
+
+    def _create_index(self, table_name: str, index: IndexDefinition) -> str:
+        table = self._table(table_name, [ColumnDefinition(name=c, type='string') for c in index.columns])
+        return self._statement(CreateIndex(sa.Index(index.name, *(table.c[c] for c in index.columns), unique=index.unique)))
+
+    def _column_spec(self, table_name: str, column: ColumnDefinition) -> str:
+        """列定义子句，例如 email VARCHAR(255) NOT NULL"""
+        table = self._table(table_name, [column])
+        return self._ddl.get_column_specification(table.c[column.name])
+
+    def _foreign_key_constraint(self, table_name: str, fk: ForeignKeyDefinition,
+                                name: Optional[str] = None) -> sa.ForeignKeyConstraint:
+        return sa.ForeignKeyConstraint(
+            [fk.column_name],
+            [sa.Table(fk.reference_table, sa.MetaData(), sa.Column(fk.reference_column)).c[fk.reference_column]],
+            name=name or self.converter.foreign_key_name(table_name, fk.column_name),
+            ondelete=fk.on_delete,
+            onupdate=fk.on_update,
+        )
+
+    def _constraint_spec(self, table_name: str, fk: ForeignKeyDefinition, name: Optional[str] = None) -> str:
+        """外键约束子句，例如 CONSTRAINT fk_post_user_id FOREIGN KEY(user_id) REFERENCES user (id)"""
+        table = sa.Table(table_name, sa.MetaData(), sa.Column(fk.column_name))
+        constraint = self._foreign_key_constraint(table_name, fk, name)
+        table.append_constraint(constraint)
+        return self._ddl.process(constraint)
+
+    def _drop_constraint(self, constraint_name: str) -> str:
+        keyword = 'FOREIGN KEY' if self.name in ('mysql', 'mariadb') else 'CONSTRAINT'
+        return f"DROP {keyword} {self._quote(constraint_name)}"
+
+    def _default_sql(self, value) -> str:
+        """
+        默认值的SQL表示
+
+        字符串如果已经是SQL表达式（带引号的字面量、函数调用、CURRENT_TIMESTAMP等，
+        例如从数据库反向解析得到的默认值）原样使用，否则作为字符串字面量。
+        """
+        if isinstance(value, str) and _SQL_EXPRESSION.match(value.strip()):
+            return value.strip()
+        return str(sa.literal(value).compile(dialect=self.dialect, compile_kwargs={'literal_binds': True}))
+
+    def _statement(self, ddl) -> str:
+        return str(ddl.compile(dialect=self.dialect)).strip()
+
+    def _tracked_foreign_key(self, table_name: str, constraint_name: str):
+        """按约束名查找跟踪的外键，返回 (列名, 外键定义)"""
+        for column, fk in self._fks.get(table_name, {}).items():
+            if self._foreign_key_name(table_name, column) == constraint_name:
+                return column, fk
+        raise ValueError(f"Unknown foreign key {constraint_name} on {table_name}; pass state")
+
+    def _foreign_key_name(self, table_name: str, column: str) -> str:
+        """跟踪的外键的实际约束名"""
+        return self._fk_names.get(table_name, {}).get(column) or self.converter.foreign_key_name(table_name, column)
+
+    def _pin_foreign_key_name(self, table_name: str, column: str) -> None:
+        """表或列重命名之前，把外键的约束名固定为当前名称"""
+        self._fk_names.setdefault(table_name, {})[column] = self._foreign_key_name(table_name, column)
+
+    def _require_alter_constraint(self, op: Operation) -> None:
+        if self.name == 'sqlite':
+            raise ValueError(f"SQLite cannot {op.type} on existing table {op.table_name} "
+                             f"without a table rebuild; pass state")
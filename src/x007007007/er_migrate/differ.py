@@ -1,9 +1,16 @@
 """
 ER差异检测器 - 比较两个ER模型，生成操作列表
 """
-from typing import List, Dict, Set, Any
+import math
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Callable, List, Dict, Optional, Set, Tuple
 from x007007007.er.models import ERModel, Entity, Column
 from .converter import ERConverter
+from .fingerprint import entity_signature
+from .matching import best_matching, jaccard_candidates
+from .optimizer import MigrationOptimizer
 from .models import (
     Operation,
     CreateTable,
@@ -11,17 +18,90 @@ from .models import (
     AddColumn,
     RemoveColumn,
     AlterColumn,
+    RenameColumn,
     AddIndex,
     RemoveIndex,
+    AddForeignKey,
+    RemoveForeignKey,
+    AlterForeignKey,
     ColumnDefinition,
+    IndexDefinition,
+    ForeignKeyDefinition,
 )
 
 
+@dataclass
+class DiffStats:
+    """一次diff的表级统计"""
+    tables_skipped: int = 0      # 结构签名相同、未逐列比较的表（包括结构未变的重命名表）
+    tables_inspected: int = 0    # 逐列比较过的表
+    tables_created: int = 0
+    tables_dropped: int = 0
+    tables_renamed: int = 0
+
+
+@dataclass
+class ColumnRename:
+    """一次diff中检测到的列重命名候选"""
+    table_name: str
+    old_name: str
+    new_name: str
+    score: float                 # 置信度
+    accepted: bool               # 是否生成了RenameColumn（否则为删除+新增）
+
+
 class ERDiffer:
     """ER模型差异检测器"""
     
-    def __init__(self):
+    # 表重命名的列结构相似度阈值
+    TABLE_RENAME_THRESHOLD = 0.8
+    
+    # 列重命名的默认置信度阈值
+    COLUMN_RENAME_THRESHOLD = 0.8
+    
+    # 列重命名置信度中各项属性的权重（类型必须相同，不参与打分）；
+    # 属性之外的权重合计0.6，列名毫不相似的两列即使其余完全相同也达不到默认阈值
+    COLUMN_RENAME_WEIGHTS = {
+        'name': 0.4,
+        'max_length': 0.1,
+        'precision': 0.05,
+        'scale': 0.05,
+        'nullable': 0.1,
+        'default': 0.1,
+        'comment': 0.05,
+        'constraints': 0.05,
+        'position': 0.1,
+    }
+    
+    # 启用多进程时，变化的表少于该数量仍然串行比较（进程启动和序列化的开销更大）
+    PARALLEL_MIN_TABLES = 500
+    
+    def __init__(self, optimize: bool = True, column_rename_threshold: Optional[float] = COLUMN_RENAME_THRESHOLD,
+                 confirm_rename: Optional[Callable[[str, str, str, float], bool]] = None,
+                 accept_renames: bool = False, workers: int = 0):
+        """
+        初始化差异检测器
+        
+        Args:
+            optimize: 是否对生成的操作做合并和依赖排序（见MigrationOptimizer）
+            column_rename_threshold: 列重命名的置信度阈值（0~1]，None表示不检测列重命名
+            confirm_rename: 确认列重命名的回调 (表名, 原列名, 新列名, 置信度) -> 是否接受
+            accept_renames: 没有确认回调时是否自动接受达到阈值的重命名；默认不接受，
+                生成删除+新增（会丢失原列的数据），检测到的候选记录在last_renames中
+            workers: 并行比较表结构的进程数，0或1表示串行
+        """
+        assert column_rename_threshold is None or 0 < column_rename_threshold <= 1, \
+            "column_rename_threshold must be in (0, 1]"
+        assert isinstance(workers, int) and workers >= 0, "workers must be a non-negative integer"
+        
         self.converter = ERConverter()
+        self.optimizer = MigrationOptimizer() if optimize else None
+        self.column_rename_threshold = column_rename_threshold
+        self.confirm_rename = confirm_rename
+        self.accept_renames = accept_renames
+        self.workers = workers
+        self.last_stats = DiffStats()
+        self.last_renames: List[ColumnRename] = []
     
     def diff(self, old_model: ERModel, new_model: ERModel) -> List[Operation]:
         """
@@ -32,9 +112,12 @@ class ERDiffer:
             new_model: 新的ER模型
             
         Returns:
-            操作列表
+            操作列表（表级统计见last_stats，列重命名候选见last_renames）
         """
         operations = []
+        stats = DiffStats()
+        self.last_stats = stats
+        self.last_renames = []
         
         # 转换实体名为表名
         old_tables = {self.converter._to_snake_case(name): entity 
@@ -56,27 +139,27 @@ class ERDiffer:
         
         # 1. 处理重命名的表
         from .models import RenameTable
-        for old_name, new_name in rename_mapping.items():
+        for old_name, new_name in sorted(rename_mapping.items()):
             operations.append(RenameTable(old_name=old_name, new_name=new_name))
             
-            # 重命名后，检测列变更
-            old_entity = old_tables[old_name]
-            new_entity = new_tables[new_name]
-            
-            col_ops = self._diff_columns(new_name, old_entity, new_entity)
-            operations.extend(col_ops)
-            
-            idx_ops = self._diff_indexes(new_name, old_entity, new_entity)
-            operations.extend(idx_ops)
-        
-        # 2. 检测删除的表（排除已重命名的）
-        for table_name in dropped_tables:
+            # 重命名后，检测列和索引变更
+            stats.tables_renamed += 1
+            if entity_signature(old_tables[old_name]) == entity_signature(new_tables[new_name]):
+                stats.tables_skipped += 1
+                continue
+            stats.tables_inspected += 1
+            operations.extend(self._diff_table(new_name, old_tables[old_name], new_tables[new_name]))
+        
+        # 2. 检测删除的表（排除已重命名的）；集合按名称排序，生成的操作顺序与哈希种子无关
+        for table_name in sorted(dropped_tables):
             if table_name not in rename_mapping:
+                stats.tables_dropped += 1
                 operations.append(DropTable(table_name=table_name))
         
         # 3. 检测新增的表（排除已重命名的）
-        for table_name in created_tables:
+        for table_name in sorted(created_tables):
             if table_name not in rename_mapping.values():
+                stats.tables_created += 1
                 entity = new_tables[table_name]
                 table_name_converted, columns = self.converter.convert_entity(entity)
                 operations.append(CreateTable(
@@ -92,25 +175,105 @@ class ERDiffer:
                         index=idx
                     ))
         
-        # 4. 检测现有表的变更（未重命名的）
-        for table_name in old_table_names & new_table_names:
-            old_entity = old_tables[table_name]
-            new_entity = new_tables[table_name]
-            
-            # 检测列变更
-            col_ops = self._diff_columns(table_name, old_entity, new_entity)
-            operations.extend(col_ops)
-            
-            # 检测索引变更
-            idx_ops = self._diff_indexes(table_name, old_entity, new_entity)
-            operations.extend(idx_ops)
+        # 4. 检测现有表的变更（未重命名的），按表名排序保证结果确定；
+        #    结构签名相同的表直接跳过，没有变更时总开销只是每张表计算一次签名
+        common_tables = sorted(old_table_names & new_table_names)
+        changed_tables = [
+            (table_name, old_tables[table_name], new_tables[table_name])
+            for table_name in common_tables
+            if entity_signature(old_tables[table_name]) != entity_signature(new_tables[table_name])
+        ]
+        stats.tables_skipped += len(common_tables) - len(changed_tables)
+        stats.tables_inspected += len(changed_tables)
+        operations.extend(self._diff_tables(changed_tables))
+        
+        # 5. 检测外键关系；每个模型的外键索引只计算一次，外键比较和删除表排序共用
+        old_fks = self.converter.foreign_key_index(old_model)
+        new_fks = self.converter.foreign_key_index(new_model)
+        dropped_only = {name for name in dropped_tables if name not in rename_mapping}
+        operations.extend(self._diff_relationships(old_fks, new_fks, rename_mapping, dropped_only,
+                                                   self.converter.foreign_key_names(old_model)))
+        
+        # 6. 合并冗余操作并按依赖排序
+        if self.optimizer is not None:
+            operations = self.optimizer.optimize(operations, self._table_references(old_fks, operations))
+        
+        return operations
+    
+    def _table_references(self, foreign_keys: Dict[str, Dict[str, ForeignKeyDefinition]],
+                          operations: List[Operation]) -> Dict[str, Set[str]]:
+        """
+        模型中的外键引用，只在有删除表操作时计算
         
-        # 5. 检测外键关系
-        fk_ops = self._diff_relationships(old_model, new_model)
-        operations.extend(fk_ops)
+        Args:
+            foreign_keys: 外键索引（见ERConverter.foreign_key_index）
+            operations: 操作列表
+            
+        Returns:
+            {表名: 被引用的表名集合}
+        """
+        if not any(isinstance(op, DropTable) for op in operations):
+            return {}
+        return {table: {fk.reference_table for fk in fks.values()} for table, fks in foreign_keys.items()}
+    
+    def _diff_table(self, table_name: str, old_entity: Entity, new_entity: Entity) -> List[Operation]:
+        """检测单张表的列和索引变更"""
+        return self._diff_columns(table_name, old_entity, new_entity) + \
+            self._diff_indexes(table_name, old_entity, new_entity)
+    
+    def _diff_tables(self, tables: List[Tuple[str, Entity, Entity]]) -> List[Operation]:
+        """
+        检测多张表的变更，表足够多且配置了workers时分片到进程池
         
+        Args:
+            tables: [(表名, 旧实体, 新实体)]
+            
+        Returns:
+            按tables顺序拼接的操作列表
+        """
+        if self.workers <= 1 or len(tables) < self.PARALLEL_MIN_TABLES:
+            operations = []
+            for table_name, old_entity, new_entity in tables:
+                operations.extend(self._diff_table(table_name, old_entity, new_entity))
+            return operations
+        
+        # 每个进程分到多个分片，平衡各表的工作量差异
+        chunk_size = math.ceil(len(tables) / (self.workers * 4))
+        chunks = [
+            (self.column_rename_threshold, tables[i:i + chunk_size])
+            for i in range(0, len(tables), chunk_size)
+        ]
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(_diff_table_chunk, chunks))
+        
+        new_entities = {table_name: new_entity for table_name, _, new_entity in tables}
+        operations = []
+        for chunk_operations, renames in results:
+            # 子进程中自动接受了重命名，是否接受（包括确认回调）在主进程中决定
+            for rename in renames:
+                if not self._accept_column_rename(rename.table_name, rename.old_name, rename.new_name, rename.score):
+                    chunk_operations = self._reject_column_rename(
+                        chunk_operations, rename.table_name, rename.old_name,
+                        new_entities[rename.table_name], rename.new_name
+                    )
+            operations.extend(chunk_operations)
         return operations
     
+    def _reject_column_rename(self, operations: List[Operation], table_name: str, old_name: str,
+                              new_entity: Entity, new_name: str) -> List[Operation]:
+        """将被拒绝的RenameColumn（及随后的AlterColumn）替换为删除+新增"""
+        result = []
+        for op in operations:
+            if isinstance(op, RenameColumn) and (op.table_name, op.old_name, op.new_name) == (table_name, old_name, new_name):
+                new_col = next(col for col in new_entity.columns if col.name == new_name)
+                result.append(RemoveColumn(table_name=table_name, column_name=old_name))
+                result.append(AddColumn(table_name=table_name, column=self.converter.convert_column(new_col)))
+            elif isinstance(op, AlterColumn) and (op.table_name, op.column_name) == (table_name, new_name):
+                continue
+            else:
+                result.append(op)
+        return result
+    
     def _diff_columns(self, table_name: str, old_entity: Entity, new_entity: Entity) -> List[Operation]:
         """
         检测列的变更
@@ -132,15 +295,37 @@ class ERDiffer:
         old_col_names = set(old_cols.keys())
         new_col_names = set(new_cols.keys())
         
+        # 检测重命名的列：重命名只修改元数据，删除+新增会重写数据并丢失原列的数据
+        renames = self._detect_column_renames(
+            table_name, old_entity, new_entity,
+            old_col_names - new_col_names, new_col_names - old_col_names
+        )
+        for old_name, new_name in renames.items():
+            operations.append(RenameColumn(
+                table_name=table_name,
+                old_name=old_name,
+                new_name=new_name
+            ))
+            alter_op = self._diff_column_properties(table_name, old_cols[old_name], new_cols[new_name])
+            if alter_op:
+                operations.append(alter_op)
+        old_col_names -= set(renames.keys())
+        new_col_names -= set(renames.values())
+        
+        # 按列在模型中的顺序遍历，生成的操作顺序与哈希种子无关
+        removed = old_col_names - new_col_names
+        added = new_col_names - old_col_names
+        common = old_col_names & new_col_names
+        
         # 检测删除的列
-        for col_name in old_col_names - new_col_names:
+        for col_name in [col.name for col in old_entity.columns if col.name in removed]:
             operations.append(RemoveColumn(
                 table_name=table_name,
                 column_name=col_name
             ))
         
         # 检测新增的列
-        for col_name in new_col_names - old_col_names:
+        for col_name in [col.name for col in new_entity.columns if col.name in added]:
             col = new_cols[col_name]
             col_def = self.converter.convert_column(col)
             operations.append(AddColumn(
@@ -149,7 +334,7 @@ class ERDiffer:
             ))
         
         # 检测修改的列
-        for col_name in old_col_names & new_col_names:
+        for col_name in [col.name for col in new_entity.columns if col.name in common]:
             old_col = old_cols[col_name]
             new_col = new_cols[col_name]
             
@@ -159,6 +344,92 @@ class ERDiffer:
         
         return operations
     
+    def _detect_column_renames(self, table_name: str, old_entity: Entity, new_entity: Entity,
+                               removed: Set[str], added: Set[str]) -> Dict[str, str]:
+        """
+        检测列重命名
+        
+        被删除的列与新增的列类型相同时，按长度、精度、可空性、默认值、注释、约束和
+        在表中的位置计算置信度，列名的相似度权重最高；在达到阈值的候选中求总置信度
+        最大的一一匹配，再逐个确认（见_accept_column_rename）。
+        
+        Args:
+            table_name: 表名
+            old_entity: 旧实体
+            new_entity: 新实体
+            removed: 被删除的列名
+            added: 新增的列名
+            
+        Returns:
+            重命名映射 {原列名: 新列名}
+        """
+        if self.column_rename_threshold is None or not removed or not added:
+            return {}
+        
+        old_positions = {col.name: i for i, col in enumerate(old_entity.columns)}
+        new_positions = {col.name: i for i, col in enumerate(new_entity.columns)}
+        old_cols = {col.name: col for col in old_entity.columns}
+        new_cols = {col.name: col for col in new_entity.columns}
+        
+        candidates = {}
+        for old_name in removed:
+            for new_name in added:
+                score = self._column_rename_score(
+                    old_cols[old_name], new_cols[new_name],
+                    abs(old_positions[old_name] - new_positions[new_name])
+                )
+                if score >= self.column_rename_threshold:
+                    candidates[(old_name, new_name)] = score
+        
+        renames = {}
+        for old_name, new_name in sorted(best_matching(candidates).items()):
+            score = candidates[(old_name, new_name)]
+            if self._accept_column_rename(table_name, old_name, new_name, score):
+                renames[old_name] = new_name
+        return renames
+    
+    def _accept_column_rename(self, table_name: str, old_name: str, new_name: str, score: float) -> bool:
+        """
+        确认一个列重命名候选并记录到last_renames
+        
+        有确认回调时由回调决定，否则取决于accept_renames
+        
+        Returns:
+            是否生成RenameColumn
+        """
+        if self.confirm_rename is not None:
+            accepted = bool(self.confirm_rename(table_name, old_name, new_name, score))
+        else:
+            accepted = self.accept_renames
+        self.last_renames.append(ColumnRename(table_name, old_name, new_name, score, accepted))
+        return accepted
+    
+    def _column_rename_score(self, old_col: Column, new_col: Column, distance: int) -> float:
+        """
+        计算一列被重命名为另一列的置信度
+        
+        Args:
+            old_col: 被删除的列
+            new_col: 新增的列
+            distance: 两列在各自表中的位置差
+            
+        Returns:
+            置信度（0.0-1.0），类型不同时为0
+        """
+        if old_col.type != new_col.type:
+            return 0.0
+        
+        weights = self.COLUMN_RENAME_WEIGHTS
+        score = weights['name'] * SequenceMatcher(None, old_col.name.lower(), new_col.name.lower()).ratio()
+        for field in ('max_length', 'precision', 'scale', 'nullable', 'default', 'comment'):
+            if getattr(old_col, field) == getattr(new_col, field):
+                score += weights[field]
+        if (old_col.is_pk, old_col.unique) == (new_col.is_pk, new_col.unique):
+            score += weights['constraints']
+        # 位置相同得满分，每偏离一位扣1/4
+        score += weights['position'] * max(0.0, 1 - distance / 4)
+        return round(score, 6)
+    
     def _diff_column_properties(self, table_name: str, old_col: Column, new_col: Column) -> Operation:
         """
         检测单个列的属性变更
@@ -226,12 +497,10 @@ class ERDiffer:
         new_indexes = self._extract_index_info(new_entity)
         
         # 检测删除的索引
-        for col_name in old_indexes - new_indexes:
-            idx_name = f"idx_{table_name}_{col_name}"
-            if old_entity.columns:
-                old_col = next((c for c in old_entity.columns if c.name == col_name), None)
-                if old_col and old_col.unique:
-                    idx_name = f"idx_{table_name}_{col_name}_unique"
+        for col_name in sorted(old_indexes - new_indexes):
+            # 使用索引的实际名称（例如反射的数据库中的名称）
+            old_col = next(c for c in old_entity.columns if c.name == col_name)
+            idx_name = self.converter.column_index_name(table_name, old_col, unique=old_col.unique)
             
             operations.append(RemoveIndex(
                 table_name=table_name,
@@ -239,18 +508,13 @@ class ERDiffer:
             ))
         
         # 检测新增的索引
-        for col_name in new_indexes - old_indexes:
+        for col_name in sorted(new_indexes - old_indexes):
             new_col = next(c for c in new_entity.columns if c.name == col_name)
             
             # 确定索引名称和类型
-            if new_col.unique:
-                idx_name = f"idx_{table_name}_{col_name}_unique"
-                unique = True
-            else:
-                idx_name = f"idx_{table_name}_{col_name}"
-                unique = False
+            unique = new_col.unique
+            idx_name = self.converter.column_index_name(table_name, new_col, unique=unique)
             
-            from .models import IndexDefinition
             operations.append(AddIndex(
                 table_name=table_name,
                 index=IndexDefinition(
@@ -260,6 +524,30 @@ class ERDiffer:
                 )
             ))
         
+        # 多列索引：按(列, 唯一性)比较，忽略名称差异（反射的索引名与设计中的可能不同）
+        old_composite = {(tuple(idx.columns), idx.unique): idx for idx in old_entity.indexes}
+        new_composite = {(tuple(idx.columns), idx.unique): idx for idx in new_entity.indexes}
+        
+        for key, idx in old_composite.items():
+            if key in new_composite:
+                continue
+            operations.append(RemoveIndex(
+                table_name=table_name,
+                index_name=idx.name
+            ))
+        
+        for key, idx in new_composite.items():
+            if key in old_composite:
+                continue
+            operations.append(AddIndex(
+                table_name=table_name,
+                index=IndexDefinition(
+                    name=idx.name,
+                    columns=list(idx.columns),
+                    unique=idx.unique
+                )
+            ))
+        
         return operations
     
     def _extract_index_info(self, entity: Entity) -> Set[str]:
@@ -285,8 +573,9 @@ class ERDiffer:
         """
         检测表重命名（启发式算法）
         
-        如果一个表被删除，另一个表被创建，且列结构相似度>80%，
-        则推断为重命名操作
+        如果一个表被删除，另一个表被创建，且列名集合的Jaccard相似度>=80%，
+        则推断为重命名操作。列名集合只计算一次，候选对通过前缀过滤的倒排索引查找，
+        最终在所有候选中求总相似度最大的一一匹配，结果与表的遍历顺序无关。
         
         Args:
             dropped_tables: 被删除的表字典 {table_name: entity}
@@ -295,138 +584,110 @@ class ERDiffer:
         Returns:
             重命名映射 {old_name: new_name}
         """
-        rename_mapping = {}
-        
-        # 对每个被删除的表，找最相似的被创建的表
-        for old_name, old_entity in dropped_tables.items():
-            best_match = None
-            best_similarity = 0.0
-            
-            for new_name, new_entity in created_tables.items():
-                # 如果新表已经被匹配过，跳过
-                if new_name in rename_mapping.values():
-                    continue
-                
-                # 计算列结构相似度
-                similarity = self._calculate_column_similarity(old_entity, new_entity)
-                
-                if similarity > best_similarity:
-                    best_similarity = similarity
-                    best_match = new_name
-            
-            # 如果相似度超过阈值（80%），认为是重命名
-            if best_match and best_similarity >= 0.8:
-                rename_mapping[old_name] = best_match
-        
-        return rename_mapping
-    
-    def _calculate_column_similarity(self, entity1: Entity, entity2: Entity) -> float:
-        """
-        计算两个实体的列结构相似度
-        
-        Args:
-            entity1: 实体1
-            entity2: 实体2
-            
-        Returns:
-            相似度（0.0-1.0）
-        """
-        # 提取列名集合
-        cols1 = {col.name for col in entity1.columns}
-        cols2 = {col.name for col in entity2.columns}
-        
-        # 如果任一实体没有列，返回0
-        if not cols1 or not cols2:
-            return 0.0
+        if not dropped_tables or not created_tables:
+            return {}
         
-        # 计算交集和并集
-        intersection = cols1 & cols2
-        union = cols1 | cols2
+        dropped_columns = {name: {col.name for col in entity.columns} for name, entity in dropped_tables.items()}
+        created_columns = {name: {col.name for col in entity.columns} for name, entity in created_tables.items()}
         
-        # Jaccard相似度
-        return len(intersection) / len(union)
+        candidates = jaccard_candidates(dropped_columns, created_columns, self.TABLE_RENAME_THRESHOLD)
+        return best_matching(candidates)
     
-    def _diff_relationships(self, old_model: ERModel, new_model: ERModel) -> List[Operation]:
+    def _diff_relationships(self, old_fks: Dict[str, Dict[str, ForeignKeyDefinition]],
+                            new_fks: Dict[str, Dict[str, ForeignKeyDefinition]],
+                            rename_mapping: Dict[str, str], dropped_tables: Set[str],
+                            old_names: Optional[Dict[str, Dict[str, str]]] = None) -> List[Operation]:
         """
         检测关系（外键）的变更
         
+        外键按 (表名, 外键列) 对齐：
+        - 只在新模型中：AddForeignKey
+        - 只在旧模型中：RemoveForeignKey（随表删除的外键不单独删除）
+        - 引用的表或列变化：先RemoveForeignKey再AddForeignKey
+        - 只有on_delete/on_update变化：AlterForeignKey
+        
         Args:
-            old_model: 旧模型
-            new_model: 新模型
+            old_fks: 旧模型的外键索引（见ERConverter.foreign_key_index）
+            new_fks: 新模型的外键索引
+            rename_mapping: 表重命名 {旧表名: 新表名}
+            dropped_tables: 删除的表（不含重命名的表）
+            old_names: 旧模型中记录了实际约束名的外键（见ERConverter.foreign_key_names），
+                删除和修改外键时使用
             
         Returns:
             操作列表
         """
         operations = []
-        
-        # 转换关系为外键
-        old_fks = self._extract_foreign_keys(old_model)
-        new_fks = self._extract_foreign_keys(new_model)
-        
-        # 检测新增的外键
-        for fk_key, fk_def in new_fks.items():
-            if fk_key not in old_fks:
-                from .models import AddForeignKey
-                operations.append(AddForeignKey(
-                    table_name=fk_def.table_name,
-                    foreign_key=fk_def.fk
+        old_names = old_names or {}
+        
+        # 重命名表不会重命名数据库中的外键约束，约束名按原表名确定
+        original_tables = {new: old for old, new in rename_mapping.items()}
+        
+        def constraint_name(table_name: str, column: str) -> str:
+            old_table = original_tables.get(table_name, table_name)
+            return old_names.get(old_table, {}).get(column) or self.converter.foreign_key_name(old_table, column)
+        
+        # 旧外键换算为重命名后的表名，被引用的表改名不算作外键变化
+        aligned: Dict[str, Dict[str, ForeignKeyDefinition]] = {}
+        for table_name, fks in old_fks.items():
+            if table_name in dropped_tables:
+                continue
+            if rename_mapping:
+                fks = {
+                    column: fk.model_copy(update={'reference_table': rename_mapping[fk.reference_table]})
+                    if fk.reference_table in rename_mapping else fk
+                    for column, fk in fks.items()
+                }
+            aligned[rename_mapping.get(table_name, table_name)] = fks
+        
+        for table_name in sorted(aligned.keys() | new_fks.keys()):
+            old = aligned.get(table_name, {})
+            new = new_fks.get(table_name, {})
+            if old == new:
+                continue
+            
+            for column in sorted(old.keys() - new.keys()):
+                operations.append(RemoveForeignKey(
+                    table_name=table_name,
+                    constraint_name=constraint_name(table_name, column)
                 ))
-        
-        # TODO: 检测删除的外键
-        # for fk_key in old_fks:
-        #     if fk_key not in new_fks:
-        #         operations.append(RemoveForeignKey(...))
+            
+            for column in sorted(new):
+                new_fk = new[column]
+                old_fk = old.get(column)
+                if old_fk is None:
+                    operations.append(AddForeignKey(table_name=table_name, foreign_key=new_fk))
+                elif (old_fk.reference_table, old_fk.reference_column) != (new_fk.reference_table, new_fk.reference_column):
+                    # 引用目标变化，需要重建约束
+                    operations.append(RemoveForeignKey(
+                        table_name=table_name,
+                        constraint_name=constraint_name(table_name, column)
+                    ))
+                    operations.append(AddForeignKey(table_name=table_name, foreign_key=new_fk))
+                elif old_fk != new_fk:
+                    operations.append(AlterForeignKey(
+                        table_name=table_name,
+                        constraint_name=constraint_name(table_name, column),
+                        new_on_delete=new_fk.on_delete if new_fk.on_delete != old_fk.on_delete else None,
+                        new_on_update=new_fk.on_update if new_fk.on_update != old_fk.on_update else None
+                    ))
         
         return operations
+
+
+def _diff_table_chunk(args: Tuple[Optional[float], List[Tuple[str, Entity, Entity]]]) -> Tuple[List[Operation], List[ColumnRename]]:
+    """
+    进程池任务：比较一批表
     
-    def _extract_foreign_keys(self, model: ERModel) -> Dict[str, Any]:
-        """
-        从模型中提取外键信息
-        
-        Args:
-            model: ER模型
-            
-        Returns:
-            外键字典，key为(table_name, column_name)
-        """
-        from dataclasses import dataclass
-        from .models import ForeignKeyDefinition
-        
-        @dataclass
-        class FKInfo:
-            table_name: str
-            fk: ForeignKeyDefinition
-        
-        fks = {}
-        
-        for rel in model.relationships:
-            # 转换关系为外键
-            fk = self.converter.convert_relationship(rel)
-            
-            # 根据关系类型确定外键所在的表
-            if rel.relation_type == "one-to-many":
-                # 外键在right_entity (many side)
-                fk_table = rel.right_entity
-            elif rel.relation_type == "many-to-one":
-                # 外键在left_entity (many side)
-                fk_table = rel.left_entity
-            elif rel.relation_type == "one-to-one":
-                # 外键在有FK列的一侧
-                if rel.right_column:
-                    fk_table = rel.right_entity
-                elif rel.left_column:
-                    fk_table = rel.left_entity
-                else:
-                    # 默认：外键在left_entity
-                    fk_table = rel.left_entity
-            else:  # many-to-many
-                # 默认：外键在left_entity
-                fk_table = rel.left_entity
-            
-            table_name = self.converter._to_snake_case(fk_table)
-            
-            # 使用(table_name, column_name)作为key
-            fk_key = (table_name, fk.column_name)
-            fks[fk_key] = FKInfo(table_name=table_name, fk=fk)
-        
-        return fks
+    Args:
+        args: (列重命名阈值, [(表名, 旧实体, 新实体)])
+        
+    Returns:
+        (操作列表, 列重命名候选)，重命名已暂时接受，由主进程决定是否保留
+    """
+    column_rename_threshold, tables = args
+    differ = ERDiffer(optimize=False, column_rename_threshold=column_rename_threshold, accept_renames=True)
+    operations = []
+    for table_name, old_entity, new_entity in tables:
+        operations.extend(differ._diff_table(table_name, old_entity, new_entity))
+    return operations, differ.last_renames
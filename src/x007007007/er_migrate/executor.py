@@ -0,0 +1,276 @@
+"""
+迁移执行器 - 对数据库执行尚未应用的迁移
+
+已应用的迁移记录在跟踪表er_migrations中（命名空间、迁移ID、应用时间、耗时）。
+每个迁移的DDL由DDLCompiler按数据库方言生成，并使用迁移之前的状态，
+因此SQLite上修改列、增删外键会按批处理方式重建表（每张表只复制一次数据）。
+
+支持事务性DDL的方言（PostgreSQL、SQLite）每个迁移的全部语句和跟踪记录在同一个
+事务中执行，失败时整体回滚；MySQL的DDL会隐式提交，迁移失败时可能只执行了一部分。
+
+数据操作（RunBackfill）按键范围分批执行，每批一个事务，不在迁移的事务中；包含数据操作的
+迁移不能同时有结构变更。每批的进度与该批一起提交，中断后再次执行apply时从断点继续，
+迁移记录为已应用后删除进度记录。
+
+压缩迁移：原迁移都未应用时执行压缩迁移；部分已应用时先执行剩余的原迁移，
+再记录压缩迁移为已应用；全部已应用时只记录压缩迁移。
+"""
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional, Set, Tuple
+import sqlalchemy as sa
+from .backfill import BackfillProgress, BackfillRunner
+from .ddl import DDLCompiler
+from .generator import MigrationGenerator
+from .history import MigrationHistory
+from .models import Migration, DATA_OPERATIONS
+from .state import SchemaState
+
+
+@dataclass
+class PlannedMigration:
+    """执行计划中的一步"""
+    migration_id: str
+    filename: str
+    record_only: bool = False    # 只记录为已应用（压缩迁移替代的原迁移都已执行）
+
+
+@dataclass
+class AppliedMigration:
+    """已执行的迁移"""
+    migration_id: str
+    statements: int              # 执行的语句数（数据操作按批数计）
+    duration: float              # 秒
+    record_only: bool = False
+
+
+class MigrationExecutor:
+    """迁移执行器"""
+
+    TRACKING_TABLE = "er_migrations"
+
+    # 支持事务性DDL的方言（MySQL的DDL会隐式提交）
+    TRANSACTIONAL_DDL = {'postgresql', 'sqlite', 'mssql'}
+
+    def __init__(self, db_url: str, migrations_dir: str, trusted: bool = False):
+        """
+        初始化迁移执行器
+
+        Args:
+            db_url: 数据库URL（SQLAlchemy格式，例如 sqlite:///app.db）
+            migrations_dir: 迁移文件根目录
+            trusted: 可信模式，已校验过的迁移文件跳过校验（见FileManager）
+        """
+        assert isinstance(db_url, str) and db_url, "db_url must be a non-empty string"
+
+        self.engine = sa.create_engine(db_url)
+        if self.engine.dialect.name == 'sqlite':
+            self._enable_sqlite_transactional_ddl(self.engine)
+        self.generator = MigrationGenerator(migrations_dir, trusted=trusted)
+        self.compiler = DDLCompiler(self.engine.dialect)
+        self.backfill = BackfillRunner(self.engine)
+        self.tracking_table = sa.Table(
+            self.TRACKING_TABLE, sa.MetaData(),
+            sa.Column('namespace', sa.String(255), primary_key=True),
+            sa.Column('migration', sa.String(255), primary_key=True),
+            sa.Column('applied_at', sa.DateTime, nullable=False),
+            sa.Column('duration_ms', sa.Integer, nullable=False),
+        )
+
+    @property
+    def transactional(self) -> bool:
+        """是否每个迁移在一个事务中执行"""
+        return self.engine.dialect.name in self.TRANSACTIONAL_DDL
+
+    def applied_migrations(self, namespace: str) -> Set[str]:
+        """
+        已应用的迁移
+
+        Args:
+            namespace: 命名空间
+
+        Returns:
+            已应用的迁移ID集合
+        """
+        self.tracking_table.create(self.engine, checkfirst=True)
+        query = sa.select(self.tracking_table.c.migration).where(self.tracking_table.c.namespace == namespace)
+        with self.engine.connect() as connection:
+            return set(connection.execute(query).scalars())
+
+    def plan(self, namespace: str, history: Optional[MigrationHistory] = None) -> List[PlannedMigration]:
+        """
+        计算待执行的迁移
+
+        Args:
+            namespace: 命名空间
+            history: 迁移历史（可选，不提供则新建）
+
+        Returns:
+            按执行顺序排列的步骤
+
+        Raises:
+            ValueError: 压缩迁移替代的原迁移只应用了一部分，且剩余的原迁移文件已删除
+        """
+        if history is None:
+            history = self.generator.load_history(namespace)
+        applied = self.applied_migrations(namespace)
+        entries = history.index_entries
+        replaced = history.replaced_filenames
+        files = {history.migration_id(filename): filename for filename in history.filenames}
+        prefix = f"{namespace}."
+
+        # 已应用的压缩迁移替代的原迁移也视为已应用
+        for filename in history.filenames:
+            if history.migration_id(filename) in applied:
+                applied.update(r[len(prefix):] for r in entries[filename].get('replaces', []) if r.startswith(prefix))
+
+        steps: List[PlannedMigration] = []
+        for filename in history.filenames:
+            migration_id = history.migration_id(filename)
+            if filename in replaced or migration_id in applied:
+                continue
+
+            originals = [r[len(prefix):] for r in entries[filename].get('replaces', []) if r.startswith(prefix)]
+            if not any(original in applied for original in originals):
+                steps.append(PlannedMigration(migration_id, filename))
+                continue
+
+            # 原迁移已部分应用：补齐剩余的原迁移，再记录压缩迁移
+            for original in originals:
+                if original in applied or entries.get(files.get(original), {}).get('replaces'):
+                    continue
+                if original not in files:
+                    raise ValueError(f"Cannot apply {migration_id}: {original} is not applied and its file is missing")
+                steps.append(PlannedMigration(original, files[original]))
+            steps.append(PlannedMigration(migration_id, filename, record_only=True))
+        return steps
+
+    def apply(self, namespace: str, history: Optional[MigrationHistory] = None,
+              progress: Optional[Callable[[AppliedMigration], None]] = None,
+              backfill_progress: Optional[Callable[[BackfillProgress], None]] = None,
+              target: Optional[str] = None) -> List[AppliedMigration]:
+        """
+        执行待执行的迁移
+
+        Args:
+            namespace: 命名空间
+            history: 迁移历史（可选，不提供则新建）
+            progress: 每执行完一个迁移时调用（可选）
+            backfill_progress: 数据操作每完成一批时调用（可选）
+            target: 目标迁移ID（可选），执行到该迁移为止，例如只执行拆分出的扩展和回填阶段；
+                目标已应用时不执行任何迁移
+
+        Returns:
+            已执行的迁移及耗时
+
+        Raises:
+            ValueError: 目标迁移不存在，或被未应用的压缩迁移替代
+        """
+        if history is None:
+            history = self.generator.load_history(namespace)
+        steps = self.plan(namespace, history)
+        if target is not None:
+            steps = self._steps_until(namespace, history, steps, target)
+        if not steps:
+            return []
+
+        state = SchemaState(self.generator.state_before(namespace, steps[0].migration_id, history=history))
+        results = []
+        for step in steps:
+            started = time.perf_counter()
+            statements: List[str] = []
+            chunks = 0
+            jobs: List[str] = []
+            if not step.record_only:
+                migration = history.load(step.filename)
+                if any(op.type in DATA_OPERATIONS for op in migration.operations):
+                    jobs, chunks = self._run_data_operations(namespace, step.migration_id, migration,
+                                                             backfill_progress)
+                else:
+                    statements = self.compiler.compile(migration, state.to_er_model())
+                state.apply_all(migration.operations)
+            self._execute(namespace, step.migration_id, statements, started)
+            self.backfill.clear(jobs)
+
+            result = AppliedMigration(step.migration_id, len(statements) + chunks, time.perf_counter() - started,
+                                      step.record_only)
+            results.append(result)
+            if progress is not None:
+                progress(result)
+        return results
+
+    def _steps_until(self, namespace: str, history: MigrationHistory, steps: List[PlannedMigration],
+                     target: str) -> List[PlannedMigration]:
+        """待执行的步骤中到目标迁移为止（包含目标）的部分"""
+        if target not in {history.migration_id(filename) for filename in history.filenames}:
+            raise ValueError(f"Migration '{target}' not found in namespace '{namespace}'")
+        for position, step in enumerate(steps):
+            if step.migration_id == target:
+                return steps[:position + 1]
+        # 不在待执行步骤中：已应用，或者被待执行的压缩迁移替代
+        replacing = [step.migration_id for step in steps
+                     if f"{namespace}.{target}" in history.index_entries[step.filename].get('replaces', [])]
+        if replacing:
+            raise ValueError(f"Cannot apply up to {target}: it is replaced by the squashed migration "
+                             f"{replacing[0]}; target {replacing[0]} instead")
+        return []
+
+    def _run_data_operations(self, namespace: str, migration_id: str, migration: Migration,
+                             progress: Optional[Callable[[BackfillProgress], None]]) -> Tuple[List[str], int]:
+        """
+        分批执行迁移中的数据操作，每批一个事务
+
+        每个操作的任务名为 {命名空间}.{迁移ID}:{操作序号}，中断后重新执行时从记录的进度继续。
+
+        Returns:
+            (任务名列表, 本次执行的批数)
+
+        Raises:
+            ValueError: 迁移中同时有结构变更（数据操作不在迁移的事务中执行，需要单独的迁移）
+        """
+        schema_operations = [op.type for op in migration.operations if op.type not in DATA_OPERATIONS]
+        if schema_operations:
+            raise ValueError(f"Migration {migration_id} mixes data operations with schema operations "
+                             f"({', '.join(schema_operations)}); move the data operations into a migration "
+                             f"of their own (see 'er-migrate split')")
+        jobs = [f"{namespace}.{migration_id}:{position}" for position in range(len(migration.operations))]
+        chunks = sum(self.backfill.run(op, job, progress) for op, job in zip(migration.operations, jobs))
+        return jobs, chunks
+
+    def _execute(self, namespace: str, migration_id: str, statements: List[str], started: float) -> None:
+        """执行一个迁移的语句并写入跟踪记录"""
+        def record(connection) -> None:
+            connection.execute(self.tracking_table.insert().values(
+                namespace=namespace,
+                migration=migration_id,
+                applied_at=datetime.now(),
+                duration_ms=round((time.perf_counter() - started) * 1000),
+            ))
+
+        if self.transactional:
+            with self.engine.begin() as connection:
+                for statement in statements:
+                    connection.exec_driver_sql(statement)
+                record(connection)
+            return
+
+        with self.engine.connect() as connection:
+            for statement in statements:
+                connection.exec_driver_sql(statement)
+            record(connection)
+            connection.commit()
+
+    @staticmethod
+    def _enable_sqlite_transactional_ddl(engine: sa.engine.Engine) -> None:
+        """
+        pysqlite默认不在DDL之前开启事务，由SQLAlchemy显式发出BEGIN，
+        使DDL和跟踪记录在同一个事务中
+        """
+        @sa.event.listens_for(engine, "connect")
+        def _disable_driver_transactions(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @sa.event.listens_for(engine, "begin")
+        def _begin(connection):
+            connection.exec_driver_sql("BEGIN")
@@ -0,0 +1,257 @@
+"""
+扩展/收缩拆分 - 把大表上不能一步完成的变更拆成多个迁移
+
+修改列类型（需要重写表的AlterColumn）拆为四个阶段：
+1. expand：添加新类型的列 {列}_new（可空）
+2. backfill：按键范围分批把旧列的值转换后写入新列（RunBackfill）
+3. switch：交换列名（{列} -> {列}_old，{列}_new -> {列}），迁移索引，按需设置NOT NULL
+4. contract：删除旧列 {列}_old
+
+删除列（RemoveColumn）拆为expand（NOT NULL的列先改为可空，应用可以停止写入）和
+contract（删除列）两个阶段。
+
+给出了回填表达式的NOT NULL新列（没有默认值的AddColumn）拆为expand（添加可空列）、
+backfill（用表达式分批计算已有行的值）和switch（设置NOT NULL）三个阶段。
+
+迁移中的其他操作留在expand阶段。应用需要在expand和switch之间同时写入新旧两列，
+回填只处理执行时已有的行。主键列、外键两侧的列和没有主键的表不拆分，保留在expand阶段。
+"""
+import copy
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from x007007007.er.models import ERModel
+from .converter import ERConverter
+from .cost import CostEstimator
+from .ddl import DDLCompiler
+from .lock import write_exclusive
+from .models import (
+    Migration,
+    Operation,
+    AddColumn,
+    RemoveColumn,
+    AlterColumn,
+    RenameColumn,
+    AddIndex,
+    RemoveIndex,
+    RunBackfill,
+    ColumnDefinition,
+)
+from .state import SchemaState, table_entity_name
+
+# 阶段名称，按执行顺序
+PHASES = ('expand', 'backfill', 'switch', 'contract')
+
+
+class ExpandContractSplitter:
+    """扩展/收缩拆分器"""
+
+    NEW_SUFFIX = "_new"
+    OLD_SUFFIX = "_old"
+
+    def __init__(self, dialect: str = 'postgresql', chunk_size: int = 1000,
+                 hot_tables: Optional[Set[str]] = None, throttle: float = 0.0,
+                 expressions: Optional[Dict[str, str]] = None):
+        """
+        初始化拆分器
+
+        Args:
+            dialect: 目标数据库方言，决定哪些类型变化需要重写表以及回填的CAST类型
+            chunk_size: 回填每批的行数
+            hot_tables: 需要拆分的表（None表示所有表）
+            throttle: 回填每批之间暂停的秒数
+            expressions: NOT NULL新列的回填表达式 {"表名.列名": SQL表达式}
+        """
+        assert isinstance(chunk_size, int) and chunk_size > 0, "chunk_size must be a positive integer"
+        assert throttle >= 0, "throttle must not be negative"
+
+        self.estimator = CostEstimator(dialect)
+        self.compiler = DDLCompiler(dialect)
+        self.converter = ERConverter()
+        self.chunk_size = chunk_size
+        self.throttle = throttle
+        self.hot_tables = hot_tables
+        self.expressions = dict(expressions or {})
+        self.skipped: List[str] = []     # 最近一次拆分中因主键、外键或表没有主键未拆分的列
+
+    def split(self, migration: Migration, state: Optional[ERModel] = None) -> List[Migration]:
+        """
+        拆分迁移
+
+        Args:
+            migration: 要拆分的迁移
+            state: 执行该迁移之前的ER状态
+
+        Returns:
+            按执行顺序的阶段迁移（名称为 {原名}_{阶段}，没有操作的阶段省略）。第一个阶段沿用
+            原迁移的依赖，后面的阶段依赖前一个阶段，保存时由调用方补上（见save_phases）
+
+        Raises:
+            ValueError: 迁移中没有需要拆分的操作
+        """
+        schema = SchemaState(copy.deepcopy(state) if state is not None else None)
+        phases = {phase: [] for phase in PHASES}
+        self.skipped = []
+
+        for op in migration.operations:
+            if self._needs_split(op, schema):
+                parts = self._split_operation(op, schema)
+                if parts is not None:
+                    for phase, operations in parts.items():
+                        phases[phase].extend(operations)
+                    schema.apply_all(parts['expand'])
+                    continue
+            phases['expand'].append(op)
+            schema.apply(op)
+
+        if len([phase for phase in PHASES if phases[phase]]) < 2:
+            raise ValueError(f"Nothing to split in migration '{migration.name}': no column type changes, "
+                             f"removals or backfilled NOT NULL columns on the selected tables")
+
+        return [
+            Migration(
+                version=migration.version,
+                name=f"{migration.name}_{phase}",
+                namespace=migration.namespace,
+                dependencies=list(migration.dependencies) if phase == PHASES[0] else [],
+                operations=phases[phase],
+                created_at=migration.created_at,
+            )
+            for phase in PHASES if phases[phase]
+        ]
+
+    def _needs_split(self, op: Operation, schema: SchemaState) -> bool:
+        """大表上需要重写表的类型变化、删除列，或给出了回填表达式的NOT NULL新列"""
+        if self.hot_tables is not None and getattr(op, 'table_name', None) not in self.hot_tables:
+            return False
+        if isinstance(op, AddColumn):
+            return (schema.has_table(op.table_name) and not op.column.nullable and op.column.default is None
+                    and f"{op.table_name}.{op.column.name}" in self.expressions)
+        if not isinstance(op, (AlterColumn, RemoveColumn)) or schema.column(op.table_name, op.column_name) is None:
+            return False
+        return isinstance(op, RemoveColumn) or self.estimator.type_change(op, schema) == 'change'
+
+    def _split_operation(self, op: Operation, schema: SchemaState) -> Optional[dict]:
+        """
+        拆分单个操作
+
+        Returns:
+            {阶段: 操作列表}，列是主键、有外键或表没有主键时返回None（不拆分）
+        """
+        model = schema.to_er_model()
+        entity = model.entities[table_entity_name(op.table_name)]
+        key = next((col.name for col in entity.columns if col.is_pk), None)
+        phases = {phase: [] for phase in PHASES}
+
+        if isinstance(op, AddColumn):
+            name = f"{op.table_name}.{op.column.name}"
+            if key is None:
+                self.skipped.append(name)
+                return None
+            phases['expand'].append(op.model_copy(update={'column': op.column.model_copy(update={'nullable': True})}))
+            phases['backfill'].append(self._backfill(op.table_name, op.column.name, self.expressions[name], key))
+            phases['switch'].append(AlterColumn(table_name=op.table_name, column_name=op.column.name,
+                                                new_nullable=False))
+            return phases
+
+        column = schema.column(op.table_name, op.column_name)
+        linked = any(
+            (rel.left_entity == entity.name and rel.left_column == column.name)
+            or (rel.right_entity == entity.name and rel.right_column == column.name)
+            for rel in model.relationships
+        )
+        if column.is_pk or linked:
+            self.skipped.append(f"{op.table_name}.{op.column_name}")
+            return None
+
+        if isinstance(op, RemoveColumn):
+            if not column.nullable:
+                phases['expand'].append(AlterColumn(table_name=op.table_name, column_name=column.name,
+                                                    new_nullable=True))
+            phases['contract'].append(op)
+            return phases
+
+        table_name, name = op.table_name, column.name
+        new_name, old_name = name + self.NEW_SUFFIX, name + self.OLD_SUFFIX
+        current = self.converter.convert_column(column)
+        target = current.model_copy(update={
+            field: value for field, value in (
+                ('type', op.new_type), ('max_length', op.new_max_length), ('precision', op.new_precision),
+                ('scale', op.new_scale), ('default', op.new_default),
+            ) if value is not None
+        })
+        nullable = target.nullable if op.new_nullable is None else op.new_nullable
+        indexes = [idx for idx in self.converter.extract_indexes(entity) if name in idx.columns]
+        if key is None:
+            self.skipped.append(f"{table_name}.{name}")
+            return None
+
+        phases['expand'].append(AddColumn(table_name=table_name, column=target.model_copy(update={
+            'name': new_name, 'nullable': True, 'unique': False, 'primary_key': False,
+        })))
+        phases['backfill'].append(self._backfill(table_name, new_name, self._cast(name, target), key))
+        switch = phases['switch']
+        switch.extend(RemoveIndex(table_name=table_name, index_name=idx.name) for idx in indexes)
+        if not current.nullable:
+            switch.append(AlterColumn(table_name=table_name, column_name=name, new_nullable=True))
+        switch.append(RenameColumn(table_name=table_name, old_name=name, new_name=old_name))
+        switch.append(RenameColumn(table_name=table_name, old_name=new_name, new_name=name))
+        if not nullable:
+            switch.append(AlterColumn(table_name=table_name, column_name=name, new_nullable=False))
+        switch.extend(AddIndex(table_name=table_name, index=idx) for idx in indexes)
+        phases['contract'].append(RemoveColumn(table_name=table_name, column_name=old_name))
+        return phases
+
+    def _backfill(self, table_name: str, column_name: str, expression: str, key: str) -> RunBackfill:
+        return RunBackfill(table_name=table_name, column_name=column_name, expression=expression,
+                           key_column=key, chunk_size=self.chunk_size, throttle=self.throttle)
+
+    def _cast(self, column_name: str, target: ColumnDefinition) -> str:
+        """把旧列转换为新类型的SQL表达式"""
+        dialect = self.compiler.dialect
+        type_spec = dialect.type_compiler_instance.process(self.compiler.column_type(target))
+        return f"CAST({dialect.identifier_preparer.quote(column_name)} AS {type_spec})"
+
+
+def save_phases(file_manager, filename: str, phases: List[Migration]) -> List[str]:
+    """
+    用拆分出的阶段迁移替换原迁移文件
+
+    在命名空间的文件锁内删除原文件，再依次保存各阶段，每个阶段依赖前一个阶段。
+    原迁移必须是命名空间中最新的迁移（还没有其他迁移依赖它）。
+
+    Args:
+        file_manager: FileManager
+        filename: 原迁移文件名
+        phases: split()返回的阶段迁移
+
+    Returns:
+        保存的文件名列表
+
+    Raises:
+        ValueError: 原迁移不是最新的迁移
+    """
+    assert phases, "phases must not be empty"
+
+    namespace = phases[0].namespace
+    with file_manager.lock(namespace):
+        filenames = file_manager.get_index(namespace).filenames()
+        if not filenames or filenames[-1] != filename:
+            raise ValueError(f"Only the latest migration can be split; {filename} is not the latest "
+                             f"in namespace '{namespace}'")
+        path = file_manager.get_namespace_dir(namespace) / filename
+        original = path.read_bytes()
+        path.unlink()
+
+        saved = []
+        try:
+            for phase in phases:
+                if saved:
+                    phase.dependencies = [f"{namespace}.{Path(saved[-1]).stem}"]
+                saved.append(file_manager.save_migration(phase).name)
+        except Exception:
+            # 恢复原迁移，删除已保存的阶段
+            for name in saved:
+                (path.parent / name).unlink()
+            write_exclusive(path, original)
+            raise
+    return saved
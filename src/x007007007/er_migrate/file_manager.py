@@ -1,51 +1,263 @@
 """
 Migration file manager - handles reading and writing migration files
 """
+import hashlib
+import json
 import re
+from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 import yaml
-from .models import Migration
+from . import __version__
+from .index import MigrationIndex, parse_migration_number
+from .lock import FileLock, write_atomic, write_exclusive
+from .models import Migration, construct_migration
+
+# 优先使用libyaml的C实现，不可用时回退到纯Python实现
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+
+# JSON格式优先使用orjson，不可用时回退到标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 支持的迁移文件格式及其扩展名
+MIGRATION_FORMATS = {
+    'yaml': '.yaml',
+    'json': '.json',
+}
+
+
+def _json_default(value):
+    """标准库json的datetime序列化，与orjson输出一致"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_migration_data(data: dict, fmt: str) -> bytes:
+    """
+    将迁移字典编码为文件内容
+    
+    Args:
+        data: 迁移字典
+        fmt: 文件格式（yaml或json）
+        
+    Returns:
+        文件内容
+    """
+    assert fmt in MIGRATION_FORMATS, f"Unknown migration format: {fmt}"
+    
+    if fmt == 'json':
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_json_default).encode('utf-8')
+    
+    content = yaml.dump(data, Dumper=YamlDumper, default_flow_style=False, allow_unicode=True, sort_keys=False)
+    return content.encode('utf-8')
+
+
+def load_migration_data(content: bytes) -> dict:
+    """
+    将文件内容解码为迁移字典
+    
+    JSON文件以 { 开头，优先按JSON解析；其他内容（或不是合法JSON时）按YAML解析，
+    因此不需要知道文件名也能正确解码两种格式。
+    
+    Args:
+        content: 文件内容
+        
+    Returns:
+        迁移字典
+    """
+    if content[:1] == b'{':
+        try:
+            if orjson is not None:
+                return orjson.loads(content)
+            return json.loads(content)
+        except ValueError:
+            pass
+    return yaml.load(content, Loader=YamlLoader)
+
+
+def migration_format(filename: str) -> str:
+    """根据扩展名判断迁移文件格式"""
+    return 'json' if filename.endswith(MIGRATION_FORMATS['json']) else 'yaml'
 
 
 class FileManager:
     """迁移文件管理器"""
     
-    def __init__(self, migrations_dir: str):
+    # 已校验文件清单，记录完整校验通过的迁移文件内容哈希
+    VALIDATED_MANIFEST = ".validated.json"
+    
+    # 命名空间的文件格式配置，内容为格式名，不存在时使用YAML
+    FORMAT_FILE = ".format"
+    DEFAULT_FORMAT = 'yaml'
+    
+    # 命名空间的锁文件，保护序号分配和迁移文件写入
+    LOCK_FILE = ".lock"
+    
+    def __init__(self, migrations_dir: str, trusted: bool = False, read_only: bool = False):
         """
         初始化文件管理器
         
         Args:
             migrations_dir: 迁移文件根目录
+            trusted: 可信模式。开启后，内容哈希已记录在已校验清单中的迁移文件
+                跳过Pydantic校验直接构造；其他文件照常校验并加入清单
+            read_only: 只读模式（用于预览），不写回目录索引和已校验清单
         """
         self.migrations_dir = Path(migrations_dir)
+        self.trusted = trusted
+        self.read_only = read_only
+        self._indexes: Dict[str, MigrationIndex] = {}
+        self._validated: Dict[str, Set[str]] = {}
+        self._dirty_manifests: Set[str] = set()
+        self._locks: Dict[str, FileLock] = {}
     
     def get_namespace_dir(self, namespace: str) -> Path:
         """获取命名空间目录"""
         return self.migrations_dir / namespace
     
-    def list_migration_files(self, namespace: str) -> List[str]:
+    def list_namespaces(self) -> List[str]:
+        """列出迁移目录下的所有命名空间（排序，忽略以.开头的目录）"""
+        if not self.migrations_dir.exists():
+            return []
+        return sorted(d.name for d in self.migrations_dir.iterdir() if d.is_dir() and not d.name.startswith('.'))
+    
+    def get_index(self, namespace: str) -> MigrationIndex:
+        """获取命名空间的目录索引"""
+        if namespace not in self._indexes:
+            self._indexes[namespace] = MigrationIndex(
+                self.get_namespace_dir(namespace),
+                load_migration_data,
+                read_only=self.read_only
+            )
+        return self._indexes[namespace]
+    
+    def get_index_entries(self, namespace: str) -> Dict[str, dict]:
         """
-        列出命名空间下的所有迁移文件
+        获取命名空间下所有迁移文件的索引项（扫描一次目录）
         
         Args:
             namespace: 命名空间名称
             
         Returns:
-            排序后的迁移文件名列表
+            {文件名: 索引项}，索引项包含number、sha256、mtime_ns、size、name、dependencies
+        """
+        return self.get_index(namespace).refresh()
+    
+    def get_format(self, namespace: str) -> str:
+        """
+        获取命名空间新迁移文件使用的格式
+        
+        Args:
+            namespace: 命名空间名称
+            
+        Returns:
+            格式名（yaml或json）
+            
+        Raises:
+            ValueError: 格式配置文件中的格式不受支持
+        """
+        format_path = self.get_namespace_dir(namespace) / self.FORMAT_FILE
+        if not format_path.exists():
+            return self.DEFAULT_FORMAT
+        
+        fmt = format_path.read_text(encoding='utf-8').strip()
+        if fmt not in MIGRATION_FORMATS:
+            raise ValueError(f"Unknown migration format '{fmt}' in {format_path}")
+        return fmt
+    
+    def set_format(self, namespace: str, fmt: str) -> None:
+        """
+        设置命名空间新迁移文件使用的格式（不转换已有文件，见convert_format）
+        
+        Args:
+            namespace: 命名空间名称
+            fmt: 格式名（yaml或json）
         """
+        assert fmt in MIGRATION_FORMATS, f"Unknown migration format: {fmt}"
+        
         namespace_dir = self.get_namespace_dir(namespace)
-        if not namespace_dir.exists():
-            return []
+        namespace_dir.mkdir(parents=True, exist_ok=True)
+        (namespace_dir / self.FORMAT_FILE).write_text(f"{fmt}\n", encoding='utf-8')
+    
+    def convert_format(self, namespace: str, fmt: str) -> List[Tuple[str, str]]:
+        """
+        将命名空间下的迁移文件转换为指定格式，并设置为该命名空间的格式
+        
+        转换基于文件中的原始字典，不经过Migration的默认值填充；
+        写入前会确认新旧内容解析出的Migration完全一致，保证转换无损。
         
-        # 查找所有.yaml和.yml文件
-        files = []
-        for ext in ['.yaml', '.yml']:
-            files.extend(namespace_dir.glob(f'*{ext}'))
+        Args:
+            namespace: 命名空间名称
+            fmt: 目标格式（yaml或json）
+            
+        Returns:
+            [(原文件名, 新文件名)]，已经是目标格式的文件不在其中
+            
+        Raises:
+            FileExistsError: 目标文件已存在
+            ValueError: 转换结果与原文件不一致
+        """
+        assert fmt in MIGRATION_FORMATS, f"Unknown migration format: {fmt}"
+        
+        namespace_dir = self.get_namespace_dir(namespace)
+        index = self.get_index(namespace)
+        converted = []
+        
+        with self.lock(namespace):
+            for filename in index.filenames():
+                if migration_format(filename) == fmt:
+                    continue
+            
+                target = Path(filename).stem + MIGRATION_FORMATS[fmt]
+                source_path = namespace_dir / filename
+                target_path = namespace_dir / target
+                if target_path.exists():
+                    raise FileExistsError(f"Cannot convert {filename}: {target} already exists")
+            
+                data = load_migration_data(source_path.read_bytes())
+                content = dump_migration_data(data, fmt)
+                if self._to_migration(namespace, load_migration_data(content)) != self._to_migration(namespace, data):
+                    raise ValueError(f"Converting {filename} to {fmt} is not lossless")
+            
+                write_exclusive(target_path, content)
+                source_path.unlink()
+                index.record(target, content, data)
+            
+                if self.trusted:
+                    self._get_validated(namespace).add(hashlib.sha256(content).hexdigest())
+                    self._dirty_manifests.add(namespace)
+                converted.append((filename, target))
+        
+        self.set_format(namespace, fmt)
+        self.save_validated_manifest(namespace)
+        return converted
+    
+    @staticmethod
+    def _to_migration(namespace: str, data: dict) -> Migration:
+        """完整校验迁移字典（缺少namespace时补齐）"""
+        return Migration(**{'namespace': namespace, **data})
+    
+    def list_migration_files(self, namespace: str) -> List[str]:
+        """
+        列出命名空间下的所有迁移文件
         
-        # 按文件名排序
-        files.sort(key=lambda f: f.name)
-        return [f.name for f in files]
+        Args:
+            namespace: 命名空间名称
+            
+        Returns:
+            排序后的迁移文件名列表
+        """
+        return self.get_index(namespace).filenames()
     
     def load_migration(self, namespace: str, filename: str) -> Migration:
         """
@@ -67,14 +279,78 @@ class FileManager:
         if not file_path.exists():
             raise FileNotFoundError(f"Migration file not found: {file_path}")
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
+        return self.parse_migration(namespace, file_path.read_bytes())
+    
+    def parse_migration(self, namespace: str, content: bytes, content_hash: Optional[str] = None) -> Migration:
+        """
+        解析迁移文件内容
+        
+        Args:
+            namespace: 命名空间名称
+            content: 迁移文件的原始内容
+            content_hash: 内容的sha256（可选，可信模式下未提供时自动计算）
+            
+        Returns:
+            Migration对象
+            
+        Raises:
+            ValidationError: 文件格式错误
+        """
+        data = load_migration_data(content)
         
         # 确保namespace字段正确
         if 'namespace' not in data:
             data['namespace'] = namespace
         
-        return Migration(**data)
+        if not self.trusted:
+            return Migration(**data)
+        
+        if content_hash is None:
+            content_hash = hashlib.sha256(content).hexdigest()
+        validated = self._get_validated(namespace)
+        if content_hash in validated:
+            return construct_migration(data)
+        
+        migration = Migration(**data)
+        validated.add(content_hash)
+        self._dirty_manifests.add(namespace)
+        return migration
+    
+    def _get_validated(self, namespace: str) -> Set[str]:
+        """读取命名空间的已校验清单（缓存）"""
+        if namespace not in self._validated:
+            hashes: Set[str] = set()
+            manifest_path = self.get_namespace_dir(namespace) / self.VALIDATED_MANIFEST
+            if manifest_path.exists():
+                # 清单只是缓存，损坏或由其他版本写入时重新校验所有文件
+                try:
+                    with open(manifest_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    data = {}
+                if data.get('version') == __version__:
+                    hashes = set(data.get('hashes', []))
+            self._validated[namespace] = hashes
+        return self._validated[namespace]
+    
+    def save_validated_manifest(self, namespace: str) -> None:
+        """
+        写回命名空间的已校验清单（仅在有新校验的文件时写入）
+        
+        Args:
+            namespace: 命名空间名称
+        """
+        if self.read_only or namespace not in self._dirty_manifests:
+            return
+        
+        namespace_dir = self.get_namespace_dir(namespace)
+        namespace_dir.mkdir(parents=True, exist_ok=True)
+        data = {
+            'version': __version__,
+            'hashes': sorted(self._validated[namespace]),
+        }
+        write_atomic(namespace_dir / self.VALIDATED_MANIFEST, json.dumps(data).encode('utf-8'))
+        self._dirty_manifests.discard(namespace)
     
     def load_namespace_migrations(self, namespace: str) -> List[Migration]:
         """
@@ -93,34 +369,85 @@ class FileManager:
             migration = self.load_migration(namespace, filename)
             migrations.append(migration)
         
+        self.save_validated_manifest(namespace)
         return migrations
     
-    def save_migration(self, migration: Migration) -> Path:
+    def save_migration(self, migration: Migration, check_latest: bool = False) -> Path:
         """
         保存迁移文件
         
+        序号分配和写入在命名空间的文件锁内进行，文件以独占方式创建：并发保存的迁移
+        得到不同的序号，不会互相覆盖。
+        
         Args:
             migration: Migration对象
+            check_latest: 确认迁移依赖命名空间当前最新的迁移。生成迁移之后如果有其他
+                进程保存了新迁移，该迁移基于过期的状态，保存会产生两个叶子迁移
             
         Returns:
             保存的文件路径
+            
+        Raises:
+            ValueError: check_latest为True且迁移不依赖当前最新的迁移
+            FileExistsError: 同名的压缩迁移文件已存在
         """
         namespace_dir = self.get_namespace_dir(migration.namespace)
         namespace_dir.mkdir(parents=True, exist_ok=True)
         
-        # 生成文件名
-        filename = self._generate_filename(migration)
-        file_path = namespace_dir / filename
-        
         # 序列化为字典，保证字段顺序
+        fmt = self.get_format(migration.namespace)
         data = self._serialize_migration(migration)
-        
-        # 写入文件
-        with open(file_path, 'w', encoding='utf-8') as f:
-            yaml.dump(data, f, default_flow_style=False, allow_unicode=True, sort_keys=False)
+        content = dump_migration_data(data, fmt)
+        index = self.get_index(migration.namespace)
+        
+        with self.lock(migration.namespace):
+            if check_latest and not migration.replaces:
+                filenames = index.filenames()
+                latest = Path(filenames[-1]).stem if filenames else None
+                if latest is not None and f"{migration.namespace}.{latest}" not in migration.dependencies:
+                    raise ValueError(
+                        f"Namespace '{migration.namespace}' changed while generating migration "
+                        f"'{migration.name}': the latest migration is now {latest}; generate it again"
+                    )
+            
+            # 生成文件名并独占写入；文件名被不遵守锁的写入方占用时使用下一个序号
+            while True:
+                filename = self._generate_filename(migration, fmt)
+                file_path = namespace_dir / filename
+                try:
+                    write_exclusive(file_path, content)
+                    break
+                except FileExistsError:
+                    if migration.replaces:
+                        raise
+            index.record(filename, content, data)
+        
+        # 由已校验的Migration对象生成的文件可以直接记入清单
+        if self.trusted:
+            self._get_validated(migration.namespace).add(hashlib.sha256(content).hexdigest())
+            self._dirty_manifests.add(migration.namespace)
+            self.save_validated_manifest(migration.namespace)
         
         return file_path
     
+    def lock(self, namespace: str) -> FileLock:
+        """
+        获取命名空间的文件锁（同一FileManager内可重入）
+        
+        持有锁期间其他进程无法在该命名空间分配序号和保存迁移。
+        
+        Args:
+            namespace: 命名空间名称
+            
+        Returns:
+            FileLock，用作上下文管理器
+        """
+        if namespace not in self._locks:
+            namespace_dir = self.get_namespace_dir(namespace)
+            namespace_dir.mkdir(parents=True, exist_ok=True)
+            self._locks[namespace] = FileLock(namespace_dir / self.LOCK_FILE)
+        return self._locks[namespace]
+    
     def _serialize_migration(self, migration: Migration) -> dict:
         """
         序列化Migration对象为有序字典
@@ -137,6 +464,8 @@ class FileManager:
         data['name'] = migration.name
         data['namespace'] = migration.namespace
         data['dependencies'] = migration.dependencies
+        if migration.replaces:
+            data['replaces'] = migration.replaces
         
         # 序列化operations
         operations = []
@@ -193,6 +522,10 @@ class FileManager:
                 op_dict['new_precision'] = operation.new_precision
             if operation.new_scale is not None:
                 op_dict['new_scale'] = operation.new_scale
+        elif operation.type == 'RenameColumn':
+            op_dict['table_name'] = operation.table_name
+            op_dict['old_name'] = operation.old_name
+            op_dict['new_name'] = operation.new_name
         elif operation.type == 'AddIndex':
             op_dict['table_name'] = operation.table_name
             op_dict['index'] = self._serialize_index(operation.index)
@@ -205,6 +538,21 @@ class FileManager:
         elif operation.type == 'RemoveForeignKey':
             op_dict['table_name'] = operation.table_name
             op_dict['constraint_name'] = operation.constraint_name
+        elif operation.type == 'AlterForeignKey':
+            op_dict['table_name'] = operation.table_name
+            op_dict['constraint_name'] = operation.constraint_name
+            if operation.new_on_delete is not None:
+                op_dict['new_on_delete'] = operation.new_on_delete
+            if operation.new_on_update is not None:
+                op_dict['new_on_update'] = operation.new_on_update
+        elif operation.type == 'RunBackfill':
+            op_dict['table_name'] = operation.table_name
+            op_dict['column_name'] = operation.column_name
+            op_dict['expression'] = operation.expression
+            op_dict['key_column'] = operation.key_column
+            op_dict['chunk_size'] = operation.chunk_size
+            if operation.throttle:
+                op_dict['throttle'] = operation.throttle
         
         return op_dict
     
@@ -250,37 +598,38 @@ class FileManager:
         
         return fk_dict
     
-    def _generate_filename(self, migration: Migration) -> str:
+    def _generate_filename(self, migration: Migration, fmt: str = DEFAULT_FORMAT) -> str:
         """
         生成迁移文件名
         
-        格式: NNNN_name.yaml
-        其中NNNN是4位数字序号
+        格式: NNNN_name.yaml（JSON格式为 NNNN_name.json）
+        其中NNNN是4位数字序号。
+        压缩迁移的格式为 NNNN_squashed_MMMM_name.yaml，NNNN和MMMM分别是
+        被替代的第一个和最后一个迁移的序号。
         
         Args:
             migration: Migration对象
+            fmt: 文件格式
             
         Returns:
             文件名
         """
-        # 获取当前命名空间下的最大序号
-        existing_files = self.list_migration_files(migration.namespace)
-        max_number = 0
+        # 清理名称（移除特殊字符）
+        clean_name = re.sub(r'[^\w\s-]', '', migration.name)
+        clean_name = re.sub(r'[-\s]+', '_', clean_name).lower()
         
-        for filename in existing_files:
-            match = re.match(r'^(\d{4})_', filename)
-            if match:
-                number = int(match.group(1))
-                max_number = max(max_number, number)
+        if migration.replaces:
+            numbers = [parse_migration_number(replaced.split('.', 1)[-1]) for replaced in migration.replaces]
+            assert None not in numbers, "Replaced migration IDs must start with a 4-digit number"
+            return f"{min(numbers):04d}_squashed_{max(numbers):04d}_{clean_name}{MIGRATION_FORMATS[fmt]}"
+        
+        # 获取当前命名空间下的最大序号（只读取索引）
+        max_number = self.get_index(migration.namespace).max_number()
         
         # 生成新序号
         new_number = max_number + 1
         
-        # 清理名称（移除特殊字符）
-        clean_name = re.sub(r'[^\w\s-]', '', migration.name)
-        clean_name = re.sub(r'[-\s]+', '_', clean_name).lower()
-        
-        return f"{new_number:04d}_{clean_name}.yaml"
+        return f"{new_number:04d}_{clean_name}{MIGRATION_FORMATS[fmt]}"
     
     def get_next_migration_number(self, namespace: str) -> int:
         """
@@ -292,13 +641,6 @@ class FileManager:
         Returns:
             下一个序号
         """
-        existing_files = self.list_migration_files(namespace)
-        max_number = 0
-        
-        for filename in existing_files:
-            match = re.match(r'^(\d{4})_', filename)
-            if match:
-                number = int(match.group(1))
-                max_number = max(max_number, number)
+        max_number = self.get_index(namespace).max_number()
         
         return max_number + 1
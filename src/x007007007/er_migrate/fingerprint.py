@@ -0,0 +1,48 @@
+"""
+实体指纹 - 实体结构的签名与哈希，用于跳过未变化的表
+
+签名覆盖差异检测关心的全部结构：每一列的所有属性（按顺序）以及多列索引的
+列和唯一性（不含索引名，与ERDiffer的比较规则一致）。实体名不参与计算，
+因此重命名后结构不变的表签名相同。
+
+同一进程内比较两个实体时直接比较签名元组即可（逐元素比较由C实现，比计算哈希快）；
+需要保存或跨进程比较时使用entity_fingerprint。
+"""
+import hashlib
+from dataclasses import fields
+from operator import attrgetter
+from typing import Tuple
+from x007007007.er.models import Column, Entity
+
+
+# 一次取出Column的全部字段（按定义顺序），索引名不参与比较
+_column_values = attrgetter(*(f.name for f in fields(Column) if f.name != 'index_name'))
+
+
+def entity_signature(entity: Entity) -> Tuple:
+    """
+    计算实体的结构签名
+
+    Args:
+        entity: 实体
+
+    Returns:
+        可比较、可哈希的元组，结构相同的实体签名相等
+    """
+    columns = tuple(map(_column_values, entity.columns))
+    if not entity.indexes:
+        return columns, ()
+    return columns, tuple(sorted((tuple(idx.columns), idx.unique) for idx in entity.indexes))
+
+
+def entity_fingerprint(entity: Entity) -> str:
+    """
+    计算实体的结构指纹（签名的稳定哈希）
+
+    Args:
+        entity: 实体
+
+    Returns:
+        十六进制指纹，结构相同的实体指纹相同
+    """
+    return hashlib.blake2b(repr(entity_signature(entity)).encode('utf-8'), digest_size=16).hexdigest()
@@ -7,25 +7,45 @@ from x007007007.er.models import ERModel
 from .converter import ERConverter
 from .differ import ERDiffer
 from .file_manager import FileManager
-from .models import Migration, Operation, CreateTable, AddColumn, AddForeignKey, RemoveColumn, DropTable, AlterColumn, RenameTable
+from .history import MigrationHistory
+from .index import parse_migration_number, parse_squashed_number
+from .snapshot import SnapshotManager, serialize_state
+from .state import SchemaState
+from .models import (
+    Migration, Operation, CreateTable, AddColumn, AddForeignKey, RenameColumn, RemoveForeignKey, AlterForeignKey,
+    DATA_OPERATIONS,
+)
 
 
 class MigrationGenerator:
     """迁移生成器"""
     
-    def __init__(self, migrations_dir: str):
+    # 默认每50个迁移写入一个状态快照
+    DEFAULT_SNAPSHOT_INTERVAL = 50
+    
+    def __init__(self, migrations_dir: str, snapshot_interval: int = DEFAULT_SNAPSHOT_INTERVAL,
+                 trusted: bool = False, differ: Optional[ERDiffer] = None, read_only: bool = False):
         """
         初始化迁移生成器
         
         Args:
             migrations_dir: 迁移文件根目录
+            snapshot_interval: 状态快照间隔（迁移数量），0表示不写入快照
+            trusted: 可信模式，已校验过的迁移文件跳过校验（见FileManager）
+            differ: 差异检测器（可选，用于配置重命名检测等，默认使用ERDiffer()）
+            read_only: 只读模式（用于预览），重建状态时不写入快照、目录索引和已校验清单
         """
+        assert isinstance(snapshot_interval, int) and snapshot_interval >= 0, "snapshot_interval must be a non-negative integer"
+        
         self.migrations_dir = migrations_dir
-        self.file_manager = FileManager(migrations_dir)
+        self.file_manager = FileManager(migrations_dir, trusted=trusted, read_only=read_only)
+        self.snapshots = SnapshotManager(self.file_manager)
+        self.snapshot_interval = 0 if read_only else snapshot_interval
         self.converter = ERConverter()
-        self.differ = ERDiffer()
+        self.differ = differ or ERDiffer()
     
-    def generate(self, namespace: str, current_er: ERModel, name: Optional[str] = None) -> Optional[Migration]:
+    def generate(self, namespace: str, current_er: ERModel, name: Optional[str] = None,
+                 history: Optional[MigrationHistory] = None) -> Optional[Migration]:
         """
         生成迁移
         
@@ -33,12 +53,16 @@ class MigrationGenerator:
             namespace: 命名空间
             current_er: 当前的ER模型
             name: 迁移名称（可选，如果不提供则自动生成）
+            history: 本次调用共享的迁移历史（可选，不提供则新建）
             
         Returns:
             Migration对象，如果没有变更则返回None
         """
+        if history is None:
+            history = self.load_history(namespace)
+        
         # 1. 重建当前状态（从已有的迁移）
-        previous_state = self._rebuild_state(namespace)
+        previous_state = self._rebuild_state(namespace, history)
         
         # 2. 计算差异
         operations = self.differ.diff(previous_state, current_er)
@@ -52,7 +76,7 @@ class MigrationGenerator:
             name = self._generate_migration_name(operations, previous_state)
         
         # 5. 计算依赖
-        dependencies = self._calculate_dependencies(namespace)
+        dependencies = self._calculate_dependencies(namespace, history)
         
         # 6. 创建迁移对象
         migration = Migration(
@@ -66,154 +90,195 @@ class MigrationGenerator:
         
         return migration
     
-    def _rebuild_state(self, namespace: str) -> ERModel:
+    def load_history(self, namespace: str) -> MigrationHistory:
+        """
+        创建命名空间的迁移历史，供一次调用内的各个步骤共享
+        
+        Args:
+            namespace: 命名空间
+            
+        Returns:
+            MigrationHistory对象
+        """
+        return MigrationHistory(self.file_manager, namespace)
+    
+    def _rebuild_state(self, namespace: str, history: Optional[MigrationHistory] = None) -> ERModel:
         """
         从迁移历史重建ER状态
         
+        优先加载与当前迁移链匹配的最新快照，只重放快照之后的迁移；
+        重放过程中每跨过snapshot_interval个迁移写入一个新快照。
+        
         Args:
             namespace: 命名空间
+            history: 迁移历史（可选，不提供则新建）
             
         Returns:
             重建的ERModel
         """
-        # 加载所有迁移
-        migrations = self.file_manager.load_namespace_migrations(namespace)
+        if history is None:
+            history = self.load_history(namespace)
+        filenames = history.filenames
         
         # 如果没有迁移，返回空模型
-        if not migrations:
+        if not filenames:
             return ERModel()
         
-        # TODO: 实现完整的状态重建逻辑
-        # 现在简单实现：从最后一个迁移推断状态
-        # 这是一个简化版本，完整版本需要state_builder.py
-        
-        from x007007007.er.models import Entity, Column, Relationship
-        
-        rebuilt_model = ERModel()
-        
-        # 遍历所有迁移的操作
-        for migration in migrations:
-            for op in migration.operations:
-                if isinstance(op, CreateTable):
-                    # 创建实体
-                    columns = []
-                    for col_def in op.columns:
-                        col = Column(
-                            name=col_def.name,
-                            type=col_def.type,
-                            is_pk=col_def.primary_key,
-                            nullable=col_def.nullable,
-                            default=col_def.default,
-                            max_length=col_def.max_length,
-                            precision=col_def.precision,
-                            scale=col_def.scale,
-                            unique=col_def.unique,
-                            comment=col_def.comment
-                        )
-                        columns.append(col)
-                    
-                    # 转换表名为实体名（snake_case -> PascalCase）
-                    entity_name = self._to_pascal_case(op.table_name)
-                    entity = Entity(name=entity_name, columns=columns)
-                    
-                    # 避免重复添加
-                    if entity_name not in rebuilt_model.entities:
-                        rebuilt_model.add_entity(entity)
-                
-                elif isinstance(op, AddColumn):
-                    # 添加列到现有实体
-                    entity_name = self._to_pascal_case(op.table_name)
-                    if entity_name in rebuilt_model.entities:
-                        entity = rebuilt_model.entities[entity_name]
-                        col = Column(
-                            name=op.column.name,
-                            type=op.column.type,
-                            is_pk=op.column.primary_key,
-                            nullable=op.column.nullable,
-                            default=op.column.default,
-                            max_length=op.column.max_length,
-                            unique=op.column.unique
-                        )
-                        entity.columns.append(col)
-                
-                elif isinstance(op, RemoveColumn):
-                    # 从实体中删除列
-                    entity_name = self._to_pascal_case(op.table_name)
-                    if entity_name in rebuilt_model.entities:
-                        entity = rebuilt_model.entities[entity_name]
-                        # 过滤掉要删除的列
-                        entity.columns = [col for col in entity.columns if col.name != op.column_name]
-                
-                elif isinstance(op, DropTable):
-                    # 删除实体
-                    entity_name = self._to_pascal_case(op.table_name)
-                    if entity_name in rebuilt_model.entities:
-                        del rebuilt_model.entities[entity_name]
-                
-                elif isinstance(op, RenameTable):
-                    # 重命名实体
-                    old_entity_name = self._to_pascal_case(op.old_name)
-                    new_entity_name = self._to_pascal_case(op.new_name)
-                    if old_entity_name in rebuilt_model.entities:
-                        entity = rebuilt_model.entities[old_entity_name]
-                        # 更新实体名称
-                        entity.name = new_entity_name
-                        # 在字典中重命名
-                        rebuilt_model.entities[new_entity_name] = entity
-                        del rebuilt_model.entities[old_entity_name]
-                
-                elif isinstance(op, AlterColumn):
-                    # 修改列属性
-                    entity_name = self._to_pascal_case(op.table_name)
-                    if entity_name in rebuilt_model.entities:
-                        entity = rebuilt_model.entities[entity_name]
-                        # 找到要修改的列
-                        for col in entity.columns:
-                            if col.name == op.column_name:
-                                # 应用修改（只更新非None的字段）
-                                if op.new_type is not None:
-                                    col.type = op.new_type
-                                if op.new_max_length is not None:
-                                    col.max_length = op.new_max_length
-                                if op.new_nullable is not None:
-                                    col.nullable = op.new_nullable
-                                if op.new_default is not None:
-                                    col.default = op.new_default
-                                if op.new_precision is not None:
-                                    col.precision = op.new_precision
-                                if op.new_scale is not None:
-                                    col.scale = op.new_scale
-                                break
-                
-                elif isinstance(op, AddForeignKey):
-                    # 重建关系信息
-                    # 从外键定义推断关系
-                    left_entity = self._to_pascal_case(op.table_name)
-                    right_entity = self._to_pascal_case(op.foreign_key.reference_table)
-                    
-                    # 创建关系对象
-                    rel = Relationship(
-                        left_entity=left_entity,
-                        right_entity=right_entity,
-                        relation_type="many-to-one",  # 外键通常表示多对一关系
-                        left_column=op.foreign_key.column_name,
-                        right_column=op.foreign_key.reference_column
-                    )
-                    
-                    # 添加关系（避免重复）
-                    # 检查是否已存在相同的关系
-                    rel_exists = any(
-                        r.left_entity == rel.left_entity and
-                        r.right_entity == rel.right_entity and
-                        r.left_column == rel.left_column and
-                        r.right_column == rel.right_column
-                        for r in rebuilt_model.relationships
-                    )
-                    
-                    if not rel_exists:
-                        rebuilt_model.add_relationship(rel)
-        
-        return rebuilt_model
+        chain_hashes = history.chain_hashes()
+        snapshot = self.snapshots.load_latest(namespace, chain_hashes)
+        if snapshot is not None:
+            replayed, state = snapshot[0], SchemaState(snapshot[1])
+        else:
+            replayed, state = 0, SchemaState()
+        
+        # 重放快照之后的迁移，跳过已被压缩迁移替代的原迁移
+        replaced = history.replaced_filenames
+        for index in range(replayed, len(filenames)):
+            if filenames[index] not in replaced:
+                state.apply_all(history.load(filenames[index]).operations)
+            
+            count = index + 1
+            if self.snapshot_interval and count % self.snapshot_interval == 0:
+                self.snapshots.save(namespace, count, chain_hashes[index], serialize_state(state.to_er_model()))
+        
+        self.file_manager.save_validated_manifest(namespace)
+        return state.to_er_model()
+    
+    def state_before(self, namespace: str, migration_id: str,
+                     history: Optional[MigrationHistory] = None) -> ERModel:
+        """
+        重放指定迁移之前的迁移，得到执行该迁移之前的ER状态
+        
+        目标是被压缩迁移替代的原迁移时，按原迁移链重放（跳过压缩迁移），
+        否则跳过已被替代的原迁移。
+        
+        Args:
+            namespace: 命名空间
+            migration_id: 迁移ID（文件名去掉扩展名）
+            history: 迁移历史（可选，不提供则新建）
+            
+        Returns:
+            执行该迁移之前的ERModel
+            
+        Raises:
+            ValueError: 迁移不存在
+        """
+        if history is None:
+            history = self.load_history(namespace)
+        filenames = history.filenames
+        position = next((i for i, f in enumerate(filenames) if history.migration_id(f) == migration_id), None)
+        if position is None:
+            raise ValueError(f"Migration '{migration_id}' not found in namespace '{namespace}'")
+        
+        replaced = history.replaced_filenames
+        entries = history.index_entries
+        original_chain = filenames[position] in replaced
+        state = SchemaState()
+        for filename in filenames[:position]:
+            skip = bool(entries[filename].get('replaces')) if original_chain else filename in replaced
+            if not skip:
+                state.apply_all(history.load(filename).operations)
+        
+        self.file_manager.save_validated_manifest(namespace)
+        return state.to_er_model()
+    
+    def squash(self, namespace: str, upto: Optional[int] = None, name: Optional[str] = None,
+               history: Optional[MigrationHistory] = None) -> Migration:
+        """
+        将序号不超过upto的迁移压缩为一个等价的迁移
+        
+        重放这些迁移得到状态后，与空模型比较生成最少的操作：先建后改的表合并为
+        一个CreateTable，先加后删的列、索引和表直接消失。压缩迁移在replaces中记录
+        被替代的原迁移，原迁移可以保留也可以删除。
+        
+        压缩迁移只包含结构变更，范围内有数据操作（RunBackfill）时不能压缩：否则执行了
+        扩展阶段、还没有执行回填的数据库会被当作已经是最新的。
+        
+        Args:
+            namespace: 命名空间
+            upto: 压缩到的最后一个迁移序号（可选，默认压缩全部迁移）
+            name: 迁移名称（可选，默认使用最后一个被压缩迁移的名称）
+            history: 迁移历史（可选，不提供则新建）
+            
+        Returns:
+            压缩后的Migration对象（未保存）
+            
+        Raises:
+            ValueError: 可压缩的迁移少于两个，upto落在已有压缩迁移的范围内，或范围内有数据操作
+        """
+        assert upto is None or (isinstance(upto, int) and upto > 0), "upto must be a positive integer"
+        
+        if history is None:
+            history = self.load_history(namespace)
+        entries = history.index_entries
+        
+        # 选取序号不超过upto的前缀
+        selected = []
+        for filename in history.filenames:
+            number = parse_migration_number(filename)
+            if number is None or (upto is not None and number > upto):
+                break
+            selected.append(filename)
+        
+        last_number = max((entries[f]['number'] for f in selected), default=0)
+        for filename in selected:
+            squashed_upto = parse_squashed_number(filename)
+            if squashed_upto is not None:
+                if upto is not None and squashed_upto > upto:
+                    raise ValueError(f"Cannot squash up to {upto:04d}: {filename} already covers up to {squashed_upto:04d}")
+                last_number = max(last_number, squashed_upto)
+        
+        replaced = history.replaced_filenames
+        active = [filename for filename in selected if filename not in replaced]
+        if len(active) < 2:
+            raise ValueError(f"Nothing to squash in namespace '{namespace}'")
+        
+        # 重放得到压缩点的状态，再从空模型生成等价操作
+        state = SchemaState()
+        for filename in active:
+            migration = history.load(filename)
+            data_operations = sorted({op.type for op in migration.operations if op.type in DATA_OPERATIONS})
+            if data_operations:
+                raise ValueError(f"Cannot squash {filename}: it contains data operations "
+                                 f"({', '.join(data_operations)}); squash up to the migration before it")
+            state.apply_all(migration.operations)
+        operations = self.differ.diff(ERModel(), state.to_er_model())
+        
+        replaces = []
+        for filename in selected:
+            for migration_id in entries[filename].get('replaces', []) + [f"{namespace}.{history.migration_id(filename)}"]:
+                if migration_id not in replaces:
+                    replaces.append(migration_id)
+        
+        # 依赖保留指向压缩范围之外的部分（例如其他命名空间）
+        dependencies = []
+        for filename in active:
+            for dependency in entries[filename]['dependencies']:
+                if dependency not in replaces and dependency not in dependencies:
+                    dependencies.append(dependency)
+        
+        self.file_manager.save_validated_manifest(namespace)
+        return Migration(
+            version="1.0",
+            name=name or entries[active[-1]]['name'] or f"squashed_{last_number:04d}",
+            namespace=namespace,
+            dependencies=dependencies,
+            replaces=replaces,
+            operations=operations,
+            created_at=datetime.now()
+        )
+    
+    def apply_operations(self, state: ERModel, operations: List[Operation]) -> None:
+        """
+        将迁移操作依次应用到ER状态（见SchemaState）
+        
+        需要连续应用多个迁移时，直接使用SchemaState可以避免每次重新建立索引。
+        
+        Args:
+            state: ER状态（原地修改）
+            operations: 操作列表
+        """
+        SchemaState(state).apply_all(operations).to_er_model()
     
     def _generate_migration_name(self, operations: List[Operation], previous_state: ERModel) -> str:
         """
@@ -238,51 +303,34 @@ class MigrationGenerator:
                 return f"create_{first_op.table_name}"
             elif isinstance(first_op, AddColumn):
                 return f"add_{first_op.column.name}"
+            elif isinstance(first_op, RenameColumn):
+                return f"rename_{first_op.old_name}_{first_op.new_name}"
             elif isinstance(first_op, AddForeignKey):
                 return f"add_foreign_key"
+            elif isinstance(first_op, RemoveForeignKey):
+                return "remove_foreign_key"
+            elif isinstance(first_op, AlterForeignKey):
+                return "alter_foreign_key"
         
         # 默认名称
         return "auto_migration"
     
-    def _calculate_dependencies(self, namespace: str) -> List[str]:
+    def _calculate_dependencies(self, namespace: str, history: Optional[MigrationHistory] = None) -> List[str]:
         """
         计算依赖关系
         
         Args:
             namespace: 命名空间
+            history: 迁移历史（可选，不提供则新建）
             
         Returns:
             依赖列表
         """
-        # 获取当前命名空间的所有迁移
-        migrations = self.file_manager.load_namespace_migrations(namespace)
+        if history is None:
+            history = self.load_history(namespace)
         
-        # 如果没有迁移，返回空列表
-        if not migrations:
+        # 依赖最后一个迁移；只需要文件名，不加载迁移内容
+        last_id = history.last_migration_id
+        if last_id is None:
             return []
-        
-        # 依赖最后一个迁移
-        last_migration = migrations[-1]
-        
-        # 获取最后一个迁移的文件名（不含扩展名）
-        files = self.file_manager.list_migration_files(namespace)
-        if files:
-            last_file = files[-1]
-            # 移除.yaml或.yml扩展名
-            migration_id = last_file.replace('.yaml', '').replace('.yml', '')
-            return [f"{namespace}.{migration_id}"]
-        
-        return []
-    
-    def _to_pascal_case(self, snake_str: str) -> str:
-        """
-        将snake_case转换为PascalCase
-        
-        Args:
-            snake_str: snake_case字符串
-            
-        Returns:
-            PascalCase字符串
-        """
-        components = snake_str.split('_')
-        return ''.join(x.title() for x in components)
+        return [f"{namespace}.{last_id}"]
@@ -0,0 +1,199 @@
+"""
+迁移依赖图 - 读取所有命名空间的迁移，解析依赖并生成拓扑执行计划
+
+节点是迁移的全名（namespace.迁移ID），边来自Migration.dependencies（从目录索引读取，
+不解析迁移内容）。已被压缩迁移替代的原迁移不作为节点，指向它们的依赖解析为替代它们的
+压缩迁移，与状态重建跳过原迁移的规则一致。
+
+检查：
+- 依赖指向不存在的迁移
+- 循环依赖
+- 同一命名空间有多个叶子迁移（没有被同一命名空间中其他迁移依赖），通常是两个分支
+  各自生成了迁移，需要合并
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+from .file_manager import FileManager
+from .history import MigrationHistory
+
+
+@dataclass
+class MigrationPlan:
+    """拓扑执行计划"""
+    order: List[str] = field(default_factory=list)          # 全部迁移的执行顺序
+    stages: List[List[str]] = field(default_factory=list)   # 分层：同一层的迁移互不依赖，可以并发执行
+    groups: List[List[str]] = field(default_factory=list)   # 互相独立的命名空间分组，不同组可以并发执行
+
+
+class MigrationGraph:
+    """跨命名空间的迁移依赖图"""
+
+    def __init__(self):
+        self.nodes: Dict[str, List[str]] = {}       # 迁移 -> 解析后的依赖（按原有顺序）
+        self.replacements: Dict[str, str] = {}      # 被替代的原迁移 -> 压缩迁移
+
+    @classmethod
+    def load(cls, migrations_dir: str, trusted: bool = False,
+             namespaces: Optional[List[str]] = None) -> 'MigrationGraph':
+        """
+        读取迁移目录下所有命名空间的迁移并构建依赖图
+
+        Args:
+            migrations_dir: 迁移文件根目录
+            trusted: 可信模式（见FileManager）
+            namespaces: 只读取这些命名空间（可选，默认全部）
+
+        Returns:
+            依赖图
+
+        Raises:
+            ValueError: 依赖指向不存在的迁移
+        """
+        file_manager = FileManager(migrations_dir, trusted=trusted)
+        graph = cls()
+        raw: Dict[str, List[str]] = {}
+        for namespace in namespaces or file_manager.list_namespaces():
+            history = MigrationHistory(file_manager, namespace)
+            replaced = history.replaced_filenames
+            for filename, entry in history.index_entries.items():
+                if filename in replaced:
+                    continue
+                node = f"{namespace}.{history.migration_id(filename)}"
+                raw[node] = list(entry.get('dependencies', []))
+                for original in entry.get('replaces', []):
+                    graph.replacements[original] = node
+
+        for node, dependencies in raw.items():
+            resolved = []
+            for dependency in dependencies:
+                target = graph.resolve(dependency)
+                if target not in raw:
+                    raise ValueError(f"{node} depends on unknown migration {dependency}")
+                if target != node and target not in resolved:
+                    resolved.append(target)
+            graph.nodes[node] = resolved
+        return graph
+
+    def resolve(self, migration: str) -> str:
+        """将被替代的原迁移解析为替代它的压缩迁移（可能经过多次压缩）"""
+        seen = set()
+        while migration in self.replacements and migration not in seen:
+            seen.add(migration)
+            migration = self.replacements[migration]
+        return migration
+
+    @staticmethod
+    def namespace_of(migration: str) -> str:
+        return migration.split('.', 1)[0]
+
+    def leaves(self) -> Dict[str, List[str]]:
+        """
+        每个命名空间的叶子迁移（没有被同一命名空间中其他迁移依赖）
+
+        Returns:
+            {命名空间: 叶子迁移列表（排序）}
+        """
+        depended: Set[str] = set()
+        for node, dependencies in self.nodes.items():
+            depended.update(d for d in dependencies if self.namespace_of(d) == self.namespace_of(node))
+        leaves: Dict[str, List[str]] = {}
+        for node in sorted(self.nodes):
+            if node not in depended:
+                leaves.setdefault(self.namespace_of(node), []).append(node)
+        return leaves
+
+    def conflicts(self) -> Dict[str, List[str]]:
+        """有多个叶子迁移的命名空间 {命名空间: 叶子迁移列表}"""
+        return {namespace: nodes for namespace, nodes in self.leaves().items() if len(nodes) > 1}
+
+    def find_cycle(self) -> Optional[List[str]]:
+        """
+        查找一个循环依赖
+
+        Returns:
+            循环上的迁移（首尾相同），没有循环时为None
+        """
+        visiting: List[str] = []
+        state: Dict[str, int] = {}    # 1: 访问中, 2: 已完成
+
+        for start in sorted(self.nodes):
+            if state.get(start):
+                continue
+            stack = [(start, iter(self.nodes[start]))]
+            state[start] = 1
+            visiting.append(start)
+            while stack:
+                node, dependencies = stack[-1]
+                dependency = next(dependencies, None)
+                if dependency is None:
+                    stack.pop()
+                    visiting.pop()
+                    state[node] = 2
+                elif state.get(dependency) == 1:
+                    return visiting[visiting.index(dependency):] + [dependency]
+                elif not state.get(dependency):
+                    state[dependency] = 1
+                    visiting.append(dependency)
+                    stack.append((dependency, iter(self.nodes[dependency])))
+        return None
+
+    def plan(self) -> MigrationPlan:
+        """
+        生成拓扑执行计划：每个迁移排在它的依赖之后，同等条件下按名称排序，结果确定
+
+        Returns:
+            执行计划
+
+        Raises:
+            ValueError: 存在循环依赖，或某个命名空间有多个叶子迁移
+        """
+        cycle = self.find_cycle()
+        if cycle is not None:
+            raise ValueError(f"Circular migration dependency: {' -> '.join(cycle)}")
+        conflicts = self.conflicts()
+        if conflicts:
+            details = "; ".join(f"{namespace}: {', '.join(nodes)}" for namespace, nodes in conflicts.items())
+            raise ValueError(f"Conflicting leaf migrations ({details}); merge them before applying")
+
+        dependents: Dict[str, List[str]] = {node: [] for node in self.nodes}
+        remaining = {node: len(dependencies) for node, dependencies in self.nodes.items()}
+        for node, dependencies in self.nodes.items():
+            for dependency in dependencies:
+                dependents[dependency].append(node)
+
+        plan = MigrationPlan()
+        ready = sorted(node for node, count in remaining.items() if count == 0)
+        while ready:
+            # 当前层的全部迁移互不依赖
+            plan.stages.append(ready)
+            next_ready: List[str] = []
+            for node in ready:
+                plan.order.append(node)
+                for dependent in dependents[node]:
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        next_ready.append(dependent)
+            ready = sorted(next_ready)
+        plan.groups = self._independent_namespaces()
+        return plan
+
+    def _independent_namespaces(self) -> List[List[str]]:
+        """按跨命名空间依赖划分命名空间，不同组之间没有依赖关系"""
+        parent: Dict[str, str] = {}
+
+        def find(namespace: str) -> str:
+            parent.setdefault(namespace, namespace)
+            while parent[namespace] != namespace:
+                parent[namespace] = parent[parent[namespace]]
+                namespace = parent[namespace]
+            return namespace
+
+        for node, dependencies in self.nodes.items():
+            find(self.namespace_of(node))
+            for dependency in dependencies:
+                parent[find(self.namespace_of(dependency))] = find(self.namespace_of(node))
+
+        groups: Dict[str, List[str]] = {}
+        for namespace in sorted(parent):
+            groups.setdefault(find(namespace), []).append(namespace)
+        return sorted(groups.values())
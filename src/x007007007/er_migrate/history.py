@@ -0,0 +1,182 @@
+"""
+迁移历史 - 单次调用内共享的命名空间迁移视图
+
+生成器、状态快照和CLI命令都需要命名空间下的迁移文件列表、文件内容哈希和
+解析后的Migration对象。MigrationHistory在一次调用内缓存这些结果：文件列表和
+内容哈希来自目录索引，需要内容的文件只被读取和校验一次。
+保存新迁移后应创建新的MigrationHistory。
+"""
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from .file_manager import FileManager
+from .models import Migration
+from .snapshot import chain_hash
+
+
+class MigrationHistory:
+    """命名空间迁移历史（惰性加载，结果缓存）"""
+
+    def __init__(self, file_manager: FileManager, namespace: str):
+        """
+        初始化迁移历史
+
+        Args:
+            file_manager: 文件管理器
+            namespace: 命名空间
+        """
+        assert isinstance(namespace, str) and len(namespace) > 0, "Namespace must be non-empty"
+
+        self.file_manager = file_manager
+        self.namespace = namespace
+        self._index_entries: Optional[Dict[str, dict]] = None
+        self._filenames: Optional[List[str]] = None
+        self._content_hashes: Dict[str, str] = {}
+        self._migrations: Dict[str, Migration] = {}
+        self._chain_hashes: Optional[List[str]] = None
+        self._replaced: Optional[Set[str]] = None
+
+    @property
+    def index_entries(self) -> Dict[str, dict]:
+        """目录索引项（见FileManager.get_index_entries）"""
+        if self._index_entries is None:
+            self._index_entries = self.file_manager.get_index_entries(self.namespace)
+        return self._index_entries
+
+    @property
+    def filenames(self) -> List[str]:
+        """排序后的迁移文件名列表"""
+        if self._filenames is None:
+            self._filenames = sorted(self.index_entries)
+        return self._filenames
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    def content(self, filename: str) -> bytes:
+        """迁移文件的原始内容"""
+        return (self.file_manager.get_namespace_dir(self.namespace) / filename).read_bytes()
+
+    def content_hash(self, filename: str) -> str:
+        """迁移文件内容的sha256（未加载的文件直接取自目录索引）"""
+        if filename in self._content_hashes:
+            return self._content_hashes[filename]
+        return self.index_entries[filename]['sha256']
+
+    def load(self, filename: str) -> Migration:
+        """
+        加载并校验单个迁移（结果缓存）
+
+        Args:
+            filename: 迁移文件名
+
+        Returns:
+            Migration对象
+        """
+        if filename not in self._migrations:
+            content = self.content(filename)
+            content_hash = hashlib.sha256(content).hexdigest()
+            self._content_hashes[filename] = content_hash
+            self._migrations[filename] = self.file_manager.parse_migration(
+                self.namespace, content, content_hash=content_hash
+            )
+        return self._migrations[filename]
+
+    @property
+    def migrations(self) -> List[Migration]:
+        """所有迁移，按文件名排序"""
+        migrations = [self.load(filename) for filename in self.filenames]
+        self.file_manager.save_validated_manifest(self.namespace)
+        return migrations
+
+    def entries(self) -> List[Tuple[str, Migration]]:
+        """(迁移ID, Migration) 列表，迁移ID为不含扩展名的文件名"""
+        return [
+            (self.migration_id(filename), migration)
+            for filename, migration in zip(self.filenames, self.migrations)
+        ]
+
+    def chain_hashes(self) -> List[str]:
+        """
+        迁移链的前缀哈希
+
+        Returns:
+            与filenames等长的列表，第i项为前i+1个文件的链哈希
+        """
+        if self._chain_hashes is None:
+            hashes = []
+            previous = ""
+            for filename in self.filenames:
+                previous = chain_hash(previous, filename, self.content_hash(filename))
+                hashes.append(previous)
+            self._chain_hashes = hashes
+        return self._chain_hashes
+
+    @property
+    def replaced_filenames(self) -> Set[str]:
+        """
+        被现存的压缩迁移替代的迁移文件（只读取目录索引）
+
+        Returns:
+            文件名集合，重建状态时应跳过这些文件
+        """
+        if self._replaced is None:
+            replaced_ids = set()
+            for entry in self.index_entries.values():
+                for replaced in entry.get('replaces', []):
+                    namespace, _, migration_id = replaced.rpartition('.')
+                    if namespace in ('', self.namespace):
+                        replaced_ids.add(migration_id)
+            self._replaced = {
+                filename for filename in self.filenames
+                if self.migration_id(filename) in replaced_ids
+            }
+        return self._replaced
+
+    @property
+    def leaves(self) -> List[str]:
+        """
+        叶子迁移：没有被本命名空间中其他迁移依赖的迁移（只读取目录索引）
+
+        正常情况下只有一个；多于一个说明两个分支（或两个并发的makemigrations）
+        基于同一个迁移各自生成了迁移，需要合并后才能继续生成。
+        指向被替代的原迁移的依赖视为指向替代它们的压缩迁移（见MigrationGraph）。
+
+        Returns:
+            叶子迁移ID列表（排序）
+        """
+        prefix = f"{self.namespace}."
+        replaced = self.replaced_filenames
+        replacements = {}
+        for filename in self.filenames:
+            for original in self.index_entries[filename].get('replaces', []):
+                replacements[original.rpartition('.')[2]] = self.migration_id(filename)
+
+        depended = set()
+        for filename in self.filenames:
+            if filename in replaced:
+                continue
+            for dependency in self.index_entries[filename].get('dependencies', []):
+                if dependency.startswith(prefix):
+                    migration_id = dependency[len(prefix):]
+                    seen = set()
+                    while migration_id in replacements and migration_id not in seen:
+                        seen.add(migration_id)
+                        migration_id = replacements[migration_id]
+                    depended.add(migration_id)
+        return [
+            self.migration_id(filename) for filename in self.filenames
+            if filename not in replaced and self.migration_id(filename) not in depended
+        ]
+
+    @staticmethod
+    def migration_id(filename: str) -> str:
+        """文件名去掉扩展名即为迁移ID"""
+        return Path(filename).stem
+
+    @property
+    def last_migration_id(self) -> Optional[str]:
+        """最后一个迁移的ID，没有迁移时为None"""
+        if not self.filenames:
+            return None
+        return self.migration_id(self.filenames[-1])
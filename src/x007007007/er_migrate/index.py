@@ -0,0 +1,191 @@
+"""
+迁移目录索引 - 缓存命名空间下迁移文件的元信息
+
+索引保存在命名空间目录下的 .index.json 中，每个迁移文件记录：
+文件名、序号、内容哈希、mtime、大小以及文件头（name、dependencies、replaces）。
+刷新时只扫描一次目录，mtime或大小变化的文件才会被重新读取和解析，
+列出文件、计算序号和依赖只需要读取索引。
+"""
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from . import __version__
+from .lock import write_atomic
+
+
+# 迁移文件扩展名
+MIGRATION_EXTENSIONS = ('.yaml', '.yml', '.json')
+
+# 文件名中的序号：NNNN_name
+_NUMBER_PATTERN = re.compile(r'^(\d{4})_')
+
+# 压缩迁移文件名：NNNN_squashed_MMMM_name，MMMM为被替代的最后一个序号
+_SQUASHED_PATTERN = re.compile(r'^\d{4}_squashed_(\d{4})(_|$)')
+
+
+def parse_migration_number(filename: str) -> Optional[int]:
+    """
+    从文件名解析迁移序号
+
+    Args:
+        filename: 迁移文件名
+
+    Returns:
+        序号，文件名不符合 NNNN_ 规则时返回None
+    """
+    match = _NUMBER_PATTERN.match(filename)
+    if match:
+        return int(match.group(1))
+    return None
+
+
+def parse_squashed_number(filename: str) -> Optional[int]:
+    """
+    从压缩迁移文件名解析被替代的最后一个序号
+
+    Args:
+        filename: 迁移文件名（或迁移ID）
+
+    Returns:
+        序号，不是压缩迁移时返回None
+    """
+    match = _SQUASHED_PATTERN.match(filename)
+    if match:
+        return int(match.group(1))
+    return None
+
+
+class MigrationIndex:
+    """单个命名空间的迁移目录索引"""
+
+    INDEX_FILE = ".index.json"
+
+    def __init__(self, namespace_dir: Path, parse_header: Callable[[bytes], dict], read_only: bool = False):
+        """
+        初始化索引
+
+        Args:
+            namespace_dir: 命名空间目录
+            parse_header: 从文件内容解析出字典的函数（只读取name、dependencies和replaces）
+            read_only: 只读模式，索引只在内存中更新，不写回索引文件
+        """
+        self.namespace_dir = namespace_dir
+        self.parse_header = parse_header
+        self.read_only = read_only
+        self._entries: Optional[Dict[str, dict]] = None
+
+    @property
+    def index_path(self) -> Path:
+        return self.namespace_dir / self.INDEX_FILE
+
+    def refresh(self) -> Dict[str, dict]:
+        """
+        扫描目录并更新索引
+
+        Returns:
+            {文件名: 索引项}
+        """
+        if not self.namespace_dir.exists():
+            self._entries = {}
+            return self._entries
+
+        if self._entries is None:
+            self._entries = self._read()
+
+        entries = {}
+        changed = False
+        with os.scandir(self.namespace_dir) as it:
+            for dir_entry in it:
+                # 跳过 .index.json、.validated.json 等隐藏文件
+                if dir_entry.name.startswith('.') or not dir_entry.name.endswith(MIGRATION_EXTENSIONS):
+                    continue
+                if not dir_entry.is_file():
+                    continue
+                stat = dir_entry.stat()
+                cached = self._entries.get(dir_entry.name)
+                if cached and cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+                    entries[dir_entry.name] = cached
+                    continue
+                content = Path(dir_entry.path).read_bytes()
+                entries[dir_entry.name] = self._build_entry(dir_entry.name, content, stat)
+                changed = True
+
+        if changed or entries.keys() != self._entries.keys():
+            self._entries = entries
+            self._write()
+        return self._entries
+
+    def record(self, filename: str, content: bytes, header: dict) -> None:
+        """
+        记录刚写入的迁移文件，避免下次刷新时重新读取
+
+        Args:
+            filename: 迁移文件名
+            content: 写入的内容
+            header: 迁移的name、dependencies和replaces
+        """
+        if self._entries is None:
+            self._entries = self._read()
+        stat = (self.namespace_dir / filename).stat()
+        self._entries[filename] = self._make_entry(filename, content, stat, header)
+        self._write()
+
+    def filenames(self) -> List[str]:
+        """排序后的迁移文件名列表"""
+        return sorted(self.refresh())
+
+    def max_number(self) -> int:
+        """已有迁移的最大序号（包括压缩迁移替代的序号），没有迁移时为0"""
+        numbers = [entry['number'] for entry in self.refresh().values() if entry['number'] is not None]
+        numbers.extend(filter(None, (parse_squashed_number(name) for name in self._entries)))
+        return max(numbers, default=0)
+
+    def _build_entry(self, filename: str, content: bytes, stat) -> dict:
+        data = self.parse_header(content) or {}
+        header = {
+            'name': data.get('name'),
+            'dependencies': list(data.get('dependencies') or []),
+            'replaces': list(data.get('replaces') or []),
+        }
+        return self._make_entry(filename, content, stat, header)
+
+    def _make_entry(self, filename: str, content: bytes, stat, header: dict) -> dict:
+        return {
+            'number': parse_migration_number(filename),
+            'sha256': hashlib.sha256(content).hexdigest(),
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'name': header.get('name'),
+            'dependencies': list(header.get('dependencies') or []),
+            'replaces': list(header.get('replaces') or []),
+        }
+
+    def _read(self) -> Dict[str, dict]:
+        if not self.index_path.exists():
+            return {}
+        # 索引只是缓存，损坏或由其他版本写入时整体重建
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != __version__:
+            return {}
+        return data.get('entries', {})
+
+    def _write(self) -> None:
+        if self.read_only:
+            return
+        data = {
+            'version': __version__,
+            'entries': {name: self._entries[name] for name in sorted(self._entries)},
+        }
+        # 索引写入失败（例如只读目录）不影响正常使用，下次刷新会重新计算；
+        # 原子替换保证并发的读取方不会读到写了一半的索引
+        try:
+            write_atomic(self.index_path, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        except OSError:
+            pass
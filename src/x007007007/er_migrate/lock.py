@@ -0,0 +1,171 @@
+"""
+文件锁与原子写入 - 保证并发生成迁移时序号不冲突
+
+多个开发者或并行的CI任务同时执行makemigrations时，各自按"最大序号+1"分配序号会生成
+相同序号的迁移文件。FileManager在命名空间的咨询锁内分配序号并写入文件，写入本身也是
+独占创建：目标文件已存在时失败，而不是覆盖。
+
+锁在POSIX上使用fcntl.flock，在Windows上使用msvcrt.locking，两者都不可用时退化为
+以O_EXCL创建锁文件（进程异常退出后会残留锁文件，需要手动删除）。
+咨询锁只在遵守它的进程之间生效，不遵守的写入方由独占创建兜底。
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+class FileLock:
+    """
+    基于锁文件的进程间咨询锁（同一对象可重入）
+
+    用法:
+        with FileLock(namespace_dir / ".lock"):
+            ...
+    """
+
+    DEFAULT_TIMEOUT = 60.0
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, path: Path, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        """
+        初始化文件锁
+
+        Args:
+            path: 锁文件路径（父目录需已存在）
+            timeout: 等待锁的最长秒数，None表示一直等待
+        """
+        assert timeout is None or timeout >= 0, "timeout must be non-negative"
+
+        self.path = Path(path)
+        self.timeout = timeout
+        self._fd: Optional[int] = None
+        self._depth = 0
+
+    @property
+    def locked(self) -> bool:
+        return self._depth > 0
+
+    def acquire(self) -> None:
+        """
+        获取锁
+
+        Raises:
+            TimeoutError: 超时仍未获取到锁
+        """
+        if self._depth:
+            self._depth += 1
+            return
+
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while not self._try_acquire():
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out after {self.timeout}s waiting for lock {self.path}")
+            time.sleep(self.POLL_INTERVAL)
+        self._depth = 1
+
+    def release(self) -> None:
+        """释放锁（重入时只有最外层释放）"""
+        assert self._depth > 0, "Lock is not held"
+
+        self._depth -= 1
+        if self._depth:
+            return
+        fd, self._fd = self._fd, None
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        os.close(fd)
+        if fcntl is None and msvcrt is None:
+            os.unlink(self.path)
+
+    def _try_acquire(self) -> bool:
+        """尝试获取一次锁，已被占用时返回False"""
+        if fcntl is None and msvcrt is None:
+            try:
+                self._fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                return False
+            return True
+
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+
+def _write_temporary(path: Path, content: bytes) -> Path:
+    """将内容写入目标所在目录的隐藏临时文件（以.开头，迁移目录扫描会跳过）"""
+    fd, temporary = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    return Path(temporary)
+
+
+def write_exclusive(path: Path, content: bytes) -> None:
+    """
+    原子地创建文件，目标已存在时失败
+
+    先写入临时文件再硬链接到目标路径，其他进程不会读到写了一半的文件。
+    文件系统不支持硬链接时退化为以独占模式直接创建。
+
+    Args:
+        path: 目标路径
+        content: 文件内容
+
+    Raises:
+        FileExistsError: 目标文件已存在
+    """
+    temporary = _write_temporary(path, content)
+    try:
+        os.link(temporary, path)
+    except FileExistsError:
+        raise
+    except OSError:
+        with open(path, 'xb') as f:
+            f.write(content)
+    finally:
+        temporary.unlink(missing_ok=True)
+
+
+def write_atomic(path: Path, content: bytes) -> None:
+    """
+    原子地写入文件（覆盖已有文件），其他进程只会读到旧内容或完整的新内容
+
+    Args:
+        path: 目标路径
+        content: 文件内容
+    """
+    temporary = _write_temporary(path, content)
+    try:
+        os.replace(temporary, path)
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
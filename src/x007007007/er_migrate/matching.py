@@ -0,0 +1,169 @@
+"""
+重命名匹配 - 在删除项与新增项之间寻找最优的一一对应
+
+用于表重命名和列重命名检测：候选对及其相似度由调用方给出，
+这里求总相似度最大的匹配（匈牙利算法），而不是按遍历顺序贪心选择。
+"""
+import math
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+
+def jaccard_candidates(left: Dict[Hashable, Set[str]], right: Dict[Hashable, Set[str]],
+                       threshold: float) -> Dict[Tuple[Hashable, Hashable], float]:
+    """
+    找出Jaccard相似度不低于阈值的 (left, right) 对
+
+    使用前缀过滤：按出现频率从低到高排列每个集合的元素，相似度不低于t的两个集合
+    一定在各自前 |S| - ceil(t·|S|) + 1 个元素中有交集。只有前缀相交的对才计算
+    精确相似度，常见元素（例如每张表都有的id列）不会产生大量候选。
+
+    Args:
+        left: {键: 元素集合}
+        right: {键: 元素集合}
+        threshold: 相似度阈值（0~1]
+
+    Returns:
+        {(left键, right键): 相似度}
+    """
+    assert 0 < threshold <= 1, "threshold must be in (0, 1]"
+
+    frequency: Dict[str, int] = {}
+    for sets in (left, right):
+        for items in sets.values():
+            for item in items:
+                frequency[item] = frequency.get(item, 0) + 1
+
+    def prefix(items: Set[str]) -> List[str]:
+        ordered = sorted(items, key=lambda item: (frequency[item], item))
+        length = len(ordered) - math.ceil(threshold * len(ordered) - 1e-9) + 1
+        return ordered[:length]
+
+    # 倒排索引：前缀元素 -> right键
+    inverted: Dict[str, List[Hashable]] = {}
+    for key, items in right.items():
+        for item in prefix(items):
+            inverted.setdefault(item, []).append(key)
+
+    candidates = {}
+    for left_key, left_items in left.items():
+        if not left_items:
+            continue
+        seen = set()
+        for item in prefix(left_items):
+            for right_key in inverted.get(item, ()):
+                if right_key in seen:
+                    continue
+                seen.add(right_key)
+                right_items = right[right_key]
+                # 大小相差过多时不可能达到阈值
+                if min(len(left_items), len(right_items)) < threshold * max(len(left_items), len(right_items)):
+                    continue
+                intersection = len(left_items & right_items)
+                similarity = intersection / (len(left_items) + len(right_items) - intersection)
+                if similarity >= threshold:
+                    candidates[(left_key, right_key)] = similarity
+    return candidates
+
+
+def best_matching(candidates: Dict[Tuple[Hashable, Hashable], float]) -> Dict[Hashable, Hashable]:
+    """
+    求总得分最大的一一匹配
+
+    候选对按连通分量分别求解，每个分量使用匈牙利算法；不在候选中的对不会被匹配。
+    键需要可排序，以保证结果确定。
+
+    Args:
+        candidates: {(left键, right键): 得分}，得分应为正数
+
+    Returns:
+        {left键: right键}
+    """
+    matching = {}
+    for component in _components(candidates):
+        lefts = sorted({left for left, _ in component})
+        rights = sorted({right for _, right in component})
+        weights = [[candidates.get((left, right), 0.0) for right in rights] for left in lefts]
+        for i, j in _hungarian(weights):
+            if (lefts[i], rights[j]) in candidates:
+                matching[lefts[i]] = rights[j]
+    return matching
+
+
+def _components(candidates: Dict[Tuple[Hashable, Hashable], float]) -> Iterable[List[Tuple[Hashable, Hashable]]]:
+    """按连通分量划分候选对"""
+    parent: Dict[Tuple[str, Hashable], Tuple[str, Hashable]] = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for left, right in candidates:
+        parent[find(('L', left))] = find(('R', right))
+
+    groups: Dict[Tuple[str, Hashable], List[Tuple[Hashable, Hashable]]] = {}
+    for pair in sorted(candidates):
+        groups.setdefault(find(('L', pair[0])), []).append(pair)
+    return groups.values()
+
+
+def _hungarian(weights: List[List[float]]) -> List[Tuple[int, int]]:
+    """
+    最大权匹配（匈牙利算法，O(n²·m)）
+
+    Args:
+        weights: n×m 得分矩阵
+
+    Returns:
+        [(行, 列)]，每行至多匹配一列
+    """
+    transposed = len(weights) > len(weights[0])
+    if transposed:
+        weights = [list(column) for column in zip(*weights)]
+    n, m = len(weights), len(weights[0])
+
+    # 转为最小化代价，行数不超过列数时每行都会被分配
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    assigned = [0] * (m + 1)     # 列 -> 行（1起始，0表示未分配）
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        assigned[0] = row
+        column = 0
+        min_value = [math.inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[column] = True
+            current_row = assigned[column]
+            delta = math.inf
+            next_column = 0
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                cost = -weights[current_row - 1][j - 1] - u[current_row] - v[j]
+                if cost < min_value[j]:
+                    min_value[j] = cost
+                    way[j] = column
+                if min_value[j] < delta:
+                    delta = min_value[j]
+                    next_column = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[assigned[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_value[j] -= delta
+            column = next_column
+            if assigned[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            assigned[column] = assigned[previous]
+            column = previous
+
+    pairs = [(assigned[j] - 1, j - 1) for j in range(1, m + 1) if assigned[j]]
+    if transposed:
+        pairs = [(j, i) for i, j in pairs]
+    return sorted(pairs)
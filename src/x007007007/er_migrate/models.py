@@ -1,7 +1,7 @@
 """
 Migration data models using Pydantic for validation
 """
-from typing import List, Optional, Any, Union, Literal
+from typing import Annotated, Dict, List, Optional, Any, Type, Union, Literal
 from datetime import datetime
 from pydantic import BaseModel, Field, field_validator
 
@@ -135,13 +135,42 @@ class AlterForeignKey(Operation):
     new_on_update: Optional[str] = None
 
 
-# 联合类型
-OperationType = Union[
+class RunBackfill(Operation):
+    """批量回填数据操作 - 按键范围分批执行 UPDATE 表 SET 列 = 表达式，每批一个事务"""
+    type: Literal["RunBackfill"] = "RunBackfill"
+    table_name: str
+    column_name: str
+    expression: str             # SQL表达式，例如 CAST(code AS BIGINT)
+    key_column: str = "id"      # 分批依据的键（唯一且可排序，通常是主键）
+    chunk_size: int = 1000      # 每批更新的行数
+    throttle: float = 0.0       # 每批之间暂停的秒数，降低对线上负载的影响
+
+    @field_validator('chunk_size')
+    @classmethod
+    def validate_chunk_size(cls, v: int) -> int:
+        assert isinstance(v, int) and v > 0, "chunk_size must be a positive integer"
+        return v
+
+    @field_validator('throttle')
+    @classmethod
+    def validate_throttle(cls, v: float) -> float:
+        assert v >= 0, "throttle must not be negative"
+        return v
+
+
+OPERATION_CLASSES = (
     CreateTable, DropTable, RenameTable,
     AddColumn, RemoveColumn, AlterColumn, RenameColumn,
     AddIndex, RemoveIndex,
-    AddForeignKey, RemoveForeignKey, AlterForeignKey
-]
+    AddForeignKey, RemoveForeignKey, AlterForeignKey,
+    RunBackfill
+)
+
+# 数据操作：不改变表结构，由执行器分批执行而不是编译为DDL
+DATA_OPERATIONS = {'RunBackfill'}
+
+# 联合类型：按type字段区分，每个操作一步定位到具体类型
+OperationType = Annotated[Union[OPERATION_CLASSES], Field(discriminator='type')]
 
 
 class Migration(BaseModel):
@@ -150,6 +179,8 @@ class Migration(BaseModel):
     name: str
     namespace: str
     dependencies: List[str] = Field(default_factory=list)
+    # 压缩迁移替代的原迁移（namespace.迁移ID），原迁移仍存在时重建状态会跳过它们
+    replaces: List[str] = Field(default_factory=list)
     operations: List[OperationType]
     created_at: Optional[datetime] = None
     
@@ -164,3 +195,52 @@ class Migration(BaseModel):
     def validate_namespace(cls, v: str) -> str:
         assert isinstance(v, str) and len(v) > 0, "Namespace must be non-empty"
         return v
+
+
+# ============ 可信快速构造 ============
+
+# 操作类型名 -> 操作类
+OPERATION_TYPES: Dict[str, Type[Operation]] = {
+    cls.model_fields['type'].default: cls for cls in OPERATION_CLASSES
+}
+
+# 操作中嵌套的模型字段
+_NESTED_FIELDS: Dict[str, Type[BaseModel]] = {
+    'columns': ColumnDefinition,
+    'column': ColumnDefinition,
+    'index': IndexDefinition,
+    'foreign_key': ForeignKeyDefinition,
+}
+
+
+def _construct_operation(data: dict) -> Operation:
+    """不经校验构造单个操作"""
+    fields = dict(data)
+    for field_name, nested_cls in _NESTED_FIELDS.items():
+        value = fields.get(field_name)
+        if isinstance(value, list):
+            fields[field_name] = [nested_cls.model_construct(**item) for item in value]
+        elif isinstance(value, dict):
+            fields[field_name] = nested_cls.model_construct(**value)
+    return OPERATION_TYPES[fields['type']].model_construct(**fields)
+
+
+def construct_migration(data: dict) -> Migration:
+    """
+    跳过Pydantic校验直接构造Migration
+    
+    只能用于已经完整校验过的内容（例如内容哈希记录在已校验清单中的迁移文件），
+    否则可能得到不合法的对象。
+    
+    Args:
+        data: 迁移文件解析出的字典
+        
+    Returns:
+        Migration对象
+    """
+    fields = dict(data)
+    fields['operations'] = [_construct_operation(op) for op in fields.get('operations', [])]
+    created_at = fields.get('created_at')
+    if isinstance(created_at, str):
+        fields['created_at'] = datetime.fromisoformat(created_at)
+    return Migration.model_construct(**fields)
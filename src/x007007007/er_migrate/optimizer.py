@@ -0,0 +1,334 @@
+"""
+迁移操作优化器 - 合并冗余操作，并按外键依赖和表分组排序
+
+优化分两步：
+1. 合并：先建后改的表/列合并为一次创建，先加后删的列/索引/表相互抵消，
+   同一列的多个AlterColumn合并为一个，连续的表重命名合并为一次。
+2. 排序：被引用的表先创建、引用其他表的表先删除，同一张表的变更排在一起，
+   外键在所有表和列就绪后再添加。
+"""
+from typing import Dict, List, Optional, Set, Tuple
+from .models import (
+    Operation,
+    CreateTable,
+    DropTable,
+    RenameTable,
+    AddColumn,
+    RemoveColumn,
+    AlterColumn,
+    RenameColumn,
+    AddIndex,
+    RemoveIndex,
+    AddForeignKey,
+    RemoveForeignKey,
+    AlterForeignKey,
+    ColumnDefinition,
+)
+
+
+# AlterColumn字段 -> ColumnDefinition字段
+_ALTER_FIELDS = {
+    'new_type': 'type',
+    'new_max_length': 'max_length',
+    'new_nullable': 'nullable',
+    'new_default': 'default',
+    'new_precision': 'precision',
+    'new_scale': 'scale',
+}
+
+# 同一张表内的操作顺序：先删索引，再改列，最后建索引
+_TABLE_OPERATION_RANK = {
+    'RemoveIndex': 0,
+    'RemoveColumn': 1,
+    'RenameColumn': 1,
+    'AddColumn': 2,
+    'AlterColumn': 3,
+    'AddIndex': 4,
+}
+
+
+class MigrationOptimizer:
+    """迁移操作优化器"""
+
+    def optimize(self, operations: List[Operation],
+                 references: Optional[Dict[str, Set[str]]] = None) -> List[Operation]:
+        """
+        优化操作列表
+
+        Args:
+            operations: 操作列表（不会被修改）
+            references: 变更前的外键引用 {表名: 被引用的表名集合}，用于确定删除表的顺序
+
+        Returns:
+            等价的优化后操作列表
+        """
+        merged = self._merge(operations)
+        return self._order(merged, references or {})
+
+    # ============ 合并 ============
+
+    def _merge(self, operations: List[Operation]) -> List[Operation]:
+        """合并冗余操作，保持原有顺序"""
+        result: List[Optional[Operation]] = []
+        created: Dict[str, int] = {}                  # 表名 -> CreateTable位置
+        renamed: Dict[str, int] = {}                  # 新表名 -> RenameTable位置
+        added: Dict[Tuple[str, str], int] = {}        # (表名, 列名) -> AddColumn位置
+        altered: Dict[Tuple[str, str], int] = {}      # (表名, 列名) -> AlterColumn位置
+        indexes: Dict[Tuple[str, str], int] = {}      # (表名, 索引名) -> AddIndex位置
+
+        def append(op: Operation) -> int:
+            result.append(op)
+            return len(result) - 1
+
+        def column_of(table: str, column: str) -> Optional[ColumnDefinition]:
+            """本次新建的列定义（新建表中的列或AddColumn的列）"""
+            if table in created:
+                return next((c for c in result[created[table]].columns if c.name == column), None)
+            if (table, column) in added:
+                return result[added[(table, column)]].column
+            return None
+
+        def drop_indexes_on(table: str, column: str) -> None:
+            """删除本次新建的、包含指定列的索引"""
+            for key, position in list(indexes.items()):
+                if key[0] == table and column in result[position].index.columns:
+                    result[position] = None
+                    del indexes[key]
+
+        for op in operations:
+            op = op.model_copy(deep=True)
+
+            if isinstance(op, CreateTable):
+                created[op.table_name] = append(op)
+
+            elif isinstance(op, DropTable):
+                table = op.table_name
+                self._discard_table(result, table, added, altered, indexes)
+                if table in created:
+                    # 先建后删：全部抵消
+                    del created[table]
+                    continue
+                if table in renamed:
+                    # 先改名后删除：直接删除原表
+                    position = renamed.pop(table)
+                    old_name = result[position].old_name
+                    result[position] = None
+                    self._discard_table(result, old_name, added, altered, indexes)
+                    op = DropTable(table_name=old_name)
+                append(op)
+
+            elif isinstance(op, RenameTable):
+                old, new = op.old_name, op.new_name
+                if old in created:
+                    # 先建后改名：直接以新名称创建
+                    self._retable(result, old, new, created, added, altered, indexes)
+                    continue
+                if old in renamed:
+                    # 连续改名合并为一次
+                    position = renamed.pop(old)
+                    self._retable(result, old, new, created, added, altered, indexes)
+                    if result[position].old_name == new:
+                        result[position] = None
+                    else:
+                        result[position].new_name = new
+                        renamed[new] = position
+                    continue
+                # 改名前的操作等价于改名后对新表的操作
+                self._retable(result, old, new, created, added, altered, indexes)
+                renamed[new] = append(op)
+
+            elif isinstance(op, AddColumn):
+                if op.table_name in created:
+                    result[created[op.table_name]].columns.append(op.column)
+                    continue
+                added[(op.table_name, op.column.name)] = append(op)
+
+            elif isinstance(op, AlterColumn):
+                key = (op.table_name, op.column_name)
+                column = column_of(*key)
+                if column is not None:
+                    for alter_field, column_field in _ALTER_FIELDS.items():
+                        value = getattr(op, alter_field)
+                        if value is not None:
+                            setattr(column, column_field, value)
+                    continue
+                if key in altered:
+                    previous = result[altered[key]]
+                    for alter_field in _ALTER_FIELDS:
+                        value = getattr(op, alter_field)
+                        if value is not None:
+                            setattr(previous, alter_field, value)
+                    continue
+                altered[key] = append(op)
+
+            elif isinstance(op, RemoveColumn):
+                key = (op.table_name, op.column_name)
+                drop_indexes_on(*key)
+                if op.table_name in created:
+                    create = result[created[op.table_name]]
+                    create.columns = [c for c in create.columns if c.name != op.column_name]
+                    continue
+                if key in added:
+                    # 先加后删：相互抵消
+                    result[added.pop(key)] = None
+                    continue
+                if key in altered:
+                    # 删除前的修改没有意义
+                    result[altered.pop(key)] = None
+                append(op)
+
+            elif isinstance(op, RenameColumn):
+                table = op.table_name
+                column = column_of(table, op.old_name)
+                for key, position in indexes.items():
+                    if key[0] == table:
+                        columns = result[position].index.columns
+                        result[position].index.columns = [op.new_name if c == op.old_name else c for c in columns]
+                if column is not None:
+                    column.name = op.new_name
+                    if (table, op.old_name) in added:
+                        added[(table, op.new_name)] = added.pop((table, op.old_name))
+                    continue
+                if (table, op.old_name) in altered:
+                    # 改名前的修改等价于改名后修改新列
+                    position = altered.pop((table, op.old_name))
+                    result[position].column_name = op.new_name
+                    altered[(table, op.new_name)] = position
+                append(op)
+
+            elif isinstance(op, RemoveIndex):
+                key = (op.table_name, op.index_name)
+                if key in indexes:
+                    # 先加后删：相互抵消
+                    result[indexes.pop(key)] = None
+                    continue
+                append(op)
+
+            elif isinstance(op, AddIndex):
+                indexes[(op.table_name, op.index.name)] = append(op)
+
+            else:
+                append(op)
+
+        return [op for op in result if op is not None]
+
+    def _discard_table(self, result: List[Optional[Operation]], table: str,
+                       added: dict, altered: dict, indexes: dict) -> None:
+        """丢弃表被删除之前对它的所有操作"""
+        for position, op in enumerate(result):
+            if op is not None and getattr(op, 'table_name', None) == table:
+                result[position] = None
+        for mapping in (added, altered, indexes):
+            for key in [key for key in mapping if key[0] == table]:
+                del mapping[key]
+
+    def _retable(self, result: List[Optional[Operation]], old: str, new: str,
+                 created: Dict[str, int], added: dict, altered: dict, indexes: dict) -> None:
+        """将已有操作中的表名old改为new（包括外键引用）"""
+        for op in result:
+            if op is None:
+                continue
+            if getattr(op, 'table_name', None) == old:
+                op.table_name = new
+            if isinstance(op, AddForeignKey) and op.foreign_key.reference_table == old:
+                op.foreign_key.reference_table = new
+        if old in created:
+            created[new] = created.pop(old)
+        for mapping in (added, altered, indexes):
+            for key in [key for key in mapping if key[0] == old]:
+                mapping[(new, key[1])] = mapping.pop(key)
+
+    # ============ 排序 ============
+
+    def _order(self, operations: List[Operation], references: Dict[str, Set[str]]) -> List[Operation]:
+        """
+        按依赖排序：
+        1. 删除将被改名占用的表
+        2. 重命名表（保持原有顺序）
+        3. 删除外键
+        4. 删除表（引用方先删）
+        5. 创建表（被引用方先建），紧跟该表的索引
+        6. 修改已有表，同一张表的变更排在一起
+        7. 添加/修改外键
+        """
+        rename_targets = {op.new_name for op in operations if isinstance(op, RenameTable)}
+
+        freeing_drops = []
+        renames = []
+        remove_fks = []
+        drops: Dict[str, DropTable] = {}
+        creates: Dict[str, CreateTable] = {}
+        table_ops: Dict[str, List[Operation]] = {}
+        add_fks = []
+
+        for op in operations:
+            if isinstance(op, DropTable):
+                if op.table_name in rename_targets:
+                    freeing_drops.append(op)
+                else:
+                    drops[op.table_name] = op
+            elif isinstance(op, RenameTable):
+                renames.append(op)
+            elif isinstance(op, RemoveForeignKey):
+                remove_fks.append(op)
+            elif isinstance(op, CreateTable):
+                creates[op.table_name] = op
+            elif isinstance(op, (AddForeignKey, AlterForeignKey)):
+                add_fks.append(op)
+            else:
+                table_ops.setdefault(op.table_name, []).append(op)
+
+        # 删除：引用方先删，即被引用的表依赖引用它的表
+        drop_deps = {table: set() for table in drops}
+        for table, referenced in references.items():
+            for target in referenced:
+                if table in drops and target in drops and target != table:
+                    drop_deps[target].add(table)
+
+        # 创建：被引用方先建
+        create_deps = {table: set() for table in creates}
+        for op in add_fks:
+            if isinstance(op, AddForeignKey):
+                target = op.foreign_key.reference_table
+                if op.table_name in creates and target in creates and target != op.table_name:
+                    create_deps[op.table_name].add(target)
+
+        ordered = freeing_drops + renames + remove_fks
+        ordered.extend(drops[table] for table in self._toposort(list(drops), drop_deps))
+        for table in self._toposort(list(creates), create_deps):
+            ordered.append(creates[table])
+            ordered.extend(self._sort_table_operations(table_ops.pop(table, [])))
+        for ops in table_ops.values():
+            ordered.extend(self._sort_table_operations(ops))
+        ordered.extend(add_fks)
+        return ordered
+
+    def _sort_table_operations(self, operations: List[Operation]) -> List[Operation]:
+        """同一张表内的操作排序（稳定排序，同级操作保持原有顺序）"""
+        return sorted(operations, key=lambda op: _TABLE_OPERATION_RANK.get(op.type, len(_TABLE_OPERATION_RANK)))
+
+    def _toposort(self, names: List[str], deps: Dict[str, Set[str]]) -> List[str]:
+        """
+        稳定的拓扑排序：按原有顺序输出，每个名称之前先输出它依赖的名称
+
+        Args:
+            names: 按原有顺序排列的名称
+            deps: {名称: 必须排在它之前的名称集合}
+
+        Returns:
+            排序后的名称；存在循环依赖时，循环处按原有顺序输出
+        """
+        ordered: List[str] = []
+        visited: Set[str] = set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            visited.add(name)
+            for dep in sorted(deps[name], key=names.index):
+                visit(dep)
+            ordered.append(name)
+
+        for name in names:
+            visit(name)
+        return ordered
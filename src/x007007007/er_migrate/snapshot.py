@@ -0,0 +1,154 @@
+"""
+状态快照 - 缓存迁移链重放后的ER状态，避免每次完整重放
+
+快照保存在命名空间目录下的 .snapshots/ 中，文件名为 NNNN_<hash>.json，
+NNNN 表示快照覆盖的迁移文件数量，hash 为这些迁移文件组成的链哈希。
+任何一个已覆盖的迁移文件被修改、删除或插入，链哈希都会变化，快照随之失效。
+快照还记录写入时的包版本和格式版本，重放逻辑（SchemaState）或状态结构变化后的旧快照同样失效。
+"""
+import hashlib
+import json
+from dataclasses import asdict
+from pathlib import Path
+from typing import List, Optional, Tuple
+from x007007007.er.models import ERModel, Entity, Column, Relationship, Index
+from . import __version__
+from .file_manager import FileManager
+from .lock import write_atomic
+
+
+# 快照格式版本，状态结构或重放语义变化时递增以丢弃旧快照（版本号不变的开发版本也能失效）
+SNAPSHOT_FORMAT = 2
+
+
+def chain_hash(previous: str, filename: str, content_hash: str) -> str:
+    """在前一个链哈希的基础上追加一个迁移文件"""
+    return hashlib.sha256(f"{previous}\n{filename}\n{content_hash}".encode('utf-8')).hexdigest()
+
+
+def serialize_state(model: ERModel) -> dict:
+    """
+    序列化ER状态为JSON兼容的字典
+
+    Args:
+        model: ER模型
+
+    Returns:
+        字典
+    """
+    return {
+        'entities': [asdict(entity) for entity in model.entities.values()],
+        'relationships': [asdict(rel) for rel in model.relationships],
+    }
+
+
+def deserialize_state(data: dict) -> ERModel:
+    """
+    从字典恢复ER状态
+
+    Args:
+        data: serialize_state的输出
+
+    Returns:
+        ERModel对象
+    """
+    model = ERModel()
+    for entity_data in data['entities']:
+        entity_data = dict(entity_data)
+        entity_data['columns'] = [Column(**col) for col in entity_data['columns']]
+        entity_data['indexes'] = [Index(**idx) for idx in entity_data.get('indexes', [])]
+        model.add_entity(Entity(**entity_data))
+    for rel_data in data['relationships']:
+        model.add_relationship(Relationship(**rel_data))
+    return model
+
+
+class SnapshotManager:
+    """状态快照管理器"""
+
+    SNAPSHOT_DIR = ".snapshots"
+
+    def __init__(self, file_manager: FileManager):
+        """
+        初始化快照管理器
+
+        Args:
+            file_manager: 文件管理器
+        """
+        self.file_manager = file_manager
+
+    def get_snapshot_dir(self, namespace: str) -> Path:
+        """获取命名空间的快照目录"""
+        return self.file_manager.get_namespace_dir(namespace) / self.SNAPSHOT_DIR
+
+    def load_latest(self, namespace: str, chain_hashes: List[str]) -> Optional[Tuple[int, ERModel]]:
+        """
+        加载与当前迁移链匹配的最新快照
+
+        Args:
+            namespace: 命名空间
+            chain_hashes: 当前迁移链的前缀哈希（见MigrationHistory.chain_hashes）
+
+        Returns:
+            (已覆盖的迁移数量, 状态)，没有可用快照时返回None
+        """
+        snapshot_dir = self.get_snapshot_dir(namespace)
+        if not snapshot_dir.exists():
+            return None
+
+        candidates = []
+        for path in snapshot_dir.glob('*.json'):
+            count, _, short_hash = path.stem.partition('_')
+            if not count.isdigit():
+                continue
+            count = int(count)
+            if 0 < count <= len(chain_hashes) and chain_hashes[count - 1].startswith(short_hash):
+                candidates.append((count, path))
+
+        for count, path in sorted(candidates, reverse=True):
+            # 快照只是缓存，损坏的文件直接忽略
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if (data.get('format') != SNAPSHOT_FORMAT or data.get('version') != __version__
+                    or data.get('chain_hash') != chain_hashes[count - 1]):
+                continue
+            return count, deserialize_state(data['state'])
+
+        return None
+
+    def save(self, namespace: str, count: int, chain_hash_value: str, state: dict) -> Path:
+        """
+        保存快照，并删除相同位置上的旧快照
+
+        Args:
+            namespace: 命名空间
+            count: 快照覆盖的迁移数量
+            chain_hash_value: 前count个迁移的链哈希
+            state: serialize_state的输出
+
+        Returns:
+            快照文件路径
+        """
+        assert count > 0, "Snapshot must cover at least one migration"
+
+        snapshot_dir = self.get_snapshot_dir(namespace)
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+
+        path = snapshot_dir / f"{count:04d}_{chain_hash_value[:16]}.json"
+        data = {
+            'format': SNAPSHOT_FORMAT,
+            'version': __version__,
+            'count': count,
+            'chain_hash': chain_hash_value,
+            'state': state,
+        }
+        # 原子替换：中断的写入不会留下截断的快照
+        write_atomic(path, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+        for stale in snapshot_dir.glob(f'{count:04d}_*.json'):
+            if stale != path:
+                stale.unlink()
+        return path
@@ -0,0 +1,411 @@
+"""
+迁移状态引擎 - 将迁移操作依次应用到ER状态
+
+生成器重建状态、压缩迁移、执行器逐个执行迁移以及er-django都通过SchemaState重放操作，
+所有操作类型（含重命名、修改、索引和外键操作）的语义只在这里实现一次。
+
+状态直接维护一个ERModel，另外按名称索引每张表的列和外键，因此每个操作只访问它涉及的
+表，耗时与表的数量和已重放的迁移数量无关。外键统一表示为多对一关系（外键所在实体在左侧），
+ERModel.relationships在to_er_model时按需同步。
+
+表名与实体名的对应规则：表名 snake_case -> 实体名 PascalCase（例如 blog_post -> BlogPost）。
+"""
+from typing import Any, Dict, Iterable, Optional
+from x007007007.er.models import ERModel, Entity, Column, Relationship, Index
+from .converter import ERConverter
+from .models import ColumnDefinition, Operation
+
+
+def table_entity_name(table_name: str) -> str:
+    """
+    表名对应的实体名（snake_case -> PascalCase）
+
+    Args:
+        table_name: 表名
+
+    Returns:
+        实体名
+    """
+    return ''.join(part.title() for part in table_name.split('_'))
+
+
+def column_from_definition(col_def: ColumnDefinition) -> Column:
+    """
+    将迁移中的列定义转换为ER模型的列
+
+    Args:
+        col_def: 列定义
+
+    Returns:
+        Column对象
+    """
+    return Column(
+        name=col_def.name,
+        type=col_def.type,
+        is_pk=col_def.primary_key,
+        nullable=col_def.nullable,
+        default=col_def.default,
+        max_length=col_def.max_length,
+        precision=col_def.precision,
+        scale=col_def.scale,
+        unique=col_def.unique,
+        comment=col_def.comment
+    )
+
+
+class SchemaState:
+    """可变的、按名称索引的ER状态"""
+
+    # 操作类型 -> 处理方法
+    _HANDLERS = {
+        'CreateTable': '_create_table',
+        'DropTable': '_drop_table',
+        'RenameTable': '_rename_table',
+        'AddColumn': '_add_column',
+        'RemoveColumn': '_remove_column',
+        'AlterColumn': '_alter_column',
+        'RenameColumn': '_rename_column',
+        'AddIndex': '_add_index',
+        'RemoveIndex': '_remove_index',
+        'AddForeignKey': '_add_foreign_key',
+        'RemoveForeignKey': '_remove_foreign_key',
+        'AlterForeignKey': '_alter_foreign_key',
+        'RunBackfill': '_run_backfill',
+    }
+
+    def __init__(self, model: Optional[ERModel] = None):
+        """
+        初始化状态
+
+        Args:
+            model: 初始ER状态（可选，例如从快照恢复的状态）。状态会原地修改该模型，
+                其中的关系统一转换为多对一外键
+        """
+        self.converter = ERConverter()
+        self._model = model if model is not None else ERModel()
+        self._columns: Dict[str, Dict[str, Column]] = {}                 # 实体 -> {列名: 列}
+        self._foreign_keys: Dict[str, Dict[str, Relationship]] = {}      # 外键所在实体 -> {列名: 关系}
+        self._references: Dict[str, Dict[int, Relationship]] = {}        # 被引用实体 -> {id: 关系}
+        self._relationships: Dict[int, Relationship] = {}                # 全部外键（按添加顺序）
+        self._relationships_dirty = False
+
+        for name, entity in self._model.entities.items():
+            self._columns[name] = {col.name: col for col in entity.columns}
+        for rel in self._model.relationships:
+            fk = self.converter.convert_relationship(rel)
+            entity_name, reference_entity, _, _ = self.converter._foreign_key_sides(rel)
+            self._replace(Relationship(
+                left_entity=entity_name,
+                right_entity=reference_entity,
+                relation_type="many-to-one",
+                left_column=fk.column_name,
+                right_column=fk.reference_column,
+                on_delete=rel.on_delete,
+                on_update=rel.on_update,
+                constraint_name=rel.constraint_name
+            ))
+        self._relationships_dirty = True
+
+    def apply(self, op: Operation) -> None:
+        """
+        应用单个操作
+
+        引用不存在的表或列的操作被忽略（与数据库中已手动处理的情况保持一致）。
+
+        Args:
+            op: 迁移操作
+
+        Raises:
+            ValueError: 不支持的操作类型
+        """
+        handler = self._HANDLERS.get(op.type)
+        if handler is None:
+            raise ValueError(f"Unsupported operation type: {op.type}")
+        getattr(self, handler)(op)
+
+    def apply_all(self, operations: Iterable[Operation]) -> 'SchemaState':
+        """
+        依次应用多个操作
+
+        Args:
+            operations: 操作列表
+
+        Returns:
+            self，便于链式调用
+        """
+        for op in operations:
+            self.apply(op)
+        return self
+
+    def has_table(self, table_name: str) -> bool:
+        """表是否存在"""
+        return table_entity_name(table_name) in self._columns
+
+    def column(self, table_name: str, column_name: str) -> Optional[Column]:
+        """
+        表中的列（与状态共享对象）
+
+        Args:
+            table_name: 表名
+            column_name: 列名
+
+        Returns:
+            Column对象，表或列不存在时返回None
+        """
+        return self._columns.get(table_entity_name(table_name), {}).get(column_name)
+
+    def to_er_model(self) -> ERModel:
+        """
+        当前状态的ERModel（与状态共享对象，继续应用操作会修改它）
+
+        Returns:
+            ERModel对象
+        """
+        if self._relationships_dirty:
+            self._model.relationships = list(self._relationships.values())
+            self._relationships_dirty = False
+        return self._model
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        当前状态的转换器字典形式（见ERConverter.convert_model）
+
+        Returns:
+            包含tables和foreign_keys的字典
+        """
+        return self.converter.convert_model(self.to_er_model())
+
+    # ============ 表操作 ============
+
+    def _create_table(self, op) -> None:
+        entity_name = table_entity_name(op.table_name)
+        if entity_name in self._model.entities:
+            return
+        entity = Entity(name=entity_name, columns=[column_from_definition(col) for col in op.columns])
+        self._model.entities[entity_name] = entity
+        self._columns[entity_name] = {col.name: col for col in entity.columns}
+
+    def _drop_table(self, op) -> None:
+        entity_name = table_entity_name(op.table_name)
+        self._model.entities.pop(entity_name, None)
+        self._columns.pop(entity_name, None)
+        # 表上的外键以及引用该表的外键随表删除
+        for rel in list(self._foreign_keys.get(entity_name, {}).values()):
+            self._unlink(rel)
+        for rel in list(self._references.get(entity_name, {}).values()):
+            self._unlink(rel)
+
+    def _rename_table(self, op) -> None:
+        old_name = table_entity_name(op.old_name)
+        new_name = table_entity_name(op.new_name)
+        entity = self._model.entities.pop(old_name, None)
+        if entity is not None:
+            entity.name = new_name
+            self._model.entities[new_name] = entity
+            self._columns[new_name] = self._columns.pop(old_name)
+            # 重命名表不会重命名数据库中的索引，记录按原表名生成的索引名
+            for column in entity.columns:
+                self._pin_index_name(op.old_name, column)
+        # 关系中引用的实体名同步更新；外键约束同样不会被重命名，记录按原表名生成的约束名
+        foreign_keys = self._foreign_keys.pop(old_name, None)
+        if foreign_keys is not None:
+            for rel in foreign_keys.values():
+                self._pin_foreign_key_name(op.old_name, rel)
+                rel.left_entity = new_name
+            self._foreign_keys[new_name] = foreign_keys
+        references = self._references.pop(old_name, None)
+        if references is not None:
+            for rel in references.values():
+                rel.right_entity = new_name
+            self._references[new_name] = references
+
+    # ============ 列操作 ============
+
+    def _add_column(self, op) -> None:
+        entity_name = table_entity_name(op.table_name)
+        columns = self._columns.get(entity_name)
+        if columns is None or op.column.name in columns:
+            return
+        column = column_from_definition(op.column)
+        self._model.entities[entity_name].columns.append(column)
+        columns[column.name] = column
+
+    def _remove_column(self, op) -> None:
+        entity_name = table_entity_name(op.table_name)
+        columns = self._columns.get(entity_name)
+        if columns is None or op.column_name not in columns:
+            return
+        entity = self._model.entities[entity_name]
+        column = columns.pop(op.column_name)
+        entity.columns = [col for col in entity.columns if col is not column]
+        # 包含该列的索引和该列上的外键随列删除
+        if entity.indexes:
+            entity.indexes = [idx for idx in entity.indexes if op.column_name not in idx.columns]
+        rel = self._foreign_keys.get(entity_name, {}).get(op.column_name)
+        if rel is not None:
+            self._unlink(rel)
+
+    def _alter_column(self, op) -> None:
+        column = self._columns.get(table_entity_name(op.table_name), {}).get(op.column_name)
+        if column is None:
+            return
+        # 只更新非None的字段
+        if op.new_type is not None:
+            column.type = op.new_type
+        if op.new_max_length is not None:
+            column.max_length = op.new_max_length
+        if op.new_nullable is not None:
+            column.nullable = op.new_nullable
+        if op.new_default is not None:
+            column.default = op.new_default
+        if op.new_precision is not None:
+            column.precision = op.new_precision
+        if op.new_scale is not None:
+            column.scale = op.new_scale
+
+    def _rename_column(self, op) -> None:
+        entity_name = table_entity_name(op.table_name)
+        columns = self._columns.get(entity_name)
+        if columns is None or op.old_name not in columns:
+            return
+        column = columns.pop(op.old_name)
+        self._pin_index_name(op.table_name, column)
+        column.name = op.new_name
+        columns[op.new_name] = column
+        # 同时更新多列索引和关系中引用的列名
+        for idx in self._model.entities[entity_name].indexes:
+            idx.columns = [op.new_name if c == op.old_name else c for c in idx.columns]
+        foreign_keys = self._foreign_keys.get(entity_name, {})
+        rel = foreign_keys.pop(op.old_name, None)
+        if rel is not None:
+            self._pin_foreign_key_name(op.table_name, rel)
+            rel.left_column = op.new_name
+            foreign_keys[op.new_name] = rel
+        for rel in self._references.get(entity_name, {}).values():
+            if rel.right_column == op.old_name:
+                rel.right_column = op.new_name
+
+    # ============ 索引操作 ============
+
+    def _add_index(self, op) -> None:
+        # 单列索引记录在列标志上，多列索引记录在entity.indexes
+        entity_name = table_entity_name(op.table_name)
+        columns = self._columns.get(entity_name)
+        if columns is None:
+            return
+        if len(op.index.columns) == 1:
+            column = columns.get(op.index.columns[0])
+            if column is not None:
+                if op.index.unique:
+                    column.unique = True
+                else:
+                    column.indexed = True
+                # 不符合命名规则的索引名记录在列上，删除时使用
+                column.index_name = None
+                if op.index.name != self.converter.column_index_name(op.table_name, column, op.index.unique):
+                    column.index_name = op.index.name
+            return
+        entity = self._model.entities[entity_name]
+        if not any(idx.name == op.index.name for idx in entity.indexes):
+            entity.indexes.append(Index(name=op.index.name, columns=list(op.index.columns), unique=op.index.unique))
+
+    def _remove_index(self, op) -> None:
+        entity_name = table_entity_name(op.table_name)
+        columns = self._columns.get(entity_name)
+        if columns is None:
+            return
+        entity = self._model.entities[entity_name]
+        remaining = [idx for idx in entity.indexes if idx.name != op.index_name]
+        if len(remaining) != len(entity.indexes):
+            entity.indexes = remaining
+            return
+        # 单列索引：先按记录的实际名称，再按命名规则 idx_{table}_{column}[_unique] 反查列
+        for column in columns.values():
+            if column.index_name == op.index_name:
+                column.unique = column.indexed = False
+                column.index_name = None
+                return
+        prefix = f"idx_{op.table_name}_"
+        if not op.index_name.startswith(prefix):
+            return
+        column_name = op.index_name[len(prefix):]
+        if column_name in columns:
+            columns[column_name].indexed = False
+        elif column_name.endswith("_unique") and column_name[:-len("_unique")] in columns:
+            columns[column_name[:-len("_unique")]].unique = False
+
+    def _pin_index_name(self, table_name: str, column: Column) -> None:
+        """表或列重命名之前，把列上单列索引的名称固定为当前名称"""
+        if column.index_name is None and (column.indexed or (column.unique and not column.is_pk)):
+            column.index_name = self.converter.column_index_name(table_name, column,
+                                                                 unique=column.unique and not column.is_pk)
+
+    # ============ 外键操作 ============
+
+    def _add_foreign_key(self, op) -> None:
+        # 外键表示多对一关系，同一 (表, 列) 上已有的外键被替换
+        self._replace(Relationship(
+            left_entity=table_entity_name(op.table_name),
+            right_entity=table_entity_name(op.foreign_key.reference_table),
+            relation_type="many-to-one",
+            left_column=op.foreign_key.column_name,
+            right_column=op.foreign_key.reference_column,
+            on_delete=op.foreign_key.on_delete,
+            on_update=op.foreign_key.on_update
+        ))
+
+    def _remove_foreign_key(self, op) -> None:
+        rel = self._find_foreign_key(op.table_name, op.constraint_name)
+        if rel is not None:
+            self._unlink(rel)
+
+    def _alter_foreign_key(self, op) -> None:
+        rel = self._find_foreign_key(op.table_name, op.constraint_name)
+        if rel is None:
+            return
+        if op.new_on_delete is not None:
+            rel.on_delete = op.new_on_delete
+        if op.new_on_update is not None:
+            rel.on_update = op.new_on_update
+
+    # ============ 数据操作 ============
+
+    def _run_backfill(self, op) -> None:
+        # 只修改数据，表结构不变
+        pass
+
+    def _find_foreign_key(self, table_name: str, constraint_name: str) -> Optional[Relationship]:
+        """按记录的实际约束名，再按命名规则 fk_{table}_{column} 查找表上的外键"""
+        foreign_keys = self._foreign_keys.get(table_entity_name(table_name), {})
+        for rel in foreign_keys.values():
+            if rel.constraint_name == constraint_name:
+                return rel
+        prefix = self.converter.foreign_key_name(table_name, "")
+        if not constraint_name.startswith(prefix):
+            return None
+        rel = foreign_keys.get(constraint_name[len(prefix):])
+        return rel if rel is not None and rel.constraint_name is None else None
+
+    def _pin_foreign_key_name(self, table_name: str, rel: Relationship) -> None:
+        """表或列重命名之前，把外键的约束名固定为当前名称"""
+        if rel.constraint_name is None:
+            rel.constraint_name = self.converter.foreign_key_name(table_name, rel.left_column)
+
+    def _replace(self, rel: Relationship) -> None:
+        """添加外键，替换同一 (实体, 列) 上已有的外键"""
+        existing = self._foreign_keys.get(rel.left_entity, {}).get(rel.left_column)
+        if existing is not None:
+            self._unlink(existing)
+        self._link(rel)
+
+    def _link(self, rel: Relationship) -> None:
+        self._foreign_keys.setdefault(rel.left_entity, {})[rel.left_column] = rel
+        self._references.setdefault(rel.right_entity, {})[id(rel)] = rel
+        self._relationships[id(rel)] = rel
+        self._relationships_dirty = True
+
+    def _unlink(self, rel: Relationship) -> None:
+        del self._foreign_keys[rel.left_entity][rel.left_column]
+        del self._references[rel.right_entity][id(rel)]
+        del self._relationships[id(rel)]
+        self._relationships_dirty = True
@@ -193,6 +193,96 @@ def test_db_parser_with_tables(tmp_path):
     assert "users" in model.entities or "Users" in model.entities
     assert "posts" in model.entities or "Posts" in model.entities
 
+def test_db_parser_iter_entities(tmp_path):
+    """Test DB parser streams entities before relationships"""
+    import sqlite3
+    db_path = tmp_path / "test.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("CREATE TABLE posts (id INTEGER PRIMARY KEY, title TEXT, user_id INTEGER REFERENCES users(id))")
+    conn.execute("CREATE TABLE tags (id INTEGER PRIMARY KEY, label TEXT)")
+    conn.commit()
+    conn.close()
+
+    parser = DBParser()
+    items = list(parser.iter_entities(f"sqlite:///{db_path}", batch_size=2))
+
+    entities = [item for item in items if isinstance(item, Entity)]
+    relationships = [item for item in items if isinstance(item, Relationship)]
+    assert sorted(e.name for e in entities) == ["posts", "tags", "users"]
+    assert items[:3] == entities
+    assert len(relationships) == 1
+    assert relationships[0].left_entity == "users"
+    assert relationships[0].right_entity == "posts"
+    assert relationships[0].right_column == "user_id"
+
+    posts = next(e for e in entities if e.name == "posts")
+    assert next(c for c in posts.columns if c.name == "user_id").is_fk
+    assert next(c for c in posts.columns if c.name == "id").is_pk
+
+def test_db_parser_iter_entities_early_close(tmp_path):
+    """Test DB parser releases the engine when the stream is abandoned"""
+    import sqlite3
+    db_path = tmp_path / "test.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+    conn.execute("CREATE TABLE posts (id INTEGER PRIMARY KEY)")
+    conn.commit()
+    conn.close()
+
+    parser = DBParser()
+    stream = parser.iter_entities(f"sqlite:///{db_path}", batch_size=1)
+    first = next(stream)
+    assert isinstance(first, Entity)
+    assert parser._engine is not None
+    stream.close()
+    assert parser._engine is None
+
+def test_db_parser_reflects_indexes(tmp_path):
+    """Test DB parser reflects unique constraints and single/multi-column indexes"""
+    import sqlite3
+    db_path = tmp_path / "test.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR(100) UNIQUE, name TEXT, "
+        "a INTEGER, b INTEGER, c INTEGER, UNIQUE (a, b))"
+    )
+    conn.execute("CREATE INDEX ix_users_name ON users (name)")
+    conn.execute("CREATE INDEX ix_users_b_c ON users (b, c)")
+    conn.commit()
+    conn.close()
+
+    model = DBParser().parse(f"sqlite:///{db_path}")
+    users = model.entities["users"]
+    columns = {c.name: c for c in users.columns}
+    assert columns["email"].unique
+    assert columns["name"].indexed
+    # Column-level UNIQUE is backed by an auto index that has no droppable name
+    assert (columns["email"].index_name, columns["name"].index_name) == (None, "ix_users_name")
+    assert not columns["id"].unique and not columns["id"].indexed
+
+    composite = {(tuple(idx.columns), idx.unique): idx for idx in users.indexes}
+    assert set(composite) == {(("a", "b"), True), (("b", "c"), False)}
+    assert composite[(("b", "c"), False)].name == "ix_users_b_c"
+
+def test_db_parser_reflects_foreign_key_actions(tmp_path):
+    """Test DB parser reads ON DELETE/ON UPDATE; a missing action is the default NO ACTION"""
+    import sqlite3
+    db_path = tmp_path / "test.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+    conn.execute("CREATE TABLE teams (id INTEGER PRIMARY KEY)")
+    conn.execute(
+        "CREATE TABLE posts (id INTEGER PRIMARY KEY, author_id INTEGER, team_id INTEGER REFERENCES teams (id) "
+        "ON UPDATE CASCADE, FOREIGN KEY (author_id) REFERENCES users (id) ON DELETE SET NULL)"
+    )
+    conn.commit()
+    conn.close()
+
+    model = DBParser().parse(f"sqlite:///{db_path}")
+    actions = {rel.left_entity: (rel.on_delete, rel.on_update) for rel in model.relationships}
+    assert actions == {"users": ("SET NULL", "NO ACTION"), "teams": ("NO ACTION", "CASCADE")}
+
 def test_renderer_with_empty_model():
     """Test renderers handle empty models and output matches expected files."""
     model = ERModel()
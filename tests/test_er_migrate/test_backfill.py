@@ -0,0 +1,142 @@
+"""
+测试批量回填的进度报告、节流和断点续传
+"""
+import sqlite3
+import pytest
+import sqlalchemy as sa
+from click.testing import CliRunner
+from x007007007.er_migrate.backfill import BackfillRunner
+from x007007007.er_migrate.cli import cli
+from x007007007.er_migrate.executor import MigrationExecutor
+from x007007007.er_migrate.file_manager import FileManager
+from x007007007.er_migrate.models import Migration, CreateTable, RunBackfill, ColumnDefinition
+
+
+class Interrupted(Exception):
+    """模拟进程在某一批之后中断"""
+
+
+def _engine(tmp_path, rows=25):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE item (id INTEGER PRIMARY KEY, price INTEGER, touched INTEGER)")
+        for key in range(1, rows + 1):
+            connection.exec_driver_sql("INSERT INTO item VALUES (?, ?, 0)", (key, key))
+    return engine
+
+
+def _interrupt_after(chunks):
+    def progress(report):
+        if report.chunks == chunks:
+            raise Interrupted()
+    return progress
+
+
+def _touched(engine):
+    with engine.connect() as connection:
+        return [row[0] for row in connection.exec_driver_sql("SELECT touched FROM item ORDER BY id")]
+
+
+# 每批把touched加1：重复执行的批会让某些行大于1
+_TOUCH = RunBackfill(table_name="item", column_name="touched", expression="touched + 1", chunk_size=10)
+
+
+class TestProgress:
+    """测试进度报告和节流"""
+
+    def test_reports_each_chunk(self, tmp_path):
+        """测试每批完成后报告累计行数、批数和键上界"""
+        engine = _engine(tmp_path)
+        reports = []
+        assert BackfillRunner(engine).run(_TOUCH, progress=reports.append) == 3
+        assert [(r.chunks, r.rows, r.last_key, r.finished) for r in reports] == [
+            (1, 10, 10, False), (2, 20, 20, False), (3, 25, 20, True),
+        ]
+
+    def test_throttle_between_chunks(self, tmp_path, monkeypatch):
+        """测试每批之间暂停，最后一批之后不暂停"""
+        sleeps = []
+        monkeypatch.setattr("x007007007.er_migrate.backfill.time.sleep", sleeps.append)
+        BackfillRunner(_engine(tmp_path)).run(_TOUCH.model_copy(update={'throttle': 0.5}))
+        assert sleeps == [0.5, 0.5]
+
+    def test_throttle_validated(self):
+        """测试暂停时间不能为负数"""
+        with pytest.raises(ValueError):
+            RunBackfill(table_name="item", column_name="touched", expression="1", throttle=-1)
+
+
+class TestResume:
+    """测试断点续传"""
+
+    def test_resumes_after_interruption(self, tmp_path):
+        """测试中断后从最后提交的批继续，每行只更新一次"""
+        engine = _engine(tmp_path)
+        with pytest.raises(Interrupted):
+            BackfillRunner(engine).run(_TOUCH, job="shop.0002_fill:0", progress=_interrupt_after(2))
+        assert _touched(engine) == [1] * 20 + [0] * 5
+
+        reports = []
+        assert BackfillRunner(engine).run(_TOUCH, job="shop.0002_fill:0", progress=reports.append) == 1
+        assert _touched(engine) == [1] * 25
+        assert (reports[-1].chunks, reports[-1].rows, reports[-1].resumed_chunks) == (3, 25, 2)
+
+        # 已完成的任务直接跳过
+        assert BackfillRunner(engine).run(_TOUCH, job="shop.0002_fill:0") == 0
+        assert _touched(engine) == [1] * 25
+
+    def test_clear(self, tmp_path):
+        """测试删除进度记录后重新开始"""
+        engine = _engine(tmp_path)
+        runner = BackfillRunner(engine)
+        runner.run(_TOUCH, job="fill")
+        runner.clear(["fill"])
+        runner.run(_TOUCH, job="fill")
+        assert _touched(engine) == [2] * 25
+
+    def test_executor_resumes_and_cleans_up(self, tmp_path):
+        """测试apply中断后再次执行从断点继续，迁移记录后删除进度"""
+        migrations_dir = str(tmp_path / "migrations")
+        db_url = f"sqlite:///{tmp_path / 'app.db'}"
+        fm = FileManager(migrations_dir)
+        fm.save_migration(Migration(name="initial", namespace="shop", operations=[
+            CreateTable(table_name="item", columns=[
+                ColumnDefinition(name="id", type="int", primary_key=True, nullable=False),
+                ColumnDefinition(name="price", type="int"),
+                ColumnDefinition(name="touched", type="int"),
+            ]),
+        ]))
+        MigrationExecutor(db_url, migrations_dir).apply("shop")
+        connection = sqlite3.connect(tmp_path / "app.db")
+        connection.executemany("INSERT INTO item VALUES (?, ?, 0)", [(key, key) for key in range(1, 26)])
+        connection.commit()
+
+        fm.save_migration(Migration(name="fill", namespace="shop", dependencies=["shop.0001_initial"],
+                                    operations=[_TOUCH]))
+        with pytest.raises(Interrupted):
+            MigrationExecutor(db_url, migrations_dir).apply("shop", backfill_progress=_interrupt_after(1))
+        assert connection.execute("SELECT job, chunks FROM er_backfill_progress").fetchall() == \
+            [("shop.0002_fill:0", 1)]
+
+        results = MigrationExecutor(db_url, migrations_dir).apply("shop")
+        assert [(r.migration_id, r.statements) for r in results] == [("0002_fill", 2)]
+        assert [row[0] for row in connection.execute("SELECT touched FROM item")] == [1] * 25
+        assert connection.execute("SELECT COUNT(*) FROM er_backfill_progress").fetchone() == (0,)
+
+
+class TestApplyCli:
+    """测试apply命令的回填输出"""
+
+    def test_reports_backfill(self, tmp_path):
+        """测试输出回填的行数和批数"""
+        migrations_dir = str(tmp_path / "migrations")
+        engine = _engine(tmp_path)
+        engine.dispose()
+        fm = FileManager(migrations_dir)
+        fm.save_migration(Migration(name="fill", namespace="shop", operations=[_TOUCH]))
+
+        result = CliRunner().invoke(cli, ["apply", "-n", "shop", "--db", f"sqlite:///{tmp_path / 'app.db'}",
+                                          "-d", migrations_dir])
+        assert result.exit_code == 0, result.output
+        assert "Backfill item.touched: 25 rows in 3 chunks, done" in result.output
+        assert "Applied shop.0001_fill (3 statements" in result.output
@@ -0,0 +1,177 @@
+"""
+测试多命名空间批量生成迁移
+"""
+import pytest
+from click.testing import CliRunner
+from x007007007.er.models import ERModel, Entity, Column
+from x007007007.er_migrate.batch import BatchGenerator, NamespaceTask
+from x007007007.er_migrate.cli import cli
+from x007007007.er_migrate.file_manager import FileManager
+from x007007007.er_migrate.models import Migration, CreateTable, ColumnDefinition
+
+
+def _model(*tables):
+    model = ERModel()
+    for table in tables:
+        model.add_entity(Entity(name=table, columns=[
+            Column(name="id", type="uuid", is_pk=True),
+            Column(name="name", type="string"),
+        ]))
+    return model
+
+
+def _write_er(path, *tables):
+    body = "".join(f"    {table} {{\n        uuid id PK\n        string name\n    }}\n" for table in tables)
+    path.write_text(f"erDiagram\n{body}", encoding="utf-8")
+    return str(path)
+
+
+class TestBatchGenerator:
+    """测试批量生成器"""
+
+    @pytest.mark.parametrize("jobs", [0, 3])
+    def test_generates_each_namespace(self, tmp_path, jobs):
+        """测试串行和并行生成的结果一致，结果顺序与任务一致"""
+        tasks = [
+            NamespaceTask("auth", _model("User", "Group")),
+            NamespaceTask("blog", _write_er(tmp_path / "blog.mmd", "Post")),
+            NamespaceTask("shop", _model("Order"), name="orders"),
+        ]
+        finished = []
+        results = BatchGenerator(str(tmp_path / "migrations"), jobs=jobs).run(
+            tasks, progress=lambda result: finished.append(result.namespace)
+        )
+
+        assert [result.namespace for result in results] == ["auth", "blog", "shop"]
+        assert sorted(finished) == ["auth", "blog", "shop"]
+        assert [result.path.name for result in results] == [
+            "0001_initial.yaml", "0001_initial.yaml", "0001_orders.yaml"
+        ]
+        assert results[0].stats.tables_created == 2
+        assert all(result.error is None and result.duration > 0 for result in results)
+
+    def test_no_changes_and_no_save(self, tmp_path):
+        """测试没有变更时不保存，save=False时只生成"""
+        migrations_dir = str(tmp_path / "migrations")
+        batch = BatchGenerator(migrations_dir)
+        batch.run([NamespaceTask("auth", _model("User"))])
+
+        unchanged, preview = batch.run([
+            NamespaceTask("auth", _model("User")),
+            NamespaceTask("blog", _model("Post")),
+        ], save=False)
+        assert unchanged.migration is None and unchanged.path is None
+        assert preview.migration is not None and preview.path is None
+        assert FileManager(migrations_dir).list_migration_files("blog") == []
+
+    @pytest.mark.parametrize("jobs", [0, 2])
+    def test_preview_writes_nothing(self, tmp_path, jobs):
+        """测试save=False时迁移目录不变：不写快照、目录索引和已校验清单"""
+        migrations_dir = tmp_path / "migrations"
+        fm = FileManager(str(migrations_dir))
+        dependencies = []
+        for number in range(1, 52):
+            path = fm.save_migration(Migration(name=f"t{number}", namespace="auth", dependencies=dependencies,
+                                               operations=[CreateTable(table_name=f"t{number}", columns=[
+                                                   ColumnDefinition(name="id", type="int")])]))
+            dependencies = [f"auth.{path.stem}"]
+        (migrations_dir / "auth" / ".index.json").unlink()
+
+        def tree():
+            return {path: path.read_bytes() for path in migrations_dir.rglob("*") if path.is_file()}
+
+        before = tree()
+        result, = BatchGenerator(str(migrations_dir), jobs=jobs).run([NamespaceTask("auth", _model("User"))],
+                                                                      save=False)
+        assert result.error is None and result.migration is not None
+        assert tree() == before
+
+    def test_failure_isolated(self, tmp_path):
+        """测试一个命名空间失败不影响其他命名空间"""
+        migrations_dir = str(tmp_path / "migrations")
+        fm = FileManager(migrations_dir)
+        for name, dependencies in [("initial", []), ("a", ["blog.0001_initial"]), ("b", ["blog.0001_initial"])]:
+            fm.save_migration(Migration(name=name, namespace="blog", dependencies=dependencies, operations=[
+                CreateTable(table_name=name, columns=[ColumnDefinition(name="id", type="int")])
+            ]))
+
+        results = BatchGenerator(migrations_dir, jobs=2).run([
+            NamespaceTask("blog", _model("Post")),
+            NamespaceTask("auth", _model("User")),
+            NamespaceTask("shop", str(tmp_path / "missing.mmd")),
+        ])
+        assert "Conflicting migrations in 'blog'" in results[0].error
+        assert results[1].path.name == "0001_initial.yaml"
+        assert results[2].error is not None
+
+    def test_duplicate_namespace_rejected(self, tmp_path):
+        """测试同一个命名空间不能出现两次"""
+        with pytest.raises(AssertionError):
+            BatchGenerator(str(tmp_path)).run([NamespaceTask("a", _model("User")), NamespaceTask("a", _model("Post"))])
+
+    def test_interactive_requires_serial(self, tmp_path):
+        """测试确认回调只能用于串行生成"""
+        with pytest.raises(AssertionError):
+            BatchGenerator(str(tmp_path), jobs=2, confirm_rename=lambda *args: True)
+
+
+class TestMultiNamespaceCli:
+    """测试makemigrations的多命名空间模式"""
+
+    def test_parallel_summary(self, tmp_path):
+        """测试并行生成多个命名空间并输出汇总"""
+        auth = _write_er(tmp_path / "auth.mmd", "User")
+        blog = _write_er(tmp_path / "blog.mmd", "Post")
+        migrations_dir = str(tmp_path / "migrations")
+        args = ['makemigrations', '-n', 'auth', '-e', auth, '-n', 'blog', '-e', blog, '-d', migrations_dir, '-j', '2']
+
+        result = CliRunner().invoke(cli, args)
+        assert result.exit_code == 0, result.output
+        assert "Summary" in result.output
+        assert "auth: 0001_initial.yaml (1 operations)" in result.output
+        assert "blog: 0001_initial.yaml (1 operations)" in result.output
+
+        result = CliRunner().invoke(cli, args)
+        assert result.exit_code == 0
+        assert "auth: no changes" in result.output
+
+    def test_summary_lists_renames(self, tmp_path):
+        """测试汇总中列出各命名空间检测到的列重命名"""
+        auth = _write_er(tmp_path / "auth.mmd", "User")
+        blog = _write_er(tmp_path / "blog.mmd", "Post")
+        migrations_dir = str(tmp_path / "migrations")
+        args = ['makemigrations', '-n', 'auth', '-e', auth, '-n', 'blog', '-e', blog, '-d', migrations_dir, '-j', '2']
+        assert CliRunner().invoke(cli, args).exit_code == 0
+
+        (tmp_path / "blog.mmd").write_text(
+            "erDiagram\n    Post {\n        uuid id PK\n        string full_name\n    }\n", encoding="utf-8")
+        result = CliRunner().invoke(cli, args)
+        assert result.exit_code == 0, result.output
+        summary = result.output.split("Summary")[1]
+        assert "blog: 0002_" in summary
+        assert "Possible column rename: post.name -> post.full_name" in summary
+
+    def test_unpaired_options(self, tmp_path):
+        """测试-n和-e数量不一致时报错"""
+        er_file = _write_er(tmp_path / "auth.mmd", "User")
+        result = CliRunner().invoke(cli, ['makemigrations', '-n', 'auth', '-n', 'blog', '-e', er_file,
+                                          '-d', str(tmp_path / "migrations")])
+        assert result.exit_code != 0
+        assert "same number of times" in result.output
+
+    def test_failed_namespace_exit_code(self, tmp_path):
+        """测试有命名空间失败时退出码非0，其他命名空间照常保存"""
+        good = _write_er(tmp_path / "auth.mmd", "User")
+        blog = _write_er(tmp_path / "blog.mmd", "Post")
+        migrations_dir = tmp_path / "migrations"
+        fm = FileManager(str(migrations_dir))
+        for name in ("a", "b"):
+            fm.save_migration(Migration(name=name, namespace="blog", operations=[
+                CreateTable(table_name=name, columns=[ColumnDefinition(name="id", type="int")])
+            ]))
+
+        result = CliRunner().invoke(cli, ['makemigrations', '-n', 'auth', '-e', good, '-n', 'blog', '-e', blog,
+                                          '-d', str(migrations_dir)])
+        assert result.exit_code != 0
+        assert "blog: failed" in result.output
+        assert (migrations_dir / "auth" / "0001_initial.yaml").exists()
@@ -76,6 +76,7 @@ erDiagram
         
         assert result2.exit_code == 0
         assert "No changes detected" in result2.output
+        assert "0 inspected" in result2.output
     
     def test_makemigrations_missing_file(self, tmp_path):
         """测试ER文件不存在时的错误处理"""
@@ -203,6 +204,100 @@ erDiagram
         assert "auth" in result.output
 
 
+class TestColumnRenameOptions:
+    """测试makemigrations的列重命名选项"""
+    
+    def _run(self, tmp_path, column_name, *options, input=None):
+        er_file = tmp_path / "schema.mmd"
+        er_file.write_text(f"""
+erDiagram
+    User {{
+        uuid id PK
+        string {column_name}
+    }}
+""")
+        return CliRunner().invoke(cli, [
+            'makemigrations', '-n', 'blog', '-e', str(er_file), '-d', str(tmp_path / ".migrations"), *options
+        ], input=input)
+    
+    def test_detected_rename_is_flagged(self, tmp_path):
+        """测试未确认的重命名在输出中标出，仍生成删除+新增"""
+        self._run(tmp_path, "mail")
+        result = self._run(tmp_path, "email")
+        
+        assert result.exit_code == 0
+        assert "Possible column rename: user.mail -> user.email" in result.output
+        content = (tmp_path / ".migrations" / "blog").glob("0002_*.yaml")
+        assert "RenameColumn" not in next(content).read_text()
+    
+    def test_rename_columns(self, tmp_path):
+        """测试--rename-columns接受检测到的重命名"""
+        self._run(tmp_path, "mail")
+        result = self._run(tmp_path, "email", "--rename-columns")
+        
+        assert result.exit_code == 0
+        assert "Detected column rename: user.mail -> user.email" in result.output
+        assert "0002_rename_mail_email.yaml" in result.output
+    
+    def test_interactive_reject(self, tmp_path):
+        """测试交互模式下拒绝重命名"""
+        self._run(tmp_path, "mail")
+        result = self._run(tmp_path, "email", "--interactive", input="n\n")
+        
+        assert result.exit_code == 0
+        assert "Was user.mail -> user.email" in result.output
+        content = (tmp_path / ".migrations" / "blog").glob("0002_*.yaml")
+        assert "RenameColumn" not in next(content).read_text()
+    
+    def test_no_rename_columns(self, tmp_path):
+        """测试关闭列重命名检测"""
+        self._run(tmp_path, "mail")
+        result = self._run(tmp_path, "email", "--no-rename-columns")
+        
+        assert result.exit_code == 0
+        assert "column rename" not in result.output
+
+
+class TestConvertFormatCommand:
+    """测试convert-format命令"""
+    
+    def test_convert_to_json_and_makemigrations(self, tmp_path):
+        """测试转换为JSON后新迁移也使用JSON格式"""
+        er_file = tmp_path / "schema.mmd"
+        er_file.write_text("""
+erDiagram
+    User {
+        uuid id PK
+        string username
+    }
+""")
+        migrations_dir = tmp_path / ".migrations"
+        runner = CliRunner()
+        runner.invoke(cli, ['makemigrations', '-n', 'blog', '-e', str(er_file), '-d', str(migrations_dir)])
+        
+        result = runner.invoke(cli, ['convert-format', '-n', 'blog', '--to', 'json', '-d', str(migrations_dir)])
+        assert result.exit_code == 0
+        assert "0001_initial.yaml -> 0001_initial.json" in result.output
+        
+        er_file.write_text("""
+erDiagram
+    User {
+        uuid id PK
+        string username
+    }
+    Post {
+        uuid id PK
+    }
+""")
+        result = runner.invoke(cli, ['makemigrations', '-n', 'blog', '-e', str(er_file), '-d', str(migrations_dir)])
+        assert result.exit_code == 0
+        assert "0002_create_post.json" in result.output
+        
+        result = runner.invoke(cli, ['showmigrations', '-n', 'blog', '-d', str(migrations_dir)])
+        assert "0001_initial" in result.output
+        assert "0002_create_post" in result.output
+
+
 class TestVersionCommand:
     """测试version命令"""
     
@@ -235,3 +330,43 @@ class TestHelpCommand:
         assert result.exit_code == 0
         assert "namespace" in result.output.lower()
         assert "er-file" in result.output.lower()
+
+
+class TestSqlCommand:
+    """测试sql命令"""
+    
+    def test_sql_for_second_migration(self, tmp_path):
+        """测试输出第二个迁移的SQL，使用之前的状态"""
+        er_file = tmp_path / "schema.mmd"
+        migrations_dir = tmp_path / ".migrations"
+        runner = CliRunner()
+        er_file.write_text("""
+erDiagram
+    User {
+        uuid id PK
+        string name
+    }
+""")
+        runner.invoke(cli, ['makemigrations', '-n', 'blog', '-e', str(er_file), '-d', str(migrations_dir)])
+        er_file.write_text("""
+erDiagram
+    User {
+        uuid id PK
+        string name
+        int age
+    }
+""")
+        runner.invoke(cli, ['makemigrations', '-n', 'blog', '-e', str(er_file), '-d', str(migrations_dir)])
+        
+        result = runner.invoke(cli, ['sql', '0002', '-n', 'blog', '--dialect', 'sqlite', '-d', str(migrations_dir)])
+        assert result.exit_code == 0
+        assert result.output.strip() == 'ALTER TABLE user ADD COLUMN age INTEGER;'
+        
+        result = runner.invoke(cli, ['sql', '0001_initial', '-n', 'blog', '-d', str(migrations_dir)])
+        assert result.exit_code == 0
+        assert 'CREATE TABLE "user"' in result.output
+    
+    def test_sql_unknown_migration(self, tmp_path):
+        """测试迁移不存在时报错"""
+        result = CliRunner().invoke(cli, ['sql', '0009', '-n', 'blog', '-d', str(tmp_path)])
+        assert result.exit_code != 0
@@ -0,0 +1,253 @@
+"""
+测试迁移代价估算和plan命令
+"""
+import json
+import pytest
+import sqlalchemy as sa
+from click.testing import CliRunner
+from x007007007.er_migrate.cli import cli
+from x007007007.er_migrate.cost import (
+    CostEstimator,
+    load_row_counts,
+    INSTANT,
+    INDEX_BUILD,
+    REWRITE,
+    LOCK_HEAVY,
+)
+from x007007007.er_migrate.file_manager import FileManager
+from x007007007.er_migrate.models import (
+    Migration,
+    CreateTable,
+    RenameTable,
+    AddColumn,
+    RemoveColumn,
+    AlterColumn,
+    AddIndex,
+    AddForeignKey,
+    ColumnDefinition,
+    IndexDefinition,
+    ForeignKeyDefinition,
+)
+from x007007007.er_migrate.state import SchemaState
+
+
+def _create_order():
+    return CreateTable(table_name="order", columns=[
+        ColumnDefinition(name="id", type="uuid", primary_key=True, nullable=False),
+        ColumnDefinition(name="code", type="string", max_length=20),
+        ColumnDefinition(name="note", type="string", max_length=100),
+        ColumnDefinition(name="total", type="decimal", precision=10, scale=2),
+        ColumnDefinition(name="user_id", type="uuid"),
+    ])
+
+
+def _migration(name, *operations):
+    return Migration(name=name, namespace="shop", operations=list(operations))
+
+
+def _order_state():
+    """已有order表的状态"""
+    return SchemaState().apply_all([_create_order()]).to_er_model()
+
+
+def _estimate(dialect, *operations, rows=None):
+    """估算已有order表上的一个迁移"""
+    estimator = CostEstimator(dialect, rows if rows is not None else {"order": 1000})
+    return estimator.estimate([("0002_change", _migration("change", *operations))], _order_state())[0]
+
+
+def _categories(result):
+    return [item.category for item in result.operations]
+
+
+class TestClassification:
+    """测试按方言分类"""
+
+    def test_postgresql(self):
+        """测试PostgreSQL：加长和加可空列是instant，类型变化和外键校验是lock-heavy"""
+        result = CostEstimator("postgresql", {"order": 1000}).estimate([("0001_change", _migration(
+            "change",
+            AddColumn(table_name="order", column=ColumnDefinition(name="paid", type="bool", default=False)),
+            AlterColumn(table_name="order", column_name="code", new_max_length=40),
+            AlterColumn(table_name="order", column_name="total", new_type="bigint"),
+            AddIndex(table_name="order", index=IndexDefinition(name="idx_order_code", columns=["code"])),
+            AddForeignKey(table_name="order", foreign_key=ForeignKeyDefinition(
+                column_name="user_id", reference_table="user", reference_column="id")),
+        ))], state=None)[0]
+        # 没有原结构时无法判断是否只是加长
+        assert _categories(result) == [INSTANT, LOCK_HEAVY, LOCK_HEAVY, INDEX_BUILD, LOCK_HEAVY]
+
+        result = _estimate(
+            "postgresql",
+            AlterColumn(table_name="order", column_name="code", new_max_length=40),
+            AlterColumn(table_name="order", column_name="note", new_type="text"),
+            AlterColumn(table_name="order", column_name="total", new_precision=12),
+            AlterColumn(table_name="order", column_name="code", new_nullable=False),
+            rows={},
+        )
+        assert _categories(result) == [INSTANT, INSTANT, INSTANT, LOCK_HEAVY]
+
+    @pytest.mark.parametrize("default, category", [
+        ("now()", INSTANT),
+        ("CURRENT_TIMESTAMP(3)", INSTANT),
+        ("pg_catalog.now()", INSTANT),
+        ("random()", LOCK_HEAVY),
+        ("gen_random_uuid()", LOCK_HEAVY),
+        ("clock_timestamp()", LOCK_HEAVY),
+    ])
+    def test_postgresql_volatile_default(self, default, category):
+        """测试PostgreSQL：STABLE函数默认值存为快速默认值，VOLATILE函数默认值重写表"""
+        result = _estimate(
+            "postgresql",
+            AddColumn(table_name="order", column=ColumnDefinition(name="created", type="datetime", default=default)),
+            AddColumn(table_name="order", column=ColumnDefinition(name="paid", type="bool")),
+            rows={"order": 5_000_000},
+        )
+        assert _categories(result) == [category, INSTANT]
+        # 大表上只有instant操作时不建议拆分
+        assert (result.split_reason is None) == (category == INSTANT)
+
+    def test_mysql(self):
+        """测试MySQL：加列instant，删列原地重建，超过长度前缀的加长需要复制表"""
+        result = _estimate(
+            "mysql",
+            AddColumn(table_name="order", column=ColumnDefinition(name="paid", type="bool")),
+            RemoveColumn(table_name="order", column_name="note"),
+            AlterColumn(table_name="order", column_name="code", new_max_length=40),
+            AlterColumn(table_name="order", column_name="code", new_max_length=200),
+        )
+        assert _categories(result) == [INSTANT, REWRITE, INSTANT, LOCK_HEAVY]
+
+    def test_mariadb_uses_mysql_rules(self):
+        """测试MariaDB使用MySQL的规则，不支持的方言报错"""
+        assert CostEstimator("mariadb").dialect == "mysql"
+        with pytest.raises(ValueError, match="No cost rules for dialect 'oracle'"):
+            CostEstimator("oracle")
+
+    def test_sqlite_rebuild_counted_once(self):
+        """测试SQLite同一张表的多个变更合并为一次重建，只计一次代价"""
+        result = _estimate(
+            "sqlite",
+            RemoveColumn(table_name="order", column_name="note"),
+            AlterColumn(table_name="order", column_name="total", new_type="bigint"),
+            AddIndex(table_name="order", index=IndexDefinition(name="idx_order_code", columns=["code"])),
+        )
+        assert _categories(result) == [REWRITE, REWRITE, REWRITE]
+        assert [item.cost for item in result.operations] == [2000, 0, 0]
+
+
+class TestCost:
+    """测试代价和拆分建议"""
+
+    def test_merged_alter_charged_once(self):
+        """测试同一张表相邻的变更合并为一条ALTER TABLE，只计一次表复制"""
+        result = _estimate(
+            "postgresql",
+            AlterColumn(table_name="order", column_name="total", new_type="bigint"),
+            AlterColumn(table_name="order", column_name="code", new_type="int"),
+            AddIndex(table_name="order", index=IndexDefinition(name="idx_order_code", columns=["code"])),
+            AlterColumn(table_name="order", column_name="note", new_type="int"),
+        )
+        assert [item.cost for item in result.operations] == [3000, 0, 1000, 3000]
+        assert result.total == 7000
+
+    def test_new_and_renamed_tables(self):
+        """测试计划中新建的表行数为0，重命名后的表使用原表名的行数"""
+        results = CostEstimator("postgresql", {"order": 500}).estimate([
+            ("0002_rename", _migration("rename", RenameTable(old_name="order", new_name="purchase"))),
+            ("0003_index", _migration("index", AddIndex(
+                table_name="purchase", index=IndexDefinition(name="idx_purchase_code", columns=["code"])))),
+        ], _order_state())
+        assert results[1].operations[0].rows == 500
+
+        result = _estimate("postgresql", AddIndex(
+            table_name="order", index=IndexDefinition(name="idx_order_code", columns=["code"])))
+        new_table = CostEstimator("postgresql", {"order": 1000}).estimate([
+            ("0001_initial", _migration("initial", _create_order(), AddIndex(
+                table_name="order", index=IndexDefinition(name="idx_order_code", columns=["code"])))),
+        ], state=None)[0]
+        assert result.operations[0].cost == 1000
+        assert new_table.operations[1].rows == 0 and new_table.total == 0
+        # 新建表本身同样是0行、instant，而不是行数未知
+        create = new_table.operations[0]
+        assert (create.rows, create.category, create.cost) == (0, INSTANT, 0)
+
+    def test_unknown_rows(self):
+        """测试没有行数的表代价为0，行数显示为未知"""
+        result = _estimate("postgresql", AlterColumn(table_name="order", column_name="total", new_type="int"),
+                           rows={})
+        assert result.operations[0].rows is None and result.total == 0
+
+    def test_split_reason(self):
+        """测试大表上的慢操作与其他操作在同一个迁移中时建议拆分"""
+        estimator = CostEstimator("postgresql", {"order": 5_000_000}, large_table_rows=1_000_000)
+        alter = AlterColumn(table_name="order", column_name="total", new_type="bigint")
+        add = AddColumn(table_name="order", column=ColumnDefinition(name="paid", type="bool"))
+
+        mixed, alone = estimator.estimate([
+            ("0002_mixed", _migration("mixed", alter, add)), ("0003_alone", _migration("alone", alter)),
+        ], _order_state())
+        assert mixed.split_reason == "1 slow operations on large tables (order) among 2 operations"
+        assert alone.split_reason is None
+
+
+class TestRowCounts:
+    """测试读取行数"""
+
+    def test_json(self, tmp_path):
+        """测试读取JSON统计文件，格式错误时报错"""
+        path = tmp_path / "stats.json"
+        path.write_text(json.dumps({"order": 12, "user": 3}), encoding="utf-8")
+        assert load_row_counts(str(path)) == {"order": 12, "user": 3}
+
+        path.write_text(json.dumps({"order": "many"}), encoding="utf-8")
+        with pytest.raises(ValueError, match="non-negative integers"):
+            load_row_counts(str(path))
+        with pytest.raises(ValueError, match="not found"):
+            load_row_counts(str(tmp_path / "missing.json"))
+
+    def test_sqlite(self, tmp_path):
+        """测试统计SQLite数据库中各表的行数"""
+        path = tmp_path / "app.db"
+        engine = sa.create_engine(f"sqlite:///{path}")
+        with engine.begin() as connection:
+            connection.exec_driver_sql('CREATE TABLE "order" (id INTEGER)')
+            connection.exec_driver_sql('INSERT INTO "order" VALUES (1), (2), (3)')
+            connection.exec_driver_sql('CREATE TABLE user (id INTEGER)')
+        engine.dispose()
+        assert load_row_counts(str(path)) == {"order": 3, "user": 0}
+
+
+class TestPlanCli:
+    """测试plan命令"""
+
+    def test_report_sorted_by_cost(self, tmp_path):
+        """测试按代价排序输出操作，并给出拆分建议"""
+        fm = FileManager(str(tmp_path / "migrations"))
+        fm.save_migration(_migration("initial", _create_order()))
+        fm.save_migration(Migration(name="change", namespace="shop", dependencies=["shop.0001_initial"], operations=[
+            AddIndex(table_name="order", index=IndexDefinition(name="idx_order_code", columns=["code"])),
+            AlterColumn(table_name="order", column_name="total", new_type="bigint"),
+        ]))
+        stats = tmp_path / "stats.json"
+        stats.write_text(json.dumps({"order": 2_000_000}), encoding="utf-8")
+
+        result = CliRunner().invoke(cli, ["plan", "-n", "shop", "--from", "0002", "--rows", str(stats),
+                                          "-d", str(tmp_path / "migrations")])
+        assert result.exit_code == 0, result.output
+        lines = result.output.splitlines()
+        alter = next(i for i, line in enumerate(lines) if "AlterColumn order.total" in line)
+        index = next(i for i, line in enumerate(lines) if "AddIndex order (idx_order_code)" in line)
+        assert alter < index
+        assert "6,000,000" in lines[alter] and "lock-heavy" in lines[alter]
+        assert "0002_change: total 8,000,000" in result.output
+        assert "Consider splitting" in result.output
+        assert "0001_initial" not in result.output
+
+    def test_unsupported_dialect(self, tmp_path):
+        """测试不支持的方言报错"""
+        fm = FileManager(str(tmp_path))
+        fm.save_migration(_migration("initial", _create_order()))
+        result = CliRunner().invoke(cli, ["plan", "-n", "shop", "--dialect", "oracle", "-d", str(tmp_path)])
+        assert result.exit_code != 0
+        assert "No cost rules for dialect" in result.output
@@ -0,0 +1,267 @@
+"""
+测试DDL编译器
+"""
+import sqlite3
+import pytest
+from x007007007.er.models import ERModel, Entity, Column, Relationship
+from x007007007.er_migrate.ddl import DDLCompiler
+from x007007007.er_migrate.models import (
+    CreateTable,
+    DropTable,
+    RenameTable,
+    AddColumn,
+    RemoveColumn,
+    AlterColumn,
+    RenameColumn,
+    AddIndex,
+    RemoveIndex,
+    AddForeignKey,
+    RemoveForeignKey,
+    AlterForeignKey,
+    ColumnDefinition,
+    IndexDefinition,
+    ForeignKeyDefinition,
+)
+
+
+def _create_tables():
+    return [
+        CreateTable(table_name="author", columns=[
+            ColumnDefinition(name="id", type="int", primary_key=True, nullable=False),
+            ColumnDefinition(name="name", type="string", max_length=50, default="anonymous"),
+        ]),
+        CreateTable(table_name="post", columns=[
+            ColumnDefinition(name="id", type="int", primary_key=True, nullable=False),
+            ColumnDefinition(name="author_id", type="int"),
+            ColumnDefinition(name="price", type="decimal", precision=10, scale=2, default=0),
+        ]),
+        AddIndex(table_name="post", index=IndexDefinition(name="idx_post_author_id", columns=["author_id"])),
+        AddForeignKey(table_name="post", foreign_key=ForeignKeyDefinition(
+            column_name="author_id", reference_table="author", reference_column="id", on_delete="SET NULL"
+        )),
+    ]
+
+
+def _state():
+    """_create_tables执行之后的状态"""
+    model = ERModel()
+    model.add_entity(Entity(name="Author", columns=[
+        Column(name="id", type="int", is_pk=True, nullable=False),
+        Column(name="name", type="string", max_length=50, default="anonymous"),
+    ]))
+    model.add_entity(Entity(name="Post", columns=[
+        Column(name="id", type="int", is_pk=True, nullable=False),
+        Column(name="author_id", type="int"),
+    ]))
+    model.add_relationship(Relationship(
+        left_entity="Post", right_entity="Author", relation_type="many-to-one",
+        left_column="author_id", right_column="id", on_delete="SET NULL"
+    ))
+    return model
+
+
+class TestCreate:
+    """测试建表和索引"""
+
+    def test_create_table_postgresql(self):
+        """测试类型、默认值和外键约束"""
+        statements = DDLCompiler('postgresql').compile(_create_tables())
+
+        assert len(statements) == 4
+        assert "name VARCHAR(50) DEFAULT 'anonymous'" in statements[0]
+        assert "price NUMERIC(10, 2) DEFAULT 0" in statements[1]
+        assert statements[2] == "CREATE INDEX idx_post_author_id ON post (author_id)"
+        assert statements[3] == (
+            "ALTER TABLE post ADD CONSTRAINT fk_post_author_id FOREIGN KEY(author_id) "
+            "REFERENCES author (id) ON DELETE SET NULL ON UPDATE CASCADE"
+        )
+
+    def test_sqlite_inlines_foreign_keys_of_new_tables(self):
+        """测试SQLite把新建表的外键写进CREATE TABLE，语句可以直接执行"""
+        statements = DDLCompiler('sqlite').compile(_create_tables())
+
+        assert len(statements) == 3
+        assert "CONSTRAINT fk_post_author_id FOREIGN KEY(author_id) REFERENCES author (id)" in statements[1]
+        connection = sqlite3.connect(":memory:")
+        for statement in statements:
+            connection.execute(statement)
+        assert connection.execute("PRAGMA foreign_key_list(post)").fetchone()[2] == "author"
+
+    def test_unknown_type_passed_through(self):
+        """测试未知类型按原样输出"""
+        statements = DDLCompiler('postgresql').compile([CreateTable(table_name="t", columns=[
+            ColumnDefinition(name="tags", type="text[]"),
+            ColumnDefinition(name="created", type="datetime", default="CURRENT_TIMESTAMP"),
+        ])])
+        assert "tags text[]" in statements[0]
+        assert "DEFAULT CURRENT_TIMESTAMP" in statements[0]
+
+
+class TestAlterMerge:
+    """测试同一张表的变更合并为一条ALTER TABLE"""
+
+    def _operations(self):
+        return [
+            AddColumn(table_name="author", column=ColumnDefinition(name="age", type="int", nullable=False, default=0)),
+            AlterColumn(table_name="author", column_name="name", new_max_length=80, new_nullable=False),
+            RemoveColumn(table_name="author", column_name="bio"),
+            AddColumn(table_name="post", column=ColumnDefinition(name="title", type="string")),
+        ]
+
+    def test_postgresql_merges_clauses(self):
+        """测试PostgreSQL每张表一条ALTER TABLE"""
+        statements = DDLCompiler('postgresql').compile(self._operations(), _state())
+        assert statements == [
+            "ALTER TABLE author ADD COLUMN age INTEGER DEFAULT 0 NOT NULL, "
+            "ALTER COLUMN name TYPE VARCHAR(80), ALTER COLUMN name SET NOT NULL, DROP COLUMN bio",
+            "ALTER TABLE post ADD COLUMN title VARCHAR(255)",
+        ]
+
+    def test_mysql_modify_uses_full_definition(self):
+        """测试MySQL用完整列定义MODIFY COLUMN"""
+        statements = DDLCompiler('mysql').compile(self._operations(), _state())
+        assert len(statements) == 2
+        assert "MODIFY COLUMN name VARCHAR(80) NOT NULL DEFAULT 'anonymous'" in statements[0]
+
+    def test_mysql_modify_requires_state(self):
+        """测试MySQL没有原列定义时报错"""
+        with pytest.raises(ValueError):
+            DDLCompiler('mysql').compile(self._operations())
+
+    def test_postgresql_length_change_requires_state(self):
+        """测试PostgreSQL没有状态时只改长度或精度报错，给出新类型时可以修改"""
+        with pytest.raises(ValueError, match="pass state"):
+            DDLCompiler('postgresql').compile([AlterColumn(table_name="post", column_name="price", new_precision=12)])
+        statements = DDLCompiler('postgresql').compile([
+            AlterColumn(table_name="post", column_name="price", new_type="decimal", new_precision=12, new_scale=2),
+        ])
+        assert statements == ["ALTER TABLE post ALTER COLUMN price TYPE NUMERIC(12, 2)"]
+
+    def test_sqlite_one_clause_per_statement(self):
+        """测试SQLite每个子句一条语句"""
+        statements = DDLCompiler('sqlite').compile([
+            AddColumn(table_name="author", column=ColumnDefinition(name="age", type="int")),
+            AddColumn(table_name="author", column=ColumnDefinition(name="bio", type="text")),
+        ])
+        assert statements == [
+            "ALTER TABLE author ADD COLUMN age INTEGER",
+            "ALTER TABLE author ADD COLUMN bio TEXT",
+        ]
+
+    def test_sqlite_alter_requires_state(self):
+        """测试SQLite没有状态时不能修改列"""
+        with pytest.raises(ValueError):
+            DDLCompiler('sqlite').compile(self._operations())
+
+    def test_non_adjacent_operations_not_merged(self):
+        """测试中间隔着其他语句时不合并，保持原有顺序"""
+        statements = DDLCompiler('postgresql').compile([
+            AddColumn(table_name="author", column=ColumnDefinition(name="a", type="int")),
+            RenameColumn(table_name="author", old_name="name", new_name="full_name"),
+            AddColumn(table_name="author", column=ColumnDefinition(name="b", type="int")),
+        ])
+        assert len(statements) == 3
+        assert statements[1] == "ALTER TABLE author RENAME COLUMN name TO full_name"
+
+
+class TestForeignKeys:
+    """测试外键语句"""
+
+    def test_alter_foreign_key_recreates_constraint(self):
+        """测试修改引用动作时删除并重建约束"""
+        op = AlterForeignKey(table_name="post", constraint_name="fk_post_author_id", new_on_delete="CASCADE")
+
+        assert DDLCompiler('postgresql').compile([op], _state()) == [
+            "ALTER TABLE post DROP CONSTRAINT fk_post_author_id, ADD CONSTRAINT fk_post_author_id "
+            "FOREIGN KEY(author_id) REFERENCES author (id) ON DELETE CASCADE ON UPDATE CASCADE"
+        ]
+        assert DDLCompiler('mysql').compile([op], _state())[0].startswith(
+            "ALTER TABLE post DROP FOREIGN KEY fk_post_author_id, ADD CONSTRAINT"
+        )
+
+    def test_renamed_table_keeps_constraint_name(self):
+        """测试表重命名后按原约束名删除并重建外键"""
+        statements = DDLCompiler('postgresql').compile([
+            RenameTable(old_name="post", new_name="article"),
+            AlterForeignKey(table_name="article", constraint_name="fk_post_author_id", new_on_delete="CASCADE"),
+            RemoveForeignKey(table_name="article", constraint_name="fk_post_author_id"),
+        ], _state())
+        assert statements == [
+            "ALTER TABLE post RENAME TO article",
+            "ALTER TABLE article DROP CONSTRAINT fk_post_author_id, ADD CONSTRAINT fk_post_author_id "
+            "FOREIGN KEY(author_id) REFERENCES author (id) ON DELETE CASCADE ON UPDATE CASCADE, "
+            "DROP CONSTRAINT fk_post_author_id",
+        ]
+
+    def test_alter_unknown_foreign_key(self):
+        """测试修改不存在的外键时报错"""
+        with pytest.raises(ValueError):
+            DDLCompiler('postgresql').compile([
+                AlterForeignKey(table_name="post", constraint_name="fk_post_author_id", new_on_delete="CASCADE")
+            ])
+
+    def test_remove_foreign_key_and_table_statements(self):
+        """测试删除外键、索引、重命名和删除表"""
+        statements = DDLCompiler('mysql').compile([
+            RemoveForeignKey(table_name="post", constraint_name="fk_post_author_id"),
+            RemoveIndex(table_name="post", index_name="idx_post_author_id"),
+            RenameTable(old_name="post", new_name="article"),
+            DropTable(table_name="article"),
+        ], _state())
+        assert statements == [
+            "ALTER TABLE post DROP FOREIGN KEY fk_post_author_id",
+            "DROP INDEX idx_post_author_id ON post",
+            "ALTER TABLE post RENAME TO article",
+            "DROP TABLE article",
+        ]
+
+
+class TestSqliteRebuild:
+    """测试SQLite批处理重建表"""
+
+    def _database(self):
+        connection = sqlite3.connect(":memory:")
+        for statement in DDLCompiler('sqlite').compile(_create_tables()):
+            connection.execute(statement)
+        connection.execute("INSERT INTO author (id, name) VALUES (1, 'ann')")
+        connection.execute("INSERT INTO post (id, author_id, price) VALUES (10, 1, 2.5)")
+        return connection
+
+    def test_many_column_changes_single_copy(self):
+        """测试同一张表的多个列变更合并为一次重建，数据保留"""
+        state = _state()
+        state.entities["Post"].columns.append(Column(name="price", type="decimal", precision=10, scale=2))
+        state.entities["Post"].columns[1].indexed = True
+        operations = [
+            RemoveIndex(table_name="post", index_name="idx_post_author_id"),
+            RenameColumn(table_name="post", old_name="author_id", new_name="writer_id"),
+            RemoveColumn(table_name="post", column_name="price"),
+            AddColumn(table_name="post", column=ColumnDefinition(name="title", type="string", default="untitled")),
+            AlterColumn(table_name="post", column_name="writer_id", new_nullable=False),
+            AddIndex(table_name="post", index=IndexDefinition(name="idx_post_writer_id", columns=["writer_id"])),
+            RemoveForeignKey(table_name="post", constraint_name="fk_post_author_id"),
+            AddForeignKey(table_name="post", foreign_key=ForeignKeyDefinition(
+                column_name="writer_id", reference_table="author", reference_column="id"
+            )),
+        ]
+        statements = DDLCompiler('sqlite').compile(operations, state)
+
+        assert [s.split(" ")[0] for s in statements] == ["CREATE", "INSERT", "DROP", "ALTER", "CREATE"]
+        assert statements[1] == "INSERT INTO _er_new_post (id, writer_id) SELECT id, author_id FROM post"
+
+        connection = self._database()
+        for statement in statements:
+            connection.execute(statement)
+        assert connection.execute("SELECT id, writer_id, title FROM post").fetchall() == [(10, 1, "untitled")]
+        assert connection.execute("PRAGMA foreign_key_list(post)").fetchone()[3:5] == ("writer_id", "id")
+        assert [row[1] for row in connection.execute("PRAGMA index_list(post)")] == ["idx_post_writer_id"]
+
+    def test_other_tables_not_rebuilt(self):
+        """测试只新增列的表不重建"""
+        statements = DDLCompiler('sqlite').compile([
+            AddColumn(table_name="author", column=ColumnDefinition(name="age", type="int")),
+            AlterForeignKey(table_name="post", constraint_name="fk_post_author_id", new_on_delete="CASCADE"),
+        ], _state())
+        assert statements[0] == "ALTER TABLE author ADD COLUMN age INTEGER"
+        assert "ON DELETE CASCADE" in statements[1]
+        assert len(statements) == 5
@@ -1,18 +1,27 @@
 """
 测试ER差异检测器
 """
+import os
+import subprocess
+import sys
+import textwrap
 import pytest
-from x007007007.er.models import Entity, Column, ERModel
-from x007007007.er_migrate.differ import ERDiffer
+from x007007007.er.models import Entity, Column, ERModel, Index, Relationship
+from x007007007.er_migrate.differ import ERDiffer, DiffStats
 from x007007007.er_migrate.models import (
     CreateTable,
     DropTable,
     AddColumn,
     RemoveColumn,
     AlterColumn,
+    RenameColumn,
     AddIndex,
     RemoveIndex,
+    AddForeignKey,
+    RemoveForeignKey,
+    AlterForeignKey,
 )
+from x007007007.er_migrate.state import SchemaState
 
 
 class TestTableOperations:
@@ -253,6 +262,122 @@ class TestColumnOperations:
         assert alter_col_ops[0].new_nullable is False
 
 
+class TestColumnRenameDetection:
+    """测试列重命名检测"""
+    
+    def _models(self, old_columns, new_columns):
+        old_model = ERModel()
+        old_model.add_entity(Entity(name="User", columns=[Column(name="id", type="uuid", is_pk=True)] + old_columns))
+        new_model = ERModel()
+        new_model.add_entity(Entity(name="User", columns=[Column(name="id", type="uuid", is_pk=True)] + new_columns))
+        return old_model, new_model
+    
+    def test_detect_renamed_column(self):
+        """C-101: 属性和位置相同的列识别为重命名"""
+        old_model, new_model = self._models(
+            [Column(name="mail", type="string", max_length=100, comment="邮箱"), Column(name="age", type="int")],
+            [Column(name="email", type="string", max_length=100, comment="邮箱"), Column(name="age", type="int")]
+        )
+        
+        operations = ERDiffer(accept_renames=True).diff(old_model, new_model)
+        
+        assert operations == [RenameColumn(table_name="user", old_name="mail", new_name="email")]
+    
+    def test_renamed_column_with_property_change(self):
+        """C-102: 重命名同时修改可空性，生成RenameColumn和AlterColumn"""
+        old_model, new_model = self._models(
+            [Column(name="mail", type="string", max_length=100, comment="邮箱")],
+            [Column(name="email", type="string", max_length=100, comment="邮箱", nullable=False)]
+        )
+        
+        operations = ERDiffer(accept_renames=True).diff(old_model, new_model)
+        
+        assert [op.type for op in operations] == ["RenameColumn", "AlterColumn"]
+        assert operations[1].column_name == "email"
+        assert operations[1].new_nullable is False
+    
+    def test_different_type_is_not_rename(self):
+        """C-103: 类型不同的列不识别为重命名"""
+        old_model, new_model = self._models(
+            [Column(name="mail", type="string")],
+            [Column(name="email", type="text")]
+        )
+        
+        types = sorted(op.type for op in ERDiffer(accept_renames=True).diff(old_model, new_model))
+        assert types == ["AddColumn", "RemoveColumn"]
+    
+    def test_threshold_and_disable(self):
+        """C-104: 低于阈值或关闭检测时生成删除+新增"""
+        old_model, new_model = self._models(
+            [Column(name="mail", type="string", comment="邮箱"), Column(name="a", type="int"), Column(name="b", type="int")],
+            [Column(name="a", type="int"), Column(name="b", type="int"), Column(name="email", type="string")]
+        )
+        
+        # 注释不同且位置相差两位：1 - 0.05 - 0.05 - 0.4 × (1 - 8/9) ≈ 0.856
+        assert any(isinstance(op, RenameColumn) for op in ERDiffer(accept_renames=True).diff(old_model, new_model))
+        assert not any(isinstance(op, RenameColumn)
+                       for op in ERDiffer(column_rename_threshold=0.9, accept_renames=True).diff(old_model, new_model))
+        assert not any(isinstance(op, RenameColumn)
+                       for op in ERDiffer(column_rename_threshold=None, accept_renames=True).diff(old_model, new_model))
+    
+    def test_confirm_callback(self):
+        """C-105: 确认回调拒绝时生成删除+新增"""
+        old_model, new_model = self._models(
+            [Column(name="mail", type="string")],
+            [Column(name="email", type="string")]
+        )
+        asked = []
+        
+        def reject(table_name, old_name, new_name, score):
+            asked.append((table_name, old_name, new_name, score))
+            return False
+        
+        differ = ERDiffer(confirm_rename=reject, accept_renames=True)
+        operations = differ.diff(old_model, new_model)
+        
+        assert asked == [("user", "mail", "email", pytest.approx(0.6 + 0.4 * 8 / 9))]
+        assert sorted(op.type for op in operations) == ["AddColumn", "RemoveColumn"]
+        assert [rename.accepted for rename in differ.last_renames] == [False]
+    
+    def test_best_assignment_for_multiple_renames(self):
+        """C-106: 多个列同时重命名时按列名和位置一一对应"""
+        old_model, new_model = self._models(
+            [Column(name="first_name", type="string"), Column(name="last_name", type="string")],
+            [Column(name="lastname", type="string"), Column(name="firstname", type="string")]
+        )
+        
+        renames = {op.old_name: op.new_name for op in ERDiffer(accept_renames=True).diff(old_model, new_model)}
+        assert renames == {"first_name": "firstname", "last_name": "lastname"}
+    
+    def test_renames_need_confirmation(self):
+        """C-107: 没有确认回调也没有accept_renames时只记录候选，生成删除+新增"""
+        old_model, new_model = self._models(
+            [Column(name="mail", type="string")],
+            [Column(name="email", type="string")]
+        )
+        
+        differ = ERDiffer()
+        operations = differ.diff(old_model, new_model)
+        
+        assert sorted(op.type for op in operations) == ["AddColumn", "RemoveColumn"]
+        assert [(r.table_name, r.old_name, r.new_name, r.accepted) for r in differ.last_renames] == \
+            [("user", "mail", "email", False)]
+    
+    @pytest.mark.parametrize("old_name, new_name", [("nickname", "email"), ("legacy_flag", "is_active")])
+    def test_unrelated_names_are_not_renames(self, old_name, new_name):
+        """C-108: 列名毫不相似时，其余属性和位置完全相同也不识别为重命名"""
+        old_model, new_model = self._models(
+            [Column(name=old_name, type="string", max_length=100)],
+            [Column(name=new_name, type="string", max_length=100)]
+        )
+        
+        differ = ERDiffer(accept_renames=True)
+        types = sorted(op.type for op in differ.diff(old_model, new_model))
+        
+        assert types == ["AddColumn", "RemoveColumn"]
+        assert differ.last_renames == []
+
+
 class TestIndexOperations:
     """测试索引操作检测"""
     
@@ -346,3 +471,327 @@ class TestIndexOperations:
         add_idx_ops = [op for op in operations if isinstance(op, AddIndex)]
         assert len(add_idx_ops) == 1
         assert add_idx_ops[0].index.unique is True
+    
+    def test_detect_added_composite_index(self):
+        """I-005: 检测新增多列索引"""
+        old_model = ERModel()
+        old_model.add_entity(Entity(
+            name="Order",
+            columns=[
+                Column(name="id", type="int", is_pk=True),
+                Column(name="customer_id", type="int"),
+                Column(name="created_at", type="datetime")
+            ]
+        ))
+        
+        new_model = ERModel()
+        new_model.add_entity(Entity(
+            name="Order",
+            columns=[
+                Column(name="id", type="int", is_pk=True),
+                Column(name="customer_id", type="int"),
+                Column(name="created_at", type="datetime")
+            ],
+            indexes=[Index(name="idx_order_customer", columns=["customer_id", "created_at"])]
+        ))
+        
+        differ = ERDiffer()
+        operations = differ.diff(old_model, new_model)
+        
+        add_idx_ops = [op for op in operations if isinstance(op, AddIndex)]
+        assert len(add_idx_ops) == 1
+        assert add_idx_ops[0].index.columns == ["customer_id", "created_at"]
+        assert add_idx_ops[0].index.unique is False
+    
+    def test_composite_index_name_ignored(self):
+        """I-006: 多列索引只按列和唯一性比较，不比较名称"""
+        columns = [
+            Column(name="id", type="int", is_pk=True),
+            Column(name="a", type="int"),
+            Column(name="b", type="int")
+        ]
+        old_model = ERModel()
+        old_model.add_entity(Entity(
+            name="Pair", columns=columns,
+            indexes=[Index(name="uq_pair_a_b", columns=["a", "b"], unique=True)]
+        ))
+        new_model = ERModel()
+        new_model.add_entity(Entity(
+            name="Pair", columns=columns,
+            indexes=[Index(name="idx_pair_a_b_unique", columns=["a", "b"], unique=True)]
+        ))
+        
+        differ = ERDiffer()
+        assert differ.diff(old_model, new_model) == []
+    
+    def test_reflected_database_has_no_phantom_indexes(self, tmp_path):
+        """I-007: 反射的数据库与设计模型比较时不产生多余的索引操作"""
+        import sqlite3
+        from x007007007.er.db_parser import DBParser
+        
+        db_path = tmp_path / "app.db"
+        conn = sqlite3.connect(str(db_path))
+        conn.execute(
+            "CREATE TABLE user (id INTEGER PRIMARY KEY, email VARCHAR(100) UNIQUE, "
+            "name VARCHAR(50), tenant_id INTEGER, code INTEGER, UNIQUE (tenant_id, code))"
+        )
+        conn.execute("CREATE INDEX ix_user_name ON user (name)")
+        conn.commit()
+        conn.close()
+        
+        reflected = DBParser().parse(f"sqlite:///{db_path}")
+        
+        design = ERModel()
+        design.add_entity(Entity(
+            name="User",
+            columns=[
+                Column(name="id", type="INTEGER", is_pk=True),
+                Column(name="email", type="VARCHAR(100)", unique=True),
+                Column(name="name", type="VARCHAR(50)", indexed=True),
+                Column(name="tenant_id", type="INTEGER"),
+                Column(name="code", type="INTEGER")
+            ],
+            indexes=[Index(name="idx_user_tenant_code", columns=["tenant_id", "code"], unique=True)]
+        ))
+        
+        differ = ERDiffer()
+        operations = differ.diff(reflected, design)
+        
+        index_ops = [op for op in operations if isinstance(op, (AddIndex, RemoveIndex))]
+        assert index_ops == []
+    
+    def test_reflected_index_dropped_by_real_name(self, tmp_path):
+        """I-008: 删除反射的单列索引时使用数据库中的索引名"""
+        import sqlite3
+        from x007007007.er.db_parser import DBParser
+        
+        db_path = tmp_path / "app.db"
+        conn = sqlite3.connect(str(db_path))
+        conn.execute("CREATE TABLE user (id INTEGER PRIMARY KEY, email VARCHAR(100), name VARCHAR(50))")
+        conn.execute("CREATE UNIQUE INDEX ix_user_email ON user (email)")
+        conn.execute("CREATE INDEX user_name_8a1f ON user (name)")
+        conn.commit()
+        conn.close()
+        
+        design = ERModel()
+        design.add_entity(Entity(name="User", columns=[
+            Column(name="id", type="INTEGER", is_pk=True),
+            Column(name="email", type="VARCHAR(100)"),
+            Column(name="name", type="VARCHAR(50)"),
+        ]))
+        
+        operations = ERDiffer().diff(DBParser().parse(f"sqlite:///{db_path}"), design)
+        assert [op for op in operations if isinstance(op, (AddIndex, RemoveIndex))] == [
+            RemoveIndex(table_name="user", index_name="ix_user_email"),
+            RemoveIndex(table_name="user", index_name="user_name_8a1f"),
+        ]
+
+
+class TestForeignKeyOperations:
+    """测试外键差异检测"""
+    
+    def _model(self, *relationships, post_name="Post"):
+        model = ERModel()
+        model.add_entity(Entity(name="User", columns=[Column(name="id", type="uuid", is_pk=True)]))
+        model.add_entity(Entity(name="Team", columns=[Column(name="id", type="uuid", is_pk=True)]))
+        model.add_entity(Entity(name=post_name, columns=[
+            Column(name="id", type="uuid", is_pk=True),
+            Column(name="author_id", type="uuid"),
+            Column(name="title", type="string"),
+        ]))
+        for rel in relationships:
+            model.add_relationship(rel)
+        return model
+    
+    def _rel(self, target="User", column="author_id", source="Post", **kwargs):
+        return Relationship(left_entity=source, right_entity=target, relation_type="many-to-one",
+                            left_column=column, right_column="id", **kwargs)
+    
+    def test_remove_foreign_key(self):
+        """FK-001: 检测删除的外键"""
+        ops = ERDiffer().diff(self._model(self._rel()), self._model())
+        assert ops == [RemoveForeignKey(table_name="post", constraint_name="fk_post_author_id")]
+    
+    def test_alter_on_delete(self):
+        """FK-002: 只有on_delete变化时生成AlterForeignKey"""
+        ops = ERDiffer().diff(self._model(self._rel()), self._model(self._rel(on_delete="SET NULL")))
+        assert ops == [AlterForeignKey(
+            table_name="post", constraint_name="fk_post_author_id", new_on_delete="SET NULL"
+        )]
+    
+    def test_repoint_foreign_key(self):
+        """FK-003: 引用目标变化时先删除再添加"""
+        ops = ERDiffer().diff(self._model(self._rel()), self._model(self._rel(target="Team")))
+        assert [op.type for op in ops] == ["RemoveForeignKey", "AddForeignKey"]
+        assert ops[1].foreign_key.reference_table == "team"
+    
+    def test_dropped_table_foreign_keys_not_removed_separately(self):
+        """FK-004: 随表删除的外键不单独生成RemoveForeignKey"""
+        new_model = self._model()
+        del new_model.entities["Post"]
+        ops = ERDiffer().diff(self._model(self._rel()), new_model)
+        assert ops == [DropTable(table_name="post")]
+    
+    def test_renamed_table_keeps_foreign_key(self):
+        """FK-005: 表重命名后外键不变时不产生外键操作"""
+        old_model = self._model(self._rel())
+        new_model = self._model(self._rel(source="Article"), post_name="Article")
+        ops = ERDiffer().diff(old_model, new_model)
+        assert [op.type for op in ops] == ["RenameTable"]
+    
+    def test_renamed_table_keeps_constraint_name(self):
+        """FK-008: 表重命名后删除或修改外键时使用数据库中的原约束名"""
+        old_model = self._model(self._rel(source="Book"), post_name="Book")
+        new_model = self._model(self._rel(source="Volume", on_delete="SET NULL"), post_name="Volume")
+        ops = ERDiffer().diff(old_model, new_model)
+        assert ops[-1] == AlterForeignKey(
+            table_name="volume", constraint_name="fk_book_author_id", new_on_delete="SET NULL"
+        )
+        
+        # 之后的迁移基于重放的状态：约束名记录在关系上
+        state = SchemaState(self._model(self._rel(source="Book"), post_name="Book")).apply_all(ops).to_er_model()
+        ops = ERDiffer().diff(state, self._model(post_name="Volume"))
+        assert ops == [RemoveForeignKey(table_name="volume", constraint_name="fk_book_author_id")]
+    
+    def test_unchanged_foreign_keys(self):
+        """FK-006: 等价的关系写法不产生操作"""
+        one_to_many = Relationship(left_entity="User", right_entity="Post", relation_type="one-to-many",
+                                   left_column="id", right_column="author_id")
+        assert ERDiffer().diff(self._model(self._rel()), self._model(one_to_many)) == []
+
+    
+    def test_reflected_actions_compared(self, tmp_path):
+        """FK-007: 反射的NO ACTION外键与设计中的CASCADE比较时生成AlterForeignKey"""
+        import sqlite3
+        from x007007007.er.db_parser import DBParser
+        
+        db_path = tmp_path / "app.db"
+        conn = sqlite3.connect(str(db_path))
+        conn.execute("CREATE TABLE user (id INTEGER PRIMARY KEY)")
+        conn.execute("CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, "
+                     "FOREIGN KEY (author_id) REFERENCES user (id) ON UPDATE CASCADE)")
+        conn.commit()
+        conn.close()
+        
+        design = ERModel()
+        design.add_entity(Entity(name="user", columns=[Column(name="id", type="INTEGER", is_pk=True)]))
+        design.add_entity(Entity(name="post", columns=[
+            Column(name="id", type="INTEGER", is_pk=True),
+            Column(name="author_id", type="INTEGER"),
+        ]))
+        design.add_relationship(self._rel(target="user", source="post"))
+        
+        ops = ERDiffer().diff(DBParser().parse(f"sqlite:///{db_path}"), design)
+        assert ops == [AlterForeignKey(
+            table_name="post", constraint_name="fk_post_author_id", new_on_delete="CASCADE"
+        )]
+
+class TestLargeModelDiff:
+    """测试大模型的表级跳过与并行比较"""
+    
+    def _models(self, count):
+        old_model = ERModel()
+        new_model = ERModel()
+        for i in range(count):
+            columns = [Column(name="id", type="uuid", is_pk=True), Column(name="mail", type="string")]
+            old_model.add_entity(Entity(name=f"Table{i}", columns=columns))
+            if i % 3 == 0:
+                changed = [Column(name="id", type="uuid", is_pk=True), Column(name="email", type="string")]
+            elif i % 3 == 1:
+                changed = columns + [Column(name="age", type="int", indexed=True)]
+            else:
+                changed = [Column(name="id", type="uuid", is_pk=True), Column(name="mail", type="string")]
+            new_model.add_entity(Entity(name=f"Table{i}", columns=changed))
+        return old_model, new_model
+    
+    def test_unchanged_tables_are_not_inspected(self, monkeypatch):
+        """L-001: 指纹相同的表不进入逐列比较"""
+        old_model, new_model = self._models(30)
+        differ = ERDiffer()
+        inspected = []
+        original = differ._diff_columns
+        monkeypatch.setattr(differ, "_diff_columns", lambda table, old, new: inspected.append(table) or original(table, old, new))
+        
+        differ.diff(old_model, new_model)
+        
+        assert len(inspected) == 20
+        assert "table2" not in inspected
+    
+    @pytest.mark.parametrize("accept_renames", [False, True])
+    def test_parallel_matches_serial(self, accept_renames):
+        """L-002: 并行比较与串行结果一致且顺序确定，子进程中的重命名同样需要确认"""
+        old_model, new_model = self._models(40)
+        serial_differ = ERDiffer(accept_renames=accept_renames)
+        serial = serial_differ.diff(old_model, new_model)
+        assert any(isinstance(op, RenameColumn) for op in serial) == accept_renames
+        
+        differ = ERDiffer(workers=2, accept_renames=accept_renames)
+        differ.PARALLEL_MIN_TABLES = 1
+        assert differ.diff(old_model, new_model) == serial
+        assert differ.last_renames == serial_differ.last_renames
+    
+    def test_parallel_confirm_in_main_process(self):
+        """L-003: 并行比较时在主进程中确认重命名"""
+        old_model, new_model = self._models(6)
+        asked = []
+        
+        def reject(table_name, old_name, new_name, score):
+            asked.append(table_name)
+            return False
+        
+        differ = ERDiffer(workers=2, confirm_rename=reject)
+        differ.PARALLEL_MIN_TABLES = 1
+        operations = differ.diff(old_model, new_model)
+        
+        assert asked == ["table0", "table3"]
+        assert not any(isinstance(op, RenameColumn) for op in operations)
+        assert operations == ERDiffer(confirm_rename=lambda *args: False).diff(old_model, new_model)
+    
+    def test_stats_report_skipped_and_inspected(self):
+        """L-004: 统计跳过和逐列比较的表数量"""
+        old_model, new_model = self._models(30)
+        new_model.add_entity(Entity(name="Extra", columns=[Column(name="id", type="uuid", is_pk=True)]))
+        differ = ERDiffer()
+        differ.diff(old_model, new_model)
+        
+        assert differ.last_stats == DiffStats(tables_skipped=10, tables_inspected=20, tables_created=1)
+        
+        differ.diff(new_model, new_model)
+        assert differ.last_stats == DiffStats(tables_skipped=31)
+    
+    def test_renamed_table_with_same_structure_is_skipped(self):
+        """L-005: 结构未变的重命名表不逐列比较"""
+        columns = [Column(name=name, type="string") for name in ("id", "a", "b", "c", "d")]
+        old_model = ERModel()
+        old_model.add_entity(Entity(name="Old", columns=columns))
+        new_model = ERModel()
+        new_model.add_entity(Entity(name="New", columns=[Column(name=c.name, type=c.type) for c in columns]))
+        differ = ERDiffer()
+        
+        assert [op.type for op in differ.diff(old_model, new_model)] == ["RenameTable"]
+        assert differ.last_stats == DiffStats(tables_skipped=1, tables_renamed=1)
+    
+    def test_order_independent_of_hash_seed(self):
+        """L-006: 不同的哈希种子下操作顺序相同"""
+        script = textwrap.dedent('''
+            from x007007007.er.models import Column, Entity, ERModel
+            from x007007007.er_migrate.differ import ERDiffer
+            old_model, new_model = ERModel(), ERModel()
+            old_model.add_entity(Entity(name="Keep", columns=[Column(name="id", type="int", is_pk=True)] + [
+                Column(name=f"old{i}", type="int", indexed=True) for i in range(8)] + [
+                Column(name=f"same{i}", type="int") for i in range(8)]))
+            new_model.add_entity(Entity(name="Keep", columns=[Column(name="id", type="int", is_pk=True)] + [
+                Column(name=f"new{i}", type="string", indexed=True) for i in range(8)] + [
+                Column(name=f"same{i}", type="bigint") for i in range(8)]))
+            for i in range(8):
+                old_model.add_entity(Entity(name=f"Gone{i}", columns=[Column(name=f"g{i}", type="int")]))
+                new_model.add_entity(Entity(name=f"Born{i}", columns=[Column(name=f"b{i}", type="int")]))
+            for op in ERDiffer(optimize=False, column_rename_threshold=None).diff(old_model, new_model):
+                print(op.model_dump_json())
+        ''')
+        outputs = set()
+        for seed in ("1", "2", "3"):
+            env = dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=os.pathsep.join(sys.path))
+            outputs.add(subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True,
+                                       check=True).stdout)
+        assert len(outputs) == 1
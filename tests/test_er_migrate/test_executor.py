@@ -0,0 +1,182 @@
+"""
+测试迁移执行器（SQLite）
+"""
+import sqlite3
+import pytest
+from click.testing import CliRunner
+from x007007007.er.models import ERModel, Entity, Column, Relationship
+from x007007007.er_migrate.cli import cli
+from x007007007.er_migrate.executor import MigrationExecutor
+from x007007007.er_migrate.generator import MigrationGenerator
+
+
+def _model(*user_columns, post=False, nullable_name=True):
+    model = ERModel()
+    model.add_entity(Entity(name="User", columns=[
+        Column(name="id", type="int", is_pk=True, nullable=False),
+        Column(name="name", type="string", nullable=nullable_name),
+        *user_columns,
+    ]))
+    if post:
+        model.add_entity(Entity(name="Post", columns=[
+            Column(name="id", type="int", is_pk=True, nullable=False),
+            Column(name="user_id", type="int"),
+        ]))
+        model.add_relationship(Relationship(left_entity="Post", right_entity="User", relation_type="many-to-one",
+                                            left_column="user_id", right_column="id"))
+    return model
+
+
+def _save(generator, *models):
+    for model in models:
+        generator.file_manager.save_migration(generator.generate("blog", model))
+
+
+def _tables(db_path):
+    connection = sqlite3.connect(db_path)
+    return {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+class TestApply:
+    """测试执行迁移"""
+
+    def test_apply_and_record(self, tmp_path):
+        """测试执行全部迁移并记录，再次执行没有待执行的迁移"""
+        generator = MigrationGenerator(str(tmp_path / "migrations"))
+        _save(generator, _model(), _model(post=True))
+        db_path = tmp_path / "app.db"
+        executor = MigrationExecutor(f"sqlite:///{db_path}", str(tmp_path / "migrations"))
+
+        results = executor.apply("blog")
+
+        assert [r.migration_id for r in results] == ["0001_initial", "0002_create_post"]
+        assert all(r.duration >= 0 for r in results)
+        assert {"user", "post", "er_migrations"} <= _tables(db_path)
+        assert executor.applied_migrations("blog") == {"0001_initial", "0002_create_post"}
+        assert executor.apply("blog") == []
+
+    def test_apply_up_to_target(self, tmp_path):
+        """测试只执行到目标迁移为止，目标已应用时不执行任何迁移"""
+        generator = MigrationGenerator(str(tmp_path / "migrations"))
+        _save(generator, _model(), _model(Column(name="age", type="int")), _model(Column(name="age", type="int"), post=True))
+        executor = MigrationExecutor(f"sqlite:///{tmp_path / 'app.db'}", str(tmp_path / "migrations"))
+
+        assert [r.migration_id for r in executor.apply("blog", target="0002_add_age")] == ["0001_initial", "0002_add_age"]
+        assert executor.apply("blog", target="0001_initial") == []
+        with pytest.raises(ValueError, match="not found"):
+            executor.apply("blog", target="0009_missing")
+        assert [r.migration_id for r in executor.apply("blog")] == ["0003_create_post"]
+
+    def test_alter_column_rebuilds_table_with_data(self, tmp_path):
+        """测试SQLite修改列时重建表并保留数据"""
+        generator = MigrationGenerator(str(tmp_path / "migrations"))
+        db_path = tmp_path / "app.db"
+        executor = MigrationExecutor(f"sqlite:///{db_path}", str(tmp_path / "migrations"))
+        _save(generator, _model())
+        executor.apply("blog")
+        sqlite3.connect(db_path).executescript("INSERT INTO user (id, name) VALUES (1, 'ann');")
+
+        _save(generator, _model(Column(name="age", type="int"), nullable_name=False))
+        results = executor.apply("blog")
+
+        assert results[0].statements > 1
+        connection = sqlite3.connect(db_path)
+        assert connection.execute("SELECT id, name, age FROM user").fetchall() == [(1, "ann", None)]
+        assert connection.execute("PRAGMA table_info(user)").fetchall()[1][3] == 1   # name NOT NULL
+
+    def test_failed_migration_rolled_back(self, tmp_path):
+        """测试迁移失败时整体回滚且不记录"""
+        generator = MigrationGenerator(str(tmp_path / "migrations"))
+        db_path = tmp_path / "app.db"
+        executor = MigrationExecutor(f"sqlite:///{db_path}", str(tmp_path / "migrations"))
+        _save(generator, _model())
+        executor.apply("blog")
+
+        # ADD COLUMN成功后，CREATE INDEX与已有索引重名而失败
+        _save(generator, _model(Column(name="age", type="int", indexed=True)))
+        sqlite3.connect(db_path).executescript("CREATE INDEX idx_user_age ON user (name);")
+
+        with pytest.raises(Exception):
+            executor.apply("blog")
+        columns = [row[1] for row in sqlite3.connect(db_path).execute("PRAGMA table_info(user)")]
+        assert "age" not in columns
+        assert executor.applied_migrations("blog") == {"0001_initial"}
+
+
+class TestApplySquashed:
+    """测试执行压缩迁移"""
+
+    def _history(self, tmp_path):
+        generator = MigrationGenerator(str(tmp_path / "migrations"))
+        _save(generator, _model(), _model(Column(name="age", type="int")), _model(Column(name="age", type="int"), post=True))
+        return generator
+
+    def test_fresh_database_uses_squashed(self, tmp_path):
+        """测试新数据库只执行压缩迁移"""
+        generator = self._history(tmp_path)
+        generator.file_manager.save_migration(generator.squash("blog"))
+        executor = MigrationExecutor(f"sqlite:///{tmp_path / 'app.db'}", str(tmp_path / "migrations"))
+
+        results = executor.apply("blog")
+        assert [r.migration_id for r in results] == ["0001_squashed_0003_create_post"]
+        assert executor.applied_migrations("blog") == {"0001_squashed_0003_create_post"}
+
+    def test_target_replaced_by_pending_squash(self, tmp_path):
+        """测试目标是待执行的压缩迁移替代的原迁移时报错"""
+        generator = self._history(tmp_path)
+        generator.file_manager.save_migration(generator.squash("blog"))
+        executor = MigrationExecutor(f"sqlite:///{tmp_path / 'app.db'}", str(tmp_path / "migrations"))
+
+        with pytest.raises(ValueError, match="replaced by the squashed migration 0001_squashed_0003_create_post"):
+            executor.apply("blog", target="0002_add_age")
+        assert executor.applied_migrations("blog") == set()
+
+    def test_partially_applied_originals(self, tmp_path):
+        """测试原迁移已部分应用时补齐剩余原迁移并记录压缩迁移"""
+        generator = MigrationGenerator(str(tmp_path / "migrations"))
+        executor = MigrationExecutor(f"sqlite:///{tmp_path / 'app.db'}", str(tmp_path / "migrations"))
+        _save(generator, _model())
+        executor.apply("blog")
+        _save(generator, _model(Column(name="age", type="int")), _model(Column(name="age", type="int"), post=True))
+        generator.file_manager.save_migration(generator.squash("blog"))
+
+        results = executor.apply("blog")
+        assert [(r.migration_id, r.record_only) for r in results] == [
+            ("0002_add_age", False),
+            ("0003_create_post", False),
+            ("0001_squashed_0003_create_post", True),
+        ]
+        assert executor.apply("blog") == []
+
+
+class TestApplyCommand:
+    """测试apply命令"""
+
+    def test_apply_command_reports_timing(self, tmp_path):
+        """测试apply命令输出每个迁移的耗时"""
+        generator = MigrationGenerator(str(tmp_path / "migrations"))
+        _save(generator, _model())
+        args = ['apply', '-n', 'blog', '--db', f"sqlite:///{tmp_path / 'app.db'}", '-d', str(tmp_path / "migrations")]
+
+        result = CliRunner().invoke(cli, args)
+        assert result.exit_code == 0
+        assert "Applied blog.0001_initial" in result.output
+        assert " ms)" in result.output
+
+        result = CliRunner().invoke(cli, args)
+        assert "No migrations to apply" in result.output
+
+    def test_apply_command_target(self, tmp_path):
+        """测试apply命令按迁移ID前缀执行到目标迁移"""
+        generator = MigrationGenerator(str(tmp_path / "migrations"))
+        _save(generator, _model(), _model(Column(name="age", type="int")))
+        args = ['apply', '-n', 'blog', '--db', f"sqlite:///{tmp_path / 'app.db'}", '-d', str(tmp_path / "migrations")]
+
+        result = CliRunner().invoke(cli, [*args, '0001'])
+        assert result.exit_code == 0, result.output
+        assert "Applying migrations for 'blog' up to 0001_initial" in result.output
+        assert "0002_add_age" not in result.output
+
+        result = CliRunner().invoke(cli, [*args, '0003'])
+        assert result.exit_code != 0
+        assert "Migration '0003' not found" in result.output
@@ -0,0 +1,284 @@
+"""
+测试扩展/收缩拆分和批量回填
+"""
+import sqlite3
+import pytest
+import sqlalchemy as sa
+from click.testing import CliRunner
+from x007007007.er_migrate.backfill import BackfillRunner
+from x007007007.er_migrate.cli import cli
+from x007007007.er_migrate.differ import ERDiffer
+from x007007007.er_migrate.executor import MigrationExecutor
+from x007007007.er_migrate.expand import ExpandContractSplitter, save_phases
+from x007007007.er_migrate.file_manager import FileManager
+from x007007007.er_migrate.history import MigrationHistory
+from x007007007.er_migrate.models import (
+    Migration,
+    CreateTable,
+    AddColumn,
+    RemoveColumn,
+    AlterColumn,
+    AddIndex,
+    AddForeignKey,
+    RunBackfill,
+    ColumnDefinition,
+    IndexDefinition,
+    ForeignKeyDefinition,
+)
+from x007007007.er_migrate.state import SchemaState
+
+
+def _create_order():
+    return CreateTable(table_name="order", columns=[
+        ColumnDefinition(name="id", type="int", primary_key=True, nullable=False),
+        ColumnDefinition(name="code", type="string", max_length=20, nullable=False),
+        ColumnDefinition(name="note", type="string", nullable=False),
+        ColumnDefinition(name="user_id", type="int"),
+    ])
+
+
+def _initial():
+    return Migration(name="initial", namespace="shop", operations=[
+        _create_order(),
+        AddIndex(table_name="order", index=IndexDefinition(name="idx_order_code", columns=["code"])),
+    ])
+
+
+def _change(*operations):
+    return Migration(name="change", namespace="shop", dependencies=["shop.0001_initial"], operations=list(operations))
+
+
+def _state():
+    return SchemaState().apply_all(_initial().operations).to_er_model()
+
+
+def _types(migration):
+    return [op.type for op in migration.operations]
+
+
+class TestRunBackfill:
+    """测试回填操作和分批执行"""
+
+    def test_chunk_size_validated(self):
+        """测试每批行数必须为正数"""
+        with pytest.raises(ValueError):
+            RunBackfill(table_name="order", column_name="code", expression="1", chunk_size=0)
+
+    def test_serialized(self, tmp_path):
+        """测试回填操作保存后可以读回，不改变状态"""
+        fm = FileManager(str(tmp_path))
+        op = RunBackfill(table_name="order", column_name="code_new", expression="CAST(code AS INTEGER)",
+                         chunk_size=50, throttle=0.2)
+        path = fm.save_migration(Migration(name="fill", namespace="shop", operations=[op]))
+        assert fm.load_migration("shop", path.name).operations == [op]
+        assert SchemaState(_state()).apply_all([op]).to_er_model().entities["Order"].columns[1].name == "code"
+
+    @pytest.mark.parametrize("keys", [list(range(1, 26)), [f"k{i:02d}" for i in range(25)]])
+    def test_runs_in_key_range_chunks(self, tmp_path, keys):
+        """测试按键范围分批更新全部行（整数和字符串键）"""
+        engine = sa.create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+        with engine.begin() as connection:
+            connection.exec_driver_sql("CREATE TABLE item (id, price INTEGER, cents INTEGER)")
+            for number, key in enumerate(keys):
+                connection.exec_driver_sql("INSERT INTO item VALUES (?, ?, NULL)", (key, number))
+
+        op = RunBackfill(table_name="item", column_name="cents", expression="price * 100", chunk_size=10)
+        assert BackfillRunner(engine).run(op) == 3
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql("SELECT price, cents FROM item").fetchall()
+        assert all(cents == price * 100 for price, cents in rows)
+
+
+class TestSplitter:
+    """测试拆分迁移"""
+
+    def test_type_change_phases(self):
+        """测试修改列类型拆为加列、回填、交换列名和删除旧列四个阶段"""
+        phases = ExpandContractSplitter(chunk_size=500).split(_change(
+            AddColumn(table_name="order", column=ColumnDefinition(name="paid", type="bool")),
+            AlterColumn(table_name="order", column_name="code", new_type="int"),
+        ), _state())
+
+        assert [phase.name for phase in phases] == ["change_expand", "change_backfill", "change_switch",
+                                                    "change_contract"]
+        expand, backfill, switch, contract = phases
+        assert expand.dependencies == ["shop.0001_initial"]
+        assert [op.column.name for op in expand.operations] == ["paid", "code_new"]
+        assert expand.operations[1].column.nullable and expand.operations[1].column.type == "int"
+
+        fill = backfill.operations[0]
+        assert (fill.column_name, fill.expression, fill.key_column, fill.chunk_size) == \
+            ("code_new", 'CAST(code AS INTEGER)', "id", 500)
+        assert _types(switch) == ["RemoveIndex", "AlterColumn", "RenameColumn", "RenameColumn",
+                                  "AlterColumn", "AddIndex"]
+        assert switch.operations[-2].new_nullable is False
+        assert contract.operations == [RemoveColumn(table_name="order", column_name="code_old")]
+
+    def test_phases_reach_same_schema(self):
+        """测试依次执行各阶段得到的结构与原迁移相同"""
+        change = _change(AlterColumn(table_name="order", column_name="code", new_type="int", new_nullable=True),
+                         RemoveColumn(table_name="order", column_name="note"))
+        phases = ExpandContractSplitter().split(change, _state())
+
+        expected = SchemaState(_state()).apply_all(change.operations).to_er_model()
+        state = SchemaState(_state())
+        for phase in phases:
+            state.apply_all(phase.operations)
+        assert ERDiffer().diff(state.to_er_model(), expected) == []
+
+    def test_remove_column(self):
+        """测试删除NOT NULL列先改为可空，在收缩阶段删除"""
+        expand, contract = ExpandContractSplitter().split(
+            _change(RemoveColumn(table_name="order", column_name="note")), _state()
+        )
+        assert expand.operations == [AlterColumn(table_name="order", column_name="note", new_nullable=True)]
+        assert _types(contract) == ["RemoveColumn"]
+
+    def test_only_hot_tables_and_rewrites(self):
+        """测试只拆分选中表上需要重写表的变更"""
+        widen = _change(AlterColumn(table_name="order", column_name="code", new_max_length=40))
+        with pytest.raises(ValueError, match="Nothing to split"):
+            ExpandContractSplitter().split(widen, _state())
+
+        change = _change(AlterColumn(table_name="order", column_name="code", new_type="int"))
+        with pytest.raises(ValueError, match="Nothing to split"):
+            ExpandContractSplitter(hot_tables={"user"}).split(change, _state())
+
+    def test_not_null_column_with_expression(self):
+        """测试给出回填表达式的NOT NULL新列拆为加可空列、回填和设置NOT NULL三个阶段"""
+        add = AddColumn(table_name="order", column=ColumnDefinition(name="total", type="int", nullable=False))
+        with pytest.raises(ValueError, match="Nothing to split"):
+            ExpandContractSplitter().split(_change(add), _state())
+
+        expand, backfill, switch = ExpandContractSplitter(throttle=0.1, expressions={"order.total": "id * 2"}).split(
+            _change(add), _state()
+        )
+        assert expand.operations[0].column.nullable
+        assert (backfill.operations[0].expression, backfill.operations[0].throttle) == ("id * 2", 0.1)
+        assert switch.operations == [AlterColumn(table_name="order", column_name="total", new_nullable=False)]
+
+    def test_foreign_key_column_not_split(self):
+        """测试外键列不拆分，保留在扩展阶段"""
+        state = SchemaState(_state()).apply_all([
+            CreateTable(table_name="user", columns=[ColumnDefinition(name="id", type="int", primary_key=True)]),
+            AddForeignKey(table_name="order", foreign_key=ForeignKeyDefinition(
+                column_name="user_id", reference_table="user", reference_column="id")),
+        ]).to_er_model()
+        splitter = ExpandContractSplitter()
+        phases = splitter.split(_change(
+            AlterColumn(table_name="order", column_name="user_id", new_type="bigint"),
+            RemoveColumn(table_name="order", column_name="note"),
+        ), state)
+        assert splitter.skipped == ["order.user_id"]
+        assert _types(phases[0]) == ["AlterColumn", "AlterColumn"]
+
+
+class TestSavePhases:
+    """测试保存拆分结果"""
+
+    def test_replaces_latest_and_chains(self, tmp_path):
+        """测试替换最新的迁移，各阶段依次依赖"""
+        fm = FileManager(str(tmp_path))
+        fm.save_migration(_initial())
+        fm.save_migration(_change(AlterColumn(table_name="order", column_name="code", new_type="int")))
+        phases = ExpandContractSplitter().split(fm.load_migration("shop", "0002_change.yaml"), _state())
+
+        saved = save_phases(fm, "0002_change.yaml", phases)
+        assert saved == ["0002_change_expand.yaml", "0003_change_backfill.yaml", "0004_change_switch.yaml",
+                         "0005_change_contract.yaml"]
+        assert fm.load_migration("shop", "0004_change_switch.yaml").dependencies == ["shop.0003_change_backfill"]
+        assert MigrationHistory(fm, "shop").leaves == ["0005_change_contract"]
+
+        with pytest.raises(ValueError, match="Only the latest migration can be split"):
+            save_phases(fm, "0002_change_expand.yaml", phases)
+
+    def test_cli_split_and_apply(self, tmp_path):
+        """测试拆分命令生成的迁移在SQLite上执行后数据完整转换"""
+        migrations_dir = tmp_path / "migrations"
+        db_url = f"sqlite:///{tmp_path / 'app.db'}"
+        fm = FileManager(str(migrations_dir))
+        fm.save_migration(_initial())
+        MigrationExecutor(db_url, str(migrations_dir)).apply("shop")
+        connection = sqlite3.connect(tmp_path / "app.db")
+        connection.executemany('INSERT INTO "order" (id, code, note) VALUES (?, ?, ?)',
+                               [(i, str(i * 7), "n") for i in range(1, 31)])
+        connection.commit()
+
+        fm.save_migration(_change(AlterColumn(table_name="order", column_name="code", new_type="int")))
+        runner = CliRunner()
+        result = runner.invoke(cli, ["split", "-n", "shop", "0002", "--dialect", "sqlite", "--chunk-size", "8",
+                                     "--dry-run", "-d", str(migrations_dir)])
+        assert result.exit_code == 0, result.output
+        assert "RunBackfill order.code_new" in result.output
+        assert len(fm.list_migration_files("shop")) == 2
+
+        # 不指定迁移时拆分最新的迁移
+        result = runner.invoke(cli, ["split", "-n", "shop", "--dialect", "sqlite", "--chunk-size", "8",
+                                     "-d", str(migrations_dir)])
+        assert result.exit_code == 0, result.output
+        assert "Split 0002_change.yaml into 4 migrations" in result.output
+
+        # 先只执行扩展和回填阶段，应用切换之后再执行其余阶段
+        result = runner.invoke(cli, ["apply", "-n", "shop", "0003", "--db", db_url, "-d", str(migrations_dir)])
+        assert result.exit_code == 0, result.output
+        assert "Applied shop.0003_change_backfill (4 statements" in result.output
+        assert "0004_change_switch" not in result.output
+        columns = [row[1] for row in connection.execute('PRAGMA table_info("order")')]
+        assert columns == ["id", "code", "note", "user_id", "code_new"]
+
+        results = MigrationExecutor(db_url, str(migrations_dir)).apply("shop")
+        assert [r.migration_id for r in results] == ["0004_change_switch", "0005_change_contract"]
+        columns = [row[1] for row in connection.execute('PRAGMA table_info("order")')]
+        assert columns == ["id", "note", "user_id", "code"]
+        assert connection.execute('SELECT code FROM "order" WHERE id = 3').fetchone() == (21,)
+        assert connection.execute("SELECT name FROM sqlite_master WHERE name = 'idx_order_code'").fetchone()
+
+    def test_cli_only_latest_saved(self, tmp_path):
+        """测试较早的迁移只能用--dry-run预览，不能拆分"""
+        fm = FileManager(str(tmp_path))
+        fm.save_migration(_initial())
+        fm.save_migration(_change(AlterColumn(table_name="order", column_name="code", new_type="int")))
+        fm.save_migration(Migration(name="later", namespace="shop", dependencies=["shop.0002_change"], operations=[
+            AddColumn(table_name="order", column=ColumnDefinition(name="paid", type="bool")),
+        ]))
+        runner = CliRunner()
+
+        result = runner.invoke(cli, ["split", "-n", "shop", "0002", "-d", str(tmp_path)])
+        assert result.exit_code != 0
+        assert "0002_change.yaml is not the latest" in result.output
+        assert len(fm.list_migration_files("shop")) == 3
+
+        result = runner.invoke(cli, ["split", "-n", "shop", "0002", "--dry-run", "-d", str(tmp_path)])
+        assert result.exit_code == 0, result.output
+        assert "RunBackfill order.code_new" in result.output
+
+    def test_cli_backfill_option(self, tmp_path):
+        """测试--backfill指定NOT NULL新列的回填表达式"""
+        fm = FileManager(str(tmp_path))
+        fm.save_migration(_initial())
+        fm.save_migration(_change(AddColumn(table_name="order",
+                                            column=ColumnDefinition(name="total", type="int", nullable=False))))
+        runner = CliRunner()
+        result = runner.invoke(cli, ["split", "-n", "shop", "0002", "--backfill", "order.total=id * 2",
+                                     "--throttle", "0.5", "--dry-run", "-d", str(tmp_path)])
+        assert result.exit_code == 0, result.output
+        assert "RunBackfill order.total" in result.output
+
+        result = runner.invoke(cli, ["split", "-n", "shop", "0002", "--backfill", "total", "-d", str(tmp_path)])
+        assert result.exit_code != 0
+        assert "Invalid --backfill 'total'" in result.output
+
+
+class TestExecutor:
+    """测试执行器对数据操作的限制"""
+
+    def test_mixed_migration_rejected(self, tmp_path):
+        """测试数据操作和结构变更不能在同一个迁移中"""
+        fm = FileManager(str(tmp_path / "migrations"))
+        fm.save_migration(Migration(name="initial", namespace="shop", operations=[
+            _create_order(),
+            RunBackfill(table_name="order", column_name="note", expression="'x'"),
+        ]))
+        executor = MigrationExecutor(f"sqlite:///{tmp_path / 'app.db'}", str(tmp_path / "migrations"))
+        with pytest.raises(ValueError, match="mixes data operations with schema operations"):
+            executor.apply("shop")
@@ -2,6 +2,7 @@
 测试文件管理器
 """
 import pytest
+from datetime import datetime
 from pathlib import Path
 from x007007007.er_migrate.file_manager import FileManager
 from x007007007.er_migrate.models import (
@@ -192,3 +193,205 @@ class TestFileManager:
         assert len(auth_files) == 1
         assert blog_files[0] == "0001_initial.yaml"
         assert auth_files[0] == "0001_initial.yaml"
+    
+    def test_uses_libyaml_when_available(self):
+        """测试libyaml可用时使用C实现的Loader/Dumper"""
+        import yaml
+        from x007007007.er_migrate import file_manager
+        
+        if yaml.__with_libyaml__:
+            assert file_manager.YamlLoader is yaml.CSafeLoader
+            assert file_manager.YamlDumper is yaml.CSafeDumper
+        else:
+            assert file_manager.YamlLoader is yaml.SafeLoader
+            assert file_manager.YamlDumper is yaml.SafeDumper
+    
+    def test_pure_python_loader_reads_same_migration(self, tmp_path, monkeypatch):
+        """测试纯Python实现与C实现加载结果一致"""
+        import yaml
+        from x007007007.er_migrate import file_manager
+        
+        fm = FileManager(str(tmp_path))
+        migration = Migration(
+            name="initial",
+            namespace="blog",
+            operations=[
+                CreateTable(
+                    table_name="user",
+                    columns=[
+                        ColumnDefinition(name="id", type="uuid", primary_key=True, nullable=False),
+                        ColumnDefinition(name="name", type="string", max_length=50, comment="用户名")
+                    ]
+                )
+            ]
+        )
+        fm.save_migration(migration)
+        default_loaded = fm.load_migration("blog", "0001_initial.yaml")
+        
+        monkeypatch.setattr(file_manager, "YamlLoader", yaml.SafeLoader)
+        python_loaded = fm.load_migration("blog", "0001_initial.yaml")
+        
+        assert python_loaded == default_loaded
+        assert python_loaded.operations[0].columns[1].comment == "用户名"
+    
+    def test_save_and_load_rename_column_and_alter_foreign_key(self, tmp_path):
+        """测试RenameColumn和AlterForeignKey的字段被完整保存"""
+        from x007007007.er_migrate.models import RenameColumn, AlterForeignKey
+        
+        fm = FileManager(str(tmp_path))
+        migration = Migration(
+            name="renames",
+            namespace="blog",
+            operations=[
+                RenameColumn(table_name="user", old_name="mail", new_name="email"),
+                AlterForeignKey(table_name="post", constraint_name="fk_post_user_id", new_on_delete="SET NULL")
+            ]
+        )
+        fm.save_migration(migration)
+        
+        loaded = fm.load_migration("blog", "0001_renames.yaml")
+        assert loaded.operations == migration.operations
+
+
+class TestTrustedMode:
+    """测试可信模式"""
+    
+    def _save(self, fm):
+        migration = Migration(
+            name="initial",
+            namespace="blog",
+            operations=[
+                CreateTable(
+                    table_name="user",
+                    columns=[ColumnDefinition(name="id", type="uuid", primary_key=True, nullable=False)]
+                )
+            ]
+        )
+        fm.save_migration(migration)
+        return migration
+    
+    def test_validated_files_skip_validation(self, tmp_path, monkeypatch):
+        """测试已记录在清单中的文件跳过校验"""
+        from x007007007.er_migrate import file_manager
+        
+        migration = self._save(FileManager(str(tmp_path)))
+        
+        # 第一次加载完整校验并写入清单
+        FileManager(str(tmp_path), trusted=True).load_namespace_migrations("blog")
+        assert (tmp_path / "blog" / FileManager.VALIDATED_MANIFEST).exists()
+        
+        def fail_validation(**data):
+            raise AssertionError("validation should be skipped")
+        
+        monkeypatch.setattr(file_manager, "Migration", fail_validation)
+        loaded = FileManager(str(tmp_path), trusted=True).load_namespace_migrations("blog")
+        assert loaded[0].operations == migration.operations
+        assert loaded[0].operations[0].columns[0].primary_key is True
+    
+    def test_saved_files_are_trusted(self, tmp_path, monkeypatch):
+        """测试可信模式下保存的文件直接记入清单"""
+        from x007007007.er_migrate import file_manager
+        
+        self._save(FileManager(str(tmp_path), trusted=True))
+        
+        monkeypatch.setattr(file_manager, "Migration", lambda **data: None)
+        loaded = FileManager(str(tmp_path), trusted=True).load_migration("blog", "0001_initial.yaml")
+        assert loaded.name == "initial"
+    
+    def test_modified_file_is_validated_again(self, tmp_path):
+        """测试内容变化的文件重新校验"""
+        from pydantic import ValidationError
+        
+        self._save(FileManager(str(tmp_path), trusted=True))
+        
+        path = tmp_path / "blog" / "0001_initial.yaml"
+        path.write_text(path.read_text(encoding="utf-8").replace("type: CreateTable", "type: Unknown"), encoding="utf-8")
+        
+        with pytest.raises(ValidationError):
+            FileManager(str(tmp_path), trusted=True).load_migration("blog", "0001_initial.yaml")
+
+
+class TestJsonFormat:
+    """测试JSON迁移文件格式"""
+    
+    def _migration(self, name="initial"):
+        return Migration(
+            name=name,
+            namespace="blog",
+            operations=[
+                CreateTable(
+                    table_name="user",
+                    columns=[
+                        ColumnDefinition(name="id", type="uuid", primary_key=True, nullable=False),
+                        ColumnDefinition(name="name", type="string", max_length=50, comment="用户名")
+                    ]
+                )
+            ]
+        )
+    
+    def test_default_format_is_yaml(self, tmp_path):
+        """测试未配置时使用YAML格式"""
+        fm = FileManager(str(tmp_path))
+        assert fm.get_format("blog") == "yaml"
+        assert fm.save_migration(self._migration()).name == "0001_initial.yaml"
+    
+    def test_save_and_load_json(self, tmp_path):
+        """测试配置为JSON的命名空间保存和加载JSON文件"""
+        fm = FileManager(str(tmp_path))
+        fm.set_format("blog", "json")
+        migration = self._migration()
+        migration.created_at = datetime(2024, 1, 2, 3, 4, 5, 678)
+        
+        path = fm.save_migration(migration)
+        assert path.name == "0001_initial.json"
+        assert path.read_bytes().startswith(b'{')
+        
+        loaded = FileManager(str(tmp_path)).load_migration("blog", "0001_initial.json")
+        assert loaded == migration
+        assert FileManager(str(tmp_path)).list_migration_files("blog") == ["0001_initial.json"]
+    
+    def test_stdlib_json_matches_orjson(self, tmp_path, monkeypatch):
+        """测试没有orjson时标准库json的输出可以被正确加载"""
+        from x007007007.er_migrate import file_manager
+        
+        monkeypatch.setattr(file_manager, "orjson", None)
+        fm = FileManager(str(tmp_path))
+        fm.set_format("blog", "json")
+        migration = self._migration()
+        migration.created_at = datetime(2024, 1, 2, 3, 4, 5)
+        fm.save_migration(migration)
+        
+        assert fm.load_migration("blog", "0001_initial.json") == migration
+    
+    def test_convert_format_round_trip(self, tmp_path):
+        """测试YAML与JSON之间互相转换无损"""
+        fm = FileManager(str(tmp_path))
+        fm.save_migration(self._migration("initial"))
+        fm.save_migration(self._migration("second"))
+        original = fm.load_namespace_migrations("blog")
+        
+        converted = fm.convert_format("blog", "json")
+        assert converted == [
+            ("0001_initial.yaml", "0001_initial.json"),
+            ("0002_second.yaml", "0002_second.json"),
+        ]
+        assert fm.get_format("blog") == "json"
+        assert sorted(p.name for p in (tmp_path / "blog").glob("000*")) == ["0001_initial.json", "0002_second.json"]
+        assert FileManager(str(tmp_path)).load_namespace_migrations("blog") == original
+        
+        # 新迁移使用JSON格式并延续序号
+        assert fm.save_migration(self._migration("third")).name == "0003_third.json"
+        
+        fm.convert_format("blog", "yaml")
+        assert FileManager(str(tmp_path)).list_migration_files("blog") == [
+            "0001_initial.yaml", "0002_second.yaml", "0003_third.yaml"
+        ]
+        assert FileManager(str(tmp_path)).load_namespace_migrations("blog")[:2] == original
+    
+    def test_unknown_format_file(self, tmp_path):
+        """测试格式配置文件中的未知格式"""
+        (tmp_path / "blog").mkdir()
+        (tmp_path / "blog" / FileManager.FORMAT_FILE).write_text("toml\n", encoding="utf-8")
+        
+        with pytest.raises(ValueError):
+            FileManager(str(tmp_path)).get_format("blog")
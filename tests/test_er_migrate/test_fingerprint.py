@@ -0,0 +1,52 @@
+"""
+测试实体指纹
+"""
+from x007007007.er.models import Entity, Column, Index
+from x007007007.er_migrate.fingerprint import entity_fingerprint, entity_signature
+
+
+def _entity(name="User", **column_overrides):
+    return Entity(
+        name=name,
+        columns=[Column(name="id", type="uuid", is_pk=True), Column(name="email", type="string", **column_overrides)],
+        indexes=[Index(name="idx_a", columns=["id", "email"])]
+    )
+
+
+class TestEntityFingerprint:
+    """测试实体指纹"""
+
+    def test_same_structure_same_fingerprint(self):
+        """测试结构相同的实体（包括名称不同）指纹相同"""
+        assert entity_fingerprint(_entity()) == entity_fingerprint(_entity())
+        assert entity_fingerprint(_entity("User")) == entity_fingerprint(_entity("Account"))
+
+    def test_signature_matches_fingerprint(self):
+        """测试签名相等与指纹相等一致"""
+        assert entity_signature(_entity()) == entity_signature(_entity("Account"))
+        assert entity_signature(_entity(nullable=False)) != entity_signature(_entity())
+        assert hash(entity_signature(_entity())) == hash(entity_signature(_entity()))
+
+    def test_index_name_ignored(self):
+        """测试多列索引名不影响指纹"""
+        renamed = _entity()
+        renamed.indexes[0].name = "idx_b"
+        assert entity_fingerprint(renamed) == entity_fingerprint(_entity())
+
+    def test_any_column_property_changes_fingerprint(self):
+        """测试任何列属性变化都会改变指纹"""
+        base = entity_fingerprint(_entity())
+        for override in ({"nullable": False}, {"max_length": 10}, {"default": "x"}, {"indexed": True},
+                         {"comment": "邮箱"}, {"unique": True}, {"precision": 5}):
+            assert entity_fingerprint(_entity(**override)) != base
+
+    def test_column_order_and_index_changes(self):
+        """测试列顺序和索引变化会改变指纹"""
+        entity = _entity()
+        reordered = _entity()
+        reordered.columns.reverse()
+        assert entity_fingerprint(reordered) != entity_fingerprint(entity)
+
+        unique = _entity()
+        unique.indexes[0].unique = True
+        assert entity_fingerprint(unique) != entity_fingerprint(entity)
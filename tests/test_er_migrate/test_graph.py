@@ -0,0 +1,98 @@
+"""
+测试跨命名空间的迁移依赖图
+"""
+import pytest
+from click.testing import CliRunner
+from x007007007.er.models import ERModel, Entity, Column
+from x007007007.er_migrate.cli import cli
+from x007007007.er_migrate.file_manager import FileManager
+from x007007007.er_migrate.generator import MigrationGenerator
+from x007007007.er_migrate.graph import MigrationGraph
+from x007007007.er_migrate.models import Migration, CreateTable, ColumnDefinition
+
+
+def _save(file_manager, namespace, number, dependencies=(), replaces=()):
+    table = f"t{number}"
+    return file_manager.save_migration(Migration(
+        name=f"step{number}",
+        namespace=namespace,
+        dependencies=list(dependencies),
+        replaces=list(replaces),
+        operations=[CreateTable(table_name=table, columns=[ColumnDefinition(name="id", type="int")])],
+    ))
+
+
+class TestMigrationGraph:
+    """测试依赖图"""
+
+    def _tree(self, tmp_path):
+        fm = FileManager(str(tmp_path))
+        _save(fm, "auth", 1)
+        _save(fm, "auth", 2, ["auth.0001_step1"])
+        _save(fm, "blog", 1, ["auth.0002_step2"])
+        _save(fm, "blog", 2, ["blog.0001_step1"])
+        _save(fm, "shop", 1)
+        return fm
+
+    def test_topological_plan(self, tmp_path):
+        """测试依赖排在前面，同层迁移可以并发"""
+        self._tree(tmp_path)
+        plan = MigrationGraph.load(str(tmp_path)).plan()
+
+        assert plan.order == [
+            "auth.0001_step1", "shop.0001_step1", "auth.0002_step2", "blog.0001_step1", "blog.0002_step2",
+        ]
+        assert plan.stages[0] == ["auth.0001_step1", "shop.0001_step1"]
+        assert plan.groups == [["auth", "blog"], ["shop"]]
+
+    def test_unknown_dependency(self, tmp_path):
+        """测试依赖不存在的迁移时报错"""
+        _save(FileManager(str(tmp_path)), "blog", 1, ["auth.0001_initial"])
+        with pytest.raises(ValueError, match="unknown migration"):
+            MigrationGraph.load(str(tmp_path))
+
+    def test_cycle_detected(self, tmp_path):
+        """测试循环依赖"""
+        fm = FileManager(str(tmp_path))
+        _save(fm, "a", 1, ["b.0001_step1"])
+        _save(fm, "b", 1, ["a.0001_step1"])
+        graph = MigrationGraph.load(str(tmp_path))
+
+        assert graph.find_cycle() == ["a.0001_step1", "b.0001_step1", "a.0001_step1"]
+        with pytest.raises(ValueError, match="Circular"):
+            graph.plan()
+
+    def test_conflicting_leaves(self, tmp_path):
+        """测试同一命名空间的两个叶子迁移"""
+        fm = FileManager(str(tmp_path))
+        _save(fm, "blog", 1)
+        _save(fm, "blog", 2, ["blog.0001_step1"])
+        _save(fm, "blog", 3, ["blog.0001_step1"])
+        graph = MigrationGraph.load(str(tmp_path))
+
+        assert graph.conflicts() == {"blog": ["blog.0002_step2", "blog.0003_step3"]}
+        with pytest.raises(ValueError, match="Conflicting"):
+            graph.plan()
+
+    def test_dependency_on_replaced_migration(self, tmp_path):
+        """测试指向被替代原迁移的依赖解析为压缩迁移"""
+        model = ERModel()
+        generator = MigrationGenerator(str(tmp_path))
+        for name in ("User", "Tag"):
+            model.add_entity(Entity(name=name, columns=[Column(name="id", type="int", is_pk=True)]))
+            generator.file_manager.save_migration(generator.generate("auth", model))
+        generator.file_manager.save_migration(generator.squash("auth"))
+        _save(generator.file_manager, "blog", 1, ["auth.0002_create_tag"])
+
+        graph = MigrationGraph.load(str(tmp_path))
+        assert graph.nodes["blog.0001_step1"] == ["auth.0001_squashed_0002_create_tag"]
+        assert graph.plan().order == ["auth.0001_squashed_0002_create_tag", "blog.0001_step1"]
+
+    def test_showmigrations_plan(self, tmp_path):
+        """测试showmigrations --plan输出执行计划"""
+        self._tree(tmp_path)
+        result = CliRunner().invoke(cli, ['showmigrations', '--plan', '-d', str(tmp_path)])
+
+        assert result.exit_code == 0
+        assert "Stage 1: auth.0001_step1, shop.0001_step1" in result.output
+        assert "auth, blog | shop" in result.output
@@ -0,0 +1,59 @@
+"""
+测试迁移历史
+"""
+import pytest
+from x007007007.er.models import ERModel, Entity, Column
+from x007007007.er_migrate.generator import MigrationGenerator
+from x007007007.er_migrate.history import MigrationHistory
+
+
+def _model(*names):
+    model = ERModel()
+    for name in names:
+        model.add_entity(Entity(name=name, columns=[Column(name="id", type="int", is_pk=True)]))
+    return model
+
+
+class TestMigrationHistory:
+    """测试迁移历史"""
+
+    def test_empty_namespace(self, tmp_path):
+        """测试空命名空间"""
+        generator = MigrationGenerator(str(tmp_path))
+        history = generator.load_history("blog")
+        assert len(history) == 0
+        assert history.migrations == []
+        assert history.last_migration_id is None
+        assert history.chain_hashes() == []
+
+    def test_entries_and_last_id(self, tmp_path):
+        """测试迁移ID与Migration对象一一对应"""
+        generator = MigrationGenerator(str(tmp_path))
+        generator.file_manager.save_migration(generator.generate("blog", _model("User")))
+        generator.file_manager.save_migration(generator.generate("blog", _model("User", "Post")))
+
+        history = MigrationHistory(generator.file_manager, "blog")
+        ids = [migration_id for migration_id, _ in history.entries()]
+        assert ids == ["0001_initial", "0002_create_post"]
+        assert history.last_migration_id == "0002_create_post"
+        assert history.load("0001_initial.yaml") is history.migrations[0]
+
+    def test_generate_parses_each_file_once(self, tmp_path, monkeypatch):
+        """测试生成迁移时每个文件只解析一次"""
+        generator = MigrationGenerator(str(tmp_path), snapshot_interval=0)
+        generator.file_manager.save_migration(generator.generate("blog", _model("User")))
+        generator.file_manager.save_migration(generator.generate("blog", _model("User", "Post")))
+
+        parsed = []
+        original_parse = generator.file_manager.parse_migration
+
+        def tracking_parse(namespace, content, **kwargs):
+            migration = original_parse(namespace, content, **kwargs)
+            parsed.append(migration.name)
+            return migration
+
+        monkeypatch.setattr(generator.file_manager, "parse_migration", tracking_parse)
+        migration = generator.generate("blog", _model("User", "Post", "Tag"))
+
+        assert migration.dependencies == ["blog.0002_create_post"]
+        assert sorted(parsed) == ["create_post", "initial"]
@@ -0,0 +1,92 @@
+"""
+测试迁移目录索引
+"""
+import json
+import os
+import pytest
+from x007007007.er_migrate.file_manager import FileManager
+from x007007007.er_migrate.index import MigrationIndex, parse_migration_number
+from x007007007.er_migrate.models import Migration
+
+
+def _save(fm, name, dependencies=None):
+    return fm.save_migration(Migration(
+        name=name,
+        namespace="blog",
+        dependencies=dependencies or [],
+        operations=[]
+    ))
+
+
+class TestMigrationIndex:
+    """测试迁移目录索引"""
+
+    def test_parse_migration_number(self):
+        """测试从文件名解析序号"""
+        assert parse_migration_number("0001_initial.yaml") == 1
+        assert parse_migration_number("0042_add_user.yml") == 42
+        assert parse_migration_number("initial.yaml") is None
+
+    def test_index_records_header(self, tmp_path):
+        """测试索引记录文件头、序号和哈希"""
+        fm = FileManager(str(tmp_path))
+        _save(fm, "initial")
+        _save(fm, "add_post", dependencies=["blog.0001_initial"])
+
+        with open(tmp_path / "blog" / MigrationIndex.INDEX_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+        entry = data["entries"]["0002_add_post.yaml"]
+        assert entry["number"] == 2
+        assert entry["name"] == "add_post"
+        assert entry["dependencies"] == ["blog.0001_initial"]
+        assert len(entry["sha256"]) == 64
+
+    def test_unchanged_files_are_not_reparsed(self, tmp_path):
+        """测试mtime未变化的文件不会被重新解析"""
+        _save(FileManager(str(tmp_path)), "initial")
+        _save(FileManager(str(tmp_path)), "add_post")
+
+        fm = FileManager(str(tmp_path))
+        parsed = []
+        index = fm.get_index("blog")
+        original = index.parse_header
+        index.parse_header = lambda content: parsed.append(content) or original(content)
+
+        assert fm.list_migration_files("blog") == ["0001_initial.yaml", "0002_add_post.yaml"]
+        assert fm.get_next_migration_number("blog") == 3
+        assert parsed == []
+
+    def test_changed_file_is_reindexed(self, tmp_path):
+        """测试修改过的文件被重新索引"""
+        fm = FileManager(str(tmp_path))
+        path = _save(fm, "initial")
+
+        path.write_text(path.read_text(encoding="utf-8").replace("name: initial", "name: renamed"), encoding="utf-8")
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        entries = FileManager(str(tmp_path)).get_index_entries("blog")
+        assert entries["0001_initial.yaml"]["name"] == "renamed"
+
+    def test_added_and_removed_files(self, tmp_path):
+        """测试新增和删除的文件反映在索引中"""
+        fm = FileManager(str(tmp_path))
+        first = _save(fm, "initial")
+        _save(fm, "add_post")
+
+        first.unlink()
+        (tmp_path / "blog" / "0003_manual.yml").write_text(
+            "name: manual\nnamespace: blog\noperations: []\n", encoding="utf-8"
+        )
+
+        assert fm.list_migration_files("blog") == ["0002_add_post.yaml", "0003_manual.yml"]
+        assert fm.get_next_migration_number("blog") == 4
+
+    def test_corrupt_index_is_rebuilt(self, tmp_path):
+        """测试损坏的索引被重建"""
+        _save(FileManager(str(tmp_path)), "initial")
+        (tmp_path / "blog" / MigrationIndex.INDEX_FILE).write_text("{broken", encoding="utf-8")
+
+        fm = FileManager(str(tmp_path))
+        assert fm.list_migration_files("blog") == ["0001_initial.yaml"]
+        assert _save(fm, "add_post").name == "0002_add_post.yaml"
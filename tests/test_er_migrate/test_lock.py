@@ -0,0 +1,191 @@
+"""
+测试并发保存迁移：文件锁、独占写入和叶子迁移冲突检测
+"""
+import threading
+import pytest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from click.testing import CliRunner
+from x007007007.er_migrate.cli import cli
+from x007007007.er_migrate.file_manager import FileManager
+from x007007007.er_migrate.history import MigrationHistory
+from x007007007.er_migrate.lock import FileLock, write_atomic, write_exclusive
+from x007007007.er_migrate.models import Migration, CreateTable, ColumnDefinition
+
+
+def _migration(namespace, name, dependencies=(), replaces=()):
+    return Migration(
+        name=name,
+        namespace=namespace,
+        dependencies=list(dependencies),
+        replaces=list(replaces),
+        operations=[CreateTable(table_name=name, columns=[ColumnDefinition(name="id", type="int")])],
+    )
+
+
+def _save_in_new_manager(migrations_dir, namespace, name):
+    """每个进程/线程使用独立的FileManager，模拟并行执行的makemigrations"""
+    return FileManager(migrations_dir).save_migration(_migration(namespace, name)).name
+
+
+class TestFileLock:
+    """测试文件锁"""
+
+    def test_exclusive_between_holders(self, tmp_path):
+        """测试另一个持有者在锁释放前无法获取"""
+        path = tmp_path / ".lock"
+        with FileLock(path):
+            with pytest.raises(TimeoutError):
+                FileLock(path, timeout=0.1).acquire()
+        with FileLock(path, timeout=0.1):
+            pass
+
+    def test_reentrant(self, tmp_path):
+        """测试同一个锁对象可以重入，最外层退出时才释放"""
+        lock = FileLock(tmp_path / ".lock")
+        with lock:
+            with lock:
+                assert lock.locked
+            assert lock.locked
+            with pytest.raises(TimeoutError):
+                FileLock(tmp_path / ".lock", timeout=0.1).acquire()
+        assert not lock.locked
+
+    def test_waiter_gets_lock_after_release(self, tmp_path):
+        """测试等待中的持有者在锁释放后获取到锁"""
+        path = tmp_path / ".lock"
+        order = []
+        lock = FileLock(path)
+        lock.acquire()
+
+        def waiter():
+            with FileLock(path, timeout=5):
+                order.append("waiter")
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        order.append("holder")
+        lock.release()
+        thread.join()
+        assert order == ["holder", "waiter"]
+
+
+class TestWrite:
+    """测试原子写入"""
+
+    def test_write_exclusive_refuses_existing(self, tmp_path):
+        """测试目标已存在时独占写入失败且不修改原文件，不残留临时文件"""
+        path = tmp_path / "0001_a.yaml"
+        write_exclusive(path, b"first")
+        with pytest.raises(FileExistsError):
+            write_exclusive(path, b"second")
+        assert path.read_bytes() == b"first"
+        assert [p.name for p in tmp_path.iterdir()] == ["0001_a.yaml"]
+
+    def test_write_atomic_replaces(self, tmp_path):
+        """测试原子写入覆盖已有文件"""
+        path = tmp_path / ".index.json"
+        write_atomic(path, b"old")
+        write_atomic(path, b"new")
+        assert path.read_bytes() == b"new"
+        assert [p.name for p in tmp_path.iterdir()] == [".index.json"]
+
+
+class TestConcurrentSave:
+    """测试并发保存迁移"""
+
+    def test_threads_get_distinct_numbers(self, tmp_path):
+        """测试多个FileManager并发保存得到不同的序号"""
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            names = list(pool.map(
+                lambda i: _save_in_new_manager(str(tmp_path), "blog", f"step{i}"), range(16)
+            ))
+        numbers = sorted(int(name[:4]) for name in names)
+        assert numbers == list(range(1, 17))
+        assert len(FileManager(str(tmp_path)).list_migration_files("blog")) == 16
+
+    def test_processes_get_distinct_numbers(self, tmp_path):
+        """测试多个进程并发保存得到不同的序号"""
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(_save_in_new_manager, str(tmp_path), "blog", f"step{i}") for i in range(8)]
+            names = [future.result() for future in futures]
+        assert sorted(int(name[:4]) for name in names) == list(range(1, 9))
+
+    def test_namespaces_independent(self, tmp_path):
+        """测试不同命名空间各自编号"""
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            names = list(pool.map(
+                lambda ns: _save_in_new_manager(str(tmp_path), ns, "initial"), ["a", "b", "c", "d"]
+            ))
+        assert names == ["0001_initial.yaml"] * 4
+
+    def test_existing_filename_takes_next_number(self, tmp_path):
+        """测试文件名被不遵守锁的写入方占用时使用下一个序号"""
+        fm = FileManager(str(tmp_path))
+        fm.save_migration(_migration("blog", "initial"))
+        # 绕过锁直接写入，且索引还不知道这个文件
+        (tmp_path / "blog" / "0002_tag.yaml").write_bytes(b"name: other\n")
+        fm.get_index("blog")._entries.pop("0002_tag.yaml", None)
+
+        path = fm.save_migration(_migration("blog", "tag", ["blog.0001_initial"]))
+        assert path.name == "0003_tag.yaml"
+        assert (tmp_path / "blog" / "0002_tag.yaml").read_bytes() == b"name: other\n"
+
+    def test_check_latest_rejects_stale_migration(self, tmp_path):
+        """测试生成后命名空间出现了新迁移时拒绝保存"""
+        fm = FileManager(str(tmp_path))
+        fm.save_migration(_migration("blog", "initial"))
+        stale = _migration("blog", "post", ["blog.0001_initial"])
+        FileManager(str(tmp_path)).save_migration(_migration("blog", "tag", ["blog.0001_initial"]))
+
+        with pytest.raises(ValueError, match="latest migration is now 0002_tag"):
+            fm.save_migration(stale, check_latest=True)
+        assert fm.list_migration_files("blog") == ["0001_initial.yaml", "0002_tag.yaml"]
+
+        fresh = _migration("blog", "post", ["blog.0002_tag"])
+        assert fm.save_migration(fresh, check_latest=True).name == "0003_post.yaml"
+
+
+class TestLeaves:
+    """测试叶子迁移冲突检测"""
+
+    def test_linear_history_has_one_leaf(self, tmp_path):
+        """测试线性历史只有一个叶子"""
+        fm = FileManager(str(tmp_path))
+        fm.save_migration(_migration("blog", "initial"))
+        fm.save_migration(_migration("blog", "post", ["blog.0001_initial"]))
+        assert MigrationHistory(fm, "blog").leaves == ["0002_post"]
+
+    def test_branches_detected(self, tmp_path):
+        """测试基于同一个迁移生成的两个迁移都是叶子"""
+        fm = FileManager(str(tmp_path))
+        fm.save_migration(_migration("blog", "initial"))
+        fm.save_migration(_migration("blog", "post", ["blog.0001_initial"]))
+        fm.save_migration(_migration("blog", "tag", ["blog.0001_initial"]))
+        assert MigrationHistory(fm, "blog").leaves == ["0002_post", "0003_tag"]
+
+    def test_dependency_on_replaced_migration(self, tmp_path):
+        """测试依赖被替代的原迁移视为依赖压缩迁移"""
+        fm = FileManager(str(tmp_path))
+        fm.save_migration(_migration("blog", "initial"))
+        fm.save_migration(_migration("blog", "post", ["blog.0001_initial"]))
+        fm.save_migration(_migration("blog", "tag", ["blog.0002_post"]))
+        fm.save_migration(_migration("blog", "squashed", replaces=["blog.0001_initial", "blog.0002_post"]))
+        assert MigrationHistory(fm, "blog").leaves == ["0003_tag"]
+
+    def test_cli_refuses_to_generate_on_conflict(self, tmp_path):
+        """测试有冲突时makemigrations拒绝生成，showmigrations给出警告"""
+        fm = FileManager(str(tmp_path))
+        fm.save_migration(_migration("blog", "initial"))
+        fm.save_migration(_migration("blog", "post", ["blog.0001_initial"]))
+        fm.save_migration(_migration("blog", "tag", ["blog.0001_initial"]))
+        er_file = tmp_path / "schema.mmd"
+        er_file.write_text("erDiagram\n    User {\n        uuid id PK\n    }\n", encoding="utf-8")
+
+        runner = CliRunner()
+        result = runner.invoke(cli, ["makemigrations", "-n", "blog", "-e", str(er_file), "-d", str(tmp_path)])
+        assert result.exit_code != 0
+        assert "Conflicting migrations in 'blog': 0002_post, 0003_tag" in result.output
+        assert len(fm.list_migration_files("blog")) == 3
+
+        result = runner.invoke(cli, ["showmigrations", "-d", str(tmp_path)])
+        assert "Conflicting latest migrations (merge needed): 0002_post, 0003_tag" in result.output
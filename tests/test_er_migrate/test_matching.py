@@ -0,0 +1,98 @@
+"""
+测试重命名匹配
+"""
+import random
+import pytest
+from x007007007.er.models import Entity, Column
+from x007007007.er_migrate.differ import ERDiffer
+from x007007007.er_migrate.matching import best_matching, jaccard_candidates
+
+
+def _entity(name, columns):
+    return Entity(name=name, columns=[Column(name=col, type="string") for col in columns])
+
+
+class TestJaccardCandidates:
+    """测试候选对查找"""
+
+    def test_matches_brute_force(self):
+        """测试前缀过滤与暴力比较结果一致"""
+        rng = random.Random(7)
+        vocabulary = [f"col_{i}" for i in range(40)] + ["id"] * 10
+        left = {f"l{i}": set(rng.sample(vocabulary, rng.randint(1, 12))) | {"id"} for i in range(60)}
+        right = {}
+        for i, (key, items) in enumerate(left.items()):
+            changed = set(items)
+            if i % 3:
+                changed.discard(rng.choice(sorted(changed)))
+            if i % 4 == 0:
+                changed.add(f"extra_{i}")
+            right[f"r{i}"] = changed
+
+        expected = {}
+        for lk, litems in left.items():
+            for rk, ritems in right.items():
+                similarity = len(litems & ritems) / len(litems | ritems)
+                if similarity >= 0.8:
+                    expected[(lk, rk)] = similarity
+
+        assert jaccard_candidates(left, right, 0.8) == pytest.approx(expected)
+
+    def test_empty_sets_never_match(self):
+        """测试空集合不产生候选"""
+        assert jaccard_candidates({"a": set()}, {"b": set()}, 0.8) == {}
+
+
+class TestBestMatching:
+    """测试最优匹配"""
+
+    def test_optimal_not_greedy(self):
+        """测试求总得分最大的匹配而不是贪心"""
+        candidates = {("a", "x"): 0.95, ("a", "y"): 0.85, ("b", "x"): 0.85}
+        assert best_matching(candidates) == {"a": "y", "b": "x"}
+
+    def test_rectangular(self):
+        """测试左右数量不同"""
+        candidates = {("a", "x"): 0.9, ("b", "x"): 0.8, ("c", "x"): 0.85}
+        assert best_matching(candidates) == {"a": "x"}
+        candidates = {("a", "x"): 0.8, ("a", "y"): 0.9, ("a", "z"): 0.85}
+        assert best_matching(candidates) == {"a": "y"}
+
+    def test_independent_components(self):
+        """测试互不相关的候选分别匹配"""
+        candidates = {("a", "x"): 0.9, ("b", "y"): 0.8, ("c", "y"): 0.81}
+        assert best_matching(candidates) == {"a": "x", "c": "y"}
+
+
+class TestTableRenameDetection:
+    """测试表重命名检测"""
+
+    def test_order_independent(self):
+        """测试匹配结果与表的遍历顺序无关"""
+        columns = ["id", "a", "b", "c", "d", "e", "f", "g", "h", "i"]
+        dropped = {
+            "old_1": _entity("Old1", columns),
+            "old_2": _entity("Old2", columns[:-1] + ["j"]),
+        }
+        created = {
+            "new_1": _entity("New1", columns[:-1] + ["j"]),
+            "new_2": _entity("New2", columns),
+        }
+        differ = ERDiffer()
+        expected = {"old_1": "new_2", "old_2": "new_1"}
+        assert differ._detect_table_renames(dropped, created) == expected
+        reversed_dropped = dict(reversed(list(dropped.items())))
+        assert differ._detect_table_renames(reversed_dropped, created) == expected
+
+    def test_many_tables(self):
+        """测试大量表同时重命名"""
+        dropped = {}
+        created = {}
+        for i in range(300):
+            columns = ["id", "created_at"] + [f"t{i}_c{j}" for j in range(8)]
+            dropped[f"legacy_{i}"] = _entity(f"Legacy{i}", columns)
+            # 奇数表换掉3列（相似度7/13），不应识别为重命名
+            created[f"table_{i}"] = _entity(f"Table{i}", columns[:-3] + [f"t{i}_new{j}" for j in range(3)] if i % 2 else columns)
+
+        renames = ERDiffer()._detect_table_renames(dropped, created)
+        assert renames == {f"legacy_{i}": f"table_{i}" for i in range(300) if i % 2 == 0}
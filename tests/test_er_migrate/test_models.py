@@ -17,6 +17,7 @@ from x007007007.er_migrate.models import (
     AddForeignKey,
     RemoveForeignKey,
     Migration,
+    construct_migration,
 )
 
 
@@ -291,3 +292,47 @@ class TestMigration:
         assert migration.name == "initial"
         assert len(migration.operations) == 1
         assert isinstance(migration.operations[0], CreateTable)
+    
+    def test_unknown_operation_type_rejected(self):
+        """测试未知的操作类型被拒绝"""
+        with pytest.raises(ValidationError):
+            Migration(
+                name="bad",
+                namespace="test",
+                operations=[{"type": "DropEverything", "table_name": "user"}]
+            )
+
+
+class TestConstructMigration:
+    """测试跳过校验的快速构造"""
+    
+    def test_construct_matches_validated(self):
+        """测试快速构造与完整校验得到相同的对象"""
+        from datetime import datetime
+        
+        data = {
+            "version": "1.0",
+            "name": "initial",
+            "namespace": "test",
+            "dependencies": ["other.0001_initial"],
+            "operations": [
+                {
+                    "type": "CreateTable",
+                    "table_name": "user",
+                    "columns": [{"name": "id", "type": "uuid", "primary_key": True, "nullable": False}]
+                },
+                {"type": "AddIndex", "table_name": "user", "index": {"name": "idx_user_id", "columns": ["id"]}},
+                {
+                    "type": "AddForeignKey",
+                    "table_name": "post",
+                    "foreign_key": {"column_name": "user_id", "reference_table": "user", "reference_column": "id"}
+                },
+                {"type": "AlterColumn", "table_name": "user", "column_name": "id", "new_nullable": True},
+            ],
+            "created_at": datetime(2024, 1, 1, 12, 0, 0)
+        }
+        
+        constructed = construct_migration(data)
+        assert constructed == Migration(**data)
+        assert isinstance(constructed.operations[0].columns[0], ColumnDefinition)
+        assert constructed.operations[2].foreign_key.on_delete == "CASCADE"
@@ -0,0 +1,203 @@
+"""
+测试迁移操作优化器
+"""
+import pytest
+from x007007007.er.models import ERModel, Entity, Column, Relationship
+from x007007007.er_migrate.differ import ERDiffer
+from x007007007.er_migrate.optimizer import MigrationOptimizer
+from x007007007.er_migrate.models import (
+    CreateTable,
+    DropTable,
+    RenameTable,
+    AddColumn,
+    RemoveColumn,
+    AlterColumn,
+    RenameColumn,
+    AddIndex,
+    RemoveIndex,
+    AddForeignKey,
+    RemoveForeignKey,
+    ColumnDefinition,
+    IndexDefinition,
+    ForeignKeyDefinition,
+)
+
+
+def _create(table, *columns):
+    return CreateTable(table_name=table, columns=[
+        ColumnDefinition(name="id", type="uuid", primary_key=True, nullable=False),
+        *(ColumnDefinition(name=name, type="string") for name in columns),
+    ])
+
+
+def _fk(table, column, reference):
+    return AddForeignKey(table_name=table, foreign_key=ForeignKeyDefinition(
+        column_name=column, reference_table=reference, reference_column="id"
+    ))
+
+
+class TestMerge:
+    """测试合并冗余操作"""
+
+    def test_create_then_alter_merged_into_create(self):
+        """测试先建后改合并为CreateTable"""
+        ops = MigrationOptimizer().optimize([
+            _create("user", "name"),
+            AddColumn(table_name="user", column=ColumnDefinition(name="email", type="string")),
+            AlterColumn(table_name="user", column_name="name", new_max_length=50, new_nullable=False),
+            RenameColumn(table_name="user", old_name="email", new_name="mail"),
+        ])
+
+        assert len(ops) == 1
+        columns = {col.name: col for col in ops[0].columns}
+        assert set(columns) == {"id", "name", "mail"}
+        assert columns["name"].max_length == 50
+        assert columns["name"].nullable is False
+
+    def test_add_then_remove_cancels(self):
+        """测试先加后删相互抵消"""
+        ops = MigrationOptimizer().optimize([
+            AddColumn(table_name="user", column=ColumnDefinition(name="tmp", type="int")),
+            AddIndex(table_name="user", index=IndexDefinition(name="idx_user_tmp", columns=["tmp"])),
+            AlterColumn(table_name="user", column_name="tmp", new_type="bigint"),
+            RemoveColumn(table_name="user", column_name="tmp"),
+            AddIndex(table_name="user", index=IndexDefinition(name="idx_user_name", columns=["name"])),
+            RemoveIndex(table_name="user", index_name="idx_user_name"),
+        ])
+        assert ops == []
+
+    def test_create_then_drop_cancels(self):
+        """测试先建后删的表及其所有操作相互抵消"""
+        ops = MigrationOptimizer().optimize([
+            _create("tag"),
+            AddIndex(table_name="tag", index=IndexDefinition(name="idx_tag_id", columns=["id"])),
+            _fk("tag", "user_id", "user"),
+            DropTable(table_name="tag"),
+        ])
+        assert ops == []
+
+    def test_alter_columns_merged(self):
+        """测试同一列的多个AlterColumn合并为一个"""
+        ops = MigrationOptimizer().optimize([
+            AlterColumn(table_name="user", column_name="name", new_type="text"),
+            AlterColumn(table_name="user", column_name="name", new_nullable=False),
+            AlterColumn(table_name="user", column_name="name", new_type="varchar", new_max_length=10),
+        ])
+        assert ops == [AlterColumn(
+            table_name="user", column_name="name", new_type="varchar", new_nullable=False, new_max_length=10
+        )]
+
+    def test_rename_chain_merged(self):
+        """测试连续重命名合并，改回原名时消失"""
+        optimizer = MigrationOptimizer()
+        assert optimizer.optimize([
+            RenameTable(old_name="a", new_name="b"),
+            RenameTable(old_name="b", new_name="c"),
+        ]) == [RenameTable(old_name="a", new_name="c")]
+        assert optimizer.optimize([
+            RenameTable(old_name="a", new_name="b"),
+            RenameTable(old_name="b", new_name="a"),
+        ]) == []
+
+    def test_create_then_rename(self):
+        """测试先建后改名直接以新名称创建"""
+        ops = MigrationOptimizer().optimize([
+            _create("post"),
+            _create("draft"),
+            _fk("post", "draft_id", "draft"),
+            RenameTable(old_name="draft", new_name="article"),
+        ])
+        assert [op.table_name for op in ops if isinstance(op, CreateTable)] == ["article", "post"]
+        assert ops[-1].foreign_key.reference_table == "article"
+
+    def test_input_not_modified(self):
+        """测试不修改传入的操作"""
+        create = _create("user")
+        MigrationOptimizer().optimize([
+            create,
+            AddColumn(table_name="user", column=ColumnDefinition(name="email", type="string")),
+        ])
+        assert [col.name for col in create.columns] == ["id"]
+
+
+class TestOrder:
+    """测试依赖排序"""
+
+    def test_referenced_tables_created_first(self):
+        """测试被引用的表先创建，外键最后添加"""
+        ops = MigrationOptimizer().optimize([
+            _create("comment", "post_id"),
+            _fk("comment", "post_id", "post"),
+            _create("post", "user_id"),
+            _fk("post", "user_id", "user"),
+            _create("user"),
+        ])
+        assert [op.type for op in ops] == ["CreateTable"] * 3 + ["AddForeignKey"] * 2
+        assert [op.table_name for op in ops[:3]] == ["user", "post", "comment"]
+
+    def test_referencing_tables_dropped_first(self):
+        """测试引用其他表的表先删除"""
+        ops = MigrationOptimizer().optimize(
+            [DropTable(table_name="user"), DropTable(table_name="post")],
+            references={"post": {"user"}},
+        )
+        assert [op.table_name for op in ops] == ["post", "user"]
+
+    def test_same_table_operations_batched(self):
+        """测试同一张表的变更排在一起，先删索引后建索引"""
+        ops = MigrationOptimizer().optimize([
+            AddColumn(table_name="user", column=ColumnDefinition(name="age", type="int")),
+            AddColumn(table_name="post", column=ColumnDefinition(name="title", type="string")),
+            AddIndex(table_name="user", index=IndexDefinition(name="idx_user_age", columns=["age"])),
+            RemoveIndex(table_name="user", index_name="idx_user_name"),
+            RemoveForeignKey(table_name="post", constraint_name="fk_post_user_id"),
+        ])
+        assert [(op.type, op.table_name) for op in ops] == [
+            ("RemoveForeignKey", "post"),
+            ("RemoveIndex", "user"),
+            ("AddColumn", "user"),
+            ("AddIndex", "user"),
+            ("AddColumn", "post"),
+        ]
+
+    def test_drop_freeing_rename_target(self):
+        """测试删除被改名占用的表排在改名之前"""
+        ops = MigrationOptimizer().optimize([
+            RenameTable(old_name="user_v2", new_name="user"),
+            DropTable(table_name="user"),
+        ])
+        assert ops == [DropTable(table_name="user_v2")]
+
+        ops = MigrationOptimizer().optimize([
+            DropTable(table_name="user"),
+            RenameTable(old_name="user_v2", new_name="user"),
+            AddColumn(table_name="user", column=ColumnDefinition(name="age", type="int")),
+        ])
+        assert [op.type for op in ops] == ["DropTable", "RenameTable", "AddColumn"]
+
+
+class TestDifferIntegration:
+    """测试差异检测器输出经过优化"""
+
+    def test_diff_creates_referenced_tables_first(self):
+        """测试差异检测器按外键依赖输出CreateTable"""
+        model = ERModel()
+        model.add_entity(Entity(name="Post", columns=[
+            Column(name="id", type="uuid", is_pk=True), Column(name="user_id", type="uuid")
+        ]))
+        model.add_entity(Entity(name="User", columns=[Column(name="id", type="uuid", is_pk=True)]))
+        model.add_relationship(Relationship(
+            left_entity="Post", right_entity="User", relation_type="many-to-one",
+            left_column="user_id", right_column="id"
+        ))
+
+        ops = ERDiffer().diff(ERModel(), model)
+        creates = [op.table_name for op in ops if isinstance(op, CreateTable)]
+        assert creates == ["user", "post"]
+        assert ops[-1].type == "AddForeignKey"
+
+    def test_diff_without_optimizer(self):
+        """测试可以关闭优化"""
+        model = ERModel()
+        model.add_entity(Entity(name="User", columns=[Column(name="id", type="uuid", is_pk=True)]))
+        assert ERDiffer(optimize=False).diff(ERModel(), model) == ERDiffer().diff(ERModel(), model)
@@ -0,0 +1,143 @@
+"""
+测试状态快照
+"""
+import pytest
+from x007007007.er.models import ERModel, Entity, Column, Relationship, Index
+from x007007007.er_migrate.generator import MigrationGenerator
+from x007007007.er_migrate.snapshot import serialize_state, deserialize_state
+
+
+def _save_history(generator, namespace, count):
+    """生成count个依次新增一张表的迁移"""
+    model = ERModel()
+    for i in range(count):
+        model.add_entity(Entity(
+            name=f"Table{i}",
+            columns=[Column(name="id", type="int", is_pk=True)]
+        ))
+        migration = generator.generate(namespace, model)
+        generator.file_manager.save_migration(migration)
+    return model
+
+
+class TestStateSerialization:
+    """测试状态序列化"""
+
+    def test_round_trip(self):
+        """测试序列化后可以无损恢复"""
+        model = ERModel()
+        model.add_entity(Entity(
+            name="User",
+            columns=[
+                Column(name="id", type="uuid", is_pk=True, nullable=False),
+                Column(name="email", type="string", max_length=100, unique=True, comment="邮箱")
+            ],
+            indexes=[Index(name="idx_user_id_email", columns=["id", "email"])]
+        ))
+        model.add_entity(Entity(name="Post", columns=[Column(name="user_id", type="uuid")]))
+        model.add_relationship(Relationship(
+            left_entity="Post", right_entity="User", relation_type="many-to-one",
+            left_column="user_id", right_column="id"
+        ))
+
+        restored = deserialize_state(serialize_state(model))
+        assert restored == model
+
+
+class TestSnapshotRebuild:
+    """测试基于快照的状态重建"""
+
+    def test_snapshot_written_at_interval(self, tmp_path):
+        """测试每跨过interval个迁移写入一个快照"""
+        generator = MigrationGenerator(str(tmp_path), snapshot_interval=2)
+        _save_history(generator, "blog", 5)
+
+        generator._rebuild_state("blog")
+
+        snapshot_dir = tmp_path / "blog" / ".snapshots"
+        counts = sorted(p.name[:4] for p in snapshot_dir.glob("*.json"))
+        assert counts == ["0002", "0004"]
+        # 快照不会被当成迁移文件
+        assert len(generator.file_manager.list_migration_files("blog")) == 5
+
+    def test_rebuild_replays_only_newer_migrations(self, tmp_path, monkeypatch):
+        """测试只重放快照之后的迁移，且结果与完整重放一致"""
+        generator = MigrationGenerator(str(tmp_path), snapshot_interval=3)
+        _save_history(generator, "blog", 4)
+        generator._rebuild_state("blog")
+
+        parsed = []
+        original_parse = generator.file_manager.parse_migration
+
+        def tracking_parse(namespace, content, **kwargs):
+            migration = original_parse(namespace, content, **kwargs)
+            parsed.append(migration.name)
+            return migration
+
+        monkeypatch.setattr(generator.file_manager, "parse_migration", tracking_parse)
+        rebuilt = generator._rebuild_state("blog")
+
+        assert parsed == ["create_table3"]
+        full = MigrationGenerator(str(tmp_path), snapshot_interval=0)._rebuild_state("blog")
+        assert rebuilt == full
+
+    def test_modified_history_invalidates_snapshot(self, tmp_path):
+        """测试修改已覆盖的迁移文件后快照失效"""
+        generator = MigrationGenerator(str(tmp_path), snapshot_interval=2)
+        _save_history(generator, "blog", 2)
+        generator._rebuild_state("blog")
+
+        # 手工修改第一个迁移：把table0改名为renamed0
+        first = tmp_path / "blog" / "0001_initial.yaml"
+        content = first.read_text(encoding="utf-8")
+        first.write_text(content.replace("table_name: table0", "table_name: renamed0"), encoding="utf-8")
+
+        rebuilt = generator._rebuild_state("blog")
+        assert "Renamed0" in rebuilt.entities
+        assert "Table0" not in rebuilt.entities
+
+    def test_corrupt_snapshot_is_ignored(self, tmp_path):
+        """测试损坏的快照文件被忽略"""
+        generator = MigrationGenerator(str(tmp_path), snapshot_interval=2)
+        model = _save_history(generator, "blog", 2)
+        generator._rebuild_state("blog")
+
+        for path in (tmp_path / "blog" / ".snapshots").glob("*.json"):
+            path.write_text("{not json", encoding="utf-8")
+
+        rebuilt = generator._rebuild_state("blog")
+        assert set(rebuilt.entities) == set(model.entities)
+        assert generator.generate("blog", model) is None
+
+    def test_other_version_snapshot_is_ignored(self, tmp_path):
+        """测试其他版本写入的快照不被使用（重放逻辑可能不同）"""
+        import json
+        generator = MigrationGenerator(str(tmp_path), snapshot_interval=2)
+        _save_history(generator, "blog", 2)
+        generator._rebuild_state("blog")
+
+        # 伪造旧版本的快照：内容被篡改，如果被使用会丢失Table1
+        path, = (tmp_path / "blog" / ".snapshots").glob("*.json")
+        data = json.loads(path.read_text(encoding="utf-8"))
+        data["version"] = "0.0.0"
+        data["state"]["entities"] = data["state"]["entities"][:1]
+        path.write_text(json.dumps(data), encoding="utf-8")
+
+        assert set(generator._rebuild_state("blog").entities) == {"Table0", "Table1"}
+
+    def test_snapshot_written_atomically(self, tmp_path, monkeypatch):
+        """测试写入中断时不留下截断的快照，已有的快照保持不变"""
+        from x007007007.er_migrate import lock
+        generator = MigrationGenerator(str(tmp_path), snapshot_interval=2)
+        _save_history(generator, "blog", 2)
+        generator._rebuild_state("blog")
+        snapshot_dir = tmp_path / "blog" / ".snapshots"
+        before = {path.name: path.read_bytes() for path in snapshot_dir.iterdir()}
+
+        def interrupted(path, content):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(lock.os, "replace", interrupted)
+        with pytest.raises(OSError):
+            generator.snapshots.save("blog", 2, "0" * 64, {"entities": [], "relationships": []})
+        assert {path.name: path.read_bytes() for path in snapshot_dir.iterdir()} == before
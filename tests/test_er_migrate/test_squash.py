@@ -0,0 +1,165 @@
+"""
+测试迁移压缩
+"""
+import pytest
+from click.testing import CliRunner
+from x007007007.er.models import ERModel, Entity, Column, Relationship
+from x007007007.er_migrate.cli import cli
+from x007007007.er_migrate.generator import MigrationGenerator
+from x007007007.er_migrate.models import Migration, RunBackfill
+
+
+def _user(*extra_columns, indexed_name=False):
+    columns = [Column(name="id", type="uuid", is_pk=True), Column(name="name", type="string", indexed=indexed_name)]
+    columns.extend(Column(name=name, type="string") for name in extra_columns)
+    return Entity(name="User", columns=columns)
+
+
+def _model(*entities, relationships=()):
+    model = ERModel()
+    for entity in entities:
+        model.add_entity(entity)
+    for rel in relationships:
+        model.add_relationship(rel)
+    return model
+
+
+def _post():
+    return Entity(name="Post", columns=[
+        Column(name="id", type="uuid", is_pk=True),
+        Column(name="user_id", type="uuid"),
+    ])
+
+
+def _save_history(generator, models):
+    """依次为每个模型生成并保存迁移"""
+    for model in models:
+        migration = generator.generate("blog", model)
+        assert migration is not None
+        generator.file_manager.save_migration(migration)
+
+
+class TestSquash:
+    """测试迁移压缩"""
+
+    def _history(self):
+        return [
+            _model(_user()),
+            _model(_user("email")),
+            _model(_user("email", "nickname", indexed_name=True)),
+            _model(_user("email", indexed_name=True), _post()),
+            _model(_user("email", indexed_name=True), _post(), Entity(name="Tag", columns=[Column(name="id", type="int", is_pk=True)])),
+            _model(_user("email", indexed_name=True), _post()),
+        ]
+
+    def test_squash_collapses_operations(self, tmp_path):
+        """测试先建后改合并为CreateTable，先加后删被消除"""
+        generator = MigrationGenerator(str(tmp_path))
+        _save_history(generator, self._history())
+
+        migration = generator.squash("blog")
+
+        types = [op.type for op in migration.operations]
+        assert types.count("CreateTable") == 2
+        assert "DropTable" not in types
+        assert "RemoveColumn" not in types
+        user = next(op for op in migration.operations if op.type == "CreateTable" and op.table_name == "user")
+        assert [col.name for col in user.columns] == ["id", "name", "email"]
+        assert migration.dependencies == []
+        assert migration.replaces[0] == "blog.0001_initial"
+        assert len(migration.replaces) == 6
+
+    def test_rebuild_skips_replaced_migrations(self, tmp_path):
+        """测试保存压缩迁移后重建状态跳过原迁移且结果不变"""
+        generator = MigrationGenerator(str(tmp_path), snapshot_interval=0)
+        history = self._history()
+        _save_history(generator, history)
+        before = generator._rebuild_state("blog")
+
+        path = generator.file_manager.save_migration(generator.squash("blog"))
+        assert path.name == "0001_squashed_0006_auto_migration.yaml"
+
+        assert generator.load_history("blog").replaced_filenames == {
+            f for f in generator.file_manager.list_migration_files("blog") if f != path.name
+        }
+        after = generator._rebuild_state("blog")
+        assert after.entities.keys() == before.entities.keys()
+        assert generator.generate("blog", history[-1]) is None
+
+    def test_squash_with_originals_deleted(self, tmp_path):
+        """测试删除原迁移后序号与依赖延续"""
+        generator = MigrationGenerator(str(tmp_path))
+        history = self._history()
+        _save_history(generator, history)
+        squashed = generator.file_manager.save_migration(generator.squash("blog"))
+
+        for path in (tmp_path / "blog").glob("000*.yaml"):
+            if path != squashed:
+                path.unlink()
+
+        assert generator.generate("blog", history[-1]) is None
+        migration = generator.generate("blog", _model(_user("email", "age", indexed_name=True), _post()))
+        assert migration.dependencies == ["blog.0001_squashed_0006_auto_migration"]
+        assert generator.file_manager.save_migration(migration).name == "0007_add_age.yaml"
+
+    def test_squash_upto(self, tmp_path):
+        """测试只压缩到指定序号，后续迁移照常重放"""
+        generator = MigrationGenerator(str(tmp_path))
+        history = self._history()
+        _save_history(generator, history)
+
+        migration = generator.squash("blog", upto=3, name="base")
+        assert [replaced.split(".")[1][:4] for replaced in migration.replaces] == ["0001", "0002", "0003"]
+        path = generator.file_manager.save_migration(migration)
+        assert path.name == "0001_squashed_0003_base.yaml"
+
+        assert generator.generate("blog", history[-1]) is None
+        assert generator.file_manager.get_next_migration_number("blog") == 7
+
+        with pytest.raises(ValueError):
+            generator.squash("blog", upto=2)
+
+    def test_squash_keeps_foreign_keys(self, tmp_path):
+        """测试压缩后外键关系保持不变"""
+        generator = MigrationGenerator(str(tmp_path))
+        rel = Relationship(left_entity="Post", right_entity="User", relation_type="many-to-one",
+                           left_column="user_id", right_column="id")
+        final = _model(_user(), _post(), relationships=[rel])
+        _save_history(generator, [_model(_user(), _post()), final])
+
+        migration = generator.squash("blog")
+        assert [op.type for op in migration.operations].count("AddForeignKey") == 1
+        generator.file_manager.save_migration(migration)
+        assert generator.generate("blog", final) is None
+
+    def test_nothing_to_squash(self, tmp_path):
+        """测试少于两个迁移时无法压缩"""
+        generator = MigrationGenerator(str(tmp_path))
+        _save_history(generator, [_model(_user())])
+
+        with pytest.raises(ValueError):
+            generator.squash("blog")
+
+    def test_data_operations_not_squashed(self, tmp_path):
+        """测试范围内有回填时不能压缩，压缩到回填之前的迁移可以"""
+        generator = MigrationGenerator(str(tmp_path))
+        _save_history(generator, self._history()[:2])
+        generator.file_manager.save_migration(Migration(
+            name="fill_email", namespace="blog", dependencies=["blog.0002_add_email"],
+            operations=[RunBackfill(table_name="user", column_name="email", expression="name")],
+        ))
+        _save_history(generator, self._history()[2:3])
+
+        with pytest.raises(ValueError, match="Cannot squash 0003_fill_email.yaml: it contains data operations"):
+            generator.squash("blog")
+        assert len(generator.squash("blog", upto=2).replaces) == 2
+
+    def test_squash_command(self, tmp_path):
+        """测试squash命令"""
+        generator = MigrationGenerator(str(tmp_path))
+        _save_history(generator, self._history()[:3])
+
+        result = CliRunner().invoke(cli, ['squash', '-n', 'blog', '-d', str(tmp_path)])
+        assert result.exit_code == 0
+        assert "Squashed 3 migrations" in result.output
+        assert len(list((tmp_path / "blog").glob("0001_squashed_0003_*.yaml"))) == 1
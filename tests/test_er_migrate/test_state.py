@@ -0,0 +1,291 @@
+"""
+测试迁移状态引擎
+"""
+import pytest
+from x007007007.er.models import ERModel, Entity, Column, Relationship, Index
+from x007007007.er_migrate.differ import ERDiffer
+from x007007007.er_migrate.models import (
+    CreateTable,
+    DropTable,
+    RenameTable,
+    AddColumn,
+    RemoveColumn,
+    AlterColumn,
+    RenameColumn,
+    AddIndex,
+    RemoveIndex,
+    AddForeignKey,
+    RemoveForeignKey,
+    AlterForeignKey,
+    ColumnDefinition,
+    IndexDefinition,
+    ForeignKeyDefinition,
+    Operation,
+)
+from x007007007.er_migrate.state import SchemaState, table_entity_name
+
+
+def _create(table, *columns):
+    return CreateTable(table_name=table, columns=[
+        ColumnDefinition(name="id", type="uuid", primary_key=True, nullable=False),
+        *(ColumnDefinition(name=name, type="string") for name in columns),
+    ])
+
+
+def _fk(table, column, reference, **options):
+    return AddForeignKey(table_name=table, foreign_key=ForeignKeyDefinition(
+        column_name=column, reference_table=reference, reference_column="id", **options
+    ))
+
+
+def _columns(model, entity):
+    return [col.name for col in model.entities[entity].columns]
+
+
+def _foreign_keys(model):
+    return sorted((r.left_entity, r.left_column, r.right_entity, r.right_column) for r in model.relationships)
+
+
+class TestTableOperations:
+    """测试表操作"""
+
+    def test_create_and_drop(self):
+        """测试建表后删表，表上的外键和引用该表的外键一起删除"""
+        state = SchemaState().apply_all([
+            _create("user"), _create("post", "user_id"), _create("tag", "post_id"),
+            _fk("post", "user_id", "user"), _fk("tag", "post_id", "post"),
+            DropTable(table_name="post"),
+        ])
+        model = state.to_er_model()
+        assert set(model.entities) == {"User", "Tag"}
+        assert model.relationships == []
+
+    def test_rename_updates_relationships(self):
+        """测试重命名表同步更新两侧关系中的实体名，包括自引用"""
+        model = SchemaState().apply_all([
+            _create("user"), _create("post", "author_id", "parent_id"),
+            _fk("post", "author_id", "user"), _fk("post", "parent_id", "post"),
+            RenameTable(old_name="post", new_name="article"),
+            RenameTable(old_name="user", new_name="account"),
+        ]).to_er_model()
+        assert set(model.entities) == {"Account", "Article"}
+        assert model.entities["Article"].name == "Article"
+        assert _foreign_keys(model) == [
+            ("Article", "author_id", "Account", "id"),
+            ("Article", "parent_id", "Article", "id"),
+        ]
+
+    def test_entity_names(self):
+        """测试表名到实体名的规则"""
+        assert table_entity_name("blog_post") == "BlogPost"
+
+
+class TestColumnOperations:
+    """测试列操作"""
+
+    def test_add_column_keeps_all_attributes(self):
+        """测试添加列保留精度、小数位和注释"""
+        model = SchemaState().apply_all([
+            _create("order"),
+            AddColumn(table_name="order", column=ColumnDefinition(
+                name="total", type="decimal", precision=10, scale=2, comment="Order total", nullable=False
+            )),
+        ]).to_er_model()
+        total = model.entities["Order"].columns[-1]
+        assert (total.precision, total.scale, total.comment, total.nullable) == (10, 2, "Order total", False)
+
+    def test_alter_column(self):
+        """测试只修改给出的属性"""
+        model = SchemaState().apply_all([
+            _create("user", "name"),
+            AlterColumn(table_name="user", column_name="name", new_max_length=50, new_nullable=False),
+        ]).to_er_model()
+        name = model.entities["User"].columns[1]
+        assert (name.type, name.max_length, name.nullable) == ("string", 50, False)
+
+    def test_remove_column_drops_dependent_index_and_foreign_key(self):
+        """测试删除列时包含该列的索引和该列上的外键一起删除"""
+        model = SchemaState().apply_all([
+            _create("user"), _create("post", "user_id", "title"),
+            _fk("post", "user_id", "user"),
+            AddIndex(table_name="post", index=IndexDefinition(name="idx_post_user_title", columns=["user_id", "title"])),
+            RemoveColumn(table_name="post", column_name="user_id"),
+        ]).to_er_model()
+        assert _columns(model, "Post") == ["id", "title"]
+        assert model.entities["Post"].indexes == []
+        assert model.relationships == []
+
+    def test_rename_column_updates_indexes_and_relationships(self):
+        """测试重命名列同步更新多列索引和两侧关系中的列名，并保持列顺序"""
+        model = SchemaState().apply_all([
+            _create("user", "name"), _create("post", "user_id", "title"),
+            _fk("post", "user_id", "user"),
+            AddIndex(table_name="post", index=IndexDefinition(name="idx_post_user_title", columns=["user_id", "title"])),
+            RenameColumn(table_name="post", old_name="user_id", new_name="author_id"),
+            RenameColumn(table_name="user", old_name="id", new_name="uid"),
+        ]).to_er_model()
+        assert _columns(model, "Post") == ["id", "author_id", "title"]
+        assert model.entities["Post"].indexes[0].columns == ["author_id", "title"]
+        assert _foreign_keys(model) == [("Post", "author_id", "User", "uid")]
+
+    def test_missing_targets_ignored(self):
+        """测试引用不存在的表或列的操作被忽略"""
+        model = SchemaState().apply_all([
+            _create("user"),
+            AddColumn(table_name="ghost", column=ColumnDefinition(name="x", type="int")),
+            RemoveColumn(table_name="user", column_name="missing"),
+            AlterColumn(table_name="user", column_name="missing", new_type="int"),
+            RenameColumn(table_name="ghost", old_name="a", new_name="b"),
+            RemoveIndex(table_name="user", index_name="idx_user_missing"),
+            RemoveForeignKey(table_name="user", constraint_name="fk_user_missing"),
+        ]).to_er_model()
+        assert _columns(model, "User") == ["id"]
+
+
+class TestIndexOperations:
+    """测试索引操作"""
+
+    def test_single_column_indexes_are_column_flags(self):
+        """测试单列索引记录在列标志上，按命名规则删除"""
+        state = SchemaState().apply_all([
+            _create("user", "email", "name"),
+            AddIndex(table_name="user", index=IndexDefinition(name="idx_user_email_unique", columns=["email"], unique=True)),
+            AddIndex(table_name="user", index=IndexDefinition(name="idx_user_name", columns=["name"])),
+        ])
+        email, name = state.to_er_model().entities["User"].columns[1:]
+        assert email.unique and name.indexed
+
+        state.apply_all([
+            RemoveIndex(table_name="user", index_name="idx_user_email_unique"),
+            RemoveIndex(table_name="user", index_name="idx_user_name"),
+        ])
+        assert not email.unique and not name.indexed
+
+    def test_index_names_survive_renames(self):
+        """测试自定义名称的单列索引和重命名前的索引按实际名称删除"""
+        state = SchemaState().apply_all([
+            _create("user", "email", "name"),
+            AddIndex(table_name="user", index=IndexDefinition(name="ix_user_email", columns=["email"])),
+            AddIndex(table_name="user", index=IndexDefinition(name="idx_user_name", columns=["name"])),
+            RenameTable(old_name="user", new_name="account"),
+            RenameColumn(table_name="account", old_name="name", new_name="full_name"),
+        ])
+        email, name = state.to_er_model().entities["Account"].columns[1:]
+        assert (email.index_name, name.index_name) == ("ix_user_email", "idx_user_name")
+
+        state.apply_all([
+            RemoveIndex(table_name="account", index_name="ix_user_email"),
+            RemoveIndex(table_name="account", index_name="idx_user_name"),
+        ])
+        assert not email.indexed and not name.indexed
+
+    def test_multi_column_index(self):
+        """测试多列索引的添加（同名不重复）和删除"""
+        add = AddIndex(table_name="user", index=IndexDefinition(name="idx_user_a_b", columns=["a", "b"], unique=True))
+        state = SchemaState().apply_all([_create("user", "a", "b"), add, add])
+        assert state.to_er_model().entities["User"].indexes == [Index(name="idx_user_a_b", columns=["a", "b"], unique=True)]
+        state.apply(RemoveIndex(table_name="user", index_name="idx_user_a_b"))
+        assert state.to_er_model().entities["User"].indexes == []
+
+
+class TestForeignKeyOperations:
+    """测试外键操作"""
+
+    def test_add_replaces_same_column(self):
+        """测试同一列上再次添加外键会替换原外键"""
+        model = SchemaState().apply_all([
+            _create("user"), _create("team"), _create("post", "owner_id"),
+            _fk("post", "owner_id", "user"),
+            _fk("post", "owner_id", "team", on_delete="SET NULL"),
+        ]).to_er_model()
+        assert _foreign_keys(model) == [("Post", "owner_id", "Team", "id")]
+        assert model.relationships[0].on_delete == "SET NULL"
+
+    def test_alter_and_remove_by_constraint_name(self):
+        """测试按约束名修改和删除外键"""
+        state = SchemaState().apply_all([
+            _create("user"), _create("post", "user_id"), _fk("post", "user_id", "user"),
+            AlterForeignKey(table_name="post", constraint_name="fk_post_user_id", new_on_delete="RESTRICT"),
+        ])
+        assert state.to_er_model().relationships[0].on_delete == "RESTRICT"
+        assert state.to_er_model().relationships[0].on_update == "CASCADE"
+
+        state.apply(RemoveForeignKey(table_name="post", constraint_name="fk_post_user_id"))
+        assert state.to_er_model().relationships == []
+
+    def test_constraint_names_survive_renames(self):
+        """测试表和列重命名后，外键仍按数据库中的原约束名修改和删除"""
+        state = SchemaState().apply_all([
+            _create("author"), _create("book", "author_id", "editor_id"),
+            _fk("book", "author_id", "author"), _fk("book", "editor_id", "author"),
+            RenameTable(old_name="book", new_name="volume"),
+            RenameColumn(table_name="volume", old_name="editor_id", new_name="reviewer_id"),
+        ])
+        names = {rel.left_column: rel.constraint_name for rel in state.to_er_model().relationships}
+        assert names == {"author_id": "fk_book_author_id", "reviewer_id": "fk_book_editor_id"}
+
+        # 按新表名推出的约束名在数据库中不存在
+        state.apply(AlterForeignKey(table_name="volume", constraint_name="fk_volume_author_id", new_on_delete="SET NULL"))
+        assert {rel.on_delete for rel in state.to_er_model().relationships} == {"CASCADE"}
+
+        state.apply_all([
+            AlterForeignKey(table_name="volume", constraint_name="fk_book_author_id", new_on_delete="SET NULL"),
+            RemoveForeignKey(table_name="volume", constraint_name="fk_book_editor_id"),
+        ])
+        assert [(rel.left_column, rel.on_delete) for rel in state.to_er_model().relationships] == \
+            [("author_id", "SET NULL")]
+
+
+class TestStateForms:
+    """测试状态的输入和输出形式"""
+
+    def test_from_model_normalizes_relationships(self):
+        """测试从ERModel建立状态时关系统一为外键在左侧的多对一关系"""
+        model = ERModel()
+        model.add_entity(Entity(name="User", columns=[Column(name="id", type="uuid", is_pk=True)]))
+        model.add_entity(Entity(name="Post", columns=[
+            Column(name="id", type="uuid", is_pk=True), Column(name="user_id", type="uuid"),
+        ]))
+        model.add_relationship(Relationship(
+            left_entity="User", right_entity="Post", relation_type="one-to-many",
+            left_column="id", right_column="user_id"
+        ))
+        state = SchemaState(model)
+        assert _foreign_keys(state.to_er_model()) == [("Post", "user_id", "User", "id")]
+
+        state.apply(RenameColumn(table_name="post", old_name="user_id", new_name="author_id"))
+        assert _foreign_keys(model) == [("Post", "author_id", "User", "id")]
+
+    def test_to_dict(self):
+        """测试输出转换器的字典形式"""
+        data = SchemaState().apply_all([
+            _create("user"), _create("post", "user_id"), _fk("post", "user_id", "user"),
+        ]).to_dict()
+        assert set(data["tables"]) == {"user", "post"}
+        assert [fk.column_name for fk in data["foreign_keys"]] == ["user_id"]
+
+    def test_replaying_diff_reproduces_model(self):
+        """测试重放差异检测生成的操作后，与目标模型没有差异"""
+        target = ERModel()
+        target.add_entity(Entity(name="User", columns=[
+            Column(name="id", type="uuid", is_pk=True, nullable=False),
+            Column(name="email", type="string", max_length=120, unique=True),
+            Column(name="balance", type="decimal", precision=12, scale=2, comment="Balance"),
+        ], indexes=[Index(name="idx_user_email_balance", columns=["email", "balance"])]))
+        target.add_entity(Entity(name="Post", columns=[
+            Column(name="id", type="uuid", is_pk=True, nullable=False),
+            Column(name="user_id", type="uuid", indexed=True),
+        ]))
+        target.add_relationship(Relationship(
+            left_entity="Post", right_entity="User", relation_type="many-to-one",
+            left_column="user_id", right_column="id", on_delete="SET NULL"
+        ))
+
+        differ = ERDiffer()
+        state = SchemaState().apply_all(differ.diff(ERModel(), target))
+        assert differ.diff(state.to_er_model(), target) == []
+
+    def test_unsupported_operation(self):
+        """测试不支持的操作类型"""
+        with pytest.raises(ValueError, match="Unsupported operation type"):
+            SchemaState().apply(Operation(type="RunSQL"))
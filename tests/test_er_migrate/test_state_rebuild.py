@@ -14,6 +14,7 @@
 """
 import pytest
 from x007007007.er.models import ERModel, Entity, Column, Relationship
+from x007007007.er_migrate.differ import ERDiffer
 from x007007007.er_migrate.generator import MigrationGenerator
 from x007007007.er_migrate.file_manager import FileManager
 
@@ -471,8 +472,80 @@ class TestStateRebuildColumnOperations:
         # 重复运行不应该生成新迁移
         migration4 = generator.generate("test", model3)
         assert migration4 is None
+    
+    def test_rebuild_applies_rename_column(self, tmp_path):
+        """测试重建状态时应用RenameColumn操作（包括索引和关系中的列名）"""
+        generator = MigrationGenerator(str(tmp_path), differ=ERDiffer(accept_renames=True))
+        fm = FileManager(str(tmp_path))
+        
+        def model(column_name):
+            model = ERModel()
+            model.add_entity(Entity(name="User", columns=[Column(name="id", type="uuid", is_pk=True)]))
+            model.add_entity(Entity(
+                name="Post",
+                columns=[
+                    Column(name="id", type="uuid", is_pk=True),
+                    Column(name=column_name, type="uuid", indexed=True)
+                ]
+            ))
+            model.add_relationship(Relationship(
+                left_entity="Post", right_entity="User", relation_type="many-to-one",
+                left_column=column_name, right_column="id"
+            ))
+            return model
+        
+        fm.save_migration(generator.generate("test", model("author_id")))
+        
+        migration = generator.generate("test", model("post_author_id"))
+        types = [op.type for op in migration.operations]
+        assert "RenameColumn" in types
+        assert "AddColumn" not in types and "RemoveColumn" not in types
+        fm.save_migration(migration)
+        
+        rebuilt = generator._rebuild_state("test")
+        post_col = rebuilt.entities["Post"].columns[1]
+        assert post_col.name == "post_author_id"
+        assert post_col.indexed is True
+        assert rebuilt.relationships[0].left_column == "post_author_id"
+        
+        # 重复运行不应该生成新迁移
+        assert generator.generate("test", model("post_author_id")) is None
+
 
 
+class TestStateRebuildIndexOperations:
+    """测试状态重建 - 索引操作"""
+    
+    def test_rebuild_applies_add_index_repeated_runs(self, tmp_path):
+        """测试重建状态时应用AddIndex操作（单列和多列索引）"""
+        from x007007007.er.models import Index
+        
+        generator = MigrationGenerator(str(tmp_path))
+        fm = FileManager(str(tmp_path))
+        
+        model = ERModel()
+        model.add_entity(Entity(
+            name="Order",
+            columns=[
+                Column(name="id", type="int", is_pk=True),
+                Column(name="number", type="string", indexed=True),
+                Column(name="customer_id", type="int"),
+                Column(name="created_at", type="datetime")
+            ],
+            indexes=[Index(name="idx_order_customer_created", columns=["customer_id", "created_at"])]
+        ))
+        
+        migration1 = generator.generate("test", model)
+        fm.save_migration(migration1)
+        
+        rebuilt = generator._rebuild_state("test")
+        order = rebuilt.entities["Order"]
+        assert next(c for c in order.columns if c.name == "number").indexed
+        assert [idx.columns for idx in order.indexes] == [["customer_id", "created_at"]]
+        
+        # 重复运行不应该生成新迁移
+        assert generator.generate("test", model) is None
+
 
 class TestStateRebuildForeignKeyOperations:
     """测试状态重建 - 外键操作"""
@@ -554,6 +627,53 @@ class TestStateRebuildForeignKeyOperations:
         assert len(files) == 1
 
 
+    def _models(self):
+        """返回 (无外键, 有外键, 改为SET NULL, 改为引用Team) 四个模型"""
+        def model(target=None, **kwargs):
+            m = ERModel()
+            m.add_entity(Entity(name="User", columns=[Column(name="id", type="uuid", is_pk=True)]))
+            m.add_entity(Entity(name="Team", columns=[Column(name="id", type="uuid", is_pk=True)]))
+            m.add_entity(Entity(name="Post", columns=[
+                Column(name="id", type="uuid", is_pk=True),
+                Column(name="author_id", type="uuid"),
+            ]))
+            if target:
+                m.add_relationship(Relationship(left_entity="Post", right_entity=target, relation_type="many-to-one",
+                                                left_column="author_id", right_column="id", **kwargs))
+            return m
+        return model(), model("User"), model("User", on_delete="SET NULL"), model("Team")
+    
+    def test_rebuild_applies_alter_and_remove_foreign_key(self, tmp_path):
+        """测试重建状态时应用AlterForeignKey、重新指向和RemoveForeignKey"""
+        generator = MigrationGenerator(str(tmp_path))
+        fm = FileManager(str(tmp_path))
+        expected_types = [None, "AddForeignKey", "AlterForeignKey", "RemoveForeignKey", "RemoveForeignKey"]
+        models = self._models()
+        
+        for model, expected in zip(models + (models[0],), expected_types):
+            migration = generator.generate("test", model)
+            if expected is not None:
+                assert migration.operations[0].type == expected
+            fm.save_migration(migration)
+            assert generator.generate("test", model) is None
+        
+        assert generator._rebuild_state("test").relationships == []
+    
+    def test_rebuild_drop_table_removes_its_foreign_keys(self, tmp_path):
+        """测试删除表后其外键不再残留在重建状态中"""
+        generator = MigrationGenerator(str(tmp_path))
+        fm = FileManager(str(tmp_path))
+        _, with_fk, _, _ = self._models()
+        fm.save_migration(generator.generate("test", with_fk))
+        
+        without_post = self._models()[0]
+        del without_post.entities["Post"]
+        fm.save_migration(generator.generate("test", without_post))
+        
+        assert generator._rebuild_state("test").relationships == []
+        assert generator.generate("test", without_post) is None
+
+
 class TestStateRebuildComplexScenarios:
     """测试状态重建 - 复杂场景"""
     
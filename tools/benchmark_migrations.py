@@ -0,0 +1,145 @@
+"""
+Benchmark loading of er_migrate migration files.
+
+Generates a synthetic namespace of CreateTable-heavy migrations in a temporary
+directory and reports per-file and total save/load time for the YAML and JSON
+on-disk formats.
+
+Usage:
+    python tools/benchmark_migrations.py [--count 1000] [--columns 12] [--repeat 3]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import yaml
+
+from x007007007.er_migrate import file_manager as file_manager_module
+from x007007007.er_migrate.file_manager import FileManager
+from x007007007.er_migrate.models import (
+    Migration,
+    CreateTable,
+    AddIndex,
+    ColumnDefinition,
+    IndexDefinition,
+)
+
+NAMESPACE = "bench"
+
+
+def build_migration(number: int, columns: int) -> Migration:
+    """Build one synthetic CreateTable migration."""
+    table_name = f"table_{number:04d}"
+    column_defs = [ColumnDefinition(name="id", type="bigint", primary_key=True, nullable=False)]
+    for i in range(columns - 1):
+        column_defs.append(ColumnDefinition(
+            name=f"field_{i}",
+            type="string",
+            max_length=255,
+            nullable=bool(i % 2),
+            comment=f"synthetic column {i}"
+        ))
+    return Migration(
+        name=f"create_{table_name}",
+        namespace=NAMESPACE,
+        dependencies=[f"{NAMESPACE}.{number - 1:04d}_create_table_{number - 1:04d}"] if number > 1 else [],
+        operations=[
+            CreateTable(table_name=table_name, columns=column_defs),
+            AddIndex(table_name=table_name, index=IndexDefinition(
+                name=f"idx_{table_name}_field_0", columns=["field_0"]
+            )),
+        ]
+    )
+
+
+def time_save(fm: FileManager, count: int, columns: int) -> float:
+    start = time.perf_counter()
+    for number in range(1, count + 1):
+        fm.save_migration(build_migration(number, columns))
+    return time.perf_counter() - start
+
+
+def time_load(fm: FileManager) -> float:
+    start = time.perf_counter()
+    migrations = fm.load_namespace_migrations(NAMESPACE)
+    elapsed = time.perf_counter() - start
+    assert migrations, "No migrations loaded"
+    return elapsed
+
+
+def report(label: str, timings: list, count: int) -> None:
+    best = min(timings)
+    median = statistics.median(timings)
+    print(f"  {label:<28} total {best * 1000:9.1f} ms (median {median * 1000:9.1f} ms)"
+          f"   per file {best / count * 1e6:8.1f} us")
+
+
+def run(count: int, columns: int, repeat: int) -> None:
+    print(f"Synthetic namespace: {count} migrations, {columns} columns per CreateTable")
+    print(f"libyaml available: {yaml.__with_libyaml__}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fm = FileManager(tmp)
+        save_elapsed = time_save(fm, count, columns)
+        print(f"\nSave")
+        report(f"yaml ({file_manager_module.YamlDumper.__name__})", [save_elapsed], count)
+
+        json_tmp = Path(tmp) / "json"
+        json_fm = FileManager(str(json_tmp))
+        json_fm.set_format(NAMESPACE, "json")
+        save_elapsed = time_save(json_fm, count, columns)
+        json_lib = "orjson" if file_manager_module.orjson is not None else "json"
+        report(f"json ({json_lib})", [save_elapsed], count)
+
+        print(f"\nLoad (best of {repeat})")
+        loaders = [file_manager_module.YamlLoader]
+        if loaders[0] is not yaml.SafeLoader:
+            loaders.append(yaml.SafeLoader)
+
+        default_loader = file_manager_module.YamlLoader
+        for loader in loaders:
+            file_manager_module.YamlLoader = loader
+            timings = [time_load(fm) for _ in range(repeat)]
+            report(f"yaml ({loader.__name__})", timings, count)
+        file_manager_module.YamlLoader = default_loader
+
+        # Trusted mode: the first load validates and records hashes, later loads skip validation
+        trusted_fm = FileManager(tmp, trusted=True)
+        time_load(trusted_fm)
+        timings = [time_load(FileManager(tmp, trusted=True)) for _ in range(repeat)]
+        report("yaml trusted", timings, count)
+
+        timings = [time_load(FileManager(str(json_tmp))) for _ in range(repeat)]
+        report(f"json ({json_lib})", timings, count)
+
+        FileManager(str(json_tmp), trusted=True).load_namespace_migrations(NAMESPACE)
+        timings = [time_load(FileManager(str(json_tmp), trusted=True)) for _ in range(repeat)]
+        report(f"json ({json_lib}) trusted", timings, count)
+
+        if file_manager_module.orjson is not None:
+            file_manager_module.orjson = None
+            timings = [time_load(FileManager(str(json_tmp))) for _ in range(repeat)]
+            report("json (json)", timings, count)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000, help="Number of migrations to generate")
+    parser.add_argument("--columns", type=int, default=12, help="Columns per CreateTable")
+    parser.add_argument("--repeat", type=int, default=3, help="Load repetitions")
+    args = parser.parse_args()
+
+    assert args.count > 0, "count must be positive"
+    assert args.columns > 0, "columns must be positive"
+    assert args.repeat > 0, "repeat must be positive"
+    run(args.count, args.columns, args.repeat)
+
+
+if __name__ == "__main__":
+    main()